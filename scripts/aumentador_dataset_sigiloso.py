@@ -1,13 +1,29 @@
 import os
+import random
 import logging
-import google.generativeai as genai
 from pymongo import MongoClient
 import pymongo.errors
 import time
 from dotenv import load_dotenv
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timezone
 import json
+from bson import ObjectId
+from dataset.migracao_dados.pool_chaves_gemini import PoolDeChaves, tokens_da_resposta
+from dataset.migracao_dados.cache_respostas_gemini import armazenar_cache_gemini, consultar_cache_gemini, gerar_conteudo
+from dataset.migracao_dados.erros_gemini import ErroGemini, ErroLimiteTaxa, ErroRespostaInvalida
+from dataset.migracao_dados.consultas_mongo import (
+    consulta_inspiracao_sigilosa,
+    criar_agenda_aumento,
+    garantir_indice_sigilosos,
+    preparar_colecoes,
+)
+from dataset.migracao_dados.fila_trabalho_mongo import ADIADO_INDEFINIDAMENTE
+from dataset.migracao_dados.indice_quase_duplicatas import (
+    consultar_texto_sintetico, encerrar_ao_receber_sigterm, registrar_texto_sintetico, salvar_indice_compartilhado
+)
+from dataset.migracao_dados.metricas_pipeline import iniciar_servidor_metricas, itens_processados, respostas_interpretadas
+from dataset.migracao_dados.registro_prompts import TAREFA_AUMENTO, prompts
 # Supondo que a função classificar_chunk_gemini exista em outro lugar e não seja usada neste script.
 # from dataset.migracao_dados.gemini_classificacao_utils import classificar_chunk_gemini
 
@@ -35,372 +51,117 @@ MONGO_PASS = os.getenv("MONGO_PASS", "senha")
 MONGO_HOST = os.getenv("MONGO_HOST", "localhost")
 MONGO_PORT = os.getenv("MONGO_PORT", "27017")
 MONGO_URI = f"mongodb://{MONGO_USER}:{MONGO_PASS}@{MONGO_HOST}:{MONGO_PORT}/"
-INTERVALO_ENTRE_GERACOES_SEGUNDOS = 30
+INTERVALO_ENTRE_CICLOS_SEGUNDOS = 30
+DOCUMENTOS_POR_CICLO = int(os.getenv("AUMENTO_DOCUMENTOS_POR_CICLO", "50"))
+TAMANHO_BLOCO_INSPIRACAO = 100  # _ids buscados por consulta ao percorrer a permutação
+PROJECAO_INSPIRACAO = {"chunk_texto": 1, "id_documento_anonimizado": 1, "id_documento_original": 1}
 
 NOME_MODELO = 'gemini-2.5-flash'
-VERSAO_PROMPT = 'v3.6' 
 
-# Carregar chaves Gemini
-key_names = [ "GEMINI_API_KEY", "GEMINI_API_KEY_4", "GEMINI_API_KEY_5",
-    "GEMINI_API_KEY_6", "GEMINI_API_KEY_7", "GEMINI_API_KEY_8", "GEMINI_API_KEY_9",]
-gemini_keys = [os.getenv(name) for name in key_names if os.getenv(name)]
-if not gemini_keys:
-    raise ValueError("Nenhuma chave Gemini encontrada no arquivo .env")
-current_key_index = 0
-
-def configurar_gemini(api_key):
-    """Configura o modelo Gemini."""
-    try:
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel(NOME_MODELO)
-        chave_mascarada = f"{api_key[:6]}...{api_key[-4:]}"
-        logger.info(f"Modelo Gemini ({NOME_MODELO}) configurado com sucesso usando a chave de índice {current_key_index} ({chave_mascarada}).")
-        return model
-    except Exception as e:
-        logger.error(f"Erro ao configurar Gemini: {e}")
-        raise
-
-model = configurar_gemini(gemini_keys[current_key_index])
+# Pool compartilhado de chaves Gemini (um cliente pré-construído por chave)
+pool_gemini = PoolDeChaves.compartilhado(NOME_MODELO)
+TOKENS_ESTIMADOS_RESPOSTA = 400  # JSON com até 200 palavras de texto sintético
+# Prefixo fixo da persona (versão padrão) + resposta JSON
+TOKENS_ESTIMADOS_GERACAO = prompts.obter(TAREFA_AUMENTO).tokens_prefixo + TOKENS_ESTIMADOS_RESPOSTA
+
+def extrair_json_resposta(resposta):
+    """Limpeza robusta para extrair o objeto JSON da resposta."""
+    cleaned_response = resposta.strip()
+    json_start = cleaned_response.find('{')
+    json_end = cleaned_response.rfind('}') + 1
+    if json_start != -1 and json_end != -1:
+        json_str = cleaned_response[json_start:json_end]
+        return json.loads(json_str)
+    else:
+        raise json.JSONDecodeError("Nenhum JSON válido encontrado.", cleaned_response, 0)
 
 def gerar_texto_sigiloso(chunk_inspiracao):
-    """Gera texto sigiloso a partir de inspiração."""
-    global model, current_key_index
-
-    # Alterna a chave a cada requisição
-    current_key_index = (current_key_index + 1) % len(gemini_keys)
-    model = configurar_gemini(gemini_keys[current_key_index])
-
-    # CONFIRMADO: Prompt com a lógica de níveis e o campo 'nivel_sigilo_gerado' na saída.
-    prompt_geracao_variada = f"""
-        Você é uma fusão de dois especialistas de alto escalão em um Tribunal Regional do Trabalho (TRT): o Corregedor-Geral, responsável pela fiscalização e disciplina interna, e o Encarregado de Proteção de Dados (DPO), guardião da conformidade com a LGPD. Seu objetivo é criar um arsenal de documentos sintéticos ultrarrealistas para treinar uma IA de classificação de sigilo. A IA precisa aprender a identificar os mais variados e graves vazamentos de dados possíveis dentro do ecossistema do tribunal.
-
-        MISSÃO:
-        Sua missão é gerar um documento sintético SIGILOSO, inspirado por um tema vago, mas transformado em um cenário que represente uma violação grave ou potencialmente grave da LGPD no contexto de servidores e magistrados do TRT. Esqueça documentos genéricos. Pense em comunicações internas, despachos, relatórios e processos que jamais poderiam se tornar públicos.
-
-        DEFINIÇÃO DOS NÍVEIS DE SIGILO (Referência para sua criação):
-
-        SIGILOSO - NÍVEL ALTO: Informações cujo vazamento aniquilaria reputações, causaria danos financeiros ou psicológicos graves, colocaria vidas em risco ou comprometeria investigações críticas. O acesso é para pouquíssimas pessoas nominadas.
-
-        Exemplos no contexto do TRT:
-
-        Laudo psiquiátrico detalhado de um magistrado, indicando um transtorno mental que afeta sua capacidade de julgamento.
-
-        Relatório de investigação conclusivo sobre qualquer forma de assédio (moral ou sexual) contra servidores, com transcrição de depoimentos de natureza íntima.
-
-        Pedido de remoção ou licença de um servidor por comprovada ameaça de morte ou coação por parte de grupos de risco ou facções criminosas.
-
-        Detalhes de ofício judicial para desconto de pensão alimentícia diretamente do salário de um magistrado ou servidor, incluindo dados dos beneficiários.
-
-        Informações sobre acordo financeiro confidencial, com valores e termos, para encerrar um processo disciplinar por conduta inadequada.
-
-        Dados genéticos ou de exames de DNA de um periciando em processo trabalhista para investigação de paternidade ou doença ocupacional.
-
-        Comunicação sigilosa da corregedoria a órgãos de controle sobre suspeita de enriquecimento ilícito ou improbidade administrativa de um servidor.
-
-        Processo de interdição de um servidor, com laudos médicos que atestam sua incapacidade para os atos da vida civil.
-
-        Registros detalhados de participação de um funcionário em programas de reabilitação para dependência de substâncias.
-
-        Medida protetiva de urgência expedida em caso de violência doméstica envolvendo um(a) integrante do tribunal.
-
-        Análise de dados bancários e fiscais de um juiz ou servidor em processo disciplinar sigiloso.
-
-        Relatório de inteligência sobre fatos desabonadores da vida pregressa de um candidato em concurso para a magistratura.
-
-        Relatório de auditoria de TI revelando o acesso indevido de um servidor a processos sigilosos ou a dados pessoais de colegas.
-
-        "Dossiê" ou anotações não oficiais de um gestor sobre dados sensíveis de um subordinado (orientação sexual, filiação político-partidária, etc.), usado para fins de perseguição.
-
-        Comunicação confidencial de órgãos de controle (Receita Federal, COAF) detalhando movimentações financeiras atípicas de um magistrado.
-
-        Laudo médico detalhado sobre a condição de saúde grave de um dependente, anexado a um pedido de licença ou benefício.
-
-        Transcrição de interceptação telefônica autorizada, compartilhada com a corregedoria, detalhando conversas pessoais comprometedoras de um servidor.
-
-        Relatório social detalhado sobre as condições de extrema vulnerabilidade social e familiar de um servidor que solicita remoção.
-
-        Documento interno que justifica a negação de um direito a um titular de dados (servidor), configurando uma potencial violação direta da LGPD.
-
-        Informações sobre diagnóstico de doença estigmatizante ou de notificação compulsória de um servidor ou parte em um processo.
-
-        Registros de atendimentos de um servidor pelo serviço de psicologia ou assistência social do tribunal, detalhando questões de foro íntimo e alta vulnerabilidade emocional.
-
-        SIGILOSO - NÍVEL MÉDIO: Informações confidenciais que, se vazadas, causariam constrangimento severo, prejuízo profissional ou violação de privacidade significativa para os envolvidos.
-
-        Exemplos no contexto do TRT:
-
-        Gestão de Pessoas e RH:
-
-        Avaliação de desempenho periódica, com feedbacks detalhados sobre pontos fortes e a desenvolver.
-
-        E-mails ou memorandos com feedback sobre a performance de estagiários ou aprendizes.
-
-        Processo de solicitação de remoção ou transferência por interesse pessoal, não relacionado à segurança.
-
-        Comunicações sobre o processo seletivo interno, incluindo lista de candidatos e justificativas para aprovação ou recusa.
-
-        Advertência ou notificação de suspensão por infração disciplinar de natureza leve (ex: atrasos, descumprimento de prazos).
-
-        Entrevista de desligamento, contendo as opiniões do servidor que está de saída sobre a gestão e o ambiente de trabalho.
-
-        Justificativas de ausência para resolver problemas pessoais ou familiares.
-
-        Saúde e Bem-estar (Não Graves):
-
-        Atestado médico para afastamento por doenças comuns (gripe, viroses) ou procedimentos de baixa complexidade.
-
-        Agendamento de perícias médicas ou exames de rotina para servidores.
-
-        Pedidos de reembolso ou comprovantes de despesas com consultas, exames ou medicamentos de uso contínuo para doenças não estigmatizantes.
-
-        Laudos de fisioterapia ou relatórios sobre tratamento de Lesão por Esforço Repetitivo (LER/DORT).
-
-        Financeiro e Administrativo:
-
-        Solicitação de adiantamento salarial ou de férias.
-
-        Relatórios detalhados de despesas de viagem para fins de reembolso (diárias, passagens, etc.).
-
-        Rascunhos de atos normativos (portarias, resoluções) antes de sua revisão final e publicação oficial.
-
-        Atas de reuniões de equipe que detalham dificuldades operacionais, metas não atingidas ou conflitos internos de baixo impacto.
-
-        E-mails trocados entre setores para planejamento de orçamento ou alocação de recursos.
-
-        Jurídico e Processual (Interno):
-
-        Comunicações entre a defesa de um servidor e a comissão de PAD, em fases iniciais ou sobre questões procedimentais.
-
-        Parecer jurídico interno sobre questões administrativas de impacto moderado, que orienta a tomada de decisão de um gestor.
-
-        Solicitação de atualização de dados cadastrais sensíveis (endereço, estado civil, dados bancários para depósito).
-
-        Pedido de certidão ou cópia de documentos funcionais para fins particulares (ex: financiamento imobiliário).
-
-        Dados Sensíveis por Definição (LGPD):
-
-        Registro de filiação sindical de um servidor, contido em um formulário de desconto em folha ou em listas da associação.
-
-        Solicitação de dispensa ou de horário especial para cumprimento de obrigações religiosas específicas (ex: Sabbat, Ramadã, etc.).
-
-        Anotações ou comentários informais de um gestor sobre a convicção política ou filosófica de um membro da equipe, registradas em e-mails ou rascunhos de avaliação.
-
-        Planilha de controle para o cadastro de dados biométricos (digital ou facial) dos servidores para um novo sistema de acesso ou ponto eletrônico.
-
-        Formulário de declaração de etnia ou raça para fins de políticas de cotas ou censo interno.
-
-        Pesquisa de clima organizacional que, embora anônima na coleta, possa ter seus resultados brutos cruzados para identificar opiniões individuais.
-
-        PROCESSO DE PENSAMENTO E GERAÇÃO (OBRIGATÓRIO):
-
-        PASSO 1: ANÁLISE DO CONCEITO-CHAVE E GATILHOS DE SENSIBILIDADE.
-        Leia o "Texto de Inspiração" e extraia o conceito mais básico e abstrato. Identifique palavras-chave ou subtemas que possam indicar dados pessoais sensíveis (saúde, filiação, sexualidade, etc.), vulnerabilidades (financeira, psicológica, segurança) ou situações de risco à privacidade que o texto de inspiração, mesmo vago, possa sugerir. Estes serão seus "gatilhos de sensibilidade" para a próxima etapa.
-        Ex: "servidor em férias" -> conceito: afastamento temporário. Gatilho: possíveis despesas médicas durante a viagem, ou licença por motivo de saúde.
-        Ex: "compra de cadeiras" -> conceito: aquisição de material. Gatilho: fraude em licitação, ou dados bancários do fornecedor.
-
-        PASSO 2: COMBINAÇÃO CRIATIVA (O CORAÇÃO DA VARIEDADE).
-        Para gerar um cenário único, escolha aleatoriamente UM item de CADA UM dos três eixos abaixo. A combinação desses três eixos definirá a natureza do seu documento.
-
-        EIXO 1: TIPO DE DOCUMENTO (A forma):
-
-        Portaria da Presidência
-
-        Despacho da Corregedoria
-
-        Ofício Circular Interno (Restrito)
-
-        Relatório Conclusivo de Sindicância
-
-        Atestado Médico (com detalhes)
-
-        Laudo Pericial Psiquiátrico
-
-        Transcrição de Depoimento (PAD)
-
-        E-mail Confidencial entre Diretores
-
-        Folha de Pagamento Detalhada (com descontos)
-
-        Pedido de Remoção por Segurança
-
-        Ata de Reunião de Colegiado (Restrita)
-
-        Solicitação de Acesso a Dados Pessoais (via Lei de Acesso à Informação, mas interna)
-
-        Registro de Auditoria de Acesso a Sistemas
-
-        Análise de Fluxo de Dados (Mapeamento LGPD interno)
-
-        EIXO 2: ASSUNTO SENSÍVEL (O conteúdo):
-
-        Investigação de Assédio Moral/Sexual
-
-        Abertura de Processo Administrativo Disciplinar (PAD)
-
-        Diagnóstico de Doença Grave ou Incapacitante (CID)
-
-        Tratamento de Saúde Mental / Dependência Química
-
-        Conflito Interpessoal Grave (com ameaças)
-
-        Suspeita de Fraude ou Corrupção
-
-        Análise de Desempenho para Exoneração
-
-        Detalhes de Dificuldade Financeira (empréstimos, dívidas)
-
-        Pedido de Proteção a Testemunha (em processo interno)
-
-        Informação sobre Orientação Sexual ou Identidade de Gênero
-
-        Solicitação de Anonimização/Exclusão de Dados Negada (com justificativa)
-
-        Relato de Violação de Dados Pessoais (Data Breach)
-
-        Decisão sobre Compartilhamento de Dados com Terceiros
-
-        Monitoramento de Comunicações Internas (e-mail, chat)
-
-        Denúncia de Retaliação por Exercício de Direito LGPD
-
-        Resultado de Teste de Vazamento de Informações (Pentest)
-
-        EIXO 3: PARTES ENVOLVIDAS (Os atores):
-
-        Juiz Titular de Vara do Trabalho
-
-        Juiz Substituto
-
-        Diretor(a) de Secretaria
-
-        Técnico(a) Judiciário(a)
-
-        Analista Judiciário(a)
-
-        Oficial de Justiça Avaliador Federal
-
-        Perito Médico Judicial
-
-        Servidor(a) Comissionado(a)
-
-        Estagiário(a) de Direito
-
-        Membro da Comissão de Ética
-
-        Coordenador(a) de TI e Segurança da Informação
-
-        Advogado(a) de Servidor em PAD
-
-        Parente/Dependente de Magistrado/Servidor (com dados próprios)
-
-        Encarregado de Proteção de Dados (DPO)
-
-        Membro da Equipe de Tratamento de Incidentes (ETIR)
-
-        PASSO 3: TRANSFORMAÇÃO CONCEITUAL E ENFÂSE LGPD.
-        Use o conceito-chave e os gatilhos de sensibilidade do PASSO 1 como pivô para o cenário criado pela sua combinação de eixos do PASSO 2. A ligação deve ser inteligente e, sempre que possível, evidenciar uma potencial violação, risco ou tratamento sensível de dados pessoais conforme a LGPD.
-        Ex: Se a inspiração era "servidor em férias", o conceito é "afastamento temporário", e o gatilho "licença por motivo de saúde". Se a combinação foi "Atestado Médico" + "Tratamento de Saúde Mental" + "Juiz Substituto", a transformação seria um atestado detalhado de licença de um juiz substituto para tratamento de saúde mental, com o risco de vazamento pela sensibilidade do dado.
-
-        PASSO 4: GERAÇÃO DO DOCUMENTO REALISTA.
-        Escreva o documento, materializando a sua transformação, seguindo as diretrizes abaixo.
-
-        Diretriz de Formato e Estilo (MUITO IMPORTANTE): O texto_sintetico deve ser um fragmento contínuo de texto, como se fosse um parágrafo ou uma sequência de parágrafos extraídos de um documento maior ou de um e-mail. NÃO inclua títulos, cabeçalhos formais (como 'DE:', 'PARA:', 'ASSUNTO:'), nem seções numeradas ou com marcadores (como '1. DOS FATOS', '2. CONCLUSÃO'). O objetivo é simular um trecho de texto vazado, não um documento oficial completo e formatado.
-
-        Diretriz de Realismo: Seja extremamente verossímil. Incorpore jargões, números de processo fictícios (ex: PAD nº 1234/2025-TRT25), matrículas funcionais, datas, e referências a artigos de leis (LGPD, Lei 8.112/90, Provimentos da Corregedoria, Resoluções do CNJ) ou regimentos internos fictícios. Destaque por que a informação é sensível sob a LGPD (Art. 5º e 11º) e como seu vazamento implicaria em risco aos direitos e liberdades dos titulares (Art. 49º). Forneça detalhes que justifiquem o sigilo e a necessidade de tratamento restrito. Pense como um Corregedor analisando uma falha disciplinar e um DPO avaliando um incidente de segurança ou privacidade.
-
-        Diretriz de Tamanho e Concisão (CRÍTICO): O texto final gerado (texto_sintetico) NÃO DEVE, EM HIPÓTESE ALGUMA, ULTRAPASSAR 200 PALAVRAS. A capacidade de resumir a essência de um documento complexo de forma concisa é parte da sua tarefa como especialista.
-
-        EXEMPLO DE TRANSFORMAÇÃO APLICANDO O NOVO PROCESSO:
-
-        Inspiração: "A servidora Maria Souza solicitou troca de monitor."
-
-        PASSO 1 (Análise): Conceito-chave é necessidade de equipamento específico por um servidor. Gatilho de Sensibilidade: possível condição de saúde que justifique a solicitação.
-
-        PASSO 2 (Combinação): Escolho aleatoriamente:
-
-        Eixo 1: Atestado Médico (com detalhes)
-
-        Eixo 2: Diagnóstico de Doença Grave ou Incapacitante (CID)
-
-        Eixo 3: Analista Judiciário(a)
-
-        PASSO 3 (Transformação): A necessidade de um equipamento específico não é por preferência, mas por uma condição médica grave. A Analista Judiciária Maria Souza precisa de um monitor especial devido a um laudo de doença degenerativa da visão, o que configura um tratamento de dado sensível sob a LGPD, com risco de discriminação caso vazado.
-
-        PASSO 4 (Geração): Gero um atestado médico detalhado para Maria Souza, matrícula 9876, emitido pelo Dr. Carlos Lima, CRM 12345, diagnosticando "Degeneração Macular (CID-10 H35.3)", recomendando trabalho remoto e o uso de um monitor de alta resolução com contraste adaptativo para evitar a progressão da cegueira. O documento é marcado como "CONFIDENCIAL", e o Art. 11 da LGPD justifica seu tratamento restrito devido à natureza de dado sensível de saúde. (Texto com ~90 palavras).
-
-        TEXTO DE INSPIRAÇÃO PARA ESTA TAREFA:
-        "{chunk_inspiracao['chunk_texto']}"
-
-        SAÍDA OBRIGATÓRIA (JSON VÁLIDO):
-        Sua resposta DEVE ser uma string JSON válida contendo um único objeto com as chaves:
-
-        "justificativa_transformacao": Uma frase curta explicando a conexão lógica que você criou (Ex: "Transformei a solicitação de um item em um laudo médico que justifica a necessidade do item.").
-
-        "nivel_sigilo_gerado": A string exata do nível de sigilo que melhor representa o documento gerado (Ex: "SIGILOSO - NÍVEL ALTO" ou "SIGILOSO - NÍVEL MÉDIO").
-
-        "texto_sintetico": O texto completo do documento sigiloso gerado, em formato de string, com no máximo 200 palavras.
-
-        "confianca_geracao_sintetica": Um número de 0.0 a 1.0.
-
-        GERE AGORA SEU DOCUMENTO SIGILOSO SEGUINDO TODOS OS PASSOS:
-        """
-    
-
-    tentativas_chave = 0
-    while tentativas_chave < len(gemini_keys):
-        try:
-            response = model.generate_content(prompt_geracao_variada)
-            # Limpeza robusta para extrair o JSON da resposta
-            cleaned_response = response.text.strip()
-            json_start = cleaned_response.find('{')
-            json_end = cleaned_response.rfind('}') + 1
-            if json_start != -1 and json_end != -1:
-                json_str = cleaned_response[json_start:json_end]
-                return json.loads(json_str)
-            else:
-                raise json.JSONDecodeError("Nenhum JSON válido encontrado.", cleaned_response, 0)
-        except Exception as e:
-            if "quota" in str(e).lower() or "rate limit" in str(e).lower() or "blocked" in str(e).lower():
-                logger.warning(f"Quota/Limite da chave {current_key_index + 1} excedido. Tentando próxima chave...")
-                tentativas_chave += 1
-                current_key_index = (current_key_index + 1) % len(gemini_keys)
-                model = configurar_gemini(gemini_keys[current_key_index])
-                continue # Tenta novamente com a nova chave
-            else:
-                logger.error(f"Erro inesperado na API do Gemini: {e}")
-                return None
-    logger.error("Todas as chaves Gemini falharam ou atingiram o limite.")
-    return None
-
-def processo_de_aumento(client):
-    """Gera e salva textos sigilosos no DB."""
+    """Gera texto sigiloso a partir de inspiração.
+
+    O resultado traz a `versao_prompt` usada. Erros da API são lançados como ErroGemini;
+    resposta sem JSON aproveitável, como ErroRespostaInvalida com o texto recebido.
+    """
+    template = prompts.escolher(TAREFA_AUMENTO, chunk_inspiracao['chunk_texto'])
+    prompt_geracao_variada = template.montar(inspiracao=chunk_inspiracao['chunk_texto'])
+
+    resposta_em_cache = consultar_cache_gemini(NOME_MODELO, template.versao, prompt_geracao_variada)
+    if resposta_em_cache is not None:
+        logger.info("Geração atendida pelo cache de respostas do Gemini.")
+        return dict(extrair_json_resposta(resposta_em_cache), versao_prompt=template.versao)
+
+    def chamar(chave):
+        response = gerar_conteudo(chave.modelo, prompt_geracao_variada)
+        pool_gemini.registrar_tokens(chave, TOKENS_ESTIMADOS_GERACAO, tokens_da_resposta(response))
+        return response
+
+    response, _ = pool_gemini.executar(TOKENS_ESTIMADOS_GERACAO, chamar)
+    texto_resposta = None
+    try:
+        texto_resposta = response.text
+        resultado = extrair_json_resposta(texto_resposta)
+    except ValueError as e:  # Inclui json.JSONDecodeError e resposta sem texto
+        respostas_interpretadas.incrementar(tarefa="aumento", forma="falha")
+        raise ErroRespostaInvalida(f"Resposta do Gemini sem JSON utilizável: {e}", saida_bruta=texto_resposta) from e
+    respostas_interpretadas.incrementar(tarefa="aumento", forma="json")
+    armazenar_cache_gemini(NOME_MODELO, template.versao, prompt_geracao_variada, response.text)
+    return dict(resultado, versao_prompt=template.versao)
+
+def embaralhar_ids_inspiracao(collection_chunks):
+    """Permutação aleatória dos _ids elegíveis como inspiração, lida uma única vez por rodada."""
+    consulta = consulta_inspiracao_sigilosa(datetime.now(timezone.utc))
+    ids = [doc["_id"] for doc in collection_chunks.find(consulta, {"_id": 1})]
+    random.shuffle(ids)
+    logger.info(f"{len(ids)} chunks elegíveis como inspiração embaralhados.")
+    return ids
+
+def iterar_chunks_inspiracao(collection_chunks, ids):
+    """Percorre a permutação em blocos, buscando os chunks por _id.
+
+    O filtro de elegibilidade é reaplicado em cada bloco, então chunks usados por outro
+    processo (ou com nova tentativa adiada) depois do embaralhamento são pulados.
+    """
+    for inicio in range(0, len(ids), TAMANHO_BLOCO_INSPIRACAO):
+        bloco = ids[inicio:inicio + TAMANHO_BLOCO_INSPIRACAO]
+        filtro = dict(consulta_inspiracao_sigilosa(datetime.now(timezone.utc)), _id={"$in": bloco})
+        docs = {doc["_id"]: doc for doc in collection_chunks.find(filtro, PROJECAO_INSPIRACAO)}
+        for chunk_id in bloco:
+            if chunk_id in docs:
+                yield docs[chunk_id]
+
+def registrar_falha_aumento(agenda, collection_chunks, chunk_id, erro, saida_bruta=None):
+    """Adia o chunk de inspiração com backoff; esgotadas as tentativas, ele vai para as falhas permanentes.
+
+    Sem status de fila, o chunk esgotado sai da consulta de inspiração com a próxima
+    tentativa adiada indefinidamente.
+    """
+    tentativas = agenda.registrar_falha(
+        collection_chunks, {"_id": chunk_id, "usado_para_geracao_sigilosa": False}, chunk_id, erro, saida_bruta,
+        campos_ao_esgotar={agenda.campo_proxima_tentativa: ADIADO_INDEFINIDAMENTE}
+    )
+    if tentativas is not None and tentativas >= agenda.max_tentativas:
+        logger.error(f"Chunk de inspiração {chunk_id} atingiu o máximo de tentativas e foi marcado como falha permanente: {erro}")
+    elif tentativas is not None:
+        logger.warning(f"Falha ao gerar texto sigiloso a partir do chunk {chunk_id}. Tentativa {tentativas} de {agenda.max_tentativas}: {erro}")
+
+def processo_de_aumento(collection_chunks, collection_sigilosos, chunk_inspiracao, agenda):
+    """Gera e salva um texto sigiloso a partir do chunk de inspiração. Retorna True se salvou."""
     try:
-        db = client['dataset_treinamento']
-        collection_chunks = db['chunks']
-        collection_sigilosos = db['chunks_sigilosos']
-        
-        logger.info("Procurando um chunk de inspiração em 'chunks'...")
-        query_busca = {
-            "usado_para_geracao_sigilosa": {"$ne": True},
-            "$or": [
-                {"erro_rotulagem": {"$exists": False}},
-                {"erro_rotulagem": False}
-            ]
-        }
-        pipeline = [{"$match": query_busca}, {"$sample": {"size": 1}}]
-        chunk_inspiracao = next(collection_chunks.aggregate(pipeline), None)
-
-        if not chunk_inspiracao:
-            logger.warning("Nenhum chunk novo encontrado para gerar dados sigilosos.")
-            return
-
         chunk_id_original = chunk_inspiracao["_id"]
-        logger.info(f"Chunk de inspiração encontrado: {chunk_id_original}")
+        logger.info(f"Chunk de inspiração: {chunk_id_original}")
 
-        resultado_geracao = gerar_texto_sigiloso(chunk_inspiracao)
+        try:
+            resultado_geracao = gerar_texto_sigiloso(chunk_inspiracao)
+        except ErroLimiteTaxa as e:
+            # Quota não é defeito do chunk: ele continua elegível sem gastar tentativa
+            logger.error(f"Quota esgotada em todas as chaves Gemini: {e}")
+            return False
+        except ErroGemini as e:
+            registrar_falha_aumento(agenda, collection_chunks, chunk_id_original, f"{type(e).__name__}: {e}", e.saida_bruta)
+            return False
 
         if resultado_geracao and resultado_geracao.get("texto_sintetico"):
             doc_sigiloso = {
+                "_id": ObjectId(),
                 "id_chunk_original": chunk_id_original,
                 "confianca_geracao": resultado_geracao.get("confianca_geracao_sintetica"),
                 # Novos campos sendo salvos no DB
@@ -413,40 +174,96 @@ def processo_de_aumento(client):
                 "status_rotulagem": "pendente", 
                 "texto_sintetico": resultado_geracao["texto_sintetico"],
                 "nome_modelo": NOME_MODELO,
-                "versao_prompt": VERSAO_PROMPT
+                "versao_prompt": resultado_geracao.get("versao_prompt")
             }
-            insert_result = collection_sigilosos.insert_one(doc_sigiloso)
-            logger.info(f"Novo chunk sigiloso gerado e inserido com o ID: {insert_result.inserted_id}")
-
-            # Marca o chunk original como utilizado
-            collection_chunks.update_one(
-                {"_id": chunk_id_original},
+            # A persona fixa tende a repetir textos: quase-duplicatas são gravadas, mas não rotuladas.
+            # O texto só entra no índice depois de gravado e com o chunk marcado: gerações
+            # descartadas não podem virar referência de quase-duplicata para textos válidos
+            doc_sigiloso.update(consultar_texto_sintetico("chunks_sigilosos", doc_sigiloso["_id"], doc_sigiloso["texto_sintetico"]))
+            # Grava antes de marcar, com upsert idempotente por chunk de inspiração: se a gravação
+            # falhar, o chunk continua elegível; se a marcação falhar, a próxima rodada só a refaz
+            try:
+                gravacao = collection_sigilosos.update_one(
+                    {"id_chunk_original": chunk_id_original}, {"$setOnInsert": doc_sigiloso}, upsert=True
+                )
+                inserido = gravacao.upserted_id is not None
+            except pymongo.errors.DuplicateKeyError:
+                # Outro processo fez o upsert do mesmo chunk ao mesmo tempo
+                inserido = False
+            # A condição no filtro garante que cada chunk inspire no máximo um documento
+            marcacao = collection_chunks.update_one(
+                {"_id": chunk_id_original, "usado_para_geracao_sigilosa": False},
                 {"$set": {"usado_para_geracao_sigilosa": True}}
             )
-            logger.info(f"Chunk de inspiração {chunk_id_original} marcado como utilizado.")
+            if not inserido:
+                logger.warning(f"Chunk de inspiração {chunk_id_original} já tem documento sigiloso. Descartando a geração.")
+                return False
+            if marcacao.modified_count == 0:
+                # O chunk foi usado por outro caminho: desfaz só o documento que este processo inseriu
+                collection_sigilosos.delete_one({"_id": doc_sigiloso["_id"]})
+                logger.warning(f"Chunk de inspiração {chunk_id_original} já foi utilizado por outro processo. Descartando a geração.")
+                return False
+            itens_processados.incrementar(estagio="aumento")
+            registrar_texto_sintetico("chunks_sigilosos", doc_sigiloso["_id"], doc_sigiloso["texto_sintetico"])
+            logger.info(f"Novo chunk sigiloso gerado e inserido com o ID: {doc_sigiloso['_id']}")
+            return True
         else:
-            logger.error(f"Falha ao gerar texto sintético para o chunk de inspiração {chunk_id_original}.")
+            registrar_falha_aumento(
+                agenda, collection_chunks, chunk_id_original,
+                "Resposta do Gemini sem texto_sintetico.", json.dumps(resultado_geracao, ensure_ascii=False)
+            )
+    except pymongo.errors.ConnectionFailure:
+        raise
     except Exception as e:
         logger.error(f"Erro geral no processo de aumento: {e}", exc_info=True)
+    return False
 
 def main():
-    """Loop principal do serviço."""
-    while True:
-        client = None
-        try:
-            logger.info("Iniciando ciclo de aumento de dados sigilosos...")
-            client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=10000)
-            client.admin.command('ping')
-            logger.info("Conexão com MongoDB estabelecida com sucesso.")
-            processo_de_aumento(client)
-        except pymongo.errors.ConnectionFailure as e:
-            logger.error(f"Não foi possível conectar ao MongoDB: {e}")
-        finally:
-            if client:
-                client.close()
-                logger.info("Conexão com MongoDB fechada.")
-        logger.info(f"Ciclo concluído. Aguardando {INTERVALO_ENTRE_GERACOES_SEGUNDOS} segundos.")
-        time.sleep(INTERVALO_ENTRE_GERACOES_SEGUNDOS)
+    """Loop principal do serviço: um único cliente MongoDB e vários documentos por ciclo."""
+    iniciar_servidor_metricas()
+    encerrar_ao_receber_sigterm()
+    client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=10000)
+    colecoes_preparadas = False
+    inspiracoes = iter(())
+    try:
+        while True:
+            try:
+                db = client['dataset_treinamento']
+                collection_chunks = db['chunks']
+                collection_sigilosos = db['chunks_sigilosos']
+                if not colecoes_preparadas:
+                    client.admin.command('ping')
+                    logger.info("Conexão com MongoDB estabelecida com sucesso.")
+                    preparar_colecoes(db)
+                    garantir_indice_sigilosos(db)
+                    agenda = criar_agenda_aumento(db)
+                    colecoes_preparadas = True
+
+                logger.info(f"Iniciando ciclo de aumento de dados sigilosos (até {DOCUMENTOS_POR_CICLO} documentos)...")
+                gerados = 0
+                for _ in range(DOCUMENTOS_POR_CICLO):
+                    chunk_inspiracao = next(inspiracoes, None)
+                    if chunk_inspiracao is None:
+                        # Permutação esgotada: embaralha de novo os chunks ainda não usados
+                        inspiracoes = iterar_chunks_inspiracao(collection_chunks, embaralhar_ids_inspiracao(collection_chunks))
+                        chunk_inspiracao = next(inspiracoes, None)
+                    if chunk_inspiracao is None:
+                        logger.warning("Nenhum chunk novo encontrado para gerar dados sigilosos.")
+                        break
+                    if processo_de_aumento(collection_chunks, collection_sigilosos, chunk_inspiracao, agenda):
+                        gerados += 1
+                logger.info(f"Ciclo concluído: {gerados} documentos sigilosos gerados.")
+                salvar_indice_compartilhado()
+            except pymongo.errors.ConnectionFailure as e:
+                # O cliente reconecta sozinho; a permutação é refeita no próximo ciclo
+                logger.error(f"Falha de conexão com o MongoDB: {e}")
+                inspiracoes = iter(())
+            logger.info(f"Aguardando {INTERVALO_ENTRE_CICLOS_SEGUNDOS} segundos.")
+            time.sleep(INTERVALO_ENTRE_CICLOS_SEGUNDOS)
+    finally:
+        salvar_indice_compartilhado()
+        client.close()
+        logger.info("Conexão com MongoDB fechada.")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
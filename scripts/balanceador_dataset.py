@@ -0,0 +1,184 @@
+import os
+import logging
+import argparse
+from pathlib import Path
+import numpy as np
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+from dataset.migracao_dados.exportador_dataset import DESTINO_PADRAO, carregar_dataset
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Etapa 9 do pipeline: subamostragem estratificada por classe, ponderada pela confiança do rótulo
+NOMES_CLASSES = {0: "Sigiloso", 1: "Interno", 2: "Público"}
+ALVO_POR_CLASSE_PADRAO = int(os.getenv("BALANCEAMENTO_ALVO_POR_CLASSE", "3333"))
+SEMENTE_PADRAO = int(os.getenv("BALANCEAMENTO_SEMENTE", "42"))
+# Peso de sorteio = confiança ** expoente: 0 ignora a confiança; valores altos quase só escolhem os mais confiantes
+EXPOENTE_CONFIANCA = float(os.getenv("BALANCEAMENTO_EXPOENTE_CONFIANCA", "2.0"))
+CONFIANCA_MINIMA = float(os.getenv("BALANCEAMENTO_CONFIANCA_MINIMA", "0.0"))
+COLUNAS_BALANCEAMENTO = ["classificacao_acesso", "confianca_classificacao", "fonte", "id_documento_original"]
+
+
+def carregar_arrays(tabela):
+    """Converte as colunas usadas no balanceamento em vetores NumPy.
+
+    `fonte` e `id_documento_original` viram códigos inteiros (via dicionário, sem comparar
+    strings em Python); documentos sem id recebem códigos próprios, um por linha.
+    """
+    classes = tabela.column("classificacao_acesso").to_numpy()
+    confianca = tabela.column("confianca_classificacao").to_numpy(zero_copy_only=False).astype(np.float64)  # nulos viram NaN
+
+    fonte = tabela.select(["fonte"]).unify_dictionaries().column("fonte").combine_chunks()
+    fontes = fonte.indices.fill_null(-1).to_numpy(zero_copy_only=False).astype(np.int64)
+    nomes_fontes = fonte.dictionary.to_pylist()
+
+    documento = tabela.column("id_documento_original").combine_chunks().dictionary_encode()
+    documentos = documento.indices.fill_null(-1).to_numpy(zero_copy_only=False).astype(np.int64)
+    sem_documento = documentos < 0
+    documentos[sem_documento] = len(documento.dictionary) + np.arange(np.count_nonzero(sem_documento))
+    return {
+        "classes": classes,
+        "confianca": confianca,
+        "fontes": fontes,
+        "nomes_fontes": nomes_fontes,
+        "documentos": documentos,
+    }
+
+
+def chaves_de_sorteio(confianca, rng, expoente=EXPOENTE_CONFIANCA, confianca_minima=CONFIANCA_MINIMA):
+    """Chaves de Efraimidis-Spirakis: os k maiores log(u)/peso de um grupo formam uma amostra
+    sem reposição com probabilidade proporcional ao peso. Confiança ausente ou abaixo do
+    mínimo recebe -inf (só entra se faltarem linhas na classe)."""
+    pesos = np.power(np.nan_to_num(confianca, nan=0.0), expoente)
+    pesos[~(confianca >= confianca_minima)] = 0.0  # ~(>=) também descarta NaN
+    u = rng.random(len(confianca))
+    with np.errstate(divide="ignore"):
+        return np.log(u) / pesos
+
+
+def _posicao_no_grupo(grupos_ordenados):
+    """Posição (0, 1, 2, ...) de cada linha dentro do seu grupo, para grupos já contíguos."""
+    n = len(grupos_ordenados)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+    inicios = np.flatnonzero(np.r_[True, grupos_ordenados[1:] != grupos_ordenados[:-1]])
+    return np.arange(n) - np.repeat(inicios, np.diff(np.r_[inicios, n]))
+
+
+def cotas_proporcionais(contagens, alvo):
+    """Divide `alvo` entre estratos proporcionalmente às contagens (maiores restos), sem exceder nenhuma."""
+    total = contagens.sum()
+    if total <= alvo:
+        return contagens.copy()
+    exatas = contagens * (alvo / total)
+    cotas = np.floor(exatas).astype(np.int64)
+    faltam = int(alvo - cotas.sum())
+    if faltam:
+        cotas[np.argsort(cotas - exatas, kind="stable")[:faltam]] += 1
+    return cotas
+
+
+def selecionar_balanceado(classes, confianca, fontes=None, documentos=None,
+                          alvo_por_classe=ALVO_POR_CLASSE_PADRAO, max_por_documento=None,
+                          semente=SEMENTE_PADRAO, expoente=EXPOENTE_CONFIANCA,
+                          confianca_minima=CONFIANCA_MINIMA):
+    """Índices (ordenados) das linhas escolhidas: até `alvo_por_classe` por classe.
+
+    Cada classe é dividida em estratos por `fonte`, com cotas proporcionais ao tamanho
+    de cada fonte, e dentro de cada estrato o sorteio é ponderado pela confiança. Com
+    `max_por_documento`, nenhum documento original contribui com mais linhas que isso,
+    evitando que poucos processos dominem o dataset (e vazem entre treino e teste).
+    Tudo é feito com ordenações vetorizadas: a mesma semente reproduz a mesma seleção.
+    """
+    n = len(classes)
+    classes = np.asarray(classes, dtype=np.int64)
+    fontes = np.zeros(n, dtype=np.int64) if fontes is None else np.asarray(fontes, dtype=np.int64)
+    rng = np.random.default_rng(semente)
+    chaves = chaves_de_sorteio(np.asarray(confianca, dtype=np.float64), rng, expoente, confianca_minima)
+
+    elegiveis = np.arange(n)
+    if max_por_documento is not None and documentos is not None:
+        # Cada documento mantém as suas `max_por_documento` linhas de maior chave
+        ordem = np.lexsort((-chaves, documentos))
+        posicao = _posicao_no_grupo(documentos[ordem])
+        elegiveis = np.sort(ordem[posicao < max_por_documento])
+
+    # Estrato = (classe, fonte); fonte ausente (-1) vira um estrato próprio
+    codigos_fonte = fontes[elegiveis] + 1
+    largura = int(codigos_fonte.max(initial=0)) + 1
+    estratos = classes[elegiveis] * largura + codigos_fonte
+    valores_estrato, contagens = np.unique(estratos, return_counts=True)
+    classes_estrato = valores_estrato // largura
+    cotas = np.zeros(len(valores_estrato), dtype=np.int64)
+    for classe in np.unique(classes_estrato):
+        do_estrato = classes_estrato == classe
+        cotas[do_estrato] = cotas_proporcionais(contagens[do_estrato], alvo_por_classe)
+        if contagens[do_estrato].sum() < alvo_por_classe:
+            logger.warning(f"Classe {NOMES_CLASSES.get(int(classe), classe)} tem só {contagens[do_estrato].sum()} linhas elegíveis para o alvo de {alvo_por_classe}; todas serão usadas.")
+
+    ordem = np.lexsort((-chaves[elegiveis], estratos))
+    estratos_ordenados = estratos[ordem]
+    posicao = _posicao_no_grupo(estratos_ordenados)
+    cota_da_linha = cotas[np.searchsorted(valores_estrato, estratos_ordenados)]
+    return np.sort(elegiveis[ordem[posicao < cota_da_linha]])
+
+
+def resumir_composicao(classes, selecionados):
+    """Loga a tabela "antes vs depois" por classe, no formato do README."""
+    antes = np.bincount(classes.astype(np.int64), minlength=3)
+    depois = np.bincount(classes[selecionados].astype(np.int64), minlength=3)
+    logger.info("Classe     |  Antes  | % Antes | Depois | % Depois")
+    for classe, nome in NOMES_CLASSES.items():
+        logger.info(f"{nome:<10} | {antes[classe]:>7} | {antes[classe] / max(antes.sum(), 1):>7.1%} | {depois[classe]:>6} | {depois[classe] / max(depois.sum(), 1):>8.1%}")
+    logger.info(f"Total      | {antes.sum():>7} |         | {depois.sum():>6} |")
+
+
+def gravar_selecao(tabela, selecionados, saida):
+    """Grava as linhas escolhidas em .arrow/.parquet ou, para outra extensão, só os _ids (um por linha)."""
+    saida = Path(saida)
+    if saida.suffix == ".arrow":
+        subconjunto = tabela.take(pa.array(selecionados))
+        with ipc.new_file(str(saida), subconjunto.schema) as escritor:
+            escritor.write_table(subconjunto)
+    elif saida.suffix == ".parquet":
+        pq.write_table(tabela.take(pa.array(selecionados)), str(saida), compression="zstd")
+    else:
+        ids = tabela.column("_id").take(pa.array(selecionados)).to_pylist()
+        saida.write_text("\n".join(ids) + "\n", encoding="utf-8")
+    logger.info(f"{len(selecionados)} linhas balanceadas gravadas em '{saida}'.")
+
+
+def balancear_dataset(destino=DESTINO_PADRAO, saida=None, alvo_por_classe=ALVO_POR_CLASSE_PADRAO,
+                      max_por_documento=None, semente=SEMENTE_PADRAO, estratificar_por_fonte=True):
+    """Balanceia o dataset exportado por `exportador_dataset.py`; retorna a tabela e os índices escolhidos."""
+    tabela = carregar_dataset(destino)
+    arrays = carregar_arrays(tabela.select(COLUNAS_BALANCEAMENTO))
+    selecionados = selecionar_balanceado(
+        arrays["classes"], arrays["confianca"],
+        fontes=arrays["fontes"] if estratificar_por_fonte else None,
+        documentos=arrays["documentos"],
+        alvo_por_classe=alvo_por_classe,
+        max_por_documento=max_por_documento,
+        semente=semente,
+    )
+    resumir_composicao(arrays["classes"], selecionados)
+    if saida:
+        gravar_selecao(tabela, selecionados, saida)
+    return tabela, selecionados
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Balanceia o dataset exportado por subamostragem ponderada pela confiança.")
+    parser.add_argument("--destino", default=str(DESTINO_PADRAO), help="Diretório do dataset exportado.")
+    parser.add_argument("--saida", default=str(Path(DESTINO_PADRAO).parent / "dataset_balanceado.arrow"),
+                        help=".arrow/.parquet grava as linhas; outra extensão grava só os _ids.")
+    parser.add_argument("--alvo-por-classe", type=int, default=ALVO_POR_CLASSE_PADRAO)
+    parser.add_argument("--max-por-documento", type=int, default=None)
+    parser.add_argument("--semente", type=int, default=SEMENTE_PADRAO)
+    parser.add_argument("--sem-estratificar-fonte", action="store_true",
+                        help="Sorteia cada classe inteira, sem preservar a proporção entre fontes.")
+    args = parser.parse_args()
+    balancear_dataset(args.destino, args.saida, args.alvo_por_classe, args.max_por_documento,
+                      args.semente, not args.sem_estratificar_fonte)
@@ -0,0 +1,308 @@
+import os
+import sys
+import json
+import time
+import queue
+import random
+import logging
+import argparse
+import tempfile
+import threading
+from pathlib import Path
+import numpy as np
+from dotenv import load_dotenv
+from pymongo import MongoClient, monitoring
+
+# O backend falso e os orçamentos sem limite precisam estar definidos antes de os scripts
+# montarem o pool compartilhado (na importação); variáveis já definidas são respeitadas
+os.environ.setdefault("GEMINI_BACKEND", "falso")
+os.environ.setdefault("GEMINI_CACHE_DESATIVADO", "1")
+os.environ.setdefault("GEMINI_RPM_POR_CHAVE", "1000000")
+os.environ.setdefault("GEMINI_TPM_POR_CHAVE", "1000000000")
+# Prefixo fixo dos prompts como contexto em cache: o relatório mostra os tokens economizados
+os.environ.setdefault("GEMINI_PREFIXO_MODO", "contexto")
+os.environ.setdefault("DEDUP_CAMINHO_INDICE", str(Path(tempfile.gettempdir()) / "benchmark_indice_quase_duplicatas.npz"))
+
+from dataset.migracao_dados.buffer_escrita_mongo import BufferEscritaMongo
+from dataset.migracao_dados.consultas_mongo import (
+    NOME_MODELO_SINTESE,
+    criar_agenda_aumento,
+    criar_fila_rotulagem,
+    criar_fila_sintese,
+    preparar_colecoes,
+)
+from dataset.migracao_dados.modelo_gemini_falso import estatisticas_backend_falso
+from dataset.migracao_dados.pool_chaves_gemini import PoolDeChaves
+from dataset.migracao_dados.registro_prompts import custo_por_chamada
+from dataset.migracao_dados.sintetizador_de_chunks import processar_lote_e_salvar, reservar_lote_por_orcamento
+from dataset.migracao_dados.rotular_chunks_gemini import ProgressoRotulagem, rotular_chunk
+from dataset.migracao_dados.aumentador_dataset_sigiloso import (
+    embaralhar_ids_inspiracao,
+    iterar_chunks_inspiracao,
+    processo_de_aumento,
+)
+
+load_dotenv(Path(__file__).parent.parent.parent / 'projeto' / '.env')
+
+# Os scripts logam cada chunk em INFO; no benchmark só interessam avisos e o relatório
+logging.getLogger().setLevel(logging.WARNING)
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+MONGO_URI = f"mongodb://{os.getenv('MONGO_USER', 'usuario')}:{os.getenv('MONGO_PASS', 'senha')}@{os.getenv('MONGO_HOST', 'localhost')}:{os.getenv('MONGO_PORT', '27017')}/"
+# Banco descartável: é apagado no início e no fim de cada execução
+DB_BENCHMARK = os.getenv("BENCHMARK_DB", "benchmark_pipeline")
+DBS_PROTEGIDOS = {"dataset_treinamento", "admin", "local", "config"}
+CHUNKS_PADRAO = 500
+AUMENTOS_PADRAO = 100
+EM_VOO_POR_CHAVE = int(os.getenv("GEMINI_EM_VOO_POR_CHAVE", "2"))
+SEMENTE_PADRAO = 0
+PALAVRAS_POR_CHUNK = 200
+CHUNKS_POR_DOCUMENTO = 5
+TOLERANCIA_REGRESSAO = 0.2
+# Métricas comparadas com a linha de base: +1 = maior é melhor, -1 = menor é melhor
+SENTIDO_METRICAS = {
+    "chunks_por_segundo": 1,
+    "latencia_p99_ms": -1,
+    "requisicoes_por_rotulo": -1,
+    "tokens_por_rotulo": -1,
+    "fracao_entrada_em_cache": 1,
+    "ops_mongo_por_chunk": -1,
+}
+COMANDOS_IGNORADOS = {"hello", "ismaster", "ping", "endSessions", "killCursors", "buildInfo", "saslStart", "saslContinue"}
+
+
+class ContadorOperacoesMongo(monitoring.CommandListener):
+    """Conta os comandos enviados ao banco do benchmark (um bulk_write conta como um)."""
+
+    def __init__(self, nome_db):
+        self.nome_db = nome_db
+        self.total = 0
+        self._lock = threading.Lock()
+
+    def started(self, evento):
+        if evento.database_name == self.nome_db and evento.command_name not in COMANDOS_IGNORADOS:
+            with self._lock:
+                self.total += 1
+
+    def succeeded(self, evento):
+        pass
+
+    def failed(self, evento):
+        pass
+
+
+def semear_corpus(db, quantidade, semente):
+    """Insere `quantidade` chunks de origem com texto aleatório (determinístico pela semente)."""
+    rng = random.Random(semente)
+    vocabulario = [f"termo{i}" for i in range(5000)]
+    documentos = []
+    for i in range(quantidade):
+        documentos.append({
+            "chunk_texto": " ".join(rng.choices(vocabulario, k=PALAVRAS_POR_CHUNK)),
+            "id_documento_original": f"doc-{i // CHUNKS_POR_DOCUMENTO}",
+            "id_documento_anonimizado": f"anon-{i // CHUNKS_POR_DOCUMENTO}",
+        })
+    db["chunks"].insert_many(documentos)
+    preparar_colecoes(db)
+
+
+def medir_estagio(nome, trabalhadores, proxima_unidade, processar, contador, contar_produzidos, finalizar=None):
+    """Roda `processar(unidade)` em `trabalhadores` threads até `proxima_unidade()` devolver None.
+
+    Retorna as métricas do estágio: vazão, latência por unidade, quota e operações no
+    MongoDB por item produzido.
+    """
+    latencias = []
+    lock = threading.Lock()
+    backend_antes = estatisticas_backend_falso.instantaneo()
+    ops_antes = contador.total
+
+    def trabalhar():
+        while True:
+            unidade = proxima_unidade()
+            if unidade is None:
+                return
+            inicio = time.perf_counter()
+            processar(unidade)
+            with lock:
+                latencias.append(time.perf_counter() - inicio)
+
+    inicio = time.perf_counter()
+    threads = [threading.Thread(target=trabalhar, daemon=True) for _ in range(trabalhadores)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if finalizar is not None:
+        finalizar()
+    duracao = time.perf_counter() - inicio
+
+    produzidos = contar_produzidos()
+    backend = {campo: valor - backend_antes[campo] for campo, valor in estatisticas_backend_falso.instantaneo().items()}
+    divisor = max(produzidos, 1)
+    return {
+        "estagio": nome,
+        "itens": produzidos,
+        "unidades": len(latencias),
+        "duracao_s": round(duracao, 3),
+        "chunks_por_segundo": round(produzidos / duracao, 2) if duracao > 0 else 0.0,
+        "latencia_p50_ms": round(float(np.percentile(latencias, 50)) * 1000, 1) if latencias else None,
+        "latencia_p99_ms": round(float(np.percentile(latencias, 99)) * 1000, 1) if latencias else None,
+        "requisicoes_por_rotulo": round(backend["chamadas"] / divisor, 3),
+        "tokens_por_rotulo": round((backend["tokens_entrada"] + backend["tokens_saida"]) / divisor, 1),
+        "tokens_em_cache_por_rotulo": round(backend["tokens_em_cache"] / divisor, 1),
+        "fracao_entrada_em_cache": round(backend["tokens_em_cache"] / backend["tokens_entrada"], 3) if backend["tokens_entrada"] else 0.0,
+        "ops_mongo_por_chunk": round((contador.total - ops_antes) / divisor, 2),
+        "erros_429": backend["erros_429"],
+        "respostas_malformadas": backend["respostas_malformadas"],
+    }
+
+
+def benchmark_sintese(db, trabalhadores, contador):
+    fila = criar_fila_sintese(db["chunks"])
+    buffer = BufferEscritaMongo()
+    estado = {"sobra": None}
+    lock = threading.Lock()
+
+    def proxima_unidade():
+        # Reserva serializada, como no alimentador do sintetizador
+        with lock:
+            docs, estado["sobra"] = reservar_lote_por_orcamento(fila, estado["sobra"])
+        return docs or None
+
+    def processar(docs):
+        lote = [{"id_original": str(doc["_id"]), "texto_original": doc.get("chunk_texto")} for doc in docs]
+        processar_lote_e_salvar(lote, {str(doc["_id"]): doc for doc in docs}, fila, db["chunks_sinteticos"], buffer)
+
+    return medir_estagio("sintese", trabalhadores, proxima_unidade, processar, contador,
+                         lambda: db["chunks_sinteticos"].count_documents({}), buffer.descarregar)
+
+
+def benchmark_rotulagem(db, trabalhadores, contador):
+    fila_trabalho = criar_fila_rotulagem(db["chunks_sinteticos"])
+    fila_local = queue.Queue()  # Chunks devolvidos após 429 em todas as chaves
+    progresso = ProgressoRotulagem()
+    buffer = BufferEscritaMongo()
+
+    def proxima_unidade():
+        try:
+            return fila_local.get_nowait()
+        except queue.Empty:
+            return fila_trabalho.reivindicar()
+
+    def processar(chunk):
+        progresso.iniciar(chunk["_id"])
+        rotular_chunk(chunk, fila_local, progresso, buffer, fila_trabalho, db["chunks_rotulados"])
+
+    return medir_estagio("rotulagem", trabalhadores, proxima_unidade, processar, contador,
+                         lambda: db["chunks_rotulados"].count_documents({}), buffer.descarregar)
+
+
+def benchmark_aumento(db, trabalhadores, contador, quantidade):
+    agenda = criar_agenda_aumento(db)
+    inspiracoes = iterar_chunks_inspiracao(db["chunks"], embaralhar_ids_inspiracao(db["chunks"]))
+    lock = threading.Lock()
+    restantes = [quantidade]
+
+    def proxima_unidade():
+        with lock:
+            if restantes[0] <= 0:
+                return None
+            restantes[0] -= 1
+            return next(inspiracoes, None)
+
+    def processar(chunk):
+        processo_de_aumento(db["chunks"], db["chunks_sigilosos"], chunk, agenda)
+
+    return medir_estagio("aumento", trabalhadores, proxima_unidade, processar, contador,
+                         lambda: db["chunks_sigilosos"].count_documents({}))
+
+
+def comparar_com_base(resultados, base, tolerancia=TOLERANCIA_REGRESSAO):
+    """Lista as métricas que pioraram mais que `tolerancia` (fração) em relação à linha de base."""
+    regressoes = []
+    base_por_estagio = {r["estagio"]: r for r in base["estagios"]}
+    for atual in resultados["estagios"]:
+        anterior = base_por_estagio.get(atual["estagio"])
+        if anterior is None:
+            continue
+        for metrica, sentido in SENTIDO_METRICAS.items():
+            valor, referencia = atual.get(metrica), anterior.get(metrica)
+            if not valor or not referencia:
+                continue
+            variacao = (valor - referencia) / referencia * sentido
+            if variacao < -tolerancia:
+                regressoes.append(f"{atual['estagio']}.{metrica}: {referencia} -> {valor} ({variacao:+.0%})")
+    return regressoes
+
+
+def registrar_resultados(resultados):
+    logger.info(f"Backend {resultados['backend']}, {resultados['chaves']} chaves x {resultados['em_voo_por_chave']} em voo, {resultados['chunks']} chunks:")
+    logger.info("estágio    | itens | chunks/s | p50 ms | p99 ms | req/rótulo | tokens/rótulo | em cache/rótulo | entrada em cache | ops Mongo/chunk | 429 | malformadas")
+    for r in resultados["estagios"]:
+        logger.info(f"{r['estagio']:<10} | {r['itens']:>5} | {r['chunks_por_segundo']:>8} | {r['latencia_p50_ms']!s:>6} | {r['latencia_p99_ms']!s:>6} | "
+                    f"{r['requisicoes_por_rotulo']:>10} | {r['tokens_por_rotulo']:>13} | {r['tokens_em_cache_por_rotulo']:>15} | {r['fracao_entrada_em_cache']:>16.1%} | "
+                    f"{r['ops_mongo_por_chunk']:>15} | {r['erros_429']:>3} | {r['respostas_malformadas']:>11}")
+    if resultados.get("prompts"):
+        logger.info("Custo por chamada, por versão de prompt (PROMPT_VERSOES_<TAREFA> roda versões lado a lado):")
+        logger.info("tarefa             | versão     | chamadas | entrada/chamada | saída/chamada | em cache/chamada")
+        for p in resultados["prompts"]:
+            logger.info(f"{p['tarefa']:<18} | {p['versao']:<10} | {p['chamadas']:>8} | {p['tokens_entrada_por_chamada']:>15} | "
+                        f"{p['tokens_saida_por_chamada']:>13} | {p['tokens_em_cache_por_chamada']:>16}")
+
+
+def executar_benchmark(chunks=CHUNKS_PADRAO, aumentos=AUMENTOS_PADRAO, em_voo_por_chave=EM_VOO_POR_CHAVE,
+                       semente=SEMENTE_PADRAO, estagios=("sintese", "rotulagem", "aumento")):
+    if DB_BENCHMARK in DBS_PROTEGIDOS:
+        raise ValueError(f"BENCHMARK_DB='{DB_BENCHMARK}' é um banco protegido; o benchmark apaga o banco que usa.")
+    random.seed(semente)  # Embaralhamento das inspirações
+    contador = ContadorOperacoesMongo(DB_BENCHMARK)
+    client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000, event_listeners=[contador])
+    try:
+        client.drop_database(DB_BENCHMARK)
+        db = client[DB_BENCHMARK]
+        semear_corpus(db, chunks, semente)
+        pool = PoolDeChaves.compartilhado(NOME_MODELO_SINTESE)
+        pool.definir_em_voo_por_chave(em_voo_por_chave)
+        trabalhadores = len(pool) * em_voo_por_chave
+        resultados = {"backend": pool.backend, "chaves": len(pool), "em_voo_por_chave": em_voo_por_chave,
+                      "chunks": chunks, "semente": semente, "estagios": []}
+        if "sintese" in estagios:
+            resultados["estagios"].append(benchmark_sintese(db, trabalhadores, contador))
+        if "rotulagem" in estagios:
+            resultados["estagios"].append(benchmark_rotulagem(db, trabalhadores, contador))
+        if "aumento" in estagios:
+            resultados["estagios"].append(benchmark_aumento(db, trabalhadores, contador, aumentos))
+        resultados["prompts"] = custo_por_chamada()
+        return resultados
+    finally:
+        client.drop_database(DB_BENCHMARK)
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark offline dos estágios do pipeline com o backend Gemini falso.")
+    parser.add_argument("--chunks", type=int, default=CHUNKS_PADRAO)
+    parser.add_argument("--aumentos", type=int, default=AUMENTOS_PADRAO, help="Documentos sigilosos a gerar no estágio de aumento.")
+    parser.add_argument("--em-voo-por-chave", type=int, default=EM_VOO_POR_CHAVE)
+    parser.add_argument("--semente", type=int, default=SEMENTE_PADRAO)
+    parser.add_argument("--estagios", nargs="+", choices=["sintese", "rotulagem", "aumento"], default=["sintese", "rotulagem", "aumento"])
+    parser.add_argument("--salvar", help="Grava os resultados em JSON (ex.: para virar a linha de base).")
+    parser.add_argument("--comparar", help="JSON de uma execução anterior; sai com código 1 se alguma métrica piorar além da tolerância.")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA_REGRESSAO)
+    args = parser.parse_args()
+
+    resultados = executar_benchmark(args.chunks, args.aumentos, args.em_voo_por_chave, args.semente, args.estagios)
+    registrar_resultados(resultados)
+    if args.salvar:
+        with open(args.salvar, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, ensure_ascii=False, indent=2)
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            regressoes = comparar_com_base(resultados, json.load(f), args.tolerancia)
+        for regressao in regressoes:
+            logger.error(f"Regressão: {regressao}")
+        if regressoes:
+            sys.exit(1)
+        logger.info("Nenhuma regressão em relação à linha de base.")
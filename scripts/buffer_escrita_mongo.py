@@ -0,0 +1,100 @@
+import time
+import logging
+import threading
+from pymongo.errors import BulkWriteError
+from dataset.migracao_dados.metricas_pipeline import span
+
+logger = logging.getLogger(__name__)
+
+TAMANHO_MAXIMO_PADRAO = 100
+INTERVALO_MAXIMO_PADRAO_SEGUNDOS = 5.0
+
+
+class BufferEscritaMongo:
+    """Acumula operações de escrita por coleção e as grava com `bulk_write`.
+
+    O buffer é descarregado quando junta `tamanho_maximo` operações ou quando a mais
+    antiga passa de `intervalo_maximo_segundos` (verificado em `adicionar` e em
+    `descarregar_se_vencido`). Cada operação pode ter um `ao_confirmar`, chamado só
+    depois que ela foi gravada sem erro (e um `ao_falhar`, caso contrário); é assim que
+    uma escrita dependente (ex.: marcar a origem como concluída) só entra no buffer
+    após a escrita principal.
+    """
+
+    def __init__(self, tamanho_maximo=TAMANHO_MAXIMO_PADRAO, intervalo_maximo_segundos=INTERVALO_MAXIMO_PADRAO_SEGUNDOS, ordenado=False):
+        self.tamanho_maximo = tamanho_maximo
+        self.intervalo_maximo_segundos = intervalo_maximo_segundos
+        self.ordenado = ordenado
+        self._pendentes = {}  # full_name -> (colecao, [(operacao, ao_confirmar, ao_falhar)])
+        self._quantidade = 0
+        self._primeira_em = None
+        self._lock = threading.Lock()
+        self.operacoes_gravadas = 0
+        self.descargas = 0
+
+    def adicionar(self, colecao, operacao, ao_confirmar=None, ao_falhar=None):
+        with self._lock:
+            _, itens = self._pendentes.setdefault(colecao.full_name, (colecao, []))
+            itens.append((operacao, ao_confirmar, ao_falhar))
+            self._quantidade += 1
+            if self._primeira_em is None:
+                self._primeira_em = time.monotonic()
+            cheio = self._quantidade >= self.tamanho_maximo
+        if cheio:
+            self.descarregar()
+        else:
+            self.descarregar_se_vencido()
+
+    def descarregar_se_vencido(self):
+        with self._lock:
+            vencido = self._primeira_em is not None and time.monotonic() - self._primeira_em >= self.intervalo_maximo_segundos
+        if vencido:
+            self.descarregar()
+
+    def descarregar(self):
+        """Grava tudo o que está pendente, inclusive o que os callbacks enfileirarem.
+
+        As coleções são gravadas na ordem em que entraram no buffer.
+        """
+        while True:
+            with self._lock:
+                pendentes = list(self._pendentes.values())
+                self._pendentes = {}
+                self._quantidade = 0
+                self._primeira_em = None
+            if not pendentes:
+                return
+            for colecao, itens in pendentes:
+                falhas = self._gravar(colecao, [operacao for operacao, _, _ in itens])
+                for indice, (_, ao_confirmar, ao_falhar) in enumerate(itens):
+                    callback = ao_falhar if indice in falhas else ao_confirmar
+                    if callback is not None:
+                        callback()
+
+    def _gravar(self, colecao, operacoes):
+        """Executa o bulk_write e retorna os índices das operações que não foram aplicadas."""
+        self.descargas += 1
+        try:
+            with span("mongo.bulk_write"):
+                colecao.bulk_write(operacoes, ordered=self.ordenado)
+            self.operacoes_gravadas += len(operacoes)
+            return set()
+        except BulkWriteError as e:
+            erros = e.details.get("writeErrors", [])
+            falhas = {erro["index"] for erro in erros}
+            if self.ordenado and falhas:
+                # Em modo ordenado, nada após o primeiro erro é aplicado
+                falhas = set(range(min(falhas), len(operacoes)))
+            self.operacoes_gravadas += len(operacoes) - len(falhas)
+            logger.error(f"bulk_write em '{colecao.name}' teve {len(erros)} erro(s); primeiro: {erros[0].get('errmsg') if erros else e}")
+            return falhas
+        except Exception as e:
+            logger.error(f"Falha no bulk_write em '{colecao.name}' ({len(operacoes)} operações): {e}")
+            return set(range(len(operacoes)))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.descarregar()
+        return False
@@ -0,0 +1,252 @@
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from dataset.migracao_dados.erros_gemini import classificar_erro_gemini, verificar_bloqueio
+from dataset.migracao_dados.metricas_pipeline import (
+    chamadas_por_prompt,
+    span,
+    tokens_gemini,
+    tokens_por_prompt,
+    tokens_prefixo_gemini,
+)
+
+logger = logging.getLogger(__name__)
+
+# Cache persistente das respostas do Gemini, endereçado por conteúdo:
+# chave = sha256(nome do modelo + versão do prompt + texto normalizado).
+CAMINHO_CACHE_PADRAO = Path(__file__).parent / 'cache_respostas_gemini.sqlite3'
+MAX_ENTRADAS_PADRAO = 200000
+FOLGA_EVICCAO = 0.1  # Remove 10% além do excedente para não despejar a cada inserção
+CARACTERES_POR_TOKEN = 4
+
+
+def normalizar_texto(texto):
+    """Colapsa espaços em branco para que diferenças de indentação não gerem chaves distintas."""
+    return " ".join(texto.split())
+
+
+def chave_cache(nome_modelo, versao_prompt, texto):
+    conteudo = f"{nome_modelo}\x00{versao_prompt}\x00{normalizar_texto(texto)}"
+    return hashlib.sha256(conteudo.encode("utf-8")).hexdigest()
+
+
+def nome_do_modelo(model):
+    """Nome do modelo sem o prefixo 'models/' que o SDK acrescenta."""
+    nome = getattr(model, "model_name", None) or type(model).__name__
+    return nome[len("models/"):] if nome.startswith("models/") else nome
+
+
+class PromptComPrefixo(str):
+    """Prompt = prefixo fixo (instruções LGPD/LAI de uma versão) + sufixo variável (o texto da vez).
+
+    Como `str`, é o prompt completo: chaves do cache, estimativas e o backend falso não
+    mudam. O modelo do pool (ver pool_chaves_gemini.ModeloComPrefixos) envia só o sufixo
+    e reaproveita o prefixo como contexto em cache ou instrução de sistema. `tarefa` e
+    `versao` vêm do registro_prompts e separam o custo de cada versão nas métricas.
+    """
+
+    def __new__(cls, prefixo, sufixo, tarefa=None, versao=None):
+        prompt = super().__new__(cls, prefixo + sufixo)
+        prompt.prefixo = prefixo
+        prompt.sufixo = sufixo
+        prompt.tarefa = tarefa
+        prompt.versao = versao
+        return prompt
+
+    @property
+    def tokens_prefixo_estimados(self):
+        return len(self.prefixo) // CARACTERES_POR_TOKEN
+
+
+class RespostaEmCache:
+    """Imita o objeto de resposta do SDK para respostas servidas pelo cache (sem consumo de tokens)."""
+
+    def __init__(self, text):
+        self.text = text
+        self.usage_metadata = None
+        self.em_cache = True
+
+
+class CacheRespostasGemini:
+    """Cache SQLite com despejo LRU limitado a `max_entradas` e contadores de acerto/falha."""
+
+    def __init__(self, caminho=CAMINHO_CACHE_PADRAO, max_entradas=MAX_ENTRADAS_PADRAO):
+        self.caminho = str(caminho)
+        self.max_entradas = max_entradas
+        self.acertos = 0
+        self.falhas = 0
+        self._lock = threading.Lock()
+        self._conexao = sqlite3.connect(self.caminho, check_same_thread=False)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.execute("PRAGMA synchronous=NORMAL")
+        self._conexao.execute(
+            "CREATE TABLE IF NOT EXISTS respostas ("
+            " chave TEXT PRIMARY KEY,"
+            " nome_modelo TEXT NOT NULL,"
+            " versao_prompt TEXT NOT NULL,"
+            " resposta TEXT NOT NULL,"
+            " criado_em REAL NOT NULL,"
+            " acessado_em REAL NOT NULL)"
+        )
+        self._conexao.execute("CREATE INDEX IF NOT EXISTS idx_respostas_acessado_em ON respostas (acessado_em)")
+        self._conexao.commit()
+        self._entradas = self._conexao.execute("SELECT COUNT(*) FROM respostas").fetchone()[0]
+
+    def consultar(self, nome_modelo, versao_prompt, texto):
+        """Retorna a resposta em cache (str) ou None, atualizando o instante de último acesso."""
+        chave = chave_cache(nome_modelo, versao_prompt, texto)
+        with self._lock:
+            linha = self._conexao.execute("SELECT resposta FROM respostas WHERE chave = ?", (chave,)).fetchone()
+            if linha is None:
+                self.falhas += 1
+                return None
+            self.acertos += 1
+            self._conexao.execute("UPDATE respostas SET acessado_em = ? WHERE chave = ?", (time.time(), chave))
+            self._conexao.commit()
+            return linha[0]
+
+    def armazenar(self, nome_modelo, versao_prompt, texto, resposta):
+        chave = chave_cache(nome_modelo, versao_prompt, texto)
+        agora = time.time()
+        with self._lock:
+            existente = self._conexao.execute("SELECT 1 FROM respostas WHERE chave = ?", (chave,)).fetchone()
+            self._conexao.execute(
+                "INSERT INTO respostas (chave, nome_modelo, versao_prompt, resposta, criado_em, acessado_em)"
+                " VALUES (?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT(chave) DO UPDATE SET resposta = excluded.resposta, acessado_em = excluded.acessado_em",
+                (chave, nome_modelo, versao_prompt, resposta, agora, agora),
+            )
+            if existente is None:
+                self._entradas += 1
+            if self._entradas > self.max_entradas:
+                self._despejar()
+            self._conexao.commit()
+
+    def _despejar(self):
+        """Remove as entradas acessadas há mais tempo até voltar abaixo do limite."""
+        self._entradas = self._conexao.execute("SELECT COUNT(*) FROM respostas").fetchone()[0]
+        excedente = self._entradas - self.max_entradas
+        if excedente <= 0:
+            return
+        quantidade = excedente + int(self.max_entradas * FOLGA_EVICCAO)
+        self._conexao.execute(
+            "DELETE FROM respostas WHERE chave IN (SELECT chave FROM respostas ORDER BY acessado_em LIMIT ?)",
+            (quantidade,),
+        )
+        self._entradas = self._conexao.execute("SELECT COUNT(*) FROM respostas").fetchone()[0]
+        logger.info(f"Cache Gemini: {quantidade} entradas menos usadas removidas ({self._entradas} restantes).")
+
+    def estatisticas(self):
+        total = self.acertos + self.falhas
+        return {
+            "acertos": self.acertos,
+            "falhas": self.falhas,
+            "taxa_acerto": self.acertos / total if total else 0.0,
+            "entradas": self._entradas,
+        }
+
+    def fechar(self):
+        with self._lock:
+            self._conexao.close()
+
+
+_cache_padrao = None
+_lock_cache_padrao = threading.Lock()
+
+
+def obter_cache_gemini():
+    """Cache compartilhado do processo; None se desativado com GEMINI_CACHE_DESATIVADO=1."""
+    global _cache_padrao
+    if os.getenv("GEMINI_CACHE_DESATIVADO") == "1":
+        return None
+    with _lock_cache_padrao:
+        if _cache_padrao is None:
+            _cache_padrao = CacheRespostasGemini(
+                os.getenv("GEMINI_CACHE_CAMINHO", CAMINHO_CACHE_PADRAO),
+                int(os.getenv("GEMINI_CACHE_MAX_ENTRADAS", MAX_ENTRADAS_PADRAO)),
+            )
+        return _cache_padrao
+
+
+def consultar_cache_gemini(nome_modelo, versao_prompt, texto):
+    """Resposta em cache para (modelo, versão, texto), ou None se ausente ou com o cache desativado."""
+    cache = obter_cache_gemini()
+    return cache.consultar(nome_modelo, versao_prompt, texto) if cache is not None else None
+
+
+def armazenar_cache_gemini(nome_modelo, versao_prompt, texto, resposta):
+    cache = obter_cache_gemini()
+    if cache is not None:
+        cache.armazenar(nome_modelo, versao_prompt, texto, resposta)
+
+
+def registrar_estatisticas_cache():
+    """Loga acertos/falhas do cache compartilhado, se ele estiver em uso."""
+    if _cache_padrao is not None:
+        estatisticas = _cache_padrao.estatisticas()
+        logger.info(f"Cache Gemini: {estatisticas['acertos']} acertos, {estatisticas['falhas']} falhas (taxa de acerto {estatisticas['taxa_acerto']:.1%}, {estatisticas['entradas']} entradas).")
+
+
+def gerar_conteudo(model, prompt, configuracao=None):
+    """`model.generate_content` com erros tipados (ver erros_gemini) e checagem de bloqueio.
+
+    O generation_config só é repassado quando houver um. A chamada é cronometrada no span
+    "gemini.generate_content" e os tokens do usage_metadata entram em `gemini_tokens_total`;
+    para um PromptComPrefixo, os tokens do prefixo entram em `gemini_tokens_prefixo_total`
+    como "em_cache" (informados pela API) ou "reenviado" (estimativa local, quando a API
+    não informa tokens em cache), e as chamadas e tokens por tarefa e versão do registro de
+    prompts em `gemini_prompt_chamadas_total` e `gemini_prompt_tokens_total`.
+    """
+    try:
+        with span("gemini.generate_content"):
+            if configuracao is None:
+                resposta = model.generate_content(prompt)
+            else:
+                resposta = model.generate_content(prompt, generation_config=configuracao)
+    except Exception as e:
+        raise classificar_erro_gemini(e) from e
+    uso = getattr(resposta, "usage_metadata", None)
+    if uso is not None:
+        nome_modelo = nome_do_modelo(model)
+        tokens_gemini.incrementar(getattr(uso, "prompt_token_count", 0) or 0, modelo=nome_modelo, direcao="entrada")
+        tokens_gemini.incrementar(getattr(uso, "candidates_token_count", 0) or 0, modelo=nome_modelo, direcao="saida")
+        if isinstance(prompt, PromptComPrefixo):
+            em_cache = getattr(uso, "cached_content_token_count", 0) or 0
+            if em_cache:
+                tokens_prefixo_gemini.incrementar(em_cache, modelo=nome_modelo, situacao="em_cache")
+            else:
+                tokens_prefixo_gemini.incrementar(prompt.tokens_prefixo_estimados, modelo=nome_modelo, situacao="reenviado")
+            if prompt.versao is not None:
+                versao = {"tarefa": prompt.tarefa, "versao": prompt.versao}
+                chamadas_por_prompt.incrementar(**versao)
+                tokens_por_prompt.incrementar(getattr(uso, "prompt_token_count", 0) or 0, direcao="entrada", **versao)
+                tokens_por_prompt.incrementar(getattr(uso, "candidates_token_count", 0) or 0, direcao="saida", **versao)
+                tokens_por_prompt.incrementar(em_cache, direcao="em_cache", **versao)
+    verificar_bloqueio(resposta)
+    return resposta
+
+
+def gerar_conteudo_com_cache(model, prompt, versao_prompt, validar=None, consultar=True, configuracao=None):
+    """Equivalente a `model.generate_content(prompt)` com cache persistente na frente.
+
+    Só armazena respostas cujo texto passe em `validar` (quando informado), para que
+    respostas malformadas não fiquem presas no cache e possam ser refeitas. Use
+    `consultar=False` quando o chamador já consultou o cache antes de reservar a chave.
+    """
+    nome_modelo = nome_do_modelo(model)
+    if consultar:
+        resposta = consultar_cache_gemini(nome_modelo, versao_prompt, prompt)
+        if resposta is not None:
+            return RespostaEmCache(resposta)
+    response = gerar_conteudo(model, prompt, configuracao)
+    try:
+        texto = response.text
+    except ValueError:
+        return response  # Sem texto utilizável: nada a armazenar, o chamador trata
+    if validar is None or validar(texto):
+        armazenar_cache_gemini(nome_modelo, versao_prompt, prompt, texto)
+    return response
@@ -0,0 +1,296 @@
+import os
+import re
+import zlib
+import logging
+import argparse
+import threading
+from datetime import datetime
+from pathlib import Path
+import numpy as np
+from pymongo import MongoClient
+from dotenv import load_dotenv
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+load_dotenv(Path(__file__).parent.parent.parent / 'projeto' / '.env')
+
+# Pré-filtro local da rotulagem: TF-IDF sobre n-gramas de palavras com hashing e regressão
+# logística multinomial, em NumPy. Rotula só o que passa do limiar de probabilidade da classe
+# prevista; o resto segue para o Gemini.
+PREFILTRO_ATIVADO = os.getenv("PREFILTRO_LOCAL_ATIVADO", "0") == "1"
+CAMINHO_MODELO_PADRAO = Path(os.getenv("PREFILTRO_CAMINHO_MODELO", Path(__file__).parent / 'classificador_local.npz'))
+# Precisão exigida, na validação, entre os chunks que o modelo rotularia sozinho em cada classe
+PRECISAO_MINIMA = float(os.getenv("PREFILTRO_PRECISAO_MINIMA", "0.97"))
+ORIGEM_CLASSIFICADOR_LOCAL = "classificador_local"
+VERSAO_CLASSIFICADOR = "ngramas-logistica-v1"
+NUM_CLASSES = 3
+NUM_ATRIBUTOS = 1 << 18
+TAMANHO_MAXIMO_NGRAMA = 2  # palavras
+FRACAO_VALIDACAO = 0.2  # por documento de origem, para o limiar não ver chunks irmãos do treino
+MIN_AMOSTRAS_LIMIAR = 30  # abaixo disso a classe não é rotulada localmente
+FREQUENCIA_MINIMA = 3  # n-gramas em menos documentos de treino são descartados (idf zero)
+EPOCAS = 100
+TAXA_APRENDIZADO = 0.1
+REGULARIZACAO_L2 = float(os.getenv("PREFILTRO_REGULARIZACAO_L2", "1e-4"))
+
+_PADRAO_PALAVRA = re.compile(r"\w+")
+
+
+def ngramas_do_texto(texto, tamanho_maximo=TAMANHO_MAXIMO_NGRAMA):
+    """Hashes crc32 (módulo NUM_ATRIBUTOS) dos n-gramas de 1 a `tamanho_maximo` palavras, com repetição."""
+    palavras = _PADRAO_PALAVRA.findall((texto or "").lower())
+    grams = list(palavras)
+    for tamanho in range(2, tamanho_maximo + 1):
+        grams.extend(" ".join(palavras[i:i + tamanho]) for i in range(len(palavras) - tamanho + 1))
+    return np.fromiter((zlib.crc32(g.encode("utf-8")) % NUM_ATRIBUTOS for g in grams), dtype=np.int64, count=len(grams))
+
+
+def contar_ngramas(textos):
+    """Matriz esparsa de contagens em coordenadas: (linhas, colunas, contagens), ordenada por linha."""
+    hashes = [ngramas_do_texto(texto) for texto in textos]
+    linhas = np.repeat(np.arange(len(hashes), dtype=np.int64), [len(h) for h in hashes])
+    colunas = np.concatenate(hashes) if hashes else np.empty(0, dtype=np.int64)
+    pares, contagens = np.unique(linhas * NUM_ATRIBUTOS + colunas, return_counts=True)
+    return pares // NUM_ATRIBUTOS, pares % NUM_ATRIBUTOS, contagens.astype(np.float32)
+
+
+class ClassificadorLocal:
+    """Regressão logística multinomial sobre TF-IDF de n-gramas com hashing.
+
+    A matriz de atributos nunca é densa: cada produto é um gather dos pesos pelas colunas
+    não nulas e um bincount por linha, então um lote de dezenas de chunks leva poucos
+    milissegundos em CPU. `limiares[c]` é a menor probabilidade com que a classe c prevista
+    é aceita sem o Gemini (infinito quando a classe nunca é aceita).
+    """
+
+    _compartilhado = None
+    _lock_compartilhado = threading.Lock()
+
+    def __init__(self, pesos, vies, idf, limiares, metadados=None):
+        self.pesos = pesos
+        self.vies = vies
+        self.idf = idf
+        self.limiares = limiares
+        self.metadados = metadados or {}
+
+    # --- atributos -------------------------------------------------------------
+
+    @staticmethod
+    def _tfidf(linhas, colunas, contagens, idf, num_linhas):
+        valores = (1.0 + np.log(contagens)) * idf[colunas]
+        normas = np.sqrt(np.bincount(linhas, weights=valores * valores, minlength=num_linhas))
+        return valores / np.maximum(normas[linhas], 1e-12)
+
+    def _pontuacoes(self, linhas, colunas, valores, num_linhas, pesos=None, vies=None):
+        pesos = self.pesos if pesos is None else pesos
+        vies = self.vies if vies is None else vies
+        contribuicoes = pesos[colunas] * valores[:, None]
+        return np.stack([np.bincount(linhas, weights=contribuicoes[:, c], minlength=num_linhas)
+                         for c in range(NUM_CLASSES)], axis=1) + vies
+
+    @staticmethod
+    def _softmax(pontuacoes):
+        exps = np.exp(pontuacoes - pontuacoes.max(axis=1, keepdims=True))
+        return exps / exps.sum(axis=1, keepdims=True)
+
+    def probabilidades(self, textos):
+        """Matriz (textos, classes) de probabilidades."""
+        linhas, colunas, contagens = contar_ngramas(textos)
+        valores = self._tfidf(linhas, colunas, contagens, self.idf, len(textos))
+        return self._softmax(self._pontuacoes(linhas, colunas, valores, len(textos)))
+
+    def prever(self, textos):
+        """(classes previstas, probabilidade da classe prevista, máscara dos aceitos sem o Gemini)."""
+        probabilidades = self.probabilidades(textos)
+        classes = probabilidades.argmax(axis=1)
+        confianca = probabilidades[np.arange(len(classes)), classes]
+        return classes, confianca, confianca >= self.limiares[classes]
+
+    # --- treino ----------------------------------------------------------------
+
+    @classmethod
+    def treinar(cls, textos, classes, pesos_amostra=None, epocas=EPOCAS, taxa_aprendizado=TAXA_APRENDIZADO,
+                regularizacao=REGULARIZACAO_L2):
+        """Ajusta o modelo (Adam em lote completo sobre a entropia cruzada ponderada); limiares infinitos."""
+        classes = np.asarray(classes, dtype=np.int64)
+        n = len(classes)
+        pesos_amostra = np.ones(n) if pesos_amostra is None else np.asarray(pesos_amostra, dtype=np.float64)
+        pesos_amostra = pesos_amostra / pesos_amostra.sum()
+        linhas, colunas, contagens = contar_ngramas(textos)
+        frequencia_documentos = np.bincount(colunas, minlength=NUM_ATRIBUTOS)
+        idf = (np.log((1.0 + n) / (1.0 + frequencia_documentos)) + 1.0).astype(np.float32)
+        idf[frequencia_documentos < FREQUENCIA_MINIMA] = 0.0
+        mantidos = idf[colunas] > 0
+        linhas, colunas, contagens = linhas[mantidos], colunas[mantidos], contagens[mantidos]
+        valores = cls._tfidf(linhas, colunas, contagens, idf, n)
+
+        # Só as colunas que aparecem no treino recebem gradiente: otimiza sobre elas, compactadas
+        usadas, colunas_compactas = np.unique(colunas, return_inverse=True)
+        pesos = np.zeros((len(usadas), NUM_CLASSES))
+        vies = np.log(np.bincount(classes, weights=pesos_amostra, minlength=NUM_CLASSES) + 1e-9)
+        alvo = np.eye(NUM_CLASSES)[classes]
+        modelo = cls(None, None, idf, np.full(NUM_CLASSES, np.inf))
+        momentos = [np.zeros_like(pesos), np.zeros_like(pesos), np.zeros_like(vies), np.zeros_like(vies)]
+        beta1, beta2 = 0.9, 0.999
+        for epoca in range(1, epocas + 1):
+            probabilidades = cls._softmax(modelo._pontuacoes(linhas, colunas_compactas, valores, n, pesos, vies))
+            erro = (probabilidades - alvo) * pesos_amostra[:, None]
+            gradiente_pesos = np.stack([np.bincount(colunas_compactas, weights=valores * erro[linhas, c], minlength=len(usadas))
+                                        for c in range(NUM_CLASSES)], axis=1) + regularizacao * pesos
+            for parametro, gradiente, m, v in ((pesos, gradiente_pesos, momentos[0], momentos[1]),
+                                               (vies, erro.sum(axis=0), momentos[2], momentos[3])):
+                m *= beta1
+                m += (1 - beta1) * gradiente
+                v *= beta2
+                v += (1 - beta2) * gradiente * gradiente
+                parametro -= taxa_aprendizado * (m / (1 - beta1 ** epoca)) / (np.sqrt(v / (1 - beta2 ** epoca)) + 1e-8)
+        modelo.pesos = np.zeros((NUM_ATRIBUTOS, NUM_CLASSES), dtype=np.float32)
+        modelo.pesos[usadas] = pesos
+        modelo.vies = vies.astype(np.float32)
+        return modelo
+
+    def calibrar_limiares(self, textos, classes, precisao_minima=PRECISAO_MINIMA):
+        """Escolhe, por classe prevista, o menor limiar com precisão >= `precisao_minima` na validação."""
+        classes = np.asarray(classes, dtype=np.int64)
+        previstas, confianca, _ = self.prever(textos)
+        limiares = np.full(NUM_CLASSES, np.inf)
+        for classe in range(NUM_CLASSES):
+            da_classe = np.flatnonzero(previstas == classe)
+            ordem = da_classe[np.argsort(-confianca[da_classe], kind="stable")]
+            precisao = np.cumsum(classes[ordem] == classe) / np.arange(1, len(ordem) + 1)
+            aceitaveis = np.flatnonzero((precisao >= precisao_minima) & (np.arange(1, len(ordem) + 1) >= MIN_AMOSTRAS_LIMIAR))
+            if len(aceitaveis):
+                limiares[classe] = confianca[ordem[aceitaveis[-1]]]
+        self.limiares = limiares
+        return self.avaliar(classes, previstas, confianca)
+
+    def avaliar(self, classes, previstas, confianca):
+        """Cobertura (fração rotulada localmente) e precisão entre os aceitos, geral e por classe."""
+        aceitos = confianca >= self.limiares[previstas]
+        acertos = aceitos & (previstas == classes)
+        relatorio = {
+            "amostras": int(len(classes)),
+            "acuracia": float((previstas == classes).mean()) if len(classes) else 0.0,
+            "cobertura": float(aceitos.mean()) if len(classes) else 0.0,
+            "precisao_aceitos": float(acertos.sum() / max(aceitos.sum(), 1)),
+        }
+        for classe in range(NUM_CLASSES):
+            aceitos_classe = aceitos & (previstas == classe)
+            relatorio[f"classe_{classe}"] = {
+                "limiar": float(self.limiares[classe]),
+                "aceitos": int(aceitos_classe.sum()),
+                "precisao": float(acertos[aceitos_classe].mean()) if aceitos_classe.any() else None,
+            }
+        return relatorio
+
+    # --- persistência ----------------------------------------------------------
+
+    def salvar(self, caminho=CAMINHO_MODELO_PADRAO):
+        """Grava os parâmetros com troca atômica do arquivo (como o índice de quase-duplicatas)."""
+        caminho = Path(caminho)
+        temporario = caminho.with_name(caminho.name + ".tmp.npz")
+        metadados = dict(self.metadados, versao=VERSAO_CLASSIFICADOR, num_atributos=NUM_ATRIBUTOS,
+                         tamanho_maximo_ngrama=TAMANHO_MAXIMO_NGRAMA)
+        np.savez(
+            temporario,
+            pesos=self.pesos, vies=self.vies, idf=self.idf, limiares=self.limiares,
+            metadados=np.array([f"{chave}={valor}" for chave, valor in metadados.items()], dtype=str),
+        )
+        os.replace(temporario, caminho)
+        logger.info(f"Classificador local salvo em '{caminho}'.")
+
+    @classmethod
+    def carregar(cls, caminho=CAMINHO_MODELO_PADRAO):
+        with np.load(caminho, allow_pickle=False) as dados:
+            metadados = dict(item.split("=", 1) for item in dados["metadados"].tolist())
+            if (metadados.get("versao"), int(metadados.get("num_atributos", 0)), int(metadados.get("tamanho_maximo_ngrama", 0))) != \
+                    (VERSAO_CLASSIFICADOR, NUM_ATRIBUTOS, TAMANHO_MAXIMO_NGRAMA):
+                raise ValueError(f"Classificador '{caminho}' foi treinado com outros atributos; treine de novo com --treinar.")
+            modelo = cls(dados["pesos"], dados["vies"], dados["idf"], dados["limiares"], metadados)
+        logger.info(f"Classificador local carregado de '{caminho}' (limiares por classe: {np.round(modelo.limiares, 3).tolist()}).")
+        return modelo
+
+    @classmethod
+    def compartilhado(cls, caminho=CAMINHO_MODELO_PADRAO, exigir_prefiltro=True):
+        """Modelo do processo, carregado uma vez; None sem modelo treinado ou, com `exigir_prefiltro`,
+        com o pré-filtro desligado (o priorizador da rotulagem usa o modelo mesmo assim)."""
+        if exigir_prefiltro and not PREFILTRO_ATIVADO:
+            return None
+        with cls._lock_compartilhado:
+            if cls._compartilhado is None:
+                caminho = Path(caminho)
+                if not caminho.exists():
+                    logger.warning(f"Classificador local '{caminho}' não existe; treine-o com classificador_local.py.")
+                    cls._compartilhado = False
+                else:
+                    cls._compartilhado = cls.carregar(caminho)
+            return cls._compartilhado or None
+
+
+def prefiltrar(textos):
+    """Rótulos locais no formato de `classificar_chunk_gemini` (None onde o Gemini deve decidir).
+
+    Com o pré-filtro desligado ou sem modelo, devolve só Nones.
+    """
+    modelo = ClassificadorLocal.compartilhado()
+    if modelo is None or not textos:
+        return [None] * len(textos)
+    classes, confianca, aceitos = modelo.prever(textos)
+    return [
+        (int(classe), f"Rotulado pelo classificador local ({VERSAO_CLASSIFICADOR}) com probabilidade {prob:.3f}.",
+         round(float(prob), 4), VERSAO_CLASSIFICADOR) if aceito else None
+        for classe, prob, aceito in zip(classes, confianca, aceitos)
+    ]
+
+
+def _na_validacao(grupo):
+    return zlib.crc32(str(grupo).encode("utf-8")) % 1000 < FRACAO_VALIDACAO * 1000
+
+
+def treinar_de_colecao(collection_rotulados, caminho=CAMINHO_MODELO_PADRAO, precisao_minima=PRECISAO_MINIMA):
+    """Treina com os rótulos do Gemini em 'chunks_rotulados' (nunca com os do próprio modelo),
+    calibra os limiares na validação (por documento de origem) e grava o modelo."""
+    filtro = {"classificacao_acesso": {"$in": list(range(NUM_CLASSES))}, "origem_rotulo": {"$ne": ORIGEM_CLASSIFICADOR_LOCAL}}
+    projecao = {"texto_sintetico": 1, "classificacao_acesso": 1, "confianca_classificacao": 1,
+                "id_documento_original": 1, "id_chunk_sintetico": 1}
+    textos, classes, confiancas, validacao = [], [], [], []
+    for doc in collection_rotulados.find(filtro, projecao):
+        if not doc.get("texto_sintetico"):
+            continue
+        textos.append(doc["texto_sintetico"])
+        classes.append(int(doc["classificacao_acesso"]))
+        confiancas.append(float(doc.get("confianca_classificacao") or 0.5))
+        validacao.append(_na_validacao(doc.get("id_documento_original") or doc.get("id_chunk_sintetico") or doc["_id"]))
+    if not textos:
+        raise ValueError("Nenhum chunk rotulado pelo Gemini para treinar o classificador local.")
+    classes, confiancas, validacao = np.array(classes), np.array(confiancas), np.array(validacao)
+    treino = np.flatnonzero(~validacao)
+    teste = np.flatnonzero(validacao)
+    logger.info(f"Treinando o classificador local com {len(treino)} chunks ({len(teste)} na validação)...")
+    # Rótulos com pouca confiança do Gemini pesam menos
+    modelo = ClassificadorLocal.treinar([textos[i] for i in treino], classes[treino], np.clip(confiancas[treino], 0.05, 1.0))
+    relatorio = modelo.calibrar_limiares([textos[i] for i in teste], classes[teste], precisao_minima)
+    modelo.metadados = {"data_treino": datetime.now().isoformat(timespec="seconds"), "amostras_treino": len(treino),
+                        "precisao_minima": precisao_minima}
+    logger.info(f"Validação: acurácia {relatorio['acuracia']:.1%}; rotularia localmente {relatorio['cobertura']:.1%} "
+                f"dos chunks com precisão {relatorio['precisao_aceitos']:.1%}.")
+    for classe in range(NUM_CLASSES):
+        info = relatorio[f"classe_{classe}"]
+        precisao = f"{info['precisao']:.1%}" if info["precisao"] is not None else "-"
+        logger.info(f"Classe {classe}: limiar {info['limiar']:.3f}, {info['aceitos']} aceitos, precisão {precisao}")
+    modelo.salvar(caminho)
+    return modelo, relatorio
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Treina o classificador local que pré-filtra a rotulagem com o Gemini.")
+    parser.add_argument("--caminho", default=str(CAMINHO_MODELO_PADRAO))
+    parser.add_argument("--precisao-minima", type=float, default=PRECISAO_MINIMA)
+    args = parser.parse_args()
+    mongo_uri = f"mongodb://{os.getenv('MONGO_USER', 'usuario')}:{os.getenv('MONGO_PASS', 'senha')}@{os.getenv('MONGO_HOST', 'localhost')}:{os.getenv('MONGO_PORT', '27017')}/"
+    client = MongoClient(mongo_uri)
+    try:
+        treinar_de_colecao(client["dataset_treinamento"]["chunks_rotulados"], args.caminho, args.precisao_minima)
+    finally:
+        client.close()
@@ -0,0 +1,349 @@
+import os
+import sys
+import logging
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+from pathlib import Path
+from bson import ObjectId
+from pymongo import IndexModel, MongoClient
+from pymongo.errors import OperationFailure
+from dataset.migracao_dados.fila_trabalho_mongo import (
+    COLECAO_FALHAS_PERMANENTES,
+    SEM_ESPERA,
+    STATUS_FALHA_PERMANENTE,
+    AgendaDeTentativas,
+    FilaDeTrabalhoMongo,
+)
+from dataset.migracao_dados.observador_mongo import ObservadorDeColecao
+
+logger = logging.getLogger(__name__)
+
+# Consultas de trabalho pendente dos scripts, já na forma que os índices abaixo atendem:
+# só igualdades, $in e um intervalo no fim. Status e flags ausentes/nulos são
+# normalizados para valores concretos por `normalizar_campos_de_fila`, o que elimina
+# os $or com $exists das versões anteriores. O prazo da próxima tentativa
+# (`proxima_tentativa_<etapa>_em`) é acrescentado pela fila/agenda de cada etapa, e o
+# limite de tentativas é aplicado pelo status "falha_permanente" (chunks antigos que
+# esgotaram as tentativas antes disso são movidos para ele na normalização).
+MAX_TENTATIVAS_SINTESE = 3
+MAX_TENTATIVAS_ROTULAGEM = 5
+MAX_TENTATIVAS_AUMENTO = 3
+NOME_MODELO_SINTESE = 'gemini-2.5-flash'
+
+CONSULTA_PENDENTES_SINTESE = {
+    "status_sintese": {"$in": ["pendente", "erro_salvamento"]},
+    "erro_rotulagem": False,
+}
+CONSULTA_PENDENTES_ROTULAGEM = {
+    "status_rotulagem": "pendente",
+    "erro_rotulagem": False,
+    "nome_modelo": NOME_MODELO_SINTESE,
+}
+# Priorização da rotulagem (priorizador_rotulagem.py): com ela ativada, a reserva segue a
+# prioridade gravada em cada chunk sintético pendente, da maior para a menor
+PRIORIZACAO_ROTULAGEM_ATIVADA = os.getenv("PRIORIZACAO_ROTULAGEM_ATIVADA", "0") == "1"
+CAMPO_PRIORIDADE_ROTULAGEM = "prioridade_rotulagem"
+CONSULTA_INSPIRACAO_SIGILOSA = {
+    "usado_para_geracao_sigilosa": False,
+    "erro_rotulagem": False,
+}
+
+# Valor assumido para cada campo quando ele está ausente ou nulo
+VALORES_PADRAO = {
+    "chunks": {
+        "status_sintese": "pendente",
+        "tentativas_sintese": 0,
+        "proxima_tentativa_sintese_em": SEM_ESPERA,
+        "erro_rotulagem": False,
+        "usado_para_geracao_sigilosa": False,
+        "proxima_tentativa_aumento_em": SEM_ESPERA,
+    },
+    "chunks_sinteticos": {
+        "erro_rotulagem": False,
+        "proxima_tentativa_rotulagem_em": SEM_ESPERA,
+    },
+}
+
+# Documentos inseridos por outros processos ainda sem os campos de fila; cada consulta
+# usa o prefixo de um índice de fila (nulo casa campo ausente)
+CONSULTAS_SEM_NORMALIZAR = {
+    "chunks": {"status_sintese": None},
+    "chunks_sinteticos": {
+        "status_rotulagem": "pendente",
+        "nome_modelo": NOME_MODELO_SINTESE,
+        "proxima_tentativa_rotulagem_em": None,
+    },
+}
+LIMITE_NORMALIZACAO_POR_CONSULTA = 1000
+# Chunks da síntese anterior à agenda de tentativas, que só eram pulados pelo
+# `tentativas_sintese < MAX_TENTATIVAS_SINTESE` da consulta de pendentes
+CONSULTA_TENTATIVAS_ESGOTADAS_SINTESE = {
+    "status_sintese": {"$in": ["pendente", "erro_salvamento"]},
+    "tentativas_sintese": {"$gte": MAX_TENTATIVAS_SINTESE},
+}
+
+INDICES = {
+    "chunks": [
+        # Igualdades primeiro, intervalo (prazo da próxima tentativa) por último
+        IndexModel([("status_sintese", 1), ("erro_rotulagem", 1), ("proxima_tentativa_sintese_em", 1)],
+                   name="fila_sintese_agendada"),
+        IndexModel([("reserva_sintese_ate", 1)], name="reservas_sintese",
+                   partialFilterExpression={"status_sintese": "em_processamento"}),
+        # Parcial: encolhe conforme os chunks são usados como inspiração
+        IndexModel([("erro_rotulagem", 1), ("proxima_tentativa_aumento_em", 1)], name="inspiracao_sigilosa_agendada",
+                   partialFilterExpression={"usado_para_geracao_sigilosa": False}),
+    ],
+    "chunks_sinteticos": [
+        IndexModel([("id_chunk_original", 1)], unique=True),
+        IndexModel([("nome_modelo", 1), ("erro_rotulagem", 1), ("proxima_tentativa_rotulagem_em", 1)],
+                   name="fila_rotulagem_agendada",
+                   partialFilterExpression={"status_rotulagem": "pendente"}),
+        IndexModel([("reserva_rotulagem_ate", 1)], name="reservas_rotulagem",
+                   partialFilterExpression={"status_rotulagem": "em_processamento"}),
+        # Igualdades, ordenação e intervalo: a reserva priorizada percorre o índice já na ordem
+        IndexModel([("nome_modelo", 1), ("erro_rotulagem", 1), (CAMPO_PRIORIDADE_ROTULAGEM, -1),
+                    ("proxima_tentativa_rotulagem_em", 1)],
+                   name="fila_rotulagem_priorizada",
+                   partialFilterExpression={"status_rotulagem": "pendente"}),
+        # O outro ramo do $or da reserva (reservas vencidas) na mesma ordem: com os dois ramos
+        # ordenados, o plano intercala os índices (SORT_MERGE) em vez de ordenar em memória
+        IndexModel([(CAMPO_PRIORIDADE_ROTULAGEM, -1), ("reserva_rotulagem_ate", 1)],
+                   name="reservas_rotulagem_priorizadas",
+                   partialFilterExpression={"status_rotulagem": "em_processamento"}),
+    ],
+    "chunks_rotulados": [
+        IndexModel([("id_chunk_sintetico", 1)]),
+    ],
+    COLECAO_FALHAS_PERMANENTES: [
+        IndexModel([("etapa", 1), ("id_documento", 1)], unique=True, name="falha_por_documento"),
+    ],
+}
+# Um documento sigiloso por chunk de inspiração: o upsert do aumentador depende desta
+# unicidade. Fica fora de INDICES porque só o aumentador o cria, depois de deduplicar a
+# coleção (ver `garantir_indice_sigilosos`); documentos antigos sem o campo não entram.
+INDICE_SIGILOSO_POR_CHUNK = IndexModel(
+    [("id_chunk_original", 1)], unique=True, name="sigiloso_por_chunk_original",
+    partialFilterExpression={"id_chunk_original": {"$exists": True}},
+)
+# Índices substituídos por versões com o prazo da próxima tentativa (o nome igual com
+# chaves diferentes faria create_indexes falhar)
+INDICES_OBSOLETOS = {
+    "chunks": ["fila_sintese", "inspiracao_sigilosa"],
+    "chunks_sinteticos": ["fila_rotulagem"],
+}
+# Estágios do explain() que a verificação dos planos trata como falta de índice
+ESTAGIOS_PROBLEMATICOS = ("COLLSCAN", "SORT")
+
+
+def consulta_inspiracao_sigilosa(agora):
+    """Chunks elegíveis como inspiração sigilosa cuja próxima tentativa já venceu em `agora`."""
+    return {**CONSULTA_INSPIRACAO_SIGILOSA, "proxima_tentativa_aumento_em": {"$lte": agora}}
+
+
+def criar_fila_sintese(col_origem):
+    """Fila com reserva atômica sobre 'status_sintese', para vários processos sintetizarem em paralelo."""
+    return FilaDeTrabalhoMongo(col_origem, "status_sintese", CONSULTA_PENDENTES_SINTESE, "sintese",
+                               max_tentativas=MAX_TENTATIVAS_SINTESE)
+
+
+def criar_fila_rotulagem(collection_chunks):
+    """Fila com reserva atômica sobre 'status_rotulagem', para vários processos rotularem em paralelo.
+
+    Com a priorização ativada, os chunks de maior `prioridade_rotulagem` são reservados primeiro.
+    """
+    ordenacao = [(CAMPO_PRIORIDADE_ROTULAGEM, -1)] if PRIORIZACAO_ROTULAGEM_ATIVADA else None
+    return FilaDeTrabalhoMongo(collection_chunks, "status_rotulagem", CONSULTA_PENDENTES_ROTULAGEM, "rotulagem",
+                               max_tentativas=MAX_TENTATIVAS_ROTULAGEM, ordenacao=ordenacao)
+
+
+def criar_observador(fila):
+    """Observador da coleção da fila: change stream ou sondagem de documentos novos/reivindicáveis."""
+    return ObservadorDeColecao(fila.colecao, fila.campo_status, lambda: ha_trabalho_novo(fila), fila.status_pendente)
+
+
+def ha_trabalho_novo(fila):
+    """Sondagem barata (duas consultas indexadas, só o _id): há documento por normalizar ou reivindicável?"""
+    colecao = fila.colecao
+    return (
+        colecao.find_one(CONSULTAS_SEM_NORMALIZAR[colecao.name], {"_id": 1}) is not None
+        or colecao.find_one(fila.filtro_reivindicaveis(datetime.now(timezone.utc)), {"_id": 1}) is not None
+    )
+
+
+def criar_agenda_aumento(db):
+    """Tentativas e dead-letter dos chunks de inspiração (o aumentador não reserva documentos)."""
+    return AgendaDeTentativas("aumento", db[COLECAO_FALHAS_PERMANENTES], MAX_TENTATIVAS_AUMENTO)
+
+
+def garantir_indices(db):
+    """Cria os índices das consultas de trabalho (idempotente: índices existentes são mantidos)."""
+    for nome_colecao, obsoletos in INDICES_OBSOLETOS.items():
+        existentes = db[nome_colecao].index_information()
+        for nome in obsoletos:
+            if nome in existentes:
+                db[nome_colecao].drop_index(nome)
+                logger.info(f"Índice obsoleto '{nome}' removido de '{nome_colecao}'.")
+    for nome_colecao, indices in INDICES.items():
+        nomes = db[nome_colecao].create_indexes(indices)
+        logger.info(f"Índices garantidos em '{nome_colecao}': {', '.join(nomes)}")
+
+
+def deduplicar_sigilosos(colecao):
+    """Deixa um único documento sigiloso por `id_chunk_original`, sem apagar nada.
+
+    Antes do upsert por chunk de inspiração, uma marcação que falhava depois da inserção
+    permitia que o mesmo chunk inspirasse vários documentos. O mais antigo de cada grupo
+    fica; nos demais o campo vira `id_chunk_original_duplicado`, fora do índice único.
+    Retorna quantos documentos foram renomeados.
+    """
+    grupos = colecao.aggregate([
+        {"$match": {"id_chunk_original": {"$exists": True}}},
+        {"$sort": {"_id": 1}},
+        {"$group": {"_id": "$id_chunk_original", "ids": {"$push": "$_id"}, "total": {"$sum": 1}}},
+        {"$match": {"total": {"$gt": 1}}},
+    ], allowDiskUse=True)
+    renomeados = 0
+    for grupo in grupos:
+        resultado = colecao.update_many(
+            {"_id": {"$in": grupo["ids"][1:]}},
+            {"$rename": {"id_chunk_original": "id_chunk_original_duplicado"}}
+        )
+        renomeados += resultado.modified_count
+    if renomeados:
+        logger.warning(f"'{colecao.name}': {renomeados} documentos sigilosos duplicados por chunk de inspiração "
+                       f"tiveram 'id_chunk_original' renomeado para 'id_chunk_original_duplicado'.")
+    return renomeados
+
+
+def garantir_indice_sigilosos(db):
+    """Chamado na partida do aumentador: deduplica 'chunks_sigilosos' e cria o índice único.
+
+    Se outro processo ainda gravar uma duplicata entre a deduplicação e a criação, o
+    aumentador segue sem o índice (o upsert continua valendo) e tenta de novo na próxima partida.
+    """
+    colecao = db["chunks_sigilosos"]
+    deduplicar_sigilosos(colecao)
+    try:
+        colecao.create_indexes([INDICE_SIGILOSO_POR_CHUNK])
+        logger.info("Índice garantido em 'chunks_sigilosos': sigiloso_por_chunk_original")
+    except OperationFailure as e:
+        logger.error(f"Não foi possível criar o índice único de 'chunks_sigilosos': {e}")
+
+
+def _estagio_valores_padrao(padroes):
+    return {"$set": {campo: {"$ifNull": [f"${campo}", valor]} for campo, valor in padroes.items()}}
+
+
+def normalizar_campos_de_fila(db):
+    """Preenche status e flags ausentes/nulos com `VALORES_PADRAO`, uma atualização por coleção,
+    e tira da fila de síntese os chunks antigos que já esgotaram as tentativas."""
+    for nome_colecao, padroes in VALORES_PADRAO.items():
+        resultado = db[nome_colecao].update_many(
+            {"$or": [{campo: None} for campo in padroes]},
+            [_estagio_valores_padrao(padroes)]
+        )
+        if resultado.modified_count:
+            logger.info(f"'{nome_colecao}': {resultado.modified_count} documentos com campos de fila normalizados.")
+    resultado = db["chunks"].update_many(
+        CONSULTA_TENTATIVAS_ESGOTADAS_SINTESE, {"$set": {"status_sintese": STATUS_FALHA_PERMANENTE}}
+    )
+    if resultado.modified_count:
+        logger.info(f"'chunks': {resultado.modified_count} chunks com as tentativas de síntese esgotadas marcados como falha permanente.")
+
+
+def normalizar_novos_documentos(colecao, ids=None):
+    """Normaliza só os documentos recém-chegados, sem varrer a coleção.
+
+    `ids` são os _ids vistos no change stream; sem eles, os documentos são buscados por
+    `CONSULTAS_SEM_NORMALIZAR` (indexada). Retorna quantos documentos foram alterados.
+    """
+    if ids is None:
+        consulta = CONSULTAS_SEM_NORMALIZAR[colecao.name]
+        ids = [doc["_id"] for doc in colecao.find(consulta, {"_id": 1}).limit(LIMITE_NORMALIZACAO_POR_CONSULTA)]
+    if not ids:
+        return 0
+    resultado = colecao.update_many({"_id": {"$in": ids}}, [_estagio_valores_padrao(VALORES_PADRAO[colecao.name])])
+    if resultado.modified_count:
+        logger.info(f"'{colecao.name}': {resultado.modified_count} documentos novos normalizados.")
+    return resultado.modified_count
+
+
+def preparar_colecoes(db):
+    """Chamado na partida dos scripts: garante os índices e normaliza documentos novos."""
+    garantir_indices(db)
+    normalizar_campos_de_fila(db)
+
+
+def consultas_dos_trabalhadores(db):
+    """(descrição, coleção, filtro, ordenação ou None) de cada consulta feita pelos scripts em regime."""
+    agora = datetime.now(timezone.utc)
+    fila_sintese = criar_fila_sintese(db["chunks"])
+    fila_rotulagem = criar_fila_rotulagem(db["chunks_sinteticos"])
+    consultas = [
+        ("reserva de síntese", db["chunks"], fila_sintese.filtro_reivindicaveis(agora), fila_sintese.ordenacao),
+        ("reserva de rotulagem", db["chunks_sinteticos"], fila_rotulagem.filtro_reivindicaveis(agora), fila_rotulagem.ordenacao),
+        ("inspiração sigilosa", db["chunks"], consulta_inspiracao_sigilosa(agora), None),
+        ("chunks novos sem normalizar", db["chunks"], CONSULTAS_SEM_NORMALIZAR["chunks"], None),
+        ("chunks sintéticos novos sem normalizar", db["chunks_sinteticos"], CONSULTAS_SEM_NORMALIZAR["chunks_sinteticos"], None),
+        ("upsert de rótulo", db["chunks_rotulados"], {"id_chunk_sintetico": None}, None),
+        ("upsert de chunk sintético", db["chunks_sinteticos"], {"id_chunk_original": None}, None),
+    ]
+    if INDICE_SIGILOSO_POR_CHUNK.document["name"] in db["chunks_sigilosos"].index_information():
+        # O índice é parcial ($exists): só atende a igualdade com um valor não nulo
+        consultas.append(("upsert de chunk sigiloso", db["chunks_sigilosos"], {"id_chunk_original": ObjectId()}, None))
+    return consultas
+
+
+def estagios_do_plano(plano):
+    """Todos os nomes de estágio de um plano do explain(), percorrendo os estágios aninhados."""
+    estagios = []
+    if isinstance(plano, dict):
+        if "stage" in plano:
+            estagios.append(plano["stage"])
+        for valor in plano.values():
+            estagios.extend(estagios_do_plano(valor))
+    elif isinstance(plano, list):
+        for item in plano:
+            estagios.extend(estagios_do_plano(item))
+    return estagios
+
+
+def estagios_problematicos(estagios):
+    """Varredura da coleção (COLLSCAN) e ordenação em memória (SORT) entre os estágios do plano.
+
+    SORT_MERGE não entra: ele só intercala ramos de um $or que já chegam ordenados pelo índice.
+    """
+    return [estagio for estagio in ESTAGIOS_PROBLEMATICOS if estagio in estagios]
+
+
+def verificar_planos_de_consulta(db):
+    """Roda explain() em cada consulta dos trabalhadores, com a ordenação que a reserva usa,
+    e retorna as que caem em COLLSCAN ou ordenam em memória."""
+    com_problemas = []
+    for descricao, colecao, filtro, ordenacao in consultas_dos_trabalhadores(db):
+        cursor = colecao.find(filtro)
+        if ordenacao:
+            cursor = cursor.sort(ordenacao)
+        plano = cursor.limit(1).explain()["queryPlanner"]["winningPlan"]
+        estagios = estagios_do_plano(plano)
+        problemas = estagios_problematicos(estagios)
+        if problemas:
+            logger.error(f"Consulta '{descricao}' em '{colecao.name}' faz {' e '.join(problemas)}: {filtro} (ordenação {ordenacao})")
+            com_problemas.append(descricao)
+        else:
+            logger.info(f"Consulta '{descricao}' em '{colecao.name}' usa índice ({' <- '.join(estagios)}).")
+    return com_problemas
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    load_dotenv(Path(__file__).parent.parent.parent / 'projeto' / '.env')
+    mongo_uri = f"mongodb://{os.getenv('MONGO_USER', 'usuario')}:{os.getenv('MONGO_PASS', 'senha')}@{os.getenv('MONGO_HOST', 'localhost')}:{os.getenv('MONGO_PORT', '27017')}/"
+    client = MongoClient(mongo_uri, serverSelectionTimeoutMS=5000)
+    try:
+        db = client['dataset_treinamento']
+        preparar_colecoes(db)
+        # Sai com erro se alguma consulta dos trabalhadores não for atendida por índice (filtro e ordenação)
+        sys.exit(1 if verificar_planos_de_consulta(db) else 0)
+    finally:
+        client.close()
@@ -0,0 +1,123 @@
+import os
+import logging
+import argparse
+from pathlib import Path
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.ipc as ipc
+from dataset.migracao_dados.exportador_dataset import DESTINO_PADRAO, carregar_dataset
+from dataset.migracao_dados.balanceador_dataset import NOMES_CLASSES, SEMENTE_PADRAO
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Divisão treino/validação/teste sem vazamento: todos os chunks de um documento de origem
+# (e as suas variantes sintéticas) caem na mesma partição
+PARTICOES = ("treino", "validacao", "teste")
+PROPORCOES_PADRAO = (0.8, 0.1, 0.1)
+COLUNAS_DIVISAO = ["_id", "classificacao_acesso", "id_documento_original", "id_chunk_original"]
+SAIDA_PADRAO = Path(DESTINO_PADRAO).parent / 'particoes_dataset.arrow'
+ESQUEMA_PARTICOES = pa.schema([
+    pa.field("_id", pa.string(), nullable=False),
+    pa.field("particao", pa.int8(), nullable=False),  # índice em PARTICOES
+])
+
+
+def codigos_de_grupo(tabela):
+    """Código inteiro do grupo de cada linha: o documento original, ou o chunk original
+    (ou o próprio _id) quando o documento não é conhecido."""
+    grupo = pc.coalesce(tabela.column("id_documento_original"), tabela.column("id_chunk_original"), tabela.column("_id"))
+    return grupo.combine_chunks().dictionary_encode().indices.to_numpy(zero_copy_only=False).astype(np.int64)
+
+
+def dividir_por_grupo(classes, grupos, proporcoes=PROPORCOES_PADRAO, semente=SEMENTE_PADRAO):
+    """Partição (0, 1, 2) de cada linha, com cada grupo inteiro em uma só partição.
+
+    Os grupos são estratificados pela classe majoritária e embaralhados dentro do estrato;
+    cada grupo vai para a partição onde cai o ponto médio do seu intervalo na soma
+    acumulada de linhas do estrato. Com grupos pequenos em relação ao estrato, as
+    proporções por classe ficam próximas de `proporcoes`. Só ordenações e somas NumPy.
+    """
+    proporcoes = np.asarray(proporcoes, dtype=np.float64)
+    if not np.isclose(proporcoes.sum(), 1.0):
+        raise ValueError(f"As proporções devem somar 1 (recebido {proporcoes.tolist()}).")
+    classes = np.asarray(classes, dtype=np.int64)
+    grupos = np.asarray(grupos, dtype=np.int64)
+    num_grupos = int(grupos.max(initial=-1)) + 1
+    num_classes = int(classes.max(initial=-1)) + 1
+
+    # Contagem (grupo, classe) em um bincount: estrato = classe majoritária do grupo
+    contagens = np.bincount(grupos * num_classes + classes, minlength=num_grupos * num_classes).reshape(num_grupos, num_classes)
+    tamanhos = contagens.sum(axis=1)
+    estratos = contagens.argmax(axis=1)
+
+    rng = np.random.default_rng(semente)
+    ordem = np.lexsort((rng.random(num_grupos), estratos))
+    estratos_ordenados = estratos[ordem]
+    acumulado = np.cumsum(tamanhos[ordem])
+    total_estrato = np.bincount(estratos, weights=tamanhos, minlength=num_classes)
+    inicio_estrato = np.cumsum(total_estrato) - total_estrato
+    ponto_medio = (acumulado - tamanhos[ordem] / 2 - inicio_estrato[estratos_ordenados]) / total_estrato[estratos_ordenados]
+    particao_grupo = np.empty(num_grupos, dtype=np.int8)
+    particao_grupo[ordem] = np.searchsorted(np.cumsum(proporcoes)[:-1], ponto_medio, side="right")
+    return particao_grupo[grupos]
+
+
+def resumir_particoes(classes, particoes, grupos):
+    """Loga as proporções por classe em cada partição e confirma que nenhum grupo foi dividido."""
+    for classe, nome in NOMES_CLASSES.items():
+        da_classe = particoes[classes == classe]
+        contagem = np.bincount(da_classe, minlength=len(PARTICOES))
+        fracoes = " | ".join(f"{PARTICOES[i]} {contagem[i]} ({contagem[i] / max(len(da_classe), 1):.1%})" for i in range(len(PARTICOES)))
+        logger.info(f"{nome:<10}: {fracoes}")
+    # Um grupo vaza se aparece com mais de uma partição
+    pares = np.unique(grupos * len(PARTICOES) + particoes)
+    vazados = len(pares) - len(np.unique(pares // len(PARTICOES)))
+    if vazados:
+        raise AssertionError(f"{vazados} grupos aparecem em mais de uma partição.")
+    logger.info(f"{len(np.unique(grupos))} documentos de origem, nenhum em mais de uma partição.")
+
+
+def gravar_particoes(ids, particoes, saida, proporcoes, semente):
+    """Grava (_id, particao int8) em Arrow IPC, com as partições, proporções e semente nos metadados."""
+    metadados = {
+        "particoes": ",".join(PARTICOES),
+        "proporcoes": ",".join(str(p) for p in proporcoes),
+        "semente": str(semente),
+    }
+    tabela = pa.table([ids, pa.array(particoes, pa.int8())], schema=ESQUEMA_PARTICOES.with_metadata(metadados))
+    with ipc.new_file(str(saida), tabela.schema) as escritor:
+        escritor.write_table(tabela)
+    logger.info(f"Partições de {len(particoes)} linhas gravadas em '{saida}'.")
+
+
+def carregar_particoes(caminho=SAIDA_PADRAO):
+    """Dicionário nome da partição -> vetor (pyarrow) de _ids, lido por memory-map."""
+    tabela = ipc.open_file(pa.memory_map(str(caminho), "r")).read_all()
+    particoes = tabela.column("particao")
+    return {nome: pc.filter(tabela.column("_id"), pc.equal(particoes, i)) for i, nome in enumerate(PARTICOES)}
+
+
+def dividir_dataset(entrada=DESTINO_PADRAO, saida=SAIDA_PADRAO, proporcoes=PROPORCOES_PADRAO, semente=SEMENTE_PADRAO):
+    """Divide o dataset exportado (diretório) ou balanceado (arquivo) e grava as partições."""
+    tabela = carregar_dataset(entrada, COLUNAS_DIVISAO)
+    classes = tabela.column("classificacao_acesso").to_numpy()
+    grupos = codigos_de_grupo(tabela)
+    particoes = dividir_por_grupo(classes, grupos, proporcoes, semente)
+    resumir_particoes(classes, particoes, grupos)
+    if saida:
+        gravar_particoes(tabela.column("_id"), particoes, saida, proporcoes, semente)
+    return particoes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Divide o dataset em treino/validação/teste agrupando por documento de origem.")
+    parser.add_argument("--entrada", default=str(DESTINO_PADRAO),
+                        help="Diretório exportado ou arquivo .arrow/.parquet (ex.: saída do balanceador).")
+    parser.add_argument("--saida", default=str(SAIDA_PADRAO))
+    parser.add_argument("--proporcoes", type=float, nargs=3, default=list(PROPORCOES_PADRAO),
+                        metavar=("TREINO", "VALIDACAO", "TESTE"))
+    parser.add_argument("--semente", type=int, default=int(os.getenv("DIVISAO_SEMENTE", SEMENTE_PADRAO)))
+    args = parser.parse_args()
+    dividir_dataset(args.entrada, args.saida, tuple(args.proporcoes), args.semente)
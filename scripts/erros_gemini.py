@@ -0,0 +1,118 @@
+import re
+import random
+from google.generativeai.types import BlockedPromptException, StopCandidateException
+
+_PADROES_RETRY = [
+    re.compile(r"retry in ([\d.]+)\s*s", re.IGNORECASE),
+    re.compile(r"retry_delay\s*\{\s*seconds:\s*(\d+)", re.IGNORECASE),
+    re.compile(r"retry-after:?\s*([\d.]+)", re.IGNORECASE),
+]
+CODIGOS_TRANSITORIOS = {408, 500, 502, 503, 504}
+# finish_reason/block_reason que indicam conteúdo barrado pelos filtros do Gemini
+MOTIVOS_BLOQUEIO = {"SAFETY", "RECITATION", "BLOCKLIST", "PROHIBITED_CONTENT", "SPII"}
+
+
+class ErroGemini(Exception):
+    """Erro de uma chamada ao Gemini, já classificado; `retry_after` é a espera sugerida pelo servidor."""
+
+    def __init__(self, mensagem, retry_after=None, erro_original=None, saida_bruta=None):
+        super().__init__(mensagem)
+        self.retry_after = retry_after
+        self.erro_original = erro_original
+        self.saida_bruta = saida_bruta
+
+
+class ErroLimiteTaxa(ErroGemini):
+    """429/quota esgotada: a chave entra em cooldown e a chamada vai para outra chave."""
+
+
+class ErroTransitorio(ErroGemini):
+    """Falha passageira (5xx, timeout, conexão): repetir na mesma chave após um backoff curto."""
+
+
+class ErroConteudoBloqueado(ErroGemini):
+    """Prompt ou resposta barrados pelos filtros de segurança: repetir não adianta."""
+
+
+class ErroPermanente(ErroGemini):
+    """Requisição inválida (4xx, modelo inexistente, chave sem permissão): não repetir."""
+
+
+class ErroRespostaInvalida(ErroGemini):
+    """O modelo respondeu, mas sem conteúdo aproveitável; `saida_bruta` guarda o texto recebido."""
+
+
+def extrair_retry_after(erro):
+    """Extrai o tempo de espera sugerido pelo servidor (em segundos) de um erro 429, se houver."""
+    textos = [str(erro)]
+    for detalhe in getattr(erro, "details", None) or []:
+        textos.append(str(detalhe))
+    for texto in textos:
+        for padrao in _PADROES_RETRY:
+            encontrado = padrao.search(texto)
+            if encontrado:
+                return float(encontrado.group(1))
+    return None
+
+
+def classificar_erro_gemini(erro):
+    """Converte uma exceção do SDK/transporte no ErroGemini correspondente."""
+    if isinstance(erro, ErroGemini):
+        return erro
+    mensagem = str(erro)
+    texto = mensagem.lower()
+    # google.api_core expõe o status HTTP em `code` (no gRPC, `code` é um método)
+    codigo = getattr(erro, "code", None)
+    if not isinstance(codigo, int):
+        codigo = None
+    retry_after = extrair_retry_after(erro)
+    if codigo == 429 or "quota" in texto or "rate limit" in texto or "resource exhausted" in texto:
+        return ErroLimiteTaxa(mensagem, retry_after, erro)
+    if isinstance(erro, (BlockedPromptException, StopCandidateException)):
+        return ErroConteudoBloqueado(mensagem, None, erro)
+    # OSError cobre ConnectionError, TimeoutError e os erros de conexão do requests
+    if codigo in CODIGOS_TRANSITORIOS or isinstance(erro, OSError):
+        return ErroTransitorio(mensagem, retry_after, erro)
+    if (codigo is not None and 400 <= codigo < 500) or "unexpected model name format" in texto:
+        return ErroPermanente(mensagem, None, erro)
+    # Desconhecido: tratado como transitório, com o número de repetições limitado
+    return ErroTransitorio(mensagem, retry_after, erro)
+
+
+def _nome_motivo(valor):
+    return getattr(valor, "name", str(valor))
+
+
+def verificar_bloqueio(resposta):
+    """Lança ErroConteudoBloqueado se o prompt ou o candidato foram barrados pelos filtros."""
+    feedback = getattr(resposta, "prompt_feedback", None)
+    motivo = getattr(feedback, "block_reason", None)
+    if motivo:
+        raise ErroConteudoBloqueado(f"Prompt bloqueado pelo Gemini: {_nome_motivo(motivo)}")
+    for candidato in getattr(resposta, "candidates", None) or []:
+        motivo = _nome_motivo(getattr(candidato, "finish_reason", ""))
+        if motivo in MOTIVOS_BLOQUEIO:
+            raise ErroConteudoBloqueado(f"Resposta bloqueada pelo Gemini: {motivo}")
+
+
+class PoliticaBackoff:
+    """Backoff exponencial com jitter ("equal jitter"), respeitando o retry-after do servidor.
+
+    Sem dica do servidor, a espera da tentativa n fica entre metade e o total de
+    min(maximo, base * 2**n). Com dica, espera a dica mais até 10% (e meio segundo)
+    de folga, para que as chaves não voltem todas no mesmo instante.
+    """
+
+    def __init__(self, base_segundos, maximo_segundos):
+        self.base_segundos = base_segundos
+        self.maximo_segundos = maximo_segundos
+
+    def espera(self, tentativa, retry_after=None):
+        if retry_after is not None:
+            return retry_after + random.uniform(0, retry_after * 0.1 + 0.5)
+        teto = min(self.maximo_segundos, self.base_segundos * 2 ** tentativa)
+        return teto / 2 + random.uniform(0, teto / 2)
+
+
+BACKOFF_TRANSITORIO = PoliticaBackoff(1.0, 30.0)
+BACKOFF_QUOTA = PoliticaBackoff(15.0, 600.0)
@@ -0,0 +1,293 @@
+import os
+import json
+import logging
+import argparse
+from pathlib import Path
+from datetime import timedelta
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+from bson import ObjectId
+from pymongo import MongoClient
+from dotenv import load_dotenv
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+load_dotenv(Path(__file__).parent.parent.parent / 'projeto' / '.env')
+
+MONGO_URI = f"mongodb://{os.getenv('MONGO_USER', 'usuario')}:{os.getenv('MONGO_PASS', 'senha')}@{os.getenv('MONGO_HOST', 'localhost')}:{os.getenv('MONGO_PORT', '27017')}/"
+DB_NAME = "dataset_treinamento"
+COLECAO_PADRAO = "chunks_rotulados"
+DESTINO_PADRAO = Path(__file__).parent / 'dataset_exportado'
+TAMANHO_LOTE_EXPORTACAO = int(os.getenv("EXPORTACAO_TAMANHO_LOTE", "5000"))
+# Parquet é mais compacto para distribuir; Arrow IPC sem compressão é lido por memory-map sem cópia
+FORMATOS = {"arrow": ".arrow", "parquet": ".parquet"}
+ARQUIVO_ESTADO = "_estado.json"
+VERSAO_ESQUEMA = 1
+# ObjectIds de máquinas diferentes não são estritamente ordenados dentro do mesmo segundo:
+# a exportação incremental relê essa janela antes da marca d'água e descarta os já exportados
+MARGEM_INCREMENTAL = timedelta(seconds=int(os.getenv("EXPORTACAO_MARGEM_INCREMENTAL_SEGUNDOS", "300")))
+
+CLASSES_VALIDAS = [0, 1, 2]
+ESQUEMA = pa.schema([
+    pa.field("_id", pa.string(), nullable=False),
+    pa.field("texto", pa.string(), nullable=False),
+    pa.field("classificacao_acesso", pa.int8(), nullable=False),
+    pa.field("fonte", pa.dictionary(pa.int8(), pa.string())),
+    pa.field("confianca_classificacao", pa.float32()),
+    pa.field("id_documento_original", pa.string()),
+    pa.field("id_chunk_original", pa.string()),
+], metadata={"versao_esquema": str(VERSAO_ESQUEMA)})
+# Fontes gravadas pelos scripts do pipeline: o dicionário de `fonte` de cada parte já começa com elas
+FONTES_CONHECIDAS = ["proad_sintetico", "proad_sintetico_sigiloso"]
+PROJECAO = {
+    "texto": 1, "texto_sintetico": 1, "classificacao_acesso": 1, "fonte": 1,
+    "confianca_classificacao": 1, "id_documento_original": 1, "id_chunk_original": 1,
+}
+
+
+def _texto_ou_none(valor):
+    return None if valor is None else str(valor)
+
+
+def _confianca(valor):
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+class ConstrutorDeLotes:
+    """Acumula documentos do MongoDB em colunas e os converte em RecordBatch do ESQUEMA.
+
+    O dicionário de `fonte` é compartilhado entre os lotes e só cresce, para que o
+    escritor IPC grave deltas em vez de substituir o dicionário a cada lote. Ele nunca
+    começa vazio: um arquivo IPC não aceita trocar o dicionário vazio do primeiro lote
+    (com `fonte` toda nula) por outro, e isso não conta como delta.
+    """
+
+    def __init__(self):
+        self.fontes = list(FONTES_CONHECIDAS)
+        self._indice_fonte = {fonte: i for i, fonte in enumerate(self.fontes)}
+        self._limpar()
+
+    def _limpar(self):
+        self.colunas = {campo.name: [] for campo in ESQUEMA}
+
+    def __len__(self):
+        return len(self.colunas["_id"])
+
+    def adicionar(self, doc):
+        """Acrescenta o documento; retorna False (e o ignora) se não tiver texto ou classe válida."""
+        texto = doc.get("texto_sintetico") or doc.get("texto")
+        try:
+            classe = int(doc.get("classificacao_acesso"))
+        except (TypeError, ValueError):
+            return False
+        if not texto or classe not in CLASSES_VALIDAS:
+            return False
+        fonte = doc.get("fonte")
+        if fonte is not None and fonte not in self._indice_fonte:
+            self._indice_fonte[fonte] = len(self.fontes)
+            self.fontes.append(fonte)
+        colunas = self.colunas
+        colunas["_id"].append(str(doc["_id"]))
+        colunas["texto"].append(texto)
+        colunas["classificacao_acesso"].append(classe)
+        colunas["fonte"].append(self._indice_fonte.get(fonte))
+        colunas["confianca_classificacao"].append(_confianca(doc.get("confianca_classificacao")))
+        colunas["id_documento_original"].append(_texto_ou_none(doc.get("id_documento_original")))
+        colunas["id_chunk_original"].append(_texto_ou_none(doc.get("id_chunk_original")))
+        return True
+
+    def extrair(self):
+        """Devolve o RecordBatch com os documentos acumulados e esvazia o construtor."""
+        colunas = self.colunas
+        arrays = [
+            pa.array(colunas["_id"], pa.string()),
+            pa.array(colunas["texto"], pa.string()),
+            pa.array(colunas["classificacao_acesso"], pa.int8()),
+            pa.DictionaryArray.from_arrays(
+                pa.array(colunas["fonte"], pa.int8()), pa.array(self.fontes, pa.string())),
+            pa.array(colunas["confianca_classificacao"], pa.float32()),
+            pa.array(colunas["id_documento_original"], pa.string()),
+            pa.array(colunas["id_chunk_original"], pa.string()),
+        ]
+        self._limpar()
+        return pa.RecordBatch.from_arrays(arrays, schema=ESQUEMA)
+
+
+class EscritorDeParte:
+    """Grava um arquivo de parte (Arrow IPC ou Parquet) lote a lote, sem reter o dataset em memória."""
+
+    def __init__(self, caminho, formato):
+        self.caminho = caminho
+        self.formato = formato
+        if formato == "arrow":
+            opcoes = ipc.IpcWriteOptions(emit_dictionary_deltas=True)
+            self._escritor = ipc.new_file(str(caminho), ESQUEMA, options=opcoes)
+        else:
+            self._escritor = pq.ParquetWriter(str(caminho), ESQUEMA, compression="zstd")
+
+    def escrever(self, lote):
+        if self.formato == "arrow":
+            self._escritor.write_batch(lote)
+        else:
+            self._escritor.write_table(pa.Table.from_batches([lote]))
+
+    def fechar(self):
+        self._escritor.close()
+
+
+def carregar_estado(destino):
+    caminho = Path(destino) / ARQUIVO_ESTADO
+    if not caminho.exists():
+        return {"versao_esquema": VERSAO_ESQUEMA, "formato": None, "registros": 0, "ultimo_id": None, "partes": []}
+    with open(caminho, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def salvar_estado(destino, estado):
+    caminho = Path(destino) / ARQUIVO_ESTADO
+    temporario = caminho.with_suffix(".tmp")
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump(estado, f, ensure_ascii=False, indent=2)
+    os.replace(temporario, caminho)  # Troca atômica: uma exportação interrompida não corrompe o estado
+
+
+def _caminho_parte(destino, parte):
+    return Path(destino) / parte["arquivo"]
+
+
+def ler_ids_exportados(destino, estado, a_partir_de):
+    """Ids já exportados com _id >= `a_partir_de` (hex), lidos só da coluna `_id` das partes."""
+    ids = set()
+    for parte in estado["partes"]:
+        if parte["ultimo_id"] < a_partir_de:
+            continue
+        coluna = _ler_parte(_caminho_parte(destino, parte), colunas=["_id"]).column("_id")
+        # O hex de ObjectIds com o mesmo tamanho ordena como o próprio ObjectId (tempo de criação primeiro)
+        ids.update(pc.filter(coluna, pc.greater_equal(coluna, a_partir_de)).to_pylist())
+    return ids
+
+
+def exportar_dataset(colecao, destino=DESTINO_PADRAO, formato="arrow", completo=False,
+                     tamanho_lote=TAMANHO_LOTE_EXPORTACAO):
+    """Exporta os chunks rotulados de `colecao` para `destino` como uma nova parte do dataset.
+
+    Lê a coleção em ordem de `_id` com projeção e cursor em lotes, gravando cada lote
+    assim que fica completo. Sem `completo`, exporta só o que entrou depois da última
+    exportação; com `completo`, descarta as partes anteriores (necessário para refletir
+    rótulos alterados em documentos já exportados). Retorna o número de registros gravados.
+    """
+    destino = Path(destino)
+    destino.mkdir(parents=True, exist_ok=True)
+    estado = carregar_estado(destino)
+    if estado["versao_esquema"] != VERSAO_ESQUEMA or (estado["formato"] not in (None, formato)):
+        logger.warning(f"Dataset em '{destino}' tem esquema/formato diferente ({estado['versao_esquema']}/{estado['formato']}); refazendo a exportação completa.")
+        completo = True
+    if completo:
+        for parte in estado["partes"]:
+            _caminho_parte(destino, parte).unlink(missing_ok=True)
+        estado = {"versao_esquema": VERSAO_ESQUEMA, "formato": formato, "registros": 0, "ultimo_id": None, "partes": []}
+    estado["formato"] = formato
+
+    filtro = {"classificacao_acesso": {"$in": CLASSES_VALIDAS}}
+    ja_exportados = set()
+    if estado["ultimo_id"]:
+        inicio_janela = ObjectId.from_datetime(ObjectId(estado["ultimo_id"]).generation_time - MARGEM_INCREMENTAL)
+        filtro["_id"] = {"$gte": inicio_janela}
+        ja_exportados = ler_ids_exportados(destino, estado, str(inicio_janela))
+
+    numero = len(estado["partes"]) + 1
+    parte = {"arquivo": f"parte-{numero:05d}{FORMATOS[formato]}", "registros": 0, "ultimo_id": None}
+    caminho = _caminho_parte(destino, parte)
+    construtor = ConstrutorDeLotes()
+    escritor = None
+    ignorados = 0
+    cursor = colecao.find(filtro, PROJECAO).sort("_id", 1).batch_size(tamanho_lote)
+    try:
+        for doc in cursor:
+            id_hex = str(doc["_id"])
+            if id_hex in ja_exportados:
+                continue
+            if not construtor.adicionar(doc):
+                ignorados += 1
+                continue
+            parte["ultimo_id"] = max(parte["ultimo_id"] or id_hex, id_hex)
+            if len(construtor) >= tamanho_lote:
+                escritor = escritor or EscritorDeParte(caminho, formato)
+                escritor.escrever(construtor.extrair())
+                parte["registros"] += tamanho_lote
+                logger.info(f"{estado['registros'] + parte['registros']} registros exportados para '{caminho.name}'...")
+        if len(construtor):
+            escritor = escritor or EscritorDeParte(caminho, formato)
+            parte["registros"] += len(construtor)
+            escritor.escrever(construtor.extrair())
+    except BaseException:
+        if escritor is not None:
+            escritor.fechar()
+            caminho.unlink(missing_ok=True)
+        raise
+    finally:
+        cursor.close()
+
+    if escritor is None:
+        salvar_estado(destino, estado)
+        logger.info(f"Nenhum registro novo para exportar em '{destino}' ({ignorados} ignorados sem texto/classe válida).")
+        return 0
+    escritor.fechar()
+    estado["partes"].append(parte)
+    estado["registros"] += parte["registros"]
+    estado["ultimo_id"] = max(estado["ultimo_id"] or parte["ultimo_id"], parte["ultimo_id"])
+    salvar_estado(destino, estado)
+    logger.info(f"{parte['registros']} registros gravados em '{caminho}' ({estado['registros']} no total, {ignorados} ignorados sem texto/classe válida).")
+    return parte["registros"]
+
+
+def _ler_parte(caminho, colunas=None):
+    if caminho.suffix == FORMATOS["arrow"]:
+        # memory-map + IPC sem compressão: as colunas apontam para as páginas do arquivo, sem cópia
+        tabela = ipc.open_file(pa.memory_map(str(caminho), "r")).read_all()
+        return tabela.select(colunas) if colunas else tabela
+    return pq.read_table(str(caminho), columns=colunas, memory_map=True)
+
+
+def carregar_dataset(destino=DESTINO_PADRAO, colunas=None):
+    """Abre todas as partes exportadas como uma única pyarrow.Table.
+
+    Partes Arrow são mapeadas em memória: abrir o dataset não lê o arquivo inteiro e
+    `tabela.column(...).to_numpy()` devolve vetores sem cópia nas colunas numéricas.
+    `destino` também pode ser um único arquivo .arrow/.parquet (ex.: a saída do balanceador).
+    """
+    destino = Path(destino)
+    if destino.is_file():
+        return _ler_parte(destino, colunas)
+    estado = carregar_estado(destino)
+    if not estado["partes"]:
+        raise FileNotFoundError(f"Nenhuma parte exportada em '{destino}'. Rode exportador_dataset.py primeiro.")
+    tabelas = [_ler_parte(_caminho_parte(destino, parte), colunas) for parte in estado["partes"]]
+    # concat_tables só junta os pedaços (ChunkedArray): não copia os buffers mapeados
+    return pa.concat_tables(tabelas)
+
+
+def main(destino, formato, completo, colecao_nome):
+    client = MongoClient(MONGO_URI)
+    try:
+        exportar_dataset(client[DB_NAME][colecao_nome], destino, formato, completo)
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exporta os chunks rotulados para Arrow/Parquet.")
+    parser.add_argument("--destino", default=str(DESTINO_PADRAO))
+    parser.add_argument("--formato", choices=sorted(FORMATOS), default="arrow",
+                        help="arrow: leitura por memory-map sem cópia; parquet: arquivos menores (zstd).")
+    parser.add_argument("--completo", action="store_true",
+                        help="Refaz a exportação inteira em vez de anexar só os documentos novos.")
+    parser.add_argument("--colecao", default=COLECAO_PADRAO)
+    args = parser.parse_args()
+    main(args.destino, args.formato, args.completo, args.colecao)
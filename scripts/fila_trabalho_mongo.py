@@ -0,0 +1,216 @@
+import os
+import uuid
+import random
+import socket
+from datetime import datetime, timedelta, timezone
+from pymongo import ReturnDocument, UpdateOne
+
+STATUS_EM_PROCESSAMENTO = "em_processamento"
+STATUS_FALHA_PERMANENTE = "falha_permanente"
+DURACAO_RESERVA_PADRAO_SEGUNDOS = int(os.getenv("MONGO_DURACAO_RESERVA_SEGUNDOS", "600"))
+
+# Reprocessamento de falhas: espera base * 2**(tentativas - 1), limitada ao máximo, com jitter
+COLECAO_FALHAS_PERMANENTES = "falhas_permanentes"
+MAX_TENTATIVAS_PADRAO = int(os.getenv("MONGO_MAX_TENTATIVAS", "5"))
+ESPERA_BASE_REPROCESSAMENTO_SEGUNDOS = int(os.getenv("MONGO_ESPERA_BASE_REPROCESSAMENTO_SEGUNDOS", "60"))
+ESPERA_MAXIMA_REPROCESSAMENTO_SEGUNDOS = int(os.getenv("MONGO_ESPERA_MAXIMA_REPROCESSAMENTO_SEGUNDOS", str(6 * 3600)))
+LIMITE_CARACTERES_SAIDA_BRUTA = 20000
+# Prazo de quem nunca falhou (sempre vencido) e de quem não deve voltar sozinho à fila
+SEM_ESPERA = datetime(1970, 1, 1, tzinfo=timezone.utc)
+ADIADO_INDEFINIDAMENTE = datetime(9999, 12, 31, tzinfo=timezone.utc)
+
+
+def gerar_id_trabalhador():
+    """Identificador único do processo: máquina, pid e um sufixo aleatório."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def _literal(valor):
+    # Em pipelines de atualização, strings com "$" seriam lidas como caminhos de campo
+    return {"$literal": valor}
+
+
+class AgendaDeTentativas:
+    """Tentativas, agendamento da próxima tentativa e dead-letter de uma etapa.
+
+    Cada falha incrementa `tentativas_<etapa>`, grava o erro em `ultimo_erro_<etapa>` e
+    agenda `proxima_tentativa_<etapa>_em` com backoff exponencial; as consultas de trabalho
+    só pegam documentos cujo prazo já venceu (`filtro_vencidos`), então um item que falha
+    sempre deixa de consumir quota a cada ciclo. Na tentativa `max_tentativas` o documento
+    sai da fila e o último erro, com a saída bruta do modelo, vai para a coleção de falhas
+    permanentes (uma entrada por etapa e documento).
+    """
+
+    def __init__(self, etapa, colecao_falhas, max_tentativas=MAX_TENTATIVAS_PADRAO,
+                 espera_base_segundos=ESPERA_BASE_REPROCESSAMENTO_SEGUNDOS,
+                 espera_maxima_segundos=ESPERA_MAXIMA_REPROCESSAMENTO_SEGUNDOS):
+        self.etapa = etapa
+        self.colecao_falhas = colecao_falhas
+        self.max_tentativas = max_tentativas
+        self.espera_base_segundos = espera_base_segundos
+        self.espera_maxima_segundos = espera_maxima_segundos
+        self.campo_tentativas = f"tentativas_{etapa}"
+        self.campo_proxima_tentativa = f"proxima_tentativa_{etapa}_em"
+        self.campo_ultimo_erro = f"ultimo_erro_{etapa}"
+
+    def filtro_vencidos(self, agora):
+        return {self.campo_proxima_tentativa: {"$lte": agora}}
+
+    def registrar_falha(self, colecao, filtro, documento_id, erro, saida_bruta=None,
+                        campos_ao_repetir=None, campos_ao_esgotar=None, campos_removidos=()):
+        """Registra a falha em uma ida ao banco e retorna o número de tentativas (None se `filtro` não casou).
+
+        `campos_ao_repetir`/`campos_ao_esgotar` são gravados conforme ainda haja tentativas ou
+        não (ex.: o status da fila); `campos_removidos` saem do documento nos dois casos.
+        """
+        agora = datetime.now(timezone.utc)
+        tentativas = f"${self.campo_tentativas}"
+        espera_ms = {"$multiply": [
+            random.uniform(500, 1000),  # "equal jitter": entre metade e o total da espera
+            {"$min": [self.espera_maxima_segundos, {"$multiply": [
+                self.espera_base_segundos, {"$pow": [2, {"$subtract": [tentativas, 1]}]}
+            ]}]},
+        ]}
+        ao_repetir = {self.campo_proxima_tentativa: {"$add": [agora, espera_ms]}}
+        ao_repetir.update({campo: _literal(valor) for campo, valor in (campos_ao_repetir or {}).items()})
+        ao_esgotar = {campo: _literal(valor) for campo, valor in (campos_ao_esgotar or {}).items()}
+        esgotou = {"$gte": [tentativas, self.max_tentativas]}
+        pipeline = [
+            {"$set": {
+                self.campo_tentativas: {"$add": [{"$ifNull": [tentativas, 0]}, 1]},
+                self.campo_ultimo_erro: _literal(str(erro)),
+            }},
+            {"$set": {
+                campo: {"$cond": [esgotou, ao_esgotar.get(campo, f"${campo}"), ao_repetir.get(campo, f"${campo}")]}
+                for campo in {**ao_repetir, **ao_esgotar}
+            }},
+        ]
+        if campos_removidos:
+            pipeline.append({"$unset": list(campos_removidos)})
+        documento = colecao.find_one_and_update(
+            filtro, pipeline, projection={self.campo_tentativas: 1}, return_document=ReturnDocument.AFTER
+        )
+        if documento is None:
+            return None
+        total = documento.get(self.campo_tentativas, 0)
+        if total >= self.max_tentativas:
+            self.colecao_falhas.update_one(
+                {"etapa": self.etapa, "id_documento": documento_id},
+                {"$set": {
+                    "colecao": colecao.name,
+                    "tentativas": total,
+                    "ultimo_erro": str(erro),
+                    "saida_bruta": saida_bruta[:LIMITE_CARACTERES_SAIDA_BRUTA] if saida_bruta else None,
+                    "data_falha": agora,
+                }},
+                upsert=True
+            )
+        return total
+
+
+class FilaDeTrabalhoMongo:
+    """Fila de trabalho sobre um campo de status existente, com reserva (lease) atômica.
+
+    Cada documento é reservado com `find_one_and_update`: o status passa a
+    "em_processamento" e o documento recebe o id do trabalhador e o prazo da reserva
+    (`trabalhador_<etapa>` e `reserva_<etapa>_ate`, em UTC). Reservas vencidas — de um
+    processo que morreu ou travou — voltam a ser reivindicáveis. A duração da reserva
+    deve ser bem maior que o tempo de processamento de um documento e que a diferença
+    entre os relógios das máquinas. Com `ordenacao` (ex.: `[("prioridade", -1)]`), a reserva
+    pega primeiro os documentos de maior prioridade.
+
+    As escritas de conclusão filtram pelo id do trabalhador: se a reserva expirou e
+    outro processo assumiu o documento, a conclusão atrasada não o sobrescreve.
+
+    Falhas passam por `registrar_falha` (ver AgendaDeTentativas): o documento volta a
+    "pendente" com a próxima tentativa agendada ou, esgotadas as tentativas, fica em
+    "falha_permanente" com uma entrada na coleção de falhas permanentes.
+    """
+
+    def __init__(self, colecao, campo_status, filtro_pendentes, etapa, status_pendente="pendente",
+                 duracao_reserva_segundos=DURACAO_RESERVA_PADRAO_SEGUNDOS, id_trabalhador=None,
+                 max_tentativas=MAX_TENTATIVAS_PADRAO, colecao_falhas=None, ordenacao=None):
+        self.colecao = colecao
+        self.ordenacao = ordenacao
+        self.campo_status = campo_status
+        self.filtro_pendentes = filtro_pendentes
+        self.status_pendente = status_pendente
+        self.duracao_reserva_segundos = duracao_reserva_segundos
+        self.id_trabalhador = id_trabalhador or gerar_id_trabalhador()
+        self.campo_trabalhador = f"trabalhador_{etapa}"
+        self.campo_reserva = f"reserva_{etapa}_ate"
+        if colecao_falhas is None:
+            colecao_falhas = colecao.database[COLECAO_FALHAS_PERMANENTES]
+        self.agenda = AgendaDeTentativas(etapa, colecao_falhas, max_tentativas)
+
+    def filtro_reivindicaveis(self, agora):
+        """Documentos pendentes com a próxima tentativa vencida ou com reserva vencida em `agora`."""
+        return {"$or": [
+            {**self.filtro_pendentes, **self.agenda.filtro_vencidos(agora)},
+            {self.campo_status: STATUS_EM_PROCESSAMENTO, self.campo_reserva: {"$lt": agora}},
+        ]}
+
+    def reivindicar(self, projecao=None):
+        """Reserva um documento pendente (ou com reserva vencida) e o retorna; None se não houver."""
+        agora = datetime.now(timezone.utc)
+        return self.colecao.find_one_and_update(
+            self.filtro_reivindicaveis(agora),
+            {"$set": {
+                self.campo_status: STATUS_EM_PROCESSAMENTO,
+                self.campo_trabalhador: self.id_trabalhador,
+                self.campo_reserva: agora + timedelta(seconds=self.duracao_reserva_segundos),
+            }},
+            projection=projecao,
+            sort=self.ordenacao,
+            return_document=ReturnDocument.AFTER
+        )
+
+    def reivindicar_lote(self, quantidade, projecao=None):
+        """Reserva até `quantidade` documentos, um `find_one_and_update` por documento."""
+        documentos = []
+        while len(documentos) < quantidade:
+            documento = self.reivindicar(projecao)
+            if documento is None:
+                break
+            documentos.append(documento)
+        return documentos
+
+    def filtro_reservado(self, documento_id):
+        """Filtro que só casa o documento enquanto ele está reservado por este trabalhador."""
+        return {"_id": documento_id, self.campo_trabalhador: self.id_trabalhador}
+
+    def operacao_concluir(self, documento_id, campos):
+        """UpdateOne (para o buffer de escrita) que grava `campos` e encerra a reserva deste trabalhador."""
+        return UpdateOne(
+            self.filtro_reservado(documento_id),
+            {"$set": campos, "$unset": {self.campo_trabalhador: "", self.campo_reserva: ""}}
+        )
+
+    def liberar(self, documento_id):
+        """Devolve o documento à fila imediatamente, sem esperar a reserva vencer."""
+        self.colecao.update_one(
+            self.filtro_reservado(documento_id),
+            {"$set": {self.campo_status: self.status_pendente}, "$unset": {self.campo_trabalhador: "", self.campo_reserva: ""}}
+        )
+
+    def adiar(self, documento_id, atraso_segundos):
+        """Devolve o documento à fila só a partir de `atraso_segundos`, sem contar tentativa (ex.: quota esgotada)."""
+        self.colecao.update_one(
+            self.filtro_reservado(documento_id),
+            {
+                "$set": {
+                    self.campo_status: self.status_pendente,
+                    self.agenda.campo_proxima_tentativa: datetime.now(timezone.utc) + timedelta(seconds=atraso_segundos),
+                },
+                "$unset": {self.campo_trabalhador: "", self.campo_reserva: ""},
+            }
+        )
+
+    def registrar_falha(self, documento_id, erro, saida_bruta=None):
+        """Encerra a reserva registrando a falha; retorna o número de tentativas (None se a reserva foi perdida)."""
+        return self.agenda.registrar_falha(
+            self.colecao, self.filtro_reservado(documento_id), documento_id, erro, saida_bruta,
+            campos_ao_repetir={self.campo_status: self.status_pendente},
+            campos_ao_esgotar={self.campo_status: STATUS_FALHA_PERMANENTE},
+            campos_removidos=(self.campo_trabalhador, self.campo_reserva),
+        )
@@ -1,12 +1,25 @@
 import logging
 import time
 import os
-import google.generativeai as genai
+import re
+import threading
+from typing_extensions import TypedDict
 from pymongo import MongoClient
 from dotenv import load_dotenv
 from pathlib import Path
 from datetime import datetime
 import json
+from dataset.migracao_dados.pool_chaves_gemini import PoolDeChaves
+from dataset.migracao_dados.cache_respostas_gemini import (
+    armazenar_cache_gemini,
+    consultar_cache_gemini,
+    gerar_conteudo,
+    gerar_conteudo_com_cache,
+    nome_do_modelo,
+)
+from dataset.migracao_dados.erros_gemini import ErroRespostaInvalida
+from dataset.migracao_dados.metricas_pipeline import respostas_interpretadas
+from dataset.migracao_dados.registro_prompts import TAREFA_CLASSIFICACAO, TAREFA_CLASSIFICACAO_LOTE, prompts
 
 # Carregar variáveis do .env do diretório do projeto
 project_root = Path(__file__).parent.parent.parent
@@ -19,111 +32,308 @@ MONGO_HOST = os.getenv("MONGO_HOST", "localhost")
 MONGO_PORT = os.getenv("MONGO_PORT", "27017")
 MONGO_URI = f"mongodb://{MONGO_USER}:{MONGO_PASS}@{MONGO_HOST}:{MONGO_PORT}/"
 
-def classificar_chunk_gemini(texto, model):
-    logger = logging.getLogger(__name__)
-    VERSAO_PROMPT_CLASSIFICACAO = 'v2.6'
-    prompt = f"""
-        Você é um Analista Sênior de Classificação de Dados em um órgão público brasileiro, especialista em conformidade com a Lei Geral de Proteção de Dados (LGPD - Lei 13.709/18) e a Lei de Acesso à Informação (LAI - Lei 12.527/11). Sua tarefa é analisar o texto fornecido e determinar o nível de acesso apropriado, seguindo diretrizes rigorosas.
-
-        ### PRINCÍPIOS-CHAVE PARA DECISÃO:
-        Antes de classificar, siga estes 3 princípios fundamentais. Estes princípios têm precedência e guiarão a aplicação das diretrizes de classificação subsequentes:
-        1.  **ATO PREPARATÓRIO vs. ATO FINAL:** Documentos que subsidiam uma decisão (pareceres, notas técnicas, relatórios de análise) são considerados **preparatórios** e devem, por padrão, ser classificados como **INTERNOS (1)**, mesmo que o ato final (o contrato, a portaria) seja público. O acesso a eles só é garantido após a edição do ato decisório final.
-            *Exemplo: Um "Parecer Técnico sobre Edital de Concurso" é interno (1), mesmo que o "Edital de Concurso" final seja público (2).*
-        2.  **INVESTIGAÇÃO E APURAÇÃO = SIGILO:** Qualquer documento que faça parte de um processo de investigação, sindicância, ou apuração de irregularidades (relatórios, denúncias, depoimentos) deve ser, por padrão, classificado como **RESTRITO (0)**, devido ao risco de dano grave à investigação e à imagem dos envolvidos, conforme exceções previstas na LAI.
-        3.  **DADO PESSOAL EM CONTEXTO ADMINISTRATIVO:** A simples presença de dados pessoais (nome, matrícula, cargo) em um documento de rotina administrativa interna (folha de ponto, despacho de processo, trâmite) justifica a classificação como **INTERNO (1)**, protegendo a privacidade do agente público sem ferir o interesse público geral.
-            *Exemplo: O nome de um servidor em uma folha de ponto é interno (1). O nome do gestor que assina um contrato público final é público (2) se for parte essencial do ato.*
-
-        ### DIRETRIZES DE CLASSIFICAÇÃO:
-        Avalie o documento e retorne:
-        1.  CLASSIFICACAO: Um número inteiro (0, 1 ou 2) para indicar a classificação de acesso:
-            * 0 (ACESSO RESTRITO): Documento protegido e acessível apenas por indivíduos com autorização legal específica.
-                Aplica-se se contiver:
-                * Informações de processos de apuração, sindicância ou disciplinares (PAD), cujo sigilo é essencial para garantir a eficácia da investigação e o direito à ampla defesa.
-                * Dados pessoais sensíveis (saúde, etnia, vida sexual, etc.) que, se divulgados, causariam dano significativo.
-                * Informações protegidas por sigilo legal (fiscal, bancário, de justiça, etc.).
-                * Informações estratégicas sigilosas da instituição.
-
-            * 1 (ACESSO INTERNO): Visível para o público interno, mas não para o externo.
-                Aplica-se a:
-                * Atos administrativos preparatórios, como Pareceres Jurídicos, Notas Técnicas, Relatórios de Análise de Risco e Despachos que fundamentam uma decisão futura.
-                * Documentos de tramitação administrativa que contenham dados pessoais de servidores ou partes, sem interesse público preponderante (ex: processos de férias, folhas de ponto, relatórios de atividades).
-                * Informações de gestão interna que não se enquadrem como sigilosas (nível 0).
-
-            * 2 (ACESSO PÚBLICO): Visível para toda a Internet.
-                Aplica-se a:
-                * Atos administrativos finais e de interesse geral (ex: editais, contratos finalizados e publicados, portarias de nomeação/exoneração, resultados de concursos).
-                * Documentos que não contêm dados pessoais ou cujo dado pessoal é parte essencial do caráter público do ato (nome do gestor que assina um contrato público).
-                * Importante: Esta classificação NÃO se aplica a documentos preparatórios, mesmo que tratem de temas que se tornarão públicos.
-
-        2.  EXPLICACAO: Em no máximo 3 frases, explique o motivo da classificação. Inicie a explicação identificando a natureza do documento (ex: "Trata-se de um ato preparatório...") e mencione o princípio ou a regra que aplicou.
-
-        3.  CONFIANCA: Um número de ponto flutuante entre 0.0 e 1.0.
-
-        Responda OBRIGATORIAMENTE com um objeto JSON, sem nenhum texto adicional antes ou depois, seguindo o esquema:
-        ```json
-        {{
-        "CLASSIFICACAO": <0, 1 ou 2>,
-        "EXPLICACAO": "<explicação curta>",
-        "CONFIANCA": <número entre 0.0 e 1.0>
-        }}
-        Texto para análise:
-        {texto}
+# Pede a resposta em JSON pelo esquema do SDK (response_schema); GEMINI_SAIDA_ESTRUTURADA=0 desliga
+SAIDA_ESTRUTURADA = os.getenv("GEMINI_SAIDA_ESTRUTURADA", "1") != "0"
+
+def montar_prompt_classificacao(texto, template=None):
+    """Prompt de classificação de um único texto (resposta em objeto JSON), na versão escolhida para o texto."""
+    template = template or prompts.escolher(TAREFA_CLASSIFICACAO, texto)
+    return template.montar(texto=texto)
+
+# typing.TypedDict não serve ao response_schema em Python < 3.12 (o SDK converte o tipo pelo pydantic)
+class ClassificacaoEstruturada(TypedDict):
+    CLASSIFICACAO: int
+    EXPLICACAO: str
+    CONFIANCA: float
+
+
+class ClassificacaoEstruturadaEmLote(TypedDict):
+    id: str
+    CLASSIFICACAO: int
+    EXPLICACAO: str
+    CONFIANCA: float
+
+
+def configuracao_geracao(em_lote=False):
+    """generation_config que pede JSON pelo esquema de resposta do SDK, ou None com a saída estruturada desligada."""
+    if not SAIDA_ESTRUTURADA:
+        return None
+    return {
+        "response_mime_type": "application/json",
+        "response_schema": list[ClassificacaoEstruturadaEmLote] if em_lote else ClassificacaoEstruturada,
+    }
+
+
+class MetricasInterpretacao:
+    """Contagem de respostas por forma de interpretação: JSON direto, reparada ou falha."""
+
+    def __init__(self):
+        self.contagens = {"json": 0, "reparada": 0, "falha": 0}
+        self._lock = threading.Lock()
+
+    def registrar(self, forma, quantidade=1):
+        with self._lock:
+            self.contagens[forma] += quantidade
+        respostas_interpretadas.incrementar(quantidade, tarefa="classificacao", forma=forma)
+
+    def estatisticas(self):
+        with self._lock:
+            contagens = dict(self.contagens)
+        total = sum(contagens.values())
+        contagens["total"] = total
+        contagens["taxa_reparo"] = contagens["reparada"] / total if total else 0.0
+        contagens["taxa_falha"] = contagens["falha"] / total if total else 0.0
+        return contagens
+
+
+metricas_interpretacao = MetricasInterpretacao()
+
+
+def registrar_metricas_interpretacao():
+    """Loga quantas respostas vieram em JSON válido, foram reparadas ou falharam."""
+    estatisticas = metricas_interpretacao.estatisticas()
+    if estatisticas["total"]:
+        logger = logging.getLogger(__name__)
+        logger.info(f"Respostas de classificação: {estatisticas['json']} JSON válido, {estatisticas['reparada']} reparadas, {estatisticas['falha']} falhas (taxa de falha {estatisticas['taxa_falha']:.1%}, reparo {estatisticas['taxa_reparo']:.1%}).")
+
+
+_decodificador_json = json.JSONDecoder()
+# Recuperam os campos de respostas malformadas: JSON truncado ou sem a chave de
+# fechamento e o formato antigo em linhas ("CLASSIFICACAO: 1")
+_PADROES_CAMPOS = {
+    "CLASSIFICACAO": re.compile(r'CLASSIFICACAO"?\s*:\s*"?(-?\d+(?:\.\d+)?)', re.IGNORECASE),
+    "EXPLICACAO": re.compile(r'EXPLICACAO"?\s*:\s*"?((?:[^"\\\n]|\\.)*)', re.IGNORECASE),
+    "CONFIANCA": re.compile(r'CONFIANCA"?\s*:\s*"?(-?\d+(?:\.\d+)?)', re.IGNORECASE),
+}
+
+
+def _extrair_objeto_json(resposta):
+    """(objeto, reparado): o primeiro objeto JSON da resposta, ignorando cercas e texto ao redor.
+
+    Se o objeto não decodifica, os campos são recuperados por expressão regular
+    (reparado=True). Retorna (None, True) se nenhum campo for encontrado.
     """
+    inicio = resposta.find('{')
+    if inicio != -1:
+        try:
+            obj, _ = _decodificador_json.raw_decode(resposta, inicio)
+            if isinstance(obj, dict):
+                return obj, False
+        except json.JSONDecodeError:
+            pass
+    obj = {}
+    for campo, padrao in _PADROES_CAMPOS.items():
+        encontrado = padrao.search(resposta)
+        if encontrado:
+            obj[campo] = encontrado.group(1).strip()
+    if "EXPLICACAO" in obj:
+        try:
+            obj["EXPLICACAO"] = json.loads(f'"{obj["EXPLICACAO"]}"')
+        except json.JSONDecodeError:
+            pass
+    return (obj or None), True
+
+
+def _validar_campos_classificacao(obj):
+    """(classificacao, explicacao, confianca) validados: classe 0–2 e confiança limitada a 0–1."""
+    valor = obj.get("CLASSIFICACAO") if obj else None
+    try:
+        numero = float(valor)
+    except (TypeError, ValueError):
+        return -1, "Erro: CLASSIFICACAO não encontrada ou inválida na resposta do modelo.", 0.0
+    if isinstance(valor, bool) or numero not in (0, 1, 2):
+        return -1, f"Erro: Classificação '{valor}' inválida recebida do modelo.", 0.0
     try:
-        response = model.generate_content(prompt)
-        resposta = response.text.strip()
-        # Tenta parsear como JSON
+        confianca = max(0.0, min(1.0, float(obj.get("CONFIANCA", 0.0))))
+    except (TypeError, ValueError):
+        confianca = 0.0
+    explicacao = obj.get("EXPLICACAO") or "Explicação não fornecida ou formato inválido."
+    return int(numero), explicacao, confianca
+
+
+def _interpretar_com_forma(resposta):
+    obj, reparado = _extrair_objeto_json(resposta)
+    classificacao, explicacao, confianca = _validar_campos_classificacao(obj)
+    if classificacao == -1:
+        forma = "falha"
+    else:
+        forma = "reparada" if reparado else "json"
+    return (classificacao, explicacao, confianca), forma
+
+
+def interpretar_resposta_classificacao(resposta):
+    """Extrai (classificacao, explicacao, confianca) do texto devolvido pelo modelo, em uma passada.
+
+    Aceita cercas ```json e texto antes/depois do objeto; respostas truncadas ou no
+    formato antigo em linhas são reparadas em vez de descartadas. Classificação fora
+    de 0–2 (ou ausente) vira -1 com a explicação começando por "Erro:".
+    """
+    return _interpretar_com_forma(resposta)[0]
+
+def resposta_classificacao_valida(resposta):
+    """Indica se a resposta traz classificação 0, 1 ou 2 com confiança (critério para entrar no cache)."""
+    classificacao, _, confianca = interpretar_resposta_classificacao(resposta)
+    return classificacao in (0, 1, 2) and confianca > 0
+
+def classificacao_em_cache(texto, nome_modelo):
+    """Classificação já em cache para o texto, no formato de `classificar_chunk_gemini`, ou None."""
+    template = prompts.escolher(TAREFA_CLASSIFICACAO, texto)
+    resposta = consultar_cache_gemini(nome_modelo, template.versao, montar_prompt_classificacao(texto, template))
+    if resposta is None:
+        return None
+    return (*interpretar_resposta_classificacao(resposta), template.versao)
+
+def classificar_chunk_gemini(texto, model, consultar_cache=True):
+    """Classifica um texto. Retorna (classificacao, explicacao, confianca, versao_prompt).
+
+    Erros da API são lançados já classificados (ErroLimiteTaxa, ErroTransitorio,
+    ErroConteudoBloqueado, ErroPermanente — ver erros_gemini) para o chamador aplicar a
+    política de cada um; resposta sem classificação aproveitável lança ErroRespostaInvalida
+    com o texto recebido em `saida_bruta`.
+    """
+    template = prompts.escolher(TAREFA_CLASSIFICACAO, texto)
+    prompt = montar_prompt_classificacao(texto, template)
+    response = gerar_conteudo_com_cache(
+        model, prompt, template.versao,
+        validar=resposta_classificacao_valida, consultar=consultar_cache,
+        configuracao=configuracao_geracao()
+    )
+    try:
+        texto_resposta = response.text
+    except ValueError as e:
+        metricas_interpretacao.registrar("falha")
+        raise ErroRespostaInvalida(f"Resposta do modelo sem texto utilizável ({e}).") from e
+    (classificacao, explicabilidade, confianca), forma = _interpretar_com_forma(texto_resposta)
+    if not getattr(response, "em_cache", False):
+        metricas_interpretacao.registrar(forma)
+    if classificacao == -1:
+        raise ErroRespostaInvalida(explicabilidade, saida_bruta=texto_resposta)
+    return classificacao, explicabilidade, confianca, template.versao
+
+def montar_prompt_classificacao_em_lote(lote, template=None):
+    """Prompt de classificação de vários textos de uma vez (resposta em lista JSON por id)."""
+    template = template or prompts.escolher(TAREFA_CLASSIFICACAO_LOTE, ",".join(str(item["id"]) for item in lote))
+    return template.montar(lote=lote)
+
+def _extrair_itens_json(resposta):
+    """(itens, reparado): a lista JSON da resposta ou, se truncada/malformada, cada objeto completo nela."""
+    inicio = resposta.find('[')
+    if inicio != -1:
         try:
-            if resposta.startswith("```json"):
-                resposta = resposta[7:]
-            if resposta.endswith("```"):
-                resposta = resposta[:-3]
-            obj = json.loads(resposta)
-            classificacao = obj.get("CLASSIFICACAO", -1)
-            explicabilidade = obj.get("EXPLICACAO", "Explicação não fornecida ou formato inválido.")
-            confianca = obj.get("CONFIANCA", 0.0)
-            return classificacao, explicabilidade, confianca, VERSAO_PROMPT_CLASSIFICACAO
-        except Exception as e_json:
-            logger.warning(f"Falha ao parsear JSON, tentando parsing antigo: {e_json}")
-            # Parsing antigo (linhas)
-            classificacao = -1
-            explicabilidade = "Explicação não fornecida ou formato inválido."
-            confianca = 0.0
-            linhas_resposta = resposta.splitlines()
-            if len(linhas_resposta) >= 3:
-                for linha in linhas_resposta:
-                    if linha.upper().startswith("CLASSIFICACAO:"):
-                        try:
-                            valor_str = linha.split(":", 1)[1].strip()
-                            valor_int = int(valor_str)
-                            if valor_int in [0, 1, 2]:
-                                classificacao = valor_int
-                            else:
-                                classificacao = -1
-                                explicabilidade = f"Erro: Classificação '{valor_str}' inválida recebida do modelo."
-                                break
-                        except Exception:
-                            classificacao = -1
-                            explicabilidade = "Erro: Formato da classificação inválido."
-                            break
-                    elif linha.upper().startswith("EXPLICACAO:"):
-                        explicabilidade = linha.split(":", 1)[1].strip()
-                    elif linha.upper().startswith("CONFIANCA:"):
-                        try:
-                            confianca_str = linha.split(":", 1)[1].strip()
-                            confianca = float(confianca_str)
-                            if not 0.0 <= confianca <= 1.0:
-                                confianca = max(0.0, min(1.0, confianca))
-                        except Exception:
-                            confianca = 0.0
-            else:
-                classificacao = -1
-                explicabilidade = "Erro: Resposta do modelo em formato inesperado."
-            if classificacao == -1 and not explicabilidade.startswith("Erro:"):
-                explicabilidade = "Erro: CLASSIFICACAO não encontrada ou inválida na resposta do modelo."
-            return classificacao, explicabilidade, confianca, VERSAO_PROMPT_CLASSIFICACAO
-    except Exception as e:
-        return -1, f"Erro ao chamar API do Gemini: {str(e)}", 0.0, VERSAO_PROMPT_CLASSIFICACAO
+            itens, _ = _decodificador_json.raw_decode(resposta, inicio)
+            if isinstance(itens, list):
+                return itens, False
+        except json.JSONDecodeError:
+            pass
+    # Recupera os objetos completos um a um (ex.: lista cortada no meio do último item)
+    itens = []
+    posicao = resposta.find('{')
+    while posicao != -1:
+        try:
+            item, posicao = _decodificador_json.raw_decode(resposta, posicao)
+            itens.append(item)
+        except json.JSONDecodeError:
+            posicao += 1
+        posicao = resposta.find('{', posicao)
+    return itens, True
+
+def _interpretar_resposta_em_lote(resposta, ids_esperados):
+    """Extrai {id: (classificacao, explicacao, confianca)} dos itens válidos da resposta em lote."""
+    itens, reparado = _extrair_itens_json(resposta)
+    resultados = {}
+    for item in itens:
+        if not isinstance(item, dict):
+            continue
+        id_item = str(item.get("id"))
+        if id_item not in ids_esperados:
+            continue
+        classificacao, explicacao, confianca = _validar_campos_classificacao(item)
+        if classificacao == -1:
+            continue
+        resultados[id_item] = (classificacao, explicacao, confianca)
+    forma = "reparada" if reparado else "json"
+    metricas_interpretacao.registrar(forma, len(resultados))
+    metricas_interpretacao.registrar("falha", len(ids_esperados) - len(resultados))
+    return resultados
+
+def classificar_chunks_gemini_em_lote(lote, model, max_tentativas=3):
+    """Classifica K textos em uma única chamada, reenviando apenas os ids que faltaram na resposta.
+
+    `lote` é uma lista de {"id": ..., "texto": ...}. Retorna (resultados, uso), onde
+    resultados mapeia id -> (classificacao, explicacao, confianca, versao_prompt) e uso
+    traz chamadas, tokens de entrada/saída (e, da entrada, os servidos pelo contexto em
+    cache), itens servidos pelo cache e tokens por chunk rotulado pela API. Erros da API
+    na primeira chamada são propagados para o chamador decidir sobre troca de chave; nas
+    retentativas, os ids restantes são devolvidos com classificação -1.
+    """
+    logger = logging.getLogger(__name__)
+    textos_por_id = {str(item["id"]): item["texto"] for item in lote}
+    # Uma versão por chamada em lote (a mesma nas retentativas dos ids faltantes)
+    template = prompts.escolher(TAREFA_CLASSIFICACAO_LOTE, ",".join(textos_por_id))
+    versao = template.versao
+    resultados = {}
+    uso = {"chamadas": 0, "tokens_entrada": 0, "tokens_saida": 0, "tokens_em_cache": 0, "rotulados": 0, "em_cache": 0, "tokens_por_chunk": None}
+    # Cada item é cacheado individualmente, pois a composição dos lotes varia entre execuções
+    nome_modelo = nome_do_modelo(model)
+    for id_item, texto in textos_por_id.items():
+        em_cache = consultar_cache_gemini(nome_modelo, versao, texto)
+        if em_cache is not None:
+            item = json.loads(em_cache)
+            resultados[id_item] = (item["CLASSIFICACAO"], item["EXPLICACAO"], item["CONFIANCA"], versao)
+    uso["em_cache"] = len(resultados)
+    pendentes = [i for i in textos_por_id if i not in resultados]
+    for tentativa in range(max_tentativas):
+        if not pendentes:
+            break
+        prompt = montar_prompt_classificacao_em_lote([{"id": i, "texto": textos_por_id[i]} for i in pendentes], template)
+        try:
+            response = gerar_conteudo(model, prompt, configuracao_geracao(em_lote=True))
+        except Exception as e:
+            if tentativa == 0:
+                raise
+            logger.warning(f"Erro ao reenviar {len(pendentes)} ids faltantes do lote: {e}")
+            break
+        uso["chamadas"] += 1
+        metadados = getattr(response, "usage_metadata", None)
+        if metadados is not None:
+            uso["tokens_entrada"] += getattr(metadados, "prompt_token_count", 0) or 0
+            uso["tokens_saida"] += getattr(metadados, "candidates_token_count", 0) or 0
+            uso["tokens_em_cache"] += getattr(metadados, "cached_content_token_count", 0) or 0
+        try:
+            texto_resposta = response.text
+        except Exception as e:
+            logger.warning(f"Resposta do lote sem texto utilizável: {e}")
+            texto_resposta = ""
+        obtidos = _interpretar_resposta_em_lote(texto_resposta, set(pendentes))
+        for id_item, (classificacao, explicacao, confianca) in obtidos.items():
+            resultados[id_item] = (classificacao, explicacao, confianca, versao)
+            armazenar_cache_gemini(nome_modelo, versao, textos_por_id[id_item], json.dumps(
+                {"CLASSIFICACAO": classificacao, "EXPLICACAO": explicacao, "CONFIANCA": confianca}, ensure_ascii=False
+            ))
+        pendentes = [i for i in pendentes if i not in resultados]
+        if pendentes:
+            logger.warning(f"Resposta cobriu {len(obtidos)} de {len(obtidos) + len(pendentes)} ids; reenviando os {len(pendentes)} faltantes.")
+    for id_item in pendentes:
+        resultados[id_item] = (-1, "Erro: id ausente ou inválido na resposta em lote do modelo.", 0.0, versao)
+    uso["rotulados"] = len(textos_por_id) - len(pendentes)
+    rotulados_pela_api = uso["rotulados"] - uso["em_cache"]
+    if rotulados_pela_api:
+        uso["tokens_por_chunk"] = (uso["tokens_entrada"] + uso["tokens_saida"]) / rotulados_pela_api
+    return resultados, uso
+
+def comparar_tamanhos_de_lote(textos, model, tamanhos=(1, 5, 10, 20)):
+    """Mede, para cada K, tokens por chunk rotulado e rótulos por requisição usando os primeiros K textos."""
+    logger = logging.getLogger(__name__)
+    medicoes = {}
+    for k in tamanhos:
+        if k > len(textos):
+            break
+        lote = [{"id": str(i), "texto": texto} for i, texto in enumerate(textos[:k])]
+        _, uso = classificar_chunks_gemini_em_lote(lote, model)
+        rotulos_por_requisicao = uso["rotulados"] / uso["chamadas"] if uso["chamadas"] else 0.0
+        medicoes[k] = {"tokens_por_chunk": uso["tokens_por_chunk"], "rotulos_por_requisicao": rotulos_por_requisicao}
+        logger.info(f"K={k}: {uso['tokens_por_chunk']} tokens/chunk, {rotulos_por_requisicao:.2f} rótulos/requisição ({uso['chamadas']} chamadas).")
+    return medicoes
 
 BATCH_SIZE = 1
 
@@ -169,33 +379,11 @@ def rotular_chunks_gemini():
             logger.info("Conexão com MongoDB fechada.")
 
 if __name__ == "__main__":
-    key_names = [
-        "GEMINI_API_KEY",
-        "GEMINI_API_KEY_4",
-        "GEMINI_API_KEY_5",
-        "GEMINI_API_KEY_6",
-        "GEMINI_API_KEY_7",
-        "GEMINI_API_KEY_8",
-        "GEMINI_API_KEY_9",
-    ]
-    gemini_keys = []
-    gemini_key_names = []
-    for name in key_names:
-        value = os.getenv(name)
-        if value:
-            gemini_keys.append(value)
-            gemini_key_names.append(name)
-    if not gemini_keys:
-        raise ValueError(f"Nenhuma chave Gemini encontrada no arquivo {env_path}")
-    current_key_index = 0
-    def configurar_gemini(key, key_name):
-        """Configura o modelo Gemini."""
-        genai.configure(api_key=key)
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        return model
-    model = configurar_gemini(gemini_keys[current_key_index], gemini_key_names[current_key_index])
+    pool_gemini = PoolDeChaves.de_ambiente('gemini-2.5-flash')
+    model = pool_gemini.chaves[0].modelo
     # Exemplo de uso interativo
     texto = input("Digite o texto para classificar:\n")
-    resultado = classificar_chunk_gemini(texto, model)
+    with pool_gemini.usar_chave(len(texto) // 4) as chave:
+        resultado = classificar_chunk_gemini(texto, chave.modelo)
     print("Resultado:", resultado)
-    rotular_chunks_gemini() 
\ No newline at end of file
+    rotular_chunks_gemini() # Script para rotular chunks já gerados usando Gemini
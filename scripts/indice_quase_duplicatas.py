@@ -0,0 +1,397 @@
+import os
+import re
+import sys
+import time
+import zlib
+import signal
+import logging
+import argparse
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+import numpy as np
+from bson import ObjectId
+from pymongo import MongoClient, UpdateMany
+from dotenv import load_dotenv
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem trava entre processos na gravação do índice
+    fcntl = None
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+load_dotenv(Path(__file__).parent.parent.parent / 'projeto' / '.env')
+
+# Índice MinHash/LSH de textos sintéticos: acusa quase-duplicatas antes de gastar quota de rotulagem
+DEDUP_ATIVADO = os.getenv("DEDUP_ATIVADO", "1") != "0"
+CAMINHO_INDICE_PADRAO = Path(os.getenv("DEDUP_CAMINHO_INDICE", Path(__file__).parent / 'indice_quase_duplicatas.npz'))
+# Vários processos gravam o mesmo arquivo: cada gravação mescla o que já está no disco
+INTERVALO_SALVAMENTO_SEGUNDOS = float(os.getenv("DEDUP_INTERVALO_SALVAMENTO_SEGUNDOS", "300"))
+LIMIAR_SIMILARIDADE = float(os.getenv("DEDUP_LIMIAR_SIMILARIDADE", "0.8"))  # Jaccard estimado entre shingles
+TAMANHO_SHINGLE = 3  # palavras
+NUM_PERMUTACOES = 128
+# 16 bandas de 8 linhas: pares com Jaccard ~0,7 já viram candidatos; a confirmação usa a assinatura inteira
+NUM_BANDAS = 16
+SEMENTE_HASHES = 1
+STATUS_QUASE_DUPLICADO = "quase_duplicado"
+PRIMO_HASH = np.uint64((1 << 31) - 1)  # Primo de Mersenne: a * x cabe em 64 bits
+MULTIPLICADOR_BANDA = np.uint64(0x100000001B3)
+CAPACIDADE_INICIAL = 1024
+# Coleções de textos sintéticos e o campo que identifica cada documento na chave do índice
+COLECOES_SINTETICAS = {"chunks_sinteticos": "id_chunk_original", "chunks_sigilosos": "_id"}
+
+_PADRAO_PALAVRA = re.compile(r"\w+")
+
+
+def shingles_do_texto(texto, tamanho=TAMANHO_SHINGLE):
+    """Hashes crc32 dos n-gramas de palavras do texto em minúsculas, sem repetição."""
+    palavras = _PADRAO_PALAVRA.findall(texto.lower())
+    if len(palavras) < tamanho:
+        grams = palavras
+    else:
+        grams = [" ".join(palavras[i:i + tamanho]) for i in range(len(palavras) - tamanho + 1)]
+    return np.unique(np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams)))
+
+
+def chave_indice(colecao, identificador):
+    return f"{colecao}:{identificador}"
+
+
+@contextmanager
+def _travar_arquivo(caminho):
+    """Trava exclusiva (flock) num arquivo `.lock` ao lado do índice, entre processos."""
+    if fcntl is None:
+        yield
+        return
+    with open(caminho.with_name(caminho.name + ".lock"), "w") as trava:
+        fcntl.flock(trava, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(trava, fcntl.LOCK_UN)
+
+
+class IndiceQuaseDuplicatas:
+    """Assinaturas MinHash em uma matriz NumPy e tabelas LSH por banda em dicionários.
+
+    `verificar_e_inserir` calcula a assinatura (uma operação vetorizada sobre os shingles),
+    consulta um balde por banda e confirma os candidatos pela fração de posições iguais
+    da assinatura — tudo abaixo de um milissegundo para chunks de ~200 palavras. Reinserir
+    uma chave substitui a assinatura anterior, e a chave nunca é duplicata de si mesma.
+    """
+
+    def __init__(self, limiar=LIMIAR_SIMILARIDADE, num_permutacoes=NUM_PERMUTACOES, num_bandas=NUM_BANDAS):
+        if num_permutacoes % num_bandas:
+            raise ValueError("num_permutacoes deve ser múltiplo de num_bandas.")
+        self.limiar = limiar
+        self.num_permutacoes = num_permutacoes
+        self.num_bandas = num_bandas
+        rng = np.random.default_rng(SEMENTE_HASHES)
+        self._a = rng.integers(1, int(PRIMO_HASH), num_permutacoes, dtype=np.uint64)
+        self._b = rng.integers(0, int(PRIMO_HASH), num_permutacoes, dtype=np.uint64)
+        self._lock = threading.RLock()
+        self.assinaturas = np.zeros((0, num_permutacoes), dtype=np.uint32)
+        self.chaves = []
+        self._linha_da_chave = {}
+        self._baldes = [dict() for _ in range(num_bandas)]
+        self.alterado = False
+        self._salvo_em = time.monotonic()
+
+    _compartilhados = {}
+    _lock_compartilhados = threading.Lock()
+
+    @classmethod
+    def compartilhado(cls, caminho=CAMINHO_INDICE_PADRAO):
+        """Uma instância por arquivo no processo, carregada do disco na primeira chamada."""
+        caminho = Path(caminho)
+        with cls._lock_compartilhados:
+            if caminho not in cls._compartilhados:
+                cls._compartilhados[caminho] = cls.carregar(caminho) if caminho.exists() else cls()
+            return cls._compartilhados[caminho]
+
+    def __len__(self):
+        return len(self.chaves)
+
+    # --- assinaturas -----------------------------------------------------------
+
+    def assinatura(self, texto):
+        """MinHash do texto (uint32 por permutação), ou None se o texto não tem palavras."""
+        shingles = shingles_do_texto(texto)
+        if not len(shingles):
+            return None
+        valores = (self._a[:, None] * (shingles[None, :] % PRIMO_HASH) + self._b[:, None]) % PRIMO_HASH
+        return valores.min(axis=1).astype(np.uint32)
+
+    def _chaves_de_banda(self, assinaturas):
+        """Hash (uint64) de cada banda das assinaturas: matriz (linhas, bandas)."""
+        linhas = self.num_permutacoes // self.num_bandas
+        bandas = assinaturas.reshape(len(assinaturas), self.num_bandas, linhas).astype(np.uint64)
+        chaves = np.zeros(bandas.shape[:2], dtype=np.uint64)
+        for coluna in range(linhas):  # Multiplicação com estouro intencional (FNV em 64 bits)
+            chaves = (chaves * MULTIPLICADOR_BANDA) ^ bandas[:, :, coluna]
+        return chaves
+
+    # --- consulta e inserção ---------------------------------------------------
+
+    def _mais_similar(self, assinatura, ignorar_linha=None):
+        candidatos = set()
+        for balde, chave in zip(self._baldes, self._chaves_de_banda(assinatura[None, :])[0].tolist()):
+            candidatos.update(balde.get(chave, ()))
+        candidatos.discard(ignorar_linha)
+        if not candidatos:
+            return None, 0.0
+        linhas = np.fromiter(candidatos, dtype=np.int64, count=len(candidatos))
+        similaridades = (self.assinaturas[linhas] == assinatura).mean(axis=1)
+        melhor = int(np.argmax(similaridades))
+        return int(linhas[melhor]), float(similaridades[melhor])
+
+    def consultar(self, texto, chave=None):
+        """(chave da quase-duplicata mais parecida, similaridade) ou (None, similaridade) abaixo do limiar."""
+        assinatura = self.assinatura(texto)
+        if assinatura is None:
+            return None, 0.0
+        with self._lock:
+            linha, similaridade = self._mais_similar(assinatura, self._linha_da_chave.get(chave))
+            return (self.chaves[linha] if linha is not None and similaridade >= self.limiar else None), similaridade
+
+    def _inserir_assinaturas(self, chaves, assinaturas):
+        linhas = []
+        for chave in chaves:
+            linha = self._linha_da_chave.get(chave)
+            if linha is None:
+                linha = len(self.chaves)
+                self._linha_da_chave[chave] = linha
+                self.chaves.append(chave)
+            linhas.append(linha)
+        necessario = len(self.chaves)
+        if necessario > len(self.assinaturas):
+            # Crescimento geométrico: inserções unitárias não copiam a matriz toda vez
+            nova = np.zeros((max(necessario, 2 * len(self.assinaturas), CAPACIDADE_INICIAL), self.num_permutacoes), dtype=np.uint32)
+            nova[:len(self.assinaturas)] = self.assinaturas
+            self.assinaturas = nova
+        self.assinaturas[linhas] = assinaturas
+        # Baldes antigos de uma chave reinserida só geram candidatos extras, descartados na confirmação
+        for balde, chaves_banda in zip(self._baldes, self._chaves_de_banda(assinaturas).T.tolist()):
+            for chave_banda, linha in zip(chaves_banda, linhas):
+                balde.setdefault(chave_banda, []).append(linha)
+        self.alterado = True
+
+    def verificar_e_inserir(self, chave, texto):
+        """Insere o texto e retorna (chave da quase-duplicata anterior ou None, similaridade).
+
+        A verificação e a inserção acontecem sob o mesmo lock: de dois textos quase iguais
+        chegando ao mesmo tempo, só o segundo é acusado.
+        """
+        assinatura = self.assinatura(texto)
+        if assinatura is None:
+            return None, 0.0
+        with self._lock:
+            linha, similaridade = self._mais_similar(assinatura, self._linha_da_chave.get(chave))
+            self._inserir_assinaturas([chave], assinatura[None, :])
+            return (self.chaves[linha] if linha is not None and similaridade >= self.limiar else None), similaridade
+
+    def inserir(self, chave, texto):
+        """Insere o texto sem verificá-lo (ex.: já verificado com `consultar` antes de ser gravado)."""
+        assinatura = self.assinatura(texto)
+        if assinatura is None:
+            return
+        with self._lock:
+            self._inserir_assinaturas([chave], assinatura[None, :])
+
+    # --- persistência ----------------------------------------------------------
+
+    def _mesclar_arquivo(self, caminho):
+        """Acrescenta as chaves gravadas no arquivo por outros processos e ausentes da memória."""
+        with np.load(caminho, allow_pickle=False) as dados:
+            if dados["parametros"].tolist() != [self.num_permutacoes, self.num_bandas, TAMANHO_SHINGLE, SEMENTE_HASHES]:
+                logger.warning(f"Índice '{caminho}' tem outros parâmetros; será sobrescrito sem mesclar.")
+                return 0
+            chaves = dados["chaves"].tolist()
+            novas = [i for i, chave in enumerate(chaves) if chave not in self._linha_da_chave]
+            if novas:
+                self._inserir_assinaturas([chaves[i] for i in novas], dados["assinaturas"][novas])
+        return len(novas)
+
+    def salvar(self, caminho=CAMINHO_INDICE_PADRAO, mesclar=True):
+        """Grava chaves e assinaturas (os baldes são refeitos na carga) com troca atômica do arquivo.
+
+        Com `mesclar`, as entradas que outro processo gravou no arquivo desde a carga são
+        incorporadas antes (e passam a valer também nas consultas deste processo); a
+        leitura, a mescla e a troca acontecem sob uma trava de arquivo.
+        """
+        caminho = Path(caminho)
+        with self._lock, _travar_arquivo(caminho):
+            mescladas = self._mesclar_arquivo(caminho) if mesclar and caminho.exists() else 0
+            temporario = caminho.with_name(caminho.name + ".tmp.npz")
+            np.savez(
+                temporario,
+                chaves=np.array(self.chaves, dtype=str),
+                assinaturas=self.assinaturas[:len(self.chaves)],
+                parametros=np.array([self.num_permutacoes, self.num_bandas, TAMANHO_SHINGLE, SEMENTE_HASHES]),
+            )
+            os.replace(temporario, caminho)
+            self.alterado = False
+            self._salvo_em = time.monotonic()
+        logger.info(f"Índice de quase-duplicatas salvo em '{caminho}' ({len(self.chaves)} textos, {mescladas} de outros processos).")
+
+    def salvar_se_alterado(self, caminho=CAMINHO_INDICE_PADRAO, intervalo_segundos=None):
+        """Salva se houve inserções; com `intervalo_segundos`, só se a última gravação já tem esse tempo."""
+        if not self.alterado:
+            return
+        if intervalo_segundos is None or time.monotonic() - self._salvo_em >= intervalo_segundos:
+            self.salvar(caminho)
+
+    @classmethod
+    def carregar(cls, caminho=CAMINHO_INDICE_PADRAO, limiar=LIMIAR_SIMILARIDADE):
+        with np.load(caminho, allow_pickle=False) as dados:
+            num_permutacoes, num_bandas, tamanho_shingle, semente = dados["parametros"].tolist()
+            if (tamanho_shingle, semente) != (TAMANHO_SHINGLE, SEMENTE_HASHES):
+                raise ValueError(f"Índice '{caminho}' foi gerado com outros parâmetros de shingle/hash; reconstrua com --agrupar.")
+            indice = cls(limiar, num_permutacoes, num_bandas)
+            chaves = dados["chaves"].tolist()
+            if chaves:
+                indice._inserir_assinaturas(chaves, dados["assinaturas"])
+        indice.alterado = False
+        logger.info(f"Índice de quase-duplicatas carregado de '{caminho}' ({len(indice)} textos).")
+        return indice
+
+    # --- modo em lote ----------------------------------------------------------
+
+    def agrupar(self):
+        """Agrupa todo o índice por quase-duplicação (união-busca sobre os pares confirmados).
+
+        Retorna o vetor com o representante (a linha mais antiga) do grupo de cada linha.
+        """
+        with self._lock:
+            n = len(self.chaves)
+            assinaturas = self.assinaturas[:n]
+            pai = np.arange(n)
+
+            def raiz(i):
+                while pai[i] != i:
+                    pai[i] = pai[pai[i]]
+                    i = pai[i]
+                return i
+
+            for balde in self._baldes:
+                for linhas in balde.values():
+                    if len(linhas) < 2:
+                        continue
+                    linhas = np.unique(linhas)
+                    # Compara cada linha do balde com a primeira; pares fora disso aparecem em outras bandas
+                    similares = linhas[1:][(assinaturas[linhas[1:]] == assinaturas[linhas[0]]).mean(axis=1) >= self.limiar]
+                    for linha in similares.tolist():
+                        a, b = raiz(linhas[0]), raiz(linha)
+                        if a != b:
+                            pai[max(a, b)] = min(a, b)
+            return np.array([raiz(i) for i in range(n)])
+
+
+def _campos_quase_duplicata(chave, duplicata_de, similaridade):
+    if duplicata_de is None:
+        return {}
+    logger.info(f"Texto {chave} é quase-duplicata de {duplicata_de} (similaridade {similaridade:.2f}); não será rotulado.")
+    return {"status_rotulagem": STATUS_QUASE_DUPLICADO, "quase_duplicata_de": duplicata_de,
+            "similaridade_quase_duplicata": round(similaridade, 4)}
+
+
+def verificar_texto_sintetico(colecao, identificador, texto):
+    """Registra o texto no índice compartilhado e devolve os campos extras do documento.
+
+    Quase-duplicatas saem com `status_rotulagem` = "quase_duplicado" (a fila de rotulagem
+    não as reserva) e a chave do texto parecido; com `DEDUP_ATIVADO=0`, nada muda. Serve
+    quando a chave é estável (reinserir substitui a entrada); para documentos que podem
+    não chegar a ser gravados, use `consultar_texto_sintetico` e `registrar_texto_sintetico`.
+    """
+    if not DEDUP_ATIVADO or not texto:
+        return {}
+    chave = chave_indice(colecao, identificador)
+    return _campos_quase_duplicata(chave, *IndiceQuaseDuplicatas.compartilhado().verificar_e_inserir(chave, texto))
+
+
+def consultar_texto_sintetico(colecao, identificador, texto):
+    """Como `verificar_texto_sintetico`, mas sem registrar o texto no índice."""
+    if not DEDUP_ATIVADO or not texto:
+        return {}
+    chave = chave_indice(colecao, identificador)
+    return _campos_quase_duplicata(chave, *IndiceQuaseDuplicatas.compartilhado().consultar(texto, chave))
+
+
+def registrar_texto_sintetico(colecao, identificador, texto):
+    """Registra no índice um texto já gravado no banco."""
+    if DEDUP_ATIVADO and texto:
+        IndiceQuaseDuplicatas.compartilhado().inserir(chave_indice(colecao, identificador), texto)
+
+
+def salvar_indice_compartilhado(somente_se_vencido=False):
+    """Persiste o índice compartilhado, se este processo o usou; chamado ao fim dos scripts e,
+    com `somente_se_vencido`, nos loops, a cada `DEDUP_INTERVALO_SALVAMENTO_SEGUNDOS`."""
+    if DEDUP_ATIVADO and CAMINHO_INDICE_PADRAO in IndiceQuaseDuplicatas._compartilhados:
+        IndiceQuaseDuplicatas.compartilhado().salvar_se_alterado(
+            intervalo_segundos=INTERVALO_SALVAMENTO_SEGUNDOS if somente_se_vencido else None
+        )
+
+
+def encerrar_ao_receber_sigterm():
+    """Transforma SIGTERM em SystemExit no thread principal, para que os `finally` dos
+    serviços (que salvam o índice e descarregam os buffers) rodem também ao pará-los."""
+    signal.signal(signal.SIGTERM, lambda numero, quadro: sys.exit(128 + numero))
+
+
+def reconstruir_e_agrupar(db, caminho=CAMINHO_INDICE_PADRAO, marcar=False):
+    """Refaz o índice a partir das coleções sintéticas e agrupa o corpus existente.
+
+    Com `marcar`, os membros ainda pendentes de rotulagem de cada grupo (exceto o
+    representante) passam a "quase_duplicado".
+    """
+    indice = IndiceQuaseDuplicatas()
+    for nome, campo in COLECOES_SINTETICAS.items():
+        chaves, assinaturas = [], []
+        for doc in db[nome].find({"texto_sintetico": {"$type": "string"}}, {campo: 1, "texto_sintetico": 1}).sort("_id", 1).batch_size(5000):
+            assinatura = indice.assinatura(doc["texto_sintetico"])
+            if assinatura is not None:
+                chaves.append(chave_indice(nome, doc[campo]))
+                assinaturas.append(assinatura)
+        if chaves:
+            indice._inserir_assinaturas(chaves, np.vstack(assinaturas))
+        logger.info(f"{len(chaves)} textos de '{nome}' indexados.")
+
+    representantes = indice.agrupar()
+    tamanhos = np.bincount(representantes, minlength=len(representantes))
+    duplicadas = np.flatnonzero(representantes != np.arange(len(representantes)))
+    logger.info(f"{len(indice)} textos, {np.count_nonzero(tamanhos > 1)} grupos de quase-duplicatas, {len(duplicadas)} textos redundantes (maior grupo: {tamanhos.max(initial=0)}).")
+
+    if marcar and len(duplicadas):
+        for nome, campo in COLECOES_SINTETICAS.items():
+            operacoes = []
+            for linha in duplicadas.tolist():
+                colecao, identificador = indice.chaves[linha].split(":", 1)
+                if colecao != nome:
+                    continue
+                operacoes.append(UpdateMany(
+                    {campo: ObjectId(identificador) if ObjectId.is_valid(identificador) else identificador,
+                     "status_rotulagem": "pendente"},
+                    {"$set": {"status_rotulagem": STATUS_QUASE_DUPLICADO, "quase_duplicata_de": indice.chaves[representantes[linha]]}}
+                ))
+            if operacoes:
+                resultado = db[nome].bulk_write(operacoes, ordered=False)
+                logger.info(f"{resultado.modified_count} documentos pendentes de '{nome}' marcados como quase-duplicados.")
+    # O índice refeito substitui o arquivo: mesclar traria de volta entradas de documentos que não existem mais
+    indice.salvar(caminho, mesclar=False)
+    return indice, representantes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconstrói o índice de quase-duplicatas e agrupa os textos sintéticos existentes.")
+    parser.add_argument("--caminho", default=str(CAMINHO_INDICE_PADRAO))
+    parser.add_argument("--marcar", action="store_true",
+                        help="Marca como quase_duplicado os membros pendentes de cada grupo, exceto o representante.")
+    args = parser.parse_args()
+    mongo_uri = f"mongodb://{os.getenv('MONGO_USER', 'usuario')}:{os.getenv('MONGO_PASS', 'senha')}@{os.getenv('MONGO_HOST', 'localhost')}:{os.getenv('MONGO_PORT', '27017')}/"
+    client = MongoClient(mongo_uri)
+    try:
+        reconstruir_e_agrupar(client["dataset_treinamento"], args.caminho, args.marcar)
+    finally:
+        client.close()
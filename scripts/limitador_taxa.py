@@ -0,0 +1,99 @@
+import threading
+import time
+
+
+class BaldeDeTokens:
+    """Balde de tokens: `capacidade` unidades repostas ao longo de `periodo_segundos`."""
+
+    def __init__(self, capacidade, periodo_segundos=60.0):
+        self.capacidade = float(capacidade)
+        self.taxa_reposicao = self.capacidade / float(periodo_segundos)
+        self.disponivel = self.capacidade
+        self.ultima_reposicao = time.monotonic()
+
+    def _repor(self, agora):
+        decorrido = agora - self.ultima_reposicao
+        if decorrido > 0:
+            self.disponivel = min(self.capacidade, self.disponivel + decorrido * self.taxa_reposicao)
+            self.ultima_reposicao = agora
+
+    def tempo_ate_disponivel(self, quantidade, agora):
+        """Segundos até haver `quantidade` unidades (0 se já houver)."""
+        self._repor(agora)
+        # Pedidos maiores que o balde inteiro são limitados à capacidade para não travar
+        quantidade = min(float(quantidade), self.capacidade)
+        if self.disponivel >= quantidade:
+            return 0.0
+        return (quantidade - self.disponivel) / self.taxa_reposicao
+
+    def consumir(self, quantidade):
+        self.disponivel -= float(quantidade)
+
+    def devolver(self, quantidade):
+        self.disponivel = min(self.capacidade, self.disponivel + float(quantidade))
+
+
+class LimitadorChave:
+    """Orçamento de RPM/TPM de uma chave Gemini, compartilhado entre threads."""
+
+    def __init__(self, rpm, tpm):
+        self.requisicoes = BaldeDeTokens(rpm)
+        self.tokens = BaldeDeTokens(tpm)
+        self.suspensa_ate = 0.0
+        self._lock = threading.Lock()
+
+    def _espera(self, agora, tokens_estimados):
+        return max(
+            self.suspensa_ate - agora,
+            self.requisicoes.tempo_ate_disponivel(1, agora),
+            self.tokens.tempo_ate_disponivel(tokens_estimados, agora),
+        )
+
+    def tempo_de_espera(self, tokens_estimados):
+        """Segundos até a chave poder atender uma requisição de `tokens_estimados`."""
+        with self._lock:
+            return self._espera(time.monotonic(), tokens_estimados)
+
+    def aguardar(self, tokens_estimados):
+        """Bloqueia até haver orçamento e reserva uma requisição + `tokens_estimados`."""
+        while True:
+            with self._lock:
+                espera = self._espera(time.monotonic(), tokens_estimados)
+                if espera <= 0:
+                    self.requisicoes.consumir(1)
+                    self.tokens.consumir(tokens_estimados)
+                    return
+            time.sleep(espera)
+
+    def ajustar_tokens(self, tokens_estimados, tokens_reais):
+        """Corrige a reserva de TPM com a contagem real informada pela API."""
+        with self._lock:
+            diferenca = tokens_reais - tokens_estimados
+            if diferenca > 0:
+                self.tokens.consumir(diferenca)
+            elif diferenca < 0:
+                self.tokens.devolver(-diferenca)
+
+    def folga(self):
+        """Fração do orçamento (RPM e TPM) ainda disponível; 0 se a chave estiver suspensa."""
+        with self._lock:
+            agora = time.monotonic()
+            if self.suspensa_ate > agora:
+                return 0.0
+            self.requisicoes.tempo_ate_disponivel(0, agora)
+            self.tokens.tempo_ate_disponivel(0, agora)
+            return min(
+                self.requisicoes.disponivel / self.requisicoes.capacidade,
+                self.tokens.disponivel / self.tokens.capacidade,
+            )
+
+    def esgotar(self):
+        """Zera o orçamento corrente (a API indicou que a quota real acabou)."""
+        with self._lock:
+            self.requisicoes.disponivel = 0.0
+            self.tokens.disponivel = 0.0
+
+    def suspender(self, segundos):
+        """Tira a chave de circulação por `segundos` (ex.: após erro de quota)."""
+        with self._lock:
+            self.suspensa_ate = max(self.suspensa_ate, time.monotonic() + segundos)
@@ -0,0 +1,280 @@
+import os
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+# Métricas no formato texto do Prometheus, sem dependência extra: contadores, histogramas e
+# medidores com rótulos, num registro global por processo. Com METRICAS_PORTA > 0 os scripts
+# expõem o registro em http://127.0.0.1:<porta>/metrics.
+PORTA_METRICAS = int(os.getenv("METRICAS_PORTA", "0"))
+ENDERECO_METRICAS = os.getenv("METRICAS_ENDERECO", "127.0.0.1")
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+BUCKETS_MONGO = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+# Comandos de manutenção da conexão, sem interesse para a latência das operações
+COMANDOS_MONGO_IGNORADOS = {"hello", "ismaster", "isMaster", "ping", "endSessions", "saslStart", "saslContinue", "buildInfo"}
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _formatar_rotulos(nomes, valores, extra=None):
+    pares = list(zip(nomes, valores))
+    if extra is not None:
+        pares.append(extra)
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{nome}="{_escapar(valor)}"' for nome, valor in pares) + "}"
+
+
+def _formatar_valor(valor):
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class _Metrica:
+    tipo = None
+
+    def __init__(self, nome, descricao, rotulos=()):
+        self.nome = nome
+        self.descricao = descricao
+        self.rotulos = tuple(rotulos)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _chave(self, rotulos):
+        if set(rotulos) != set(self.rotulos):
+            raise ValueError(f"A métrica '{self.nome}' espera os rótulos {self.rotulos}, recebeu {tuple(rotulos)}.")
+        return tuple(str(rotulos[nome]) for nome in self.rotulos)
+
+    def exposicao(self):
+        linhas = [f"# HELP {self.nome} {self.descricao}", f"# TYPE {self.nome} {self.tipo}"]
+        with self._lock:
+            series = sorted(self._series.items())
+        for valores, serie in series:
+            linhas.extend(self._linhas_serie(valores, serie))
+        return linhas
+
+
+class Contador(_Metrica):
+    """Contador monotônico por combinação de rótulos."""
+
+    tipo = "counter"
+
+    def incrementar(self, quantidade=1, **rotulos):
+        chave = self._chave(rotulos)
+        with self._lock:
+            self._series[chave] = self._series.get(chave, 0) + quantidade
+
+    def valor(self, **rotulos):
+        with self._lock:
+            return self._series.get(self._chave(rotulos), 0)
+
+    def series(self):
+        """[(rótulos, valor)] de todas as combinações de rótulos já incrementadas."""
+        with self._lock:
+            return [(dict(zip(self.rotulos, chave)), valor) for chave, valor in self._series.items()]
+
+    def _linhas_serie(self, valores, serie):
+        return [f"{self.nome}{_formatar_rotulos(self.rotulos, valores)} {_formatar_valor(serie)}"]
+
+
+class Histograma(_Metrica):
+    """Distribuição de observações em buckets cumulativos, com soma e contagem."""
+
+    tipo = "histogram"
+
+    def __init__(self, nome, descricao, rotulos=(), buckets=BUCKETS_LATENCIA):
+        super().__init__(nome, descricao, rotulos)
+        self.buckets = tuple(sorted(buckets))
+
+    def observar(self, valor, **rotulos):
+        chave = self._chave(rotulos)
+        indice = bisect.bisect_left(self.buckets, valor)
+        with self._lock:
+            serie = self._series.get(chave)
+            if serie is None:
+                serie = self._series[chave] = [[0] * (len(self.buckets) + 1), 0.0]
+            serie[0][indice] += 1
+            serie[1] += valor
+
+    @contextmanager
+    def cronometrar(self, **rotulos):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(time.perf_counter() - inicio, **rotulos)
+
+    def _linhas_serie(self, valores, serie):
+        contagens, soma = serie
+        linhas = []
+        acumulado = 0
+        for limite, contagem in zip(self.buckets + (float("inf"),), contagens):
+            acumulado += contagem
+            rotulos = _formatar_rotulos(self.rotulos, valores, ("le", _formatar_valor(float(limite))))
+            linhas.append(f"{self.nome}_bucket{rotulos} {acumulado}")
+        rotulos = _formatar_rotulos(self.rotulos, valores)
+        linhas.append(f"{self.nome}_sum{rotulos} {_formatar_valor(soma)}")
+        linhas.append(f"{self.nome}_count{rotulos} {acumulado}")
+        return linhas
+
+
+class Medidor(_Metrica):
+    """Valor instantâneo; com `acompanhar`, lido de uma função no momento da coleta."""
+
+    tipo = "gauge"
+
+    def definir(self, valor, **rotulos):
+        chave = self._chave(rotulos)
+        with self._lock:
+            self._series[chave] = valor
+
+    def acompanhar(self, funcao, **rotulos):
+        self.definir(funcao, **rotulos)
+
+    def _linhas_serie(self, valores, serie):
+        try:
+            valor = serie() if callable(serie) else serie
+        except Exception:
+            return []
+        return [f"{self.nome}{_formatar_rotulos(self.rotulos, valores)} {_formatar_valor(valor)}"]
+
+
+class RegistroMetricas:
+    """Conjunto de métricas do processo; `criar` devolve a existente se o nome já foi registrado."""
+
+    def __init__(self):
+        self._metricas = {}
+        self._lock = threading.Lock()
+
+    def criar(self, classe, nome, descricao, rotulos=(), **opcoes):
+        with self._lock:
+            metrica = self._metricas.get(nome)
+            if metrica is None:
+                metrica = self._metricas[nome] = classe(nome, descricao, rotulos, **opcoes)
+            elif not isinstance(metrica, classe) or metrica.rotulos != tuple(rotulos):
+                raise ValueError(f"Métrica '{nome}' já registrada com outro tipo ou rótulos.")
+            return metrica
+
+    def contador(self, nome, descricao, rotulos=()):
+        return self.criar(Contador, nome, descricao, rotulos)
+
+    def histograma(self, nome, descricao, rotulos=(), buckets=BUCKETS_LATENCIA):
+        return self.criar(Histograma, nome, descricao, rotulos, buckets=buckets)
+
+    def medidor(self, nome, descricao, rotulos=()):
+        return self.criar(Medidor, nome, descricao, rotulos)
+
+    def exposicao(self):
+        """Todas as métricas no formato texto do Prometheus (versão 0.0.4)."""
+        with self._lock:
+            metricas = list(self._metricas.values())
+        linhas = []
+        for metrica in metricas:
+            linhas.extend(metrica.exposicao())
+        return "\n".join(linhas) + "\n"
+
+
+registro = RegistroMetricas()
+
+latencia_gemini = registro.histograma(
+    "gemini_chamada_segundos", "Latência das chamadas ao Gemini por chave e resultado.", ("chave", "resultado"))
+erros_quota_gemini = registro.contador(
+    "gemini_erros_quota_total", "Respostas 429/quota esgotada por chave.", ("chave",))
+tokens_gemini = registro.contador(
+    "gemini_tokens_total", "Tokens consumidos segundo o usage_metadata da resposta.", ("modelo", "direcao"))
+tokens_prefixo_gemini = registro.contador(
+    "gemini_tokens_prefixo_total", "Tokens do prefixo fixo dos prompts: em cache no provedor ou reenviados (estimativa local).", ("modelo", "situacao"))
+chamadas_por_prompt = registro.contador(
+    "gemini_prompt_chamadas_total", "Chamadas ao Gemini por tarefa e versão do prompt.", ("tarefa", "versao"))
+tokens_por_prompt = registro.contador(
+    "gemini_prompt_tokens_total", "Tokens por tarefa e versão do prompt (entrada, saída e, da entrada, em cache).", ("tarefa", "versao", "direcao"))
+respostas_interpretadas = registro.contador(
+    "pipeline_respostas_interpretadas_total", "Respostas do modelo por forma de interpretação (json, reparada, falha).", ("tarefa", "forma"))
+latencia_mongo = registro.histograma(
+    "mongo_comando_segundos", "Latência dos comandos MongoDB por comando e resultado.", ("comando", "resultado"), BUCKETS_MONGO)
+profundidade_fila = registro.medidor(
+    "pipeline_fila_profundidade", "Itens aguardando na fila de entrada de cada estágio.", ("fila",))
+rotulos_por_origem = registro.contador(
+    "pipeline_rotulos_total", "Rótulos gravados por origem (gemini, cache ou classificador_local).", ("origem",))
+itens_processados = registro.contador(
+    "pipeline_itens_processados_total", "Itens concluídos por estágio (a taxa dá os chunks por segundo).", ("estagio",))
+duracao_spans = registro.histograma(
+    "pipeline_span_segundos", "Duração dos trechos cronometrados com `span`.", ("span",))
+
+
+@contextmanager
+def span(nome):
+    """Cronometra o bloco no histograma `pipeline_span_segundos{span=nome}`, com ou sem erro."""
+    with duracao_spans.cronometrar(span=nome):
+        yield
+
+
+class OuvinteComandosMongo(monitoring.CommandListener):
+    """Alimenta `mongo_comando_segundos` com a duração reportada pelo próprio driver."""
+
+    def started(self, evento):
+        pass
+
+    def succeeded(self, evento):
+        if evento.command_name not in COMANDOS_MONGO_IGNORADOS:
+            latencia_mongo.observar(evento.duration_micros / 1e6, comando=evento.command_name, resultado="sucesso")
+
+    def failed(self, evento):
+        if evento.command_name not in COMANDOS_MONGO_IGNORADOS:
+            latencia_mongo.observar(evento.duration_micros / 1e6, comando=evento.command_name, resultado="falha")
+
+
+# Ouvintes globais valem para os MongoClient criados depois: os scripts importam este módulo
+# (via pool_chaves_gemini) antes de conectar
+monitoring.register(OuvinteComandosMongo())
+
+
+class _TratadorMetricas(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        corpo = registro.exposicao().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, formato, *args):
+        pass  # Uma linha por coleta só poluiria o log do pipeline
+
+
+_servidor = None
+_lock_servidor = threading.Lock()
+
+
+def iniciar_servidor_metricas(porta=None, endereco=ENDERECO_METRICAS):
+    """Sobe o endpoint /metrics numa thread daemon; porta 0 (padrão sem METRICAS_PORTA) não sobe nada.
+
+    Chamadas repetidas reaproveitam o servidor já iniciado. Retorna o servidor ou None.
+    """
+    global _servidor
+    porta = PORTA_METRICAS if porta is None else porta
+    if porta <= 0:
+        return None
+    with _lock_servidor:
+        if _servidor is None:
+            try:
+                _servidor = ThreadingHTTPServer((endereco, porta), _TratadorMetricas)
+            except OSError as e:
+                logger.error(f"Não foi possível expor as métricas em {endereco}:{porta}: {e}")
+                return None
+            _servidor.daemon_threads = True
+            threading.Thread(target=_servidor.serve_forever, name="servidor-metricas", daemon=True).start()
+            logger.info(f"Métricas expostas em http://{endereco}:{porta}/metrics")
+        return _servidor
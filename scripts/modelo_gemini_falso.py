@@ -0,0 +1,223 @@
+import os
+import json
+import time
+import random
+import hashlib
+import logging
+import threading
+from dataset.migracao_dados.erros_gemini import ErroLimiteTaxa, ErroTransitorio
+
+logger = logging.getLogger(__name__)
+
+# Backend local e determinístico no lugar do Gemini (GEMINI_BACKEND=falso): reconhece os
+# prompts de síntese, aumento sigiloso e classificação (individual e em lote) e responde no
+# formato que cada script espera, sem rede e sem quota.
+DISTRIBUICOES_LATENCIA = ("constante", "exponencial", "lognormal")
+MARCADOR_SINTESE = "LOTE DE CHUNKS PARA PROCESSAR:"
+MARCADOR_SIGILOSO = "TEXTO DE INSPIRAÇÃO PARA ESTA TAREFA:"
+MARCADOR_CLASSIFICACAO_LOTE = "Textos para análise:"
+MARCADOR_CLASSIFICACAO = "Texto para análise:"
+FIM_INSPIRACAO_SIGILOSO = "GERE AGORA"
+CARACTERES_POR_TOKEN = 4
+
+_decodificador_json = json.JSONDecoder()
+
+
+class PerfilFalso:
+    """Comportamento do backend falso: latência, injeção de falhas e semente."""
+
+    def __init__(self, latencia_media=0.05, distribuicao="exponencial", taxa_429=0.0, taxa_transitorio=0.0,
+                 taxa_json_malformado=0.0, retry_after=1.0, semente=0):
+        if distribuicao not in DISTRIBUICOES_LATENCIA:
+            raise ValueError(f"Distribuição de latência desconhecida: {distribuicao} (use {', '.join(DISTRIBUICOES_LATENCIA)}).")
+        self.latencia_media = latencia_media
+        self.distribuicao = distribuicao
+        self.taxa_429 = taxa_429
+        self.taxa_transitorio = taxa_transitorio
+        self.taxa_json_malformado = taxa_json_malformado
+        self.retry_after = retry_after
+        self.semente = semente
+
+    @classmethod
+    def de_ambiente(cls):
+        return cls(
+            latencia_media=float(os.getenv("GEMINI_FALSO_LATENCIA_MEDIA", "0.05")),
+            distribuicao=os.getenv("GEMINI_FALSO_DISTRIBUICAO_LATENCIA", "exponencial"),
+            taxa_429=float(os.getenv("GEMINI_FALSO_TAXA_429", "0")),
+            taxa_transitorio=float(os.getenv("GEMINI_FALSO_TAXA_TRANSITORIO", "0")),
+            taxa_json_malformado=float(os.getenv("GEMINI_FALSO_TAXA_JSON_MALFORMADO", "0")),
+            retry_after=float(os.getenv("GEMINI_FALSO_RETRY_AFTER", "1")),
+            semente=int(os.getenv("GEMINI_FALSO_SEMENTE", "0")),
+        )
+
+    def latencia(self, rng):
+        if self.latencia_media <= 0:
+            return 0.0
+        if self.distribuicao == "constante":
+            return self.latencia_media
+        if self.distribuicao == "exponencial":
+            return rng.expovariate(1.0 / self.latencia_media)
+        # Lognormal com sigma 1 e a mesma média: cauda longa, como a latência real da API
+        return rng.lognormvariate(0.0, 1.0) * self.latencia_media / 1.6487
+
+
+class EstatisticasBackendFalso:
+    """Contadores globais do backend falso (todas as chaves), para o benchmark."""
+
+    CAMPOS = ("chamadas", "erros_429", "erros_transitorios", "respostas_malformadas", "tokens_entrada", "tokens_saida", "tokens_em_cache")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._contagens = dict.fromkeys(self.CAMPOS, 0)
+
+    def registrar(self, **incrementos):
+        with self._lock:
+            for campo, valor in incrementos.items():
+                self._contagens[campo] += valor
+
+    def instantaneo(self):
+        with self._lock:
+            return dict(self._contagens)
+
+
+estatisticas_backend_falso = EstatisticasBackendFalso()
+
+
+class UsoFalso:
+    def __init__(self, tokens_entrada, tokens_saida, tokens_em_cache=0):
+        # Como na API, prompt_token_count inclui os tokens servidos pelo contexto em cache
+        self.prompt_token_count = tokens_entrada
+        self.candidates_token_count = tokens_saida
+        self.cached_content_token_count = tokens_em_cache
+        self.total_token_count = tokens_entrada + tokens_saida
+
+
+class CandidatoFalso:
+    finish_reason = "STOP"
+
+
+class RespostaFalsa:
+    """Imita os campos da resposta do SDK lidos pelos scripts."""
+
+    def __init__(self, texto, tokens_entrada, tokens_em_cache=0):
+        self.text = texto
+        self.usage_metadata = UsoFalso(tokens_entrada, len(texto) // CARACTERES_POR_TOKEN, tokens_em_cache)
+        self.candidates = [CandidatoFalso()]
+        self.prompt_feedback = None
+
+
+def _lista_apos(prompt, marcador):
+    """Lista JSON que segue o marcador no prompt (o lote enviado), ou []."""
+    inicio = prompt.find("[", prompt.find(marcador))
+    try:
+        itens, _ = _decodificador_json.raw_decode(prompt, inicio)
+    except (ValueError, json.JSONDecodeError):
+        return []
+    return itens if isinstance(itens, list) else []
+
+
+def _classe_do_texto(texto):
+    """Classe estável por texto: o mesmo chunk recebe sempre o mesmo rótulo."""
+    return int(hashlib.sha256(texto.encode("utf-8")).hexdigest(), 16) % 3
+
+
+def _reescrever(texto, rng):
+    palavras = (texto or "").split()
+    rng.shuffle(palavras)
+    return "Texto sintético: " + " ".join(palavras[:200])
+
+
+def _classificacao(texto, rng):
+    return {
+        "CLASSIFICACAO": _classe_do_texto(texto),
+        "EXPLICACAO": "Trata-se de uma resposta do backend Gemini falso.",
+        "CONFIANCA": round(rng.uniform(0.6, 1.0), 2),
+    }
+
+
+def gerar_texto_falso(prompt, rng):
+    """Texto de resposta no formato esperado pelo tipo de prompt reconhecido."""
+    if MARCADOR_SINTESE in prompt:
+        resposta = [
+            {"id_original": item.get("id_original"), "texto_sintetico": _reescrever(item.get("texto_original"), rng),
+             "confianca_geracao": round(rng.uniform(0.7, 1.0), 2)}
+            for item in _lista_apos(prompt, MARCADOR_SINTESE) if isinstance(item, dict)
+        ]
+    elif MARCADOR_SIGILOSO in prompt:
+        inspiracao = prompt.split(MARCADOR_SIGILOSO, 1)[1].split(FIM_INSPIRACAO_SIGILOSO, 1)[0].strip().strip('"')
+        resposta = {
+            "justificativa_transformacao": "Transformação gerada pelo backend Gemini falso.",
+            "nivel_sigilo_gerado": "SIGILOSO - NÍVEL MÉDIO",
+            "texto_sintetico": "Documento sigiloso: " + _reescrever(inspiracao, rng),
+            "confianca_geracao_sintetica": round(rng.uniform(0.7, 1.0), 2),
+        }
+    elif MARCADOR_CLASSIFICACAO_LOTE in prompt:
+        resposta = [
+            dict(id=item.get("id"), **_classificacao(item.get("texto") or "", rng))
+            for item in _lista_apos(prompt, MARCADOR_CLASSIFICACAO_LOTE) if isinstance(item, dict)
+        ]
+    elif MARCADOR_CLASSIFICACAO in prompt:
+        resposta = _classificacao(prompt.split(MARCADOR_CLASSIFICACAO, 1)[1].strip(), rng)
+    else:
+        return "Resposta do backend Gemini falso."
+    return json.dumps(resposta, ensure_ascii=False)
+
+
+class ModeloGeminiFalso:
+    """Substituto de `genai.GenerativeModel` com o mesmo `generate_content`.
+
+    O sorteio de latência e falhas usa um gerador semeado por (semente, prompt, n-ésima
+    chamada com esse prompt): a mesma carga produz as mesmas respostas e falhas,
+    independentemente da ordem em que as threads chegam. A `instrucao_sistema` conta como
+    início do prompt; com `contexto_em_cache`, seus tokens voltam em `cached_content_token_count`.
+    """
+
+    def __init__(self, nome_modelo, perfil=None, instrucao_sistema=None, contexto_em_cache=False):
+        self.model_name = f"models/{nome_modelo}"
+        self.perfil = perfil or PerfilFalso.de_ambiente()
+        self.instrucao_sistema = instrucao_sistema or ""
+        self.contexto_em_cache = contexto_em_cache
+        self._chamadas_por_prompt = {}
+        self._lock = threading.Lock()
+
+    def _gerador(self, prompt):
+        resumo = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        with self._lock:
+            ordem = self._chamadas_por_prompt.get(resumo, 0)
+            self._chamadas_por_prompt[resumo] = ordem + 1
+        return random.Random(f"{self.perfil.semente}:{resumo}:{ordem}")
+
+    def generate_content(self, prompt, generation_config=None):
+        prompt = self.instrucao_sistema + prompt
+        rng = self._gerador(prompt)
+        perfil = self.perfil
+        time.sleep(perfil.latencia(rng))
+        tokens_entrada = len(prompt) // CARACTERES_POR_TOKEN
+        tokens_em_cache = len(self.instrucao_sistema) // CARACTERES_POR_TOKEN if self.contexto_em_cache else 0
+        sorteio = rng.random()
+        if sorteio < perfil.taxa_429:
+            estatisticas_backend_falso.registrar(chamadas=1, erros_429=1)
+            raise ErroLimiteTaxa("429 Resource has been exhausted (e.g. check quota).", retry_after=perfil.retry_after)
+        if sorteio < perfil.taxa_429 + perfil.taxa_transitorio:
+            estatisticas_backend_falso.registrar(chamadas=1, erros_transitorios=1)
+            raise ErroTransitorio("503 The model is overloaded. Please try again later.")
+        texto = gerar_texto_falso(prompt, rng)
+        malformada = rng.random() < perfil.taxa_json_malformado
+        if malformada:
+            texto = texto[:max(1, int(len(texto) * rng.uniform(0.3, 0.9)))]  # Resposta truncada
+        resposta = RespostaFalsa(texto, tokens_entrada, tokens_em_cache)
+        estatisticas_backend_falso.registrar(
+            chamadas=1, respostas_malformadas=int(malformada), tokens_entrada=tokens_entrada,
+            tokens_saida=resposta.usage_metadata.candidates_token_count, tokens_em_cache=tokens_em_cache,
+        )
+        return resposta
+
+
+def criar_modelo_falso(api_key, nome_modelo, instrucao_sistema=None):
+    """Fábrica do backend "falso" para `pool_chaves_gemini` (a chave é ignorada)."""
+    return ModeloGeminiFalso(nome_modelo, instrucao_sistema=instrucao_sistema)
+
+
+def criar_modelo_falso_em_cache(api_key, nome_modelo, prefixo, ttl_segundos):
+    """Fábrica do modo "contexto": o prefixo faz as vezes de um CachedContent."""
+    return ModeloGeminiFalso(nome_modelo, instrucao_sistema=prefixo, contexto_em_cache=True)
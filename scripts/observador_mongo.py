@@ -0,0 +1,105 @@
+import time
+import logging
+import threading
+from pymongo.errors import OperationFailure, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+INTERVALO_SONDAGEM_SEGUNDOS = 5.0
+MAX_IDS_INSERIDOS = 1000
+
+
+class ObservadorDeColecao:
+    """Acorda o alimentador de uma etapa quando chega trabalho novo na coleção.
+
+    Com replica set, uma thread acompanha um change stream filtrado (inserções e
+    atualizações que devolvem o status a `status_pendente`) e guarda os _ids inseridos,
+    para que o alimentador os normalize e os reserve em seguida. Sem change streams
+    (servidor standalone) ou se o stream cair, `aguardar` passa a chamar `sondar` — uma
+    consulta indexada barata — a cada `intervalo_sondagem_segundos`.
+
+    Itens com nova tentativa agendada não geram evento ao vencer; por isso `aguardar`
+    sempre retorna ao fim do `timeout`, e o chamador refaz a reserva.
+    """
+
+    def __init__(self, colecao, campo_status, sondar, status_pendente="pendente",
+                 intervalo_sondagem_segundos=INTERVALO_SONDAGEM_SEGUNDOS):
+        self.colecao = colecao
+        self.sondar = sondar
+        self.intervalo_sondagem_segundos = intervalo_sondagem_segundos
+        self.pipeline = [{"$match": {"$or": [
+            {"operationType": {"$in": ["insert", "replace"]}},
+            {"operationType": "update", f"updateDescription.updatedFields.{campo_status}": status_pendente},
+        ]}}]
+        self.modo = None
+        self._evento = threading.Event()
+        self._lock = threading.Lock()
+        self._inseridos = []
+        self._excedeu_ids = False
+        self._stream = None
+        self._thread = None
+
+    def iniciar(self):
+        try:
+            self._stream = self.colecao.watch(self.pipeline)
+        except OperationFailure as e:
+            # Código 40573: change streams só existem em replica sets/clusters shardados
+            logger.info(f"Change streams indisponíveis em '{self.colecao.name}' ({e.code}); usando sondagem a cada {self.intervalo_sondagem_segundos:.0f}s.")
+            self.modo = "sondagem"
+            return self
+        self.modo = "change_stream"
+        self._thread = threading.Thread(target=self._acompanhar, daemon=True)
+        self._thread.start()
+        logger.info(f"Acompanhando '{self.colecao.name}' por change stream.")
+        return self
+
+    def _acompanhar(self):
+        try:
+            for evento in self._stream:
+                with self._lock:
+                    if evento["operationType"] == "insert":
+                        if len(self._inseridos) < MAX_IDS_INSERIDOS:
+                            self._inseridos.append(evento["documentKey"]["_id"])
+                        else:
+                            self._excedeu_ids = True
+                self._evento.set()
+        except PyMongoError as e:
+            if self.modo == "change_stream":
+                logger.warning(f"Change stream de '{self.colecao.name}' interrompido ({e}); passando para sondagem.")
+                self.modo = "sondagem"
+                self._evento.set()
+
+    def aguardar(self, timeout):
+        """Espera trabalho novo por até `timeout` segundos.
+
+        Retorna os _ids inseridos desde a última chamada, ou None quando eles não são
+        conhecidos (modo sondagem ou ids demais) e a normalização deve buscá-los por consulta.
+        """
+        if self.modo == "change_stream":
+            self._evento.wait(timeout)
+            self._evento.clear()
+            with self._lock:
+                inseridos, self._inseridos = self._inseridos, []
+                excedeu, self._excedeu_ids = self._excedeu_ids, False
+            return None if excedeu or self.modo != "change_stream" else inseridos
+        limite = time.monotonic() + timeout
+        while not self.sondar():
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            time.sleep(min(self.intervalo_sondagem_segundos, restante))
+        return None
+
+    def parar(self):
+        self.modo = None
+        if self._stream is not None:
+            self._stream.close()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *exc):
+        self.parar()
+        return False
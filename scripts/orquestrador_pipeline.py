@@ -0,0 +1,419 @@
+# Orquestrador: síntese -> rotulagem -> aumento como estágios concorrentes de um único processo
+import os
+import time
+import queue
+import logging
+import argparse
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from dotenv import load_dotenv
+from pathlib import Path
+from bson import ObjectId
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import BulkWriteError
+from dataset.migracao_dados.buffer_escrita_mongo import BufferEscritaMongo
+from dataset.migracao_dados.cache_respostas_gemini import registrar_estatisticas_cache
+from dataset.migracao_dados.consultas_mongo import (
+    NOME_MODELO_SINTESE,
+    criar_agenda_aumento,
+    criar_fila_rotulagem,
+    criar_fila_sintese,
+    criar_observador,
+    garantir_indice_sigilosos,
+    normalizar_novos_documentos,
+    preparar_colecoes,
+)
+from dataset.migracao_dados.fila_trabalho_mongo import STATUS_EM_PROCESSAMENTO
+from dataset.migracao_dados.gemini_classificacao_utils import registrar_metricas_interpretacao
+from dataset.migracao_dados.indice_quase_duplicatas import (
+    STATUS_QUASE_DUPLICADO, encerrar_ao_receber_sigterm, salvar_indice_compartilhado
+)
+from dataset.migracao_dados.metricas_pipeline import iniciar_servidor_metricas, itens_processados, profundidade_fila
+from dataset.migracao_dados.pool_chaves_gemini import PoolDeChaves
+from dataset.migracao_dados.priorizador_rotulagem import criar_priorizador
+from dataset.migracao_dados.sintetizador_de_chunks import (
+    estatisticas_lotes,
+    registrar_falha_sintese,
+    reservar_lote_por_orcamento,
+    sintetizar_lote,
+)
+from dataset.migracao_dados.rotular_chunks_gemini import ProgressoRotulagem, rotular_chunk
+from dataset.migracao_dados.aumentador_dataset_sigiloso import (
+    embaralhar_ids_inspiracao,
+    iterar_chunks_inspiracao,
+    processo_de_aumento,
+)
+
+project_root = Path(__file__).parent.parent.parent
+load_dotenv(project_root / 'projeto' / '.env')
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+MONGO_USER = os.getenv("MONGO_USER", "usuario")
+MONGO_PASS = os.getenv("MONGO_PASS", "senha")
+MONGO_HOST = os.getenv("MONGO_HOST", "localhost")
+MONGO_PORT = os.getenv("MONGO_PORT", "27017")
+MONGO_URI = f"mongodb://{MONGO_USER}:{MONGO_PASS}@{MONGO_HOST}:{MONGO_PORT}/"
+
+# Trabalhadores por estágio (padrão derivado do número de chaves); 0 desliga o aumento
+EM_VOO_POR_CHAVE = int(os.getenv("GEMINI_EM_VOO_POR_CHAVE", "2"))
+TRABALHADORES_SINTESE = int(os.getenv("ORQUESTRADOR_TRABALHADORES_SINTESE", "0"))
+TRABALHADORES_ROTULAGEM = int(os.getenv("ORQUESTRADOR_TRABALHADORES_ROTULAGEM", "0"))
+TRABALHADORES_AUMENTO = int(os.getenv("ORQUESTRADOR_TRABALHADORES_AUMENTO", "1"))
+# Capacidade das filas entre estágios, em itens por trabalhador do estágio consumidor
+ITENS_NA_FILA_POR_TRABALHADOR = 2
+INTERVALO_SEM_PENDENTES_SEGUNDOS = 60
+INTERVALO_ALIMENTACAO_SEGUNDOS = 0.5
+INTERVALO_RELATORIO_SEGUNDOS = 60
+
+
+class MedidorEstagio:
+    """Utilização de um estágio: fração do tempo dos trabalhadores gasta processando.
+
+    O tempo em que um trabalhador fica parado esperando vaga na fila do estágio seguinte
+    (backpressure) é contado à parte: estágio muito ocupado é gargalo; estágio muito
+    bloqueado está esperando o seguinte.
+    """
+
+    def __init__(self, nome, trabalhadores, fila_entrada):
+        self.nome = nome
+        self.trabalhadores = trabalhadores
+        self.fila_entrada = fila_entrada
+        self.inicio = time.monotonic()
+        self.ocupado_segundos = 0.0
+        self.bloqueado_segundos = 0.0
+        self.itens = 0
+        self._lock = threading.Lock()
+        profundidade_fila.acompanhar(fila_entrada.qsize, fila=nome)
+
+    @contextmanager
+    def processando(self):
+        inicio = time.monotonic()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.ocupado_segundos += time.monotonic() - inicio
+                self.itens += 1
+
+    def registrar_bloqueio(self, segundos):
+        with self._lock:
+            self.bloqueado_segundos += segundos
+
+    def utilizacao(self):
+        capacidade = (time.monotonic() - self.inicio) * self.trabalhadores
+        return self.ocupado_segundos / capacidade if capacidade > 0 else 0.0
+
+    def resumo(self):
+        return (f"{self.nome}: {self.utilizacao():.0%} ocupado, {self.itens} itens, "
+                f"fila {self.fila_entrada.qsize()}/{self.fila_entrada.maxsize}, "
+                f"{self.bloqueado_segundos:.0f}s bloqueado no estágio seguinte")
+
+
+def colocar(fila, item, parar, medidor=None):
+    """`put` que respeita o sinal de parada; o tempo esperando vaga conta como bloqueio do medidor."""
+    inicio = time.monotonic()
+    while not parar.is_set():
+        try:
+            fila.put(item, timeout=INTERVALO_ALIMENTACAO_SEGUNDOS)
+            break
+        except queue.Full:
+            continue
+    if medidor is not None:
+        medidor.registrar_bloqueio(time.monotonic() - inicio)
+    return not parar.is_set()
+
+
+def esvaziar(fila):
+    """Retira da fila local, sem bloquear, tudo o que ainda está nela (exceto sentinelas)."""
+    itens = []
+    while True:
+        try:
+            item = fila.get_nowait()
+        except queue.Empty:
+            return itens
+        if item is not None:
+            itens.append(item)
+
+
+def devolver_a_fila(fila_trabalho, docs):
+    """Libera no banco as reservas deste processo que não serão processadas (encerramento)."""
+    for doc in docs:
+        fila_trabalho.liberar(doc["_id"])
+    if docs:
+        logger.info(f"{len(docs)} documento(s) devolvido(s) à fila de '{fila_trabalho.colecao.name}' no encerramento.")
+
+
+class OrquestradorPipeline:
+    """Síntese, rotulagem e aumento num só processo, com um cliente MongoDB e um pool de chaves.
+
+    - síntese: um alimentador reserva lotes de `chunks` (orçamento de tokens) para os
+      trabalhadores; cada lote sintetizado é gravado com um bulk_write, e os documentos
+      inseridos já nascem reservados para a rotulagem deste processo e seguem, em memória,
+      direto para a fila de rotulagem (sem reler o texto do banco).
+    - rotulagem: consome essa fila; quando há vaga sobrando, um alimentador também reserva
+      chunks sintéticos pendentes no banco (de outros processos ou com reserva vencida).
+      Com a priorização da rotulagem ativada, os sintetizados não são repassados em memória:
+      ficam pendentes e o alimentador os reserva na ordem de prioridade.
+    - aumento: gera textos sigilosos a partir de chunks de inspiração, com a mesma agenda
+      de tentativas do aumentador avulso.
+
+    As filas entre estágios são limitadas: se a rotulagem não acompanha, os trabalhadores
+    de síntese esperam vaga, e o alimentador deixa de reservar chunks. As chamadas ao
+    Gemini dos três estágios passam pelo mesmo `PoolDeChaves.compartilhado`.
+    """
+
+    def __init__(self, db, trabalhadores_sintese, trabalhadores_rotulagem, trabalhadores_aumento):
+        self.db = db
+        self.parar = threading.Event()
+        self.buffer = BufferEscritaMongo()
+        self.fila_sintese = criar_fila_sintese(db["chunks"])
+        self.fila_rotulagem = criar_fila_rotulagem(db["chunks_sinteticos"])
+        # Mesmo id de trabalhador nas duas etapas: as reservas são deste processo
+        self.fila_rotulagem.id_trabalhador = self.fila_sintese.id_trabalhador
+        self.agenda_aumento = criar_agenda_aumento(db)
+        self.progresso_rotulagem = ProgressoRotulagem()
+        self.priorizador = criar_priorizador(db)
+        self.lotes = queue.Queue(maxsize=max(1, trabalhadores_sintese) * ITENS_NA_FILA_POR_TRABALHADOR)
+        self.a_rotular = queue.Queue(maxsize=max(1, trabalhadores_rotulagem) * ITENS_NA_FILA_POR_TRABALHADOR)
+        self.inspiracoes = queue.Queue(maxsize=max(1, trabalhadores_aumento) * ITENS_NA_FILA_POR_TRABALHADOR)
+        self.medidores = [
+            MedidorEstagio("síntese", trabalhadores_sintese, self.lotes),
+            MedidorEstagio("rotulagem", trabalhadores_rotulagem, self.a_rotular),
+        ]
+        if trabalhadores_aumento:
+            self.medidores.append(MedidorEstagio("aumento", trabalhadores_aumento, self.inspiracoes))
+        self.threads = []
+        self._quantidades = (trabalhadores_sintese, trabalhadores_rotulagem, trabalhadores_aumento)
+
+    # --- síntese ---------------------------------------------------------------
+
+    def _alimentar_sintese(self):
+        observador = criar_observador(self.fila_sintese).iniciar()
+        sobra = None
+        try:
+            while not self.parar.is_set():
+                docs, sobra = reservar_lote_por_orcamento(self.fila_sintese, sobra)
+                if not docs:
+                    self.buffer.descarregar()
+                    normalizar_novos_documentos(self.fila_sintese.colecao, observador.aguardar(INTERVALO_SEM_PENDENTES_SEGUNDOS))
+                    continue
+                if not colocar(self.lotes, docs, self.parar):
+                    devolver_a_fila(self.fila_sintese, docs)
+        finally:
+            observador.parar()
+            if sobra is not None:
+                devolver_a_fila(self.fila_sintese, [sobra])
+
+    def _gravar_sinteticos(self, sintetizados):
+        """Grava o lote sintetizado e retorna (índices inseridos, índices com erro).
+
+        O status de rotulagem e a reserva só valem para documentos inseridos agora: um
+        chunk sintético que já existia para a origem (rotulado ou reservado por outro
+        processo) mantém os que tinha.
+        """
+        reserva_ate = datetime.now(timezone.utc) + timedelta(seconds=self.fila_rotulagem.duracao_reserva_segundos)
+        campos_da_fila = ("status_rotulagem", self.fila_rotulagem.campo_trabalhador, self.fila_rotulagem.campo_reserva)
+        operacoes = []
+        for chunk_id_obj, _, doc_sintetico in sintetizados:
+            if doc_sintetico["status_rotulagem"] != STATUS_QUASE_DUPLICADO and self.priorizador is None:
+                doc_sintetico.update({
+                    "status_rotulagem": STATUS_EM_PROCESSAMENTO,
+                    self.fila_rotulagem.campo_trabalhador: self.fila_rotulagem.id_trabalhador,
+                    self.fila_rotulagem.campo_reserva: reserva_ate,
+                })
+            doc_sintetico["_id"] = ObjectId()
+            operacoes.append(UpdateOne(
+                {"id_chunk_original": chunk_id_obj},
+                {
+                    "$set": {k: v for k, v in doc_sintetico.items() if k != "_id" and k not in campos_da_fila},
+                    "$setOnInsert": {k: v for k, v in doc_sintetico.items() if k == "_id" or k in campos_da_fila},
+                },
+                upsert=True
+            ))
+        try:
+            resultado = self.fila_rotulagem.colecao.bulk_write(operacoes, ordered=False)
+            return set(resultado.upserted_ids), set()
+        except BulkWriteError as e:
+            inseridos = {item["index"] for item in e.details.get("upserted", [])}
+            falhas = {erro["index"] for erro in e.details.get("writeErrors", [])}
+            return inseridos, falhas
+
+    def _sintetizar(self, medidor):
+        while True:
+            docs = self.lotes.get()
+            if docs is None:
+                return
+            if self.parar.is_set():
+                # Encerrando: o lote volta à fila do banco sem ser processado
+                for doc in docs:
+                    self.fila_sintese.liberar(doc["_id"])
+                continue
+            try:
+                with medidor.processando():
+                    lote = [{"id_original": str(doc["_id"]), "texto_original": doc.get("chunk_texto")} for doc in docs]
+                    sintetizados = sintetizar_lote(lote, {str(doc["_id"]): doc for doc in docs}, self.fila_sintese)
+                    inseridos, falhas = self._gravar_sinteticos(sintetizados) if sintetizados else (set(), set())
+                para_rotular = []
+                for indice, (chunk_id_obj, chunk_id_str, doc_sintetico) in enumerate(sintetizados):
+                    if indice in falhas:
+                        registrar_falha_sintese(self.fila_sintese, chunk_id_obj, chunk_id_str, "Erro ao salvar o chunk sintetizado.")
+                        continue
+                    self.buffer.adicionar(self.fila_sintese.colecao, self.fila_sintese.operacao_concluir(
+                        chunk_id_obj, {"status_sintese": "sucesso", "tentativas_sintese": 0}
+                    ))
+                    itens_processados.incrementar(estagio="síntese")
+                    if doc_sintetico["status_rotulagem"] != STATUS_EM_PROCESSAMENTO:
+                        continue  # Quase-duplicata, ou pendente para a rotulagem priorizada
+                    if indice in inseridos:
+                        para_rotular.append(doc_sintetico)
+                    else:
+                        # Já existia um chunk sintético para a origem: ele mantém o status de
+                        # rotulagem e a reserva que tinha
+                        logger.warning(f"Chunk {chunk_id_str} já tinha versão sintética; o status de rotulagem dela foi mantido.")
+                for posicao, doc_sintetico in enumerate(para_rotular):
+                    self.progresso_rotulagem.iniciar(doc_sintetico["_id"])
+                    if not colocar(self.a_rotular, doc_sintetico, self.parar, medidor):
+                        # Encerrando: os restantes voltam à fila do banco sem esperar a reserva vencer
+                        devolver_a_fila(self.fila_rotulagem, para_rotular[posicao:])
+                        break
+            except Exception as e:
+                logger.error(f"Erro ao processar lote de {len(docs)} chunks: {e}", exc_info=True)
+
+    # --- rotulagem -------------------------------------------------------------
+
+    def _alimentar_rotulagem(self):
+        """Completa a fila de rotulagem com chunks sintéticos pendentes no banco quando sobra vaga."""
+        while not self.parar.is_set():
+            if self.priorizador is not None:
+                self.priorizador.atualizar()
+            livres = self.a_rotular.maxsize // 2 - self.a_rotular.qsize()
+            novos = self.fila_rotulagem.reivindicar_lote(livres) if livres > 0 else []
+            for posicao, chunk in enumerate(novos):
+                self.progresso_rotulagem.iniciar(chunk["_id"])
+                if not colocar(self.a_rotular, chunk, self.parar):
+                    devolver_a_fila(self.fila_rotulagem, novos[posicao:])
+                    break
+            self.buffer.descarregar_se_vencido()
+            if not novos:
+                self.parar.wait(INTERVALO_ALIMENTACAO_SEGUNDOS * 10)
+
+    def _rotular(self, medidor):
+        colecao_rotulados = self.db["chunks_rotulados"]
+        while True:
+            chunk = self.a_rotular.get()
+            if chunk is None:
+                return
+            with medidor.processando():
+                rotular_chunk(chunk, self.a_rotular, self.progresso_rotulagem, self.buffer,
+                              self.fila_rotulagem, colecao_rotulados)
+
+    # --- aumento ---------------------------------------------------------------
+
+    def _alimentar_aumento(self):
+        colecao_chunks = self.db["chunks"]
+        while not self.parar.is_set():
+            encontrou = False
+            for chunk in iterar_chunks_inspiracao(colecao_chunks, embaralhar_ids_inspiracao(colecao_chunks)):
+                encontrou = True
+                if not colocar(self.inspiracoes, chunk, self.parar):
+                    return
+            if not encontrou:
+                self.parar.wait(INTERVALO_SEM_PENDENTES_SEGUNDOS)
+
+    def _aumentar(self, medidor):
+        while True:
+            chunk = self.inspiracoes.get()
+            if chunk is None:
+                return
+            if self.parar.is_set():
+                continue
+            with medidor.processando():
+                processo_de_aumento(self.db["chunks"], self.db["chunks_sigilosos"], chunk, self.agenda_aumento)
+
+    # --- ciclo de vida ---------------------------------------------------------
+
+    def _iniciar_thread(self, alvo, *args):
+        thread = threading.Thread(target=alvo, args=args, daemon=True)
+        thread.start()
+        self.threads.append(thread)
+        return thread
+
+    def registrar_relatorio(self):
+        medidores = sorted(self.medidores, key=lambda m: m.utilizacao(), reverse=True)
+        for medidor in medidores:
+            logger.info(f"[utilização] {medidor.resumo()}")
+        logger.info(f"[utilização] gargalo provável: {medidores[0].nome}")
+
+    def executar(self):
+        trabalhadores_sintese, trabalhadores_rotulagem, trabalhadores_aumento = self._quantidades
+        medidor_sintese, medidor_rotulagem = self.medidores[:2]
+        alimentadores = [self._iniciar_thread(self._alimentar_sintese), self._iniciar_thread(self._alimentar_rotulagem)]
+        consumidores = [(self.lotes, self._iniciar_thread(self._sintetizar, medidor_sintese))
+                        for _ in range(trabalhadores_sintese)]
+        consumidores += [(self.a_rotular, self._iniciar_thread(self._rotular, medidor_rotulagem))
+                         for _ in range(trabalhadores_rotulagem)]
+        if trabalhadores_aumento:
+            alimentadores.append(self._iniciar_thread(self._alimentar_aumento))
+            consumidores += [(self.inspiracoes, self._iniciar_thread(self._aumentar, self.medidores[2]))
+                             for _ in range(trabalhadores_aumento)]
+        logger.info(f"Orquestrador ({self.fila_sintese.id_trabalhador}): {trabalhadores_sintese} trabalhadores de síntese, "
+                    f"{trabalhadores_rotulagem} de rotulagem, {trabalhadores_aumento} de aumento.")
+        try:
+            while not self.parar.wait(INTERVALO_RELATORIO_SEGUNDOS):
+                self.registrar_relatorio()
+                estatisticas_lotes.registrar_relatorio()
+                salvar_indice_compartilhado(somente_se_vencido=True)
+        except KeyboardInterrupt:
+            logger.info("Interrompido; encerrando os estágios...")
+        finally:
+            self.parar.set()
+            for alimentador in alimentadores:
+                alimentador.join()
+            # Estágios encerrados na ordem do pipeline, cada um depois de esvaziar a própria fila
+            for fila_estagio in (self.lotes, self.a_rotular, self.inspiracoes):
+                trabalhadores = [thread for fila_thread, thread in consumidores if fila_thread is fila_estagio]
+                for _ in trabalhadores:
+                    fila_estagio.put(None)
+                for thread in trabalhadores:
+                    thread.join()
+            # Chunks que a rotulagem devolveu à fila local (quota esgotada) depois das sentinelas
+            devolver_a_fila(self.fila_rotulagem, esvaziar(self.a_rotular))
+            self.buffer.descarregar()
+            self.registrar_relatorio()
+
+
+def main(em_voo_por_chave=EM_VOO_POR_CHAVE):
+    pool = PoolDeChaves.compartilhado(NOME_MODELO_SINTESE)
+    pool.definir_em_voo_por_chave(em_voo_por_chave)
+    capacidade = len(pool) * em_voo_por_chave
+    iniciar_servidor_metricas()
+    encerrar_ao_receber_sigterm()
+    client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
+    try:
+        client.admin.command('ping')
+        db = client['dataset_treinamento']
+        preparar_colecoes(db)
+        if TRABALHADORES_AUMENTO:
+            garantir_indice_sigilosos(db)
+        OrquestradorPipeline(
+            db,
+            TRABALHADORES_SINTESE or max(1, capacidade // 2),
+            TRABALHADORES_ROTULAGEM or capacidade,
+            TRABALHADORES_AUMENTO,
+        ).executar()
+    finally:
+        registrar_estatisticas_cache()
+        registrar_metricas_interpretacao()
+        salvar_indice_compartilhado()
+        client.close()
+        logger.info("Conexão com MongoDB fechada.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Executa síntese, rotulagem e aumento como estágios de um único processo.")
+    parser.add_argument("--em-voo-por-chave", type=int, default=EM_VOO_POR_CHAVE)
+    args = parser.parse_args()
+    main(args.em_voo_por_chave)
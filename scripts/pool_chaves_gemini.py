@@ -0,0 +1,356 @@
+import os
+import time
+import logging
+import datetime
+import threading
+from contextlib import contextmanager
+import google.generativeai as genai
+from google.ai import generativelanguage as glm
+from dataset.migracao_dados.limitador_taxa import LimitadorChave
+from dataset.migracao_dados.cache_respostas_gemini import PromptComPrefixo
+from dataset.migracao_dados.metricas_pipeline import erros_quota_gemini, latencia_gemini
+from dataset.migracao_dados.modelo_gemini_falso import criar_modelo_falso, criar_modelo_falso_em_cache
+from dataset.migracao_dados.erros_gemini import (
+    BACKOFF_QUOTA,
+    BACKOFF_TRANSITORIO,
+    ErroGemini,
+    ErroLimiteTaxa,
+    ErroTransitorio,
+    extrair_retry_after,
+)
+
+logger = logging.getLogger(__name__)
+
+KEY_NAMES = [
+    "GEMINI_API_KEY",
+    "GEMINI_API_KEY_4",
+    "GEMINI_API_KEY_5",
+    "GEMINI_API_KEY_6",
+    "GEMINI_API_KEY_7",
+    "GEMINI_API_KEY_8",
+    "GEMINI_API_KEY_9",
+]
+# Orçamento padrão por chave (plano gratuito do gemini-2.5-flash); sobrescrito via .env
+RPM_PADRAO = 10
+TPM_PADRAO = 250000
+EM_VOO_PADRAO = 1
+MAX_TENTATIVAS_TRANSITORIAS = 4
+# Backend dos modelos: "gemini" (API real) ou "falso" (modelo_gemini_falso, sem rede nem quota)
+BACKEND_PADRAO = os.getenv("GEMINI_BACKEND", "gemini")
+CHAVES_FALSAS_PADRAO = int(os.getenv("GEMINI_FALSO_CHAVES", "3"))
+# Reaproveitamento do prefixo fixo dos prompts (PromptComPrefixo), por chave:
+#   "instrucao"   - o prefixo vai como system_instruction de um modelo criado uma vez por prefixo
+#   "contexto"    - o prefixo vira um CachedContent da API (tokens em cache com desconto); se a
+#                   criação falhar (ex.: prefixo abaixo do mínimo de tokens), usa "instrucao"
+#   "concatenado" - envia o prompt inteiro, como antes
+MODOS_PREFIXO = ("instrucao", "contexto", "concatenado")
+MODO_PREFIXO_PADRAO = os.getenv("GEMINI_PREFIXO_MODO", "instrucao")
+# Validade do CachedContent; o modelo da chave recria o cache um pouco antes de expirar
+TTL_CONTEXTO_SEGUNDOS = int(os.getenv("GEMINI_CONTEXTO_TTL_SEGUNDOS", "3600"))
+FOLGA_RENOVACAO_CONTEXTO = 0.9
+_pools_compartilhados = {}
+_lock_pools = threading.Lock()
+
+
+def carregar_chaves_gemini(nomes=KEY_NAMES):
+    """Lê as chaves Gemini definidas no ambiente, na ordem de `nomes`."""
+    chaves = []
+    for name in nomes:
+        value = os.getenv(name)
+        if value:
+            chaves.append((name, value))
+    if not chaves:
+        raise ValueError("Nenhuma chave Gemini encontrada no arquivo .env")
+    return chaves
+
+
+def _opcoes_cliente(api_key):
+    """(client_options, transporte) dos clientes de uma chave."""
+    opcoes_cliente = {"api_key": api_key}
+    transporte = None
+    endpoint = os.getenv("GEMINI_API_ENDPOINT")
+    if endpoint:
+        # Permite apontar para um servidor local (ver servidor_gemini_falso.py)
+        opcoes_cliente["api_endpoint"] = endpoint
+        transporte = "rest"
+    return opcoes_cliente, transporte
+
+
+def criar_modelo_gemini(api_key, nome_modelo, instrucao_sistema=None):
+    """Cria um modelo com cliente próprio para a chave, sem alterar a configuração global do genai."""
+    opcoes_cliente, transporte = _opcoes_cliente(api_key)
+    modelo = genai.GenerativeModel(nome_modelo, system_instruction=instrucao_sistema)
+    # Cada chave precisa do próprio cliente: genai.configure é global ao processo
+    modelo._client = glm.GenerativeServiceClient(client_options=opcoes_cliente, transport=transporte)
+    return modelo
+
+
+def criar_modelo_gemini_em_cache(api_key, nome_modelo, prefixo, ttl_segundos):
+    """Cria um CachedContent com o prefixo na conta da chave e um modelo que o referencia.
+
+    O cache é criado pelo cliente da própria chave (`genai.caching` usa o cliente global).
+    """
+    opcoes_cliente, transporte = _opcoes_cliente(api_key)
+    cliente_cache = glm.CacheServiceClient(client_options=opcoes_cliente, transport=transporte)
+    conteudo = cliente_cache.create_cached_content(cached_content=glm.CachedContent(
+        model=f"models/{nome_modelo}",
+        system_instruction=glm.Content(parts=[glm.Part(text=prefixo)]),
+        ttl=datetime.timedelta(seconds=ttl_segundos),
+    ))
+    modelo = genai.GenerativeModel.from_cached_content(genai.caching.CachedContent._from_obj(conteudo))
+    modelo._client = glm.GenerativeServiceClient(client_options=opcoes_cliente, transport=transporte)
+    return modelo
+
+
+# Fábricas (api_key, nome_modelo, instrucao_sistema=None) -> objeto com `model_name` e
+# `generate_content(prompt, generation_config=None)`
+BACKENDS_MODELO = {
+    "gemini": criar_modelo_gemini,
+    "falso": criar_modelo_falso,
+}
+# Fábricas (api_key, nome_modelo, prefixo, ttl_segundos) do modo "contexto"; backends sem
+# uma usam a instrução de sistema
+BACKENDS_CONTEXTO = {
+    "gemini": criar_modelo_gemini_em_cache,
+    "falso": criar_modelo_falso_em_cache,
+}
+
+
+def registrar_backend(nome, fabrica, fabrica_contexto=None):
+    """Disponibiliza outro backend de modelo para `GEMINI_BACKEND`."""
+    BACKENDS_MODELO[nome] = fabrica
+    if fabrica_contexto is not None:
+        BACKENDS_CONTEXTO[nome] = fabrica_contexto
+
+
+def criar_modelo(api_key, nome_modelo, backend=None, instrucao_sistema=None):
+    backend = backend or BACKEND_PADRAO
+    if backend not in BACKENDS_MODELO:
+        raise ValueError(f"Backend de modelo desconhecido: '{backend}' (disponíveis: {', '.join(BACKENDS_MODELO)}).")
+    if instrucao_sistema is None:
+        return BACKENDS_MODELO[backend](api_key, nome_modelo)
+    return BACKENDS_MODELO[backend](api_key, nome_modelo, instrucao_sistema=instrucao_sistema)
+
+
+class ModeloComPrefixos:
+    """Modelo de uma chave que reaproveita o prefixo fixo dos prompts.
+
+    Para um PromptComPrefixo, envia só o sufixo a um modelo que já carrega o prefixo
+    (CachedContent ou system_instruction), criado uma vez por prefixo; outros prompts vão
+    inteiros ao modelo base. O resultado da chamada é o mesmo de `generate_content`.
+    """
+
+    def __init__(self, api_key, nome_modelo, backend=None, modo=None, ttl_segundos=TTL_CONTEXTO_SEGUNDOS):
+        modo = modo or MODO_PREFIXO_PADRAO
+        if modo not in MODOS_PREFIXO:
+            raise ValueError(f"Modo de prefixo desconhecido: '{modo}' (use {', '.join(MODOS_PREFIXO)}).")
+        self.api_key = api_key
+        self.nome_modelo = nome_modelo
+        self.backend = backend or BACKEND_PADRAO
+        self.modo = modo
+        self.ttl_segundos = ttl_segundos
+        self.base = criar_modelo(api_key, nome_modelo, self.backend)
+        self.model_name = self.base.model_name
+        self._por_prefixo = {}  # prefixo -> (modelo, instante monotônico de renovação)
+        self._lock = threading.Lock()
+
+    def _criar_para_prefixo(self, prefixo):
+        fabrica_contexto = BACKENDS_CONTEXTO.get(self.backend)
+        if self.modo == "contexto" and fabrica_contexto is not None:
+            try:
+                modelo = fabrica_contexto(self.api_key, self.nome_modelo, prefixo, self.ttl_segundos)
+                return modelo, time.monotonic() + self.ttl_segundos * FOLGA_RENOVACAO_CONTEXTO
+            except Exception as e:
+                logger.warning(f"Contexto em cache indisponível para {self.nome_modelo} ({e}); usando instrução de sistema.")
+        # Sem cache explícito, a nova tentativa de criar o contexto fica para depois do TTL
+        modelo = criar_modelo(self.api_key, self.nome_modelo, self.backend, instrucao_sistema=prefixo)
+        renovacao = time.monotonic() + self.ttl_segundos if self.modo == "contexto" else float("inf")
+        return modelo, renovacao
+
+    def modelo_para(self, prefixo):
+        """Modelo que já carrega `prefixo`, criado (ou renovado) sob demanda."""
+        with self._lock:
+            modelo, renovacao = self._por_prefixo.get(prefixo, (None, 0.0))
+            if modelo is None or time.monotonic() >= renovacao:
+                modelo, renovacao = self._por_prefixo[prefixo] = self._criar_para_prefixo(prefixo)
+            return modelo
+
+    def generate_content(self, prompt, generation_config=None):
+        if isinstance(prompt, PromptComPrefixo) and self.modo != "concatenado":
+            modelo, conteudo = self.modelo_para(prompt.prefixo), prompt.sufixo
+        else:
+            modelo, conteudo = self.base, str(prompt)
+        if generation_config is None:
+            return modelo.generate_content(conteudo)
+        return modelo.generate_content(conteudo, generation_config=generation_config)
+
+
+def tokens_da_resposta(resposta):
+    """Total de tokens (entrada + saída) informado pela API, ou None se indisponível."""
+    uso = getattr(resposta, "usage_metadata", None)
+    return getattr(uso, "total_token_count", None) if uso is not None else None
+
+
+class EstadoChave:
+    """Cliente pré-construído e orçamento de uma chave Gemini."""
+
+    def __init__(self, nome, modelo, limitador, max_em_voo):
+        self.nome = nome
+        self.modelo = modelo
+        self.limitador = limitador
+        self.max_em_voo = max_em_voo
+        self.em_voo = 0
+        self.erros_quota = 0
+        self.erros_quota_consecutivos = 0  # Base do backoff exponencial do cooldown
+
+    def folga(self):
+        """Fração do orçamento ainda disponível (0 se em cooldown ou sem vaga)."""
+        if self.em_voo >= self.max_em_voo:
+            return 0.0
+        return self.limitador.folga()
+
+
+class PoolDeChaves:
+    """Pool compartilhado de chaves Gemini: um cliente por chave, cooldown e orçamento por chave.
+
+    Cada requisição vai para a chave com mais folga; chaves em cooldown após um 429
+    ficam de fora até o prazo informado pelo servidor (ou o padrão) expirar.
+    """
+
+    def __init__(self, chaves, nome_modelo, rpm=RPM_PADRAO, tpm=TPM_PADRAO, em_voo_por_chave=EM_VOO_PADRAO, backend=None):
+        self.nome_modelo = nome_modelo
+        self.backend = backend or BACKEND_PADRAO
+        self.chaves = [
+            EstadoChave(nome, ModeloComPrefixos(valor, nome_modelo, self.backend), LimitadorChave(rpm, tpm), em_voo_por_chave)
+            for nome, valor in chaves
+        ]
+        self._condicao = threading.Condition()
+        logger.info(f"Pool Gemini ({nome_modelo}, backend {self.backend}, prefixo {MODO_PREFIXO_PADRAO}) com {len(self.chaves)} chaves (RPM={rpm}, TPM={tpm}, em voo={em_voo_por_chave} por chave).")
+
+    @classmethod
+    def de_ambiente(cls, nome_modelo, nomes=KEY_NAMES, em_voo_por_chave=None):
+        """Monta o pool com as chaves e orçamentos definidos nas variáveis de ambiente."""
+        rpm = int(os.getenv("GEMINI_RPM_POR_CHAVE", RPM_PADRAO))
+        tpm = int(os.getenv("GEMINI_TPM_POR_CHAVE", TPM_PADRAO))
+        if em_voo_por_chave is None:
+            em_voo_por_chave = int(os.getenv("GEMINI_EM_VOO_POR_CHAVE", EM_VOO_PADRAO))
+        if BACKEND_PADRAO == "gemini":
+            chaves = carregar_chaves_gemini(nomes)
+        else:
+            # Backends locais não usam chave: as "chaves" só reproduzem o paralelismo e o orçamento
+            chaves = [(f"{BACKEND_PADRAO.upper()}_{i + 1}", "") for i in range(CHAVES_FALSAS_PADRAO)]
+        return cls(chaves, nome_modelo, rpm, tpm, em_voo_por_chave)
+
+    @classmethod
+    def compartilhado(cls, nome_modelo):
+        """Pool único do processo para o modelo: scripts importados juntos (ex.: pelo orquestrador) dividem as chaves."""
+        with _lock_pools:
+            if nome_modelo not in _pools_compartilhados:
+                _pools_compartilhados[nome_modelo] = cls.de_ambiente(nome_modelo)
+            return _pools_compartilhados[nome_modelo]
+
+    def __len__(self):
+        return len(self.chaves)
+
+    def definir_em_voo_por_chave(self, em_voo_por_chave):
+        """Ajusta quantas requisições simultâneas cada chave pode ter."""
+        with self._condicao:
+            for chave in self.chaves:
+                chave.max_em_voo = em_voo_por_chave
+            self._condicao.notify_all()
+
+    def adquirir(self, tokens_estimados):
+        """Bloqueia até alguma chave ter orçamento e reserva a de maior folga."""
+        with self._condicao:
+            while True:
+                candidatas = [c for c in self.chaves if c.em_voo < c.max_em_voo]
+                prontas = [c for c in candidatas if c.limitador.tempo_de_espera(tokens_estimados) <= 0]
+                if prontas:
+                    chave = max(prontas, key=lambda c: c.folga())
+                    chave.limitador.aguardar(tokens_estimados)
+                    chave.em_voo += 1
+                    return chave
+                if candidatas:
+                    espera = min(c.limitador.tempo_de_espera(tokens_estimados) for c in candidatas)
+                else:
+                    espera = None  # Todas as vagas ocupadas: aguarda uma liberação
+                self._condicao.wait(timeout=espera)
+
+    def liberar(self, chave):
+        """Devolve a vaga ocupada na chave."""
+        with self._condicao:
+            chave.em_voo -= 1
+            self._condicao.notify_all()
+
+    @contextmanager
+    def usar_chave(self, tokens_estimados):
+        chave = self.adquirir(tokens_estimados)
+        try:
+            yield chave
+        finally:
+            self.liberar(chave)
+
+    def registrar_tokens(self, chave, tokens_estimados, tokens_reais):
+        """Corrige a reserva de TPM da chave com a contagem real devolvida pela API."""
+        if tokens_reais is not None:
+            chave.limitador.ajustar_tokens(tokens_estimados, tokens_reais)
+
+    def registrar_erro_quota(self, chave, erro=None):
+        """Coloca a chave em cooldown e zera sua folga.
+
+        O cooldown respeita o retry-after do servidor; sem ele, cresce exponencialmente
+        (com jitter) a cada 429 seguido da mesma chave.
+        """
+        retry_after = getattr(erro, "retry_after", None) if isinstance(erro, ErroGemini) else None
+        if retry_after is None and erro is not None:
+            retry_after = extrair_retry_after(erro)
+        espera = BACKOFF_QUOTA.espera(chave.erros_quota_consecutivos, retry_after)
+        chave.erros_quota += 1
+        chave.erros_quota_consecutivos += 1
+        chave.limitador.suspender(espera)
+        chave.limitador.esgotar()
+        logger.warning(f"Chave {chave.nome} em cooldown por {espera:.0f}s após erro de quota.")
+        with self._condicao:
+            self._condicao.notify_all()
+
+    def executar(self, tokens_estimados, chamada, max_tentativas_transitorias=MAX_TENTATIVAS_TRANSITORIAS):
+        """Executa `chamada(chave)` aplicando a política de cada tipo de ErroGemini.
+
+        - ErroLimiteTaxa: a chave entra em cooldown e a chamada vai para outra chave
+          (até uma vez por chave do pool; depois o erro é propagado).
+        - ErroTransitorio: repete após backoff exponencial com jitter, sem segurar a vaga.
+        - ErroConteudoBloqueado, ErroPermanente e exceções não classificadas: propagados.
+
+        Retorna (resultado, chave usada).
+        """
+        erros_quota = 0
+        tentativas_transitorias = 0
+        while True:
+            espera = None
+            chave = self.adquirir(tokens_estimados)
+            inicio = time.perf_counter()
+            resultado_chamada = "erro"
+            try:
+                resultado = chamada(chave)
+                resultado_chamada = "sucesso"
+                chave.erros_quota_consecutivos = 0
+                return resultado, chave
+            except ErroLimiteTaxa as e:
+                resultado_chamada = "limite_taxa"
+                erros_quota_gemini.incrementar(chave=chave.nome)
+                self.registrar_erro_quota(chave, e)
+                erros_quota += 1
+                if erros_quota >= len(self):
+                    raise
+            except ErroTransitorio as e:
+                resultado_chamada = "transitorio"
+                if tentativas_transitorias >= max_tentativas_transitorias:
+                    raise
+                espera = BACKOFF_TRANSITORIO.espera(tentativas_transitorias, e.retry_after)
+                tentativas_transitorias += 1
+                logger.warning(f"Erro transitório na chave {chave.nome}: {e}. Nova tentativa em {espera:.1f}s.")
+            finally:
+                latencia_gemini.observar(time.perf_counter() - inicio, chave=chave.nome, resultado=resultado_chamada)
+                self.liberar(chave)
+            if espera is not None:
+                time.sleep(espera)
@@ -0,0 +1,152 @@
+import os
+import time
+import logging
+import argparse
+from pathlib import Path
+import numpy as np
+from pymongo import MongoClient, UpdateOne
+from dotenv import load_dotenv
+from dataset.migracao_dados.classificador_local import NUM_CLASSES, ClassificadorLocal
+from dataset.migracao_dados.consultas_mongo import (
+    CAMPO_PRIORIDADE_ROTULAGEM,
+    CONSULTA_PENDENTES_ROTULAGEM,
+    PRIORIZACAO_ROTULAGEM_ATIVADA,
+)
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+load_dotenv(Path(__file__).parent.parent.parent / 'projeto' / '.env')
+
+# Aprendizado ativo na rotulagem: o classificador local pontua os chunks pendentes e a fila
+# reserva primeiro os mais úteis para o dataset balanceado —
+#   prioridade = PESO_INCERTEZA * entropia normalizada
+#              + PESO_CLASSE * soma_c P(c) * falta_c,   falta_c = fração do alvo da classe ainda sem rótulo
+# Classes que já têm rótulos suficientes para o balanceamento deixam de atrair a quota.
+ALVO_POR_CLASSE = int(os.getenv("BALANCEAMENTO_ALVO_POR_CLASSE", "3333"))  # o mesmo do balanceador
+PESO_INCERTEZA = float(os.getenv("PRIORIZACAO_PESO_INCERTEZA", "0.5"))
+PESO_CLASSE = float(os.getenv("PRIORIZACAO_PESO_CLASSE", "1.0"))
+# Repontuação completa (as faltas por classe mudam conforme os rótulos chegam); entre uma e
+# outra, só os chunks ainda sem prioridade são pontuados, no máximo a cada INTERVALO_PONTUACAO_NOVOS.
+# Sem prioridade, o chunk fica no fim da ordem de reserva (nulo vem depois dos números).
+INTERVALO_REPONTUACAO_SEGUNDOS = int(os.getenv("PRIORIZACAO_INTERVALO_REPONTUACAO_SEGUNDOS", "600"))
+INTERVALO_PONTUACAO_NOVOS_SEGUNDOS = int(os.getenv("PRIORIZACAO_INTERVALO_NOVOS_SEGUNDOS", "30"))
+TAMANHO_LOTE_PONTUACAO = 1000
+
+
+def faltas_por_classe(contagens, alvo=ALVO_POR_CLASSE):
+    """Fração do alvo de cada classe que ainda falta rotular (0 quando a classe já chegou ao alvo)."""
+    contagens = np.asarray(contagens, dtype=np.float64)
+    return np.clip((alvo - contagens) / max(alvo, 1), 0.0, 1.0)
+
+
+def pontuar(probabilidades, faltas, peso_incerteza=PESO_INCERTEZA, peso_classe=PESO_CLASSE):
+    """Prioridade de cada linha de `probabilidades` (matriz textos x classes), vetorizada."""
+    probabilidades = np.clip(probabilidades, 1e-12, 1.0)
+    entropia = -(probabilidades * np.log(probabilidades)).sum(axis=1) / np.log(probabilidades.shape[1])
+    return peso_incerteza * entropia + peso_classe * (probabilidades @ faltas)
+
+
+def contar_rotulados(collection_rotulados):
+    """Rótulos gravados por classe, com uma agregação."""
+    contagens = np.zeros(NUM_CLASSES, dtype=np.int64)
+    pipeline = [{"$group": {"_id": "$classificacao_acesso", "total": {"$sum": 1}}}]
+    for grupo in collection_rotulados.aggregate(pipeline):
+        try:
+            classe = int(grupo["_id"])
+        except (TypeError, ValueError):
+            continue
+        if 0 <= classe < NUM_CLASSES:
+            contagens[classe] += grupo["total"]
+    return contagens
+
+
+class PriorizadorRotulagem:
+    """Grava `prioridade_rotulagem` nos chunks sintéticos pendentes.
+
+    `atualizar` é chamado no laço de reserva da rotulagem: pontua os chunks novos a cada
+    `intervalo_novos_segundos` e repontua todos os pendentes a cada `intervalo_repontuacao_segundos`.
+    """
+
+    def __init__(self, collection_chunks, collection_rotulados, modelo,
+                 intervalo_repontuacao_segundos=INTERVALO_REPONTUACAO_SEGUNDOS,
+                 intervalo_novos_segundos=INTERVALO_PONTUACAO_NOVOS_SEGUNDOS):
+        self.collection_chunks = collection_chunks
+        self.collection_rotulados = collection_rotulados
+        self.modelo = modelo
+        self.intervalo_repontuacao_segundos = intervalo_repontuacao_segundos
+        self.intervalo_novos_segundos = intervalo_novos_segundos
+        self.faltas = None
+        self._ultima_repontuacao = None
+        self._ultima_pontuacao = None
+
+    def pontuar_pendentes(self, somente_novos=False):
+        """Pontua os chunks pendentes (só os sem prioridade, com `somente_novos`); retorna quantos."""
+        filtro = dict(CONSULTA_PENDENTES_ROTULAGEM)
+        if somente_novos:
+            filtro[CAMPO_PRIORIDADE_ROTULAGEM] = None
+        cursor = self.collection_chunks.find(filtro, {"texto_sintetico": 1}).batch_size(TAMANHO_LOTE_PONTUACAO)
+        total = 0
+        lote = []
+        for doc in cursor:
+            lote.append(doc)
+            if len(lote) >= TAMANHO_LOTE_PONTUACAO:
+                total += self._gravar_prioridades(lote)
+                lote = []
+        if lote:
+            total += self._gravar_prioridades(lote)
+        return total
+
+    def _gravar_prioridades(self, docs):
+        prioridades = pontuar(self.modelo.probabilidades([doc.get("texto_sintetico") or "" for doc in docs]), self.faltas)
+        # O filtro de status evita reescrever chunks que outro processo reservou nesse meio-tempo
+        operacoes = [
+            UpdateOne({"_id": doc["_id"], "status_rotulagem": "pendente"},
+                      {"$set": {CAMPO_PRIORIDADE_ROTULAGEM: round(float(prioridade), 6)}})
+            for doc, prioridade in zip(docs, prioridades)
+        ]
+        self.collection_chunks.bulk_write(operacoes, ordered=False)
+        return len(operacoes)
+
+    def atualizar(self):
+        """Pontua os chunks novos ou, vencido o intervalo, repontua todos os pendentes."""
+        agora = time.monotonic()
+        completa = self._ultima_repontuacao is None or agora - self._ultima_repontuacao >= self.intervalo_repontuacao_segundos
+        if not completa and agora - self._ultima_pontuacao < self.intervalo_novos_segundos:
+            return 0
+        self._ultima_pontuacao = agora
+        if completa:
+            contagens = contar_rotulados(self.collection_rotulados)
+            self.faltas = faltas_por_classe(contagens)
+            self._ultima_repontuacao = agora
+        inicio = time.perf_counter()
+        total = self.pontuar_pendentes(somente_novos=not completa)
+        if completa or total:
+            logger.info(f"Priorização: {total} chunks pendentes pontuados em {time.perf_counter() - inicio:.1f}s "
+                        f"(faltas por classe {np.round(self.faltas, 2).tolist()}).")
+        return total
+
+
+def criar_priorizador(db):
+    """Priorizador da rotulagem, ou None com a priorização desligada ou sem classificador local treinado."""
+    if not PRIORIZACAO_ROTULAGEM_ATIVADA:
+        return None
+    modelo = ClassificadorLocal.compartilhado(exigir_prefiltro=False)
+    if modelo is None:
+        logger.warning("Priorização da rotulagem ativada sem classificador local; os chunks seguem sem prioridade.")
+        return None
+    return PriorizadorRotulagem(db["chunks_sinteticos"], db["chunks_rotulados"], modelo)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pontua os chunks sintéticos pendentes para a rotulagem priorizada.")
+    parser.parse_args()
+    mongo_uri = f"mongodb://{os.getenv('MONGO_USER', 'usuario')}:{os.getenv('MONGO_PASS', 'senha')}@{os.getenv('MONGO_HOST', 'localhost')}:{os.getenv('MONGO_PORT', '27017')}/"
+    client = MongoClient(mongo_uri)
+    try:
+        modelo = ClassificadorLocal.compartilhado(exigir_prefiltro=False)
+        if modelo is None:
+            raise SystemExit("Treine o classificador local antes (classificador_local.py).")
+        PriorizadorRotulagem(client["dataset_treinamento"]["chunks_sinteticos"], client["dataset_treinamento"]["chunks_rotulados"], modelo).atualizar()
+    finally:
+        client.close()
@@ -0,0 +1,545 @@
+import os
+import json
+import zlib
+import logging
+import argparse
+from dataset.migracao_dados.cache_respostas_gemini import CARACTERES_POR_TOKEN, PromptComPrefixo
+from dataset.migracao_dados.metricas_pipeline import chamadas_por_prompt, tokens_por_prompt
+
+logger = logging.getLogger(__name__)
+
+# Registro das versões dos prompts do Gemini. Cada template (tarefa, versão) é montado uma vez,
+# na importação: o prefixo fixo e a sua contagem de tokens ficam prontos e cada chamada só
+# preenche o sufixo. Versões de uma mesma tarefa podem rodar lado a lado:
+# PROMPT_VERSOES_SINTESE="v2.2,v2.3" reparte as chamadas entre elas pelo hash da entrada, e
+# `gemini_prompt_tokens_total` (ou `custo_por_chamada`) compara o custo de cada versão.
+TAREFA_CLASSIFICACAO = "classificacao"
+TAREFA_CLASSIFICACAO_LOTE = "classificacao_lote"
+TAREFA_SINTESE = "sintese"
+TAREFA_AUMENTO = "aumento_sigiloso"
+JSON_COMPACTO = {"separators": (",", ":")}
+
+
+class TemplatePrompt:
+    """Uma versão de prompt: prefixo fixo + sufixo com campos `{nome}` preenchidos a cada chamada.
+
+    Campos que não são str entram serializados em JSON com `opcoes_json` (compacto por padrão).
+    """
+
+    def __init__(self, tarefa, versao, prefixo, sufixo, opcoes_json=JSON_COMPACTO):
+        self.tarefa = tarefa
+        self.versao = versao
+        self.prefixo = prefixo
+        self.sufixo = sufixo
+        self.opcoes_json = dict(opcoes_json)
+        self.tokens_prefixo = len(prefixo) // CARACTERES_POR_TOKEN
+
+    def serializar(self, valor):
+        return json.dumps(valor, ensure_ascii=False, **self.opcoes_json)
+
+    def montar(self, **campos):
+        """PromptComPrefixo com o sufixo preenchido por `campos`."""
+        valores = {nome: valor if isinstance(valor, str) else self.serializar(valor) for nome, valor in campos.items()}
+        return PromptComPrefixo(self.prefixo, self.sufixo.format(**valores), tarefa=self.tarefa, versao=self.versao)
+
+
+class RegistroPrompts:
+    """Templates por tarefa e versão, com a versão padrão e as versões ativas de cada tarefa."""
+
+    def __init__(self):
+        self._templates = {}
+        self._padrao = {}
+        self._ativas = {}
+
+    def registrar(self, template, padrao=False):
+        """Registra o template; a primeira versão de uma tarefa é a padrão até outra ser marcada com `padrao`."""
+        versoes = self._templates.setdefault(template.tarefa, {})
+        if template.versao in versoes:
+            raise ValueError(f"Versão '{template.versao}' já registrada para a tarefa '{template.tarefa}'.")
+        versoes[template.versao] = template
+        if padrao or template.tarefa not in self._padrao:
+            self._padrao[template.tarefa] = template.versao
+        return template
+
+    def tarefas(self):
+        return list(self._templates)
+
+    def versoes(self, tarefa):
+        return list(self._templates.get(tarefa, {}))
+
+    def obter(self, tarefa, versao=None):
+        """Template da versão pedida (ou da padrão) da tarefa."""
+        versoes = self._templates.get(tarefa)
+        if not versoes:
+            raise ValueError(f"Tarefa de prompt desconhecida: '{tarefa}' (registradas: {', '.join(self._templates)}).")
+        versao = versao or self._padrao[tarefa]
+        if versao not in versoes:
+            raise ValueError(f"Versão '{versao}' não registrada para a tarefa '{tarefa}' (disponíveis: {', '.join(versoes)}).")
+        return versoes[versao]
+
+    def ativar(self, tarefa, versoes):
+        """Define as versões entre as quais `escolher` reparte as chamadas da tarefa."""
+        self._ativas[tarefa] = [self.obter(tarefa, versao).versao for versao in versoes]
+
+    def ativas(self, tarefa):
+        """Versões em uso: PROMPT_VERSOES_<TAREFA> (separadas por vírgula) ou só a padrão."""
+        if tarefa not in self._ativas:
+            configuradas = os.getenv(f"PROMPT_VERSOES_{tarefa.upper()}", "")
+            self.ativar(tarefa, [v.strip() for v in configuradas.split(",") if v.strip()] or [self.obter(tarefa).versao])
+        return self._ativas[tarefa]
+
+    def escolher(self, tarefa, chave=""):
+        """Template para uma chamada; com várias versões ativas, a mesma `chave` (ex.: o texto) cai sempre na mesma."""
+        ativas = self.ativas(tarefa)
+        if len(ativas) == 1:
+            return self.obter(tarefa, ativas[0])
+        return self.obter(tarefa, ativas[zlib.crc32(chave.encode("utf-8")) % len(ativas)])
+
+
+def custo_por_chamada():
+    """Tokens médios por chamada de cada (tarefa, versão) enviada ao Gemini neste processo."""
+    tokens = {}
+    for rotulos, valor in tokens_por_prompt.series():
+        tokens.setdefault((rotulos["tarefa"], rotulos["versao"]), {})[rotulos["direcao"]] = valor
+    custos = []
+    for rotulos, chamadas in sorted(chamadas_por_prompt.series(), key=lambda item: (item[0]["tarefa"], item[0]["versao"])):
+        if not chamadas:
+            continue
+        por_direcao = tokens.get((rotulos["tarefa"], rotulos["versao"]), {})
+        custos.append({
+            "tarefa": rotulos["tarefa"],
+            "versao": rotulos["versao"],
+            "chamadas": chamadas,
+            **{f"tokens_{direcao}_por_chamada": round(por_direcao.get(direcao, 0) / chamadas, 1) for direcao in ("entrada", "saida", "em_cache")},
+        })
+    return custos
+
+
+# Bloco fixo de instruções LGPD/LAI, comum à classificação individual e em lote
+DIRETRIZES_CLASSIFICACAO = """
+        Você é um Analista Sênior de Classificação de Dados em um órgão público brasileiro, especialista em conformidade com a Lei Geral de Proteção de Dados (LGPD - Lei 13.709/18) e a Lei de Acesso à Informação (LAI - Lei 12.527/11). Sua tarefa é analisar o texto fornecido e determinar o nível de acesso apropriado, seguindo diretrizes rigorosas.
+
+        ### PRINCÍPIOS-CHAVE PARA DECISÃO:
+        Antes de classificar, siga estes 3 princípios fundamentais. Estes princípios têm precedência e guiarão a aplicação das diretrizes de classificação subsequentes:
+        1.  **ATO PREPARATÓRIO vs. ATO FINAL:** Documentos que subsidiam uma decisão (pareceres, notas técnicas, relatórios de análise) são considerados **preparatórios** e devem, por padrão, ser classificados como **INTERNOS (1)**, mesmo que o ato final (o contrato, a portaria) seja público. O acesso a eles só é garantido após a edição do ato decisório final.
+            *Exemplo: Um "Parecer Técnico sobre Edital de Concurso" é interno (1), mesmo que o "Edital de Concurso" final seja público (2).*
+        2.  **INVESTIGAÇÃO E APURAÇÃO = SIGILO:** Qualquer documento que faça parte de um processo de investigação, sindicância, ou apuração de irregularidades (relatórios, denúncias, depoimentos) deve ser, por padrão, classificado como **RESTRITO (0)**, devido ao risco de dano grave à investigação e à imagem dos envolvidos, conforme exceções previstas na LAI.
+        3.  **DADO PESSOAL EM CONTEXTO ADMINISTRATIVO:** A simples presença de dados pessoais (nome, matrícula, cargo) em um documento de rotina administrativa interna (folha de ponto, despacho de processo, trâmite) justifica a classificação como **INTERNO (1)**, protegendo a privacidade do agente público sem ferir o interesse público geral.
+            *Exemplo: O nome de um servidor em uma folha de ponto é interno (1). O nome do gestor que assina um contrato público final é público (2) se for parte essencial do ato.*
+
+        ### DIRETRIZES DE CLASSIFICAÇÃO:
+        Avalie o documento e retorne:
+        1.  CLASSIFICACAO: Um número inteiro (0, 1 ou 2) para indicar a classificação de acesso:
+            * 0 (ACESSO RESTRITO): Documento protegido e acessível apenas por indivíduos com autorização legal específica.
+                Aplica-se se contiver:
+                * Informações de processos de apuração, sindicância ou disciplinares (PAD), cujo sigilo é essencial para garantir a eficácia da investigação e o direito à ampla defesa.
+                * Dados pessoais sensíveis (saúde, etnia, vida sexual, etc.) que, se divulgados, causariam dano significativo.
+                * Informações protegidas por sigilo legal (fiscal, bancário, de justiça, etc.).
+                * Informações estratégicas sigilosas da instituição.
+
+            * 1 (ACESSO INTERNO): Visível para o público interno, mas não para o externo.
+                Aplica-se a:
+                * Atos administrativos preparatórios, como Pareceres Jurídicos, Notas Técnicas, Relatórios de Análise de Risco e Despachos que fundamentam uma decisão futura.
+                * Documentos de tramitação administrativa que contenham dados pessoais de servidores ou partes, sem interesse público preponderante (ex: processos de férias, folhas de ponto, relatórios de atividades).
+                * Informações de gestão interna que não se enquadrem como sigilosas (nível 0).
+
+            * 2 (ACESSO PÚBLICO): Visível para toda a Internet.
+                Aplica-se a:
+                * Atos administrativos finais e de interesse geral (ex: editais, contratos finalizados e publicados, portarias de nomeação/exoneração, resultados de concursos).
+                * Documentos que não contêm dados pessoais ou cujo dado pessoal é parte essencial do caráter público do ato (nome do gestor que assina um contrato público).
+                * Importante: Esta classificação NÃO se aplica a documentos preparatórios, mesmo que tratem de temas que se tornarão públicos.
+
+        2.  EXPLICACAO: Em no máximo 3 frases, explique o motivo da classificação. Inicie a explicação identificando a natureza do documento (ex: "Trata-se de um ato preparatório...") e mencione o princípio ou a regra que aplicou.
+
+        3.  CONFIANCA: Um número de ponto flutuante entre 0.0 e 1.0.
+"""
+
+PREFIXO_CLASSIFICACAO = DIRETRIZES_CLASSIFICACAO + """
+        Responda OBRIGATORIAMENTE com um objeto JSON, sem nenhum texto adicional antes ou depois, seguindo o esquema:
+        ```json
+        {
+        "CLASSIFICACAO": <0, 1 ou 2>,
+        "EXPLICACAO": "<explicação curta>",
+        "CONFIANCA": <número entre 0.0 e 1.0>
+        }
+"""
+
+SUFIXO_CLASSIFICACAO = """        Texto para análise:
+        {texto}
+    """
+
+PREFIXO_CLASSIFICACAO_LOTE = DIRETRIZES_CLASSIFICACAO + """
+        Você receberá uma LISTA JSON de textos, cada um com "id" e "texto". Classifique CADA texto de forma independente.
+        Responda OBRIGATORIAMENTE com uma lista JSON, sem nenhum texto adicional antes ou depois, contendo exatamente um objeto por texto recebido, seguindo o esquema:
+        [
+        {
+        "id": "<mesmo id do texto de entrada>",
+        "CLASSIFICACAO": <0, 1 ou 2>,
+        "EXPLICACAO": "<explicação curta>",
+        "CONFIANCA": <número entre 0.0 e 1.0>
+        }
+        ]
+"""
+
+SUFIXO_CLASSIFICACAO_LOTE = """        Textos para análise:
+        {lote}
+    """
+
+# Síntese: instruções e exemplo fixos; o sufixo traz o lote de chunks
+PREFIXO_SINTESE = """
+        Você é um especialista na criação de dados sintéticos para treinar IAs na classificação de sigilo de documentos, com foco na LGPD e LAI. Sua especialidade é o domínio administrativo e jurídico.
+        Sua tarefa é processar a lista de textos JSON abaixo. Para cada texto, crie uma nova versão sintética, seguindo as regras à risca para garantir a qualidade do dataset de treinamento.
+
+        REGRAS PRINCIPAIS:
+
+        1. OBJETIVO PRINCIPAL - MANTER O NÍVEL DE SIGILO: O propósito final é treinar um modelo de IA para classificar documentos conforme seu nível de sigilo. Portanto, a regra mais importante é: o texto sintético deve manter o mesmo contexto e o mesmo potencial de sensibilidade do texto original. Se o original continha dados sensíveis (mesmo que anonimizados como <DADOS_BANCARIOS>), o texto sintético deve conter dados fictícios igualmente sensíveis (ex: números de contas bancárias, valores de transações, etc.). A natureza do documento (um relatório financeiro, um ofício judicial, um memorando interno) deve ser preservada.
+
+        2. REESCRITA COMPLETA COM DADOS FICTÍCIOS: O novo texto deve ser uma paráfrase completa do original. Todas as informações específicas (nomes, datas, locais, valores, números de processo, etc.) devem ser substituídas por dados totalmente fictícios, mas que sejam realistas e plausíveis dentro do contexto administrativo/jurídico.
+
+        3. SUBSTITUIÇÃO OBRIGATÓRIA DE PLACEHOLDERS: O texto original contém placeholders anonimizados no formato <TIPO_DADO> (ex: <PESSOA>, <ORGANIZAÇÃO>). Você DEVE OBRIGATORIAMENTE substituir cada um desses placeholders por uma informação fictícia correspondente ao tipo indicado. Por exemplo, <PESSOA> vira "Sra. Carolina Matos", <ORGANIZAÇÃO> vira "Consultoria Integral Ltda.", e assim por diante.
+
+        4. CONCISÃO E LIMITE DE TAMANHO: O "texto_sintetico" gerado NÃO PODE ULTRAPASSAR 200 PALAVRAS. Seja objetivo e preserve a essência do documento original dentro deste limite.
+
+        5. SAÍDA ESTRITAMENTE EM JSON: Sua resposta DEVE ser uma string JSON válida, representando uma lista de objetos. Não inclua nenhum texto, explicação ou formatação fora do JSON (absolutamente nenhum ```json no início ou no fim).
+
+        EXEMPLO DE TRANSFORMAÇÃO:
+
+        ENTRADA (Exemplo de um item da lista):
+
+        JSON
+
+        {
+          "id_original": "exemplo_id_123",
+          "texto_original": "OFÍCIO Nº 101/2024 - <ORGANIZAÇÃO> Requerimento de Pagamento. RECLAMANTE: <PESSOA>. RECLAMADA: <ORGANIZAÇÃO>. Foi arbitrado pelo Juízo, a título de honorários periciais, o valor de R$ 1.500,00."
+        }
+        SAÍDA ESPERADA (Como você deve gerar o item correspondente na lista de resultados):
+
+        JSON
+
+        {
+          "id_original": "exemplo_id_123",
+          "texto_sintetico": "COMUNICADO OFICIAL Nº 245/2024 - TRIBUNAL REGIONAL DO TRABALHO. Assunto: Solicitação de Quitação de Verba Honorária. Requerente: Sra. Juliana Almeida. Requerida: Empresa de Logística Brasil Total S.A. Foi estipulado por este Juízo, para cobrir os honorários do perito, a quantia de R$ 1.850,00.",
+          "confianca_geracao": 0.98
+        }
+        ESTRUTURA DE ENTRADA (POR ITEM):
+
+        "id_original": Identificador do chunk.
+
+        "texto_original": O texto a ser reescrito.
+
+        ESTRUTURA DE SAÍDA OBRIGATÓRIA (POR ITEM):
+
+        "id_original": O mesmo identificador do chunk de entrada.
+
+        "texto_sintetico": O texto totalmente reescrito com dados fictícios, placeholders substituídos e com no máximo 200 palavras.
+
+        "confianca_geracao": Um float de 0.0 a 1.0 indicando sua confiança na qualidade da geração.
+
+"""
+
+SUFIXO_SINTESE = """        LOTE DE CHUNKS PARA PROCESSAR:
+        {lote}
+    """
+
+# Aumento sigiloso: persona, níveis de sigilo, processo e formato da saída; o sufixo traz o
+# texto de inspiração.
+# CONFIRMADO: Prompt com a lógica de níveis e o campo 'nivel_sigilo_gerado' na saída.
+PREFIXO_AUMENTO = """
+        Você é uma fusão de dois especialistas de alto escalão em um Tribunal Regional do Trabalho (TRT): o Corregedor-Geral, responsável pela fiscalização e disciplina interna, e o Encarregado de Proteção de Dados (DPO), guardião da conformidade com a LGPD. Seu objetivo é criar um arsenal de documentos sintéticos ultrarrealistas para treinar uma IA de classificação de sigilo. A IA precisa aprender a identificar os mais variados e graves vazamentos de dados possíveis dentro do ecossistema do tribunal.
+
+        MISSÃO:
+        Sua missão é gerar um documento sintético SIGILOSO, inspirado por um tema vago, mas transformado em um cenário que represente uma violação grave ou potencialmente grave da LGPD no contexto de servidores e magistrados do TRT. Esqueça documentos genéricos. Pense em comunicações internas, despachos, relatórios e processos que jamais poderiam se tornar públicos.
+
+        DEFINIÇÃO DOS NÍVEIS DE SIGILO (Referência para sua criação):
+
+        SIGILOSO - NÍVEL ALTO: Informações cujo vazamento aniquilaria reputações, causaria danos financeiros ou psicológicos graves, colocaria vidas em risco ou comprometeria investigações críticas. O acesso é para pouquíssimas pessoas nominadas.
+
+        Exemplos no contexto do TRT:
+
+        Laudo psiquiátrico detalhado de um magistrado, indicando um transtorno mental que afeta sua capacidade de julgamento.
+
+        Relatório de investigação conclusivo sobre qualquer forma de assédio (moral ou sexual) contra servidores, com transcrição de depoimentos de natureza íntima.
+
+        Pedido de remoção ou licença de um servidor por comprovada ameaça de morte ou coação por parte de grupos de risco ou facções criminosas.
+
+        Detalhes de ofício judicial para desconto de pensão alimentícia diretamente do salário de um magistrado ou servidor, incluindo dados dos beneficiários.
+
+        Informações sobre acordo financeiro confidencial, com valores e termos, para encerrar um processo disciplinar por conduta inadequada.
+
+        Dados genéticos ou de exames de DNA de um periciando em processo trabalhista para investigação de paternidade ou doença ocupacional.
+
+        Comunicação sigilosa da corregedoria a órgãos de controle sobre suspeita de enriquecimento ilícito ou improbidade administrativa de um servidor.
+
+        Processo de interdição de um servidor, com laudos médicos que atestam sua incapacidade para os atos da vida civil.
+
+        Registros detalhados de participação de um funcionário em programas de reabilitação para dependência de substâncias.
+
+        Medida protetiva de urgência expedida em caso de violência doméstica envolvendo um(a) integrante do tribunal.
+
+        Análise de dados bancários e fiscais de um juiz ou servidor em processo disciplinar sigiloso.
+
+        Relatório de inteligência sobre fatos desabonadores da vida pregressa de um candidato em concurso para a magistratura.
+
+        Relatório de auditoria de TI revelando o acesso indevido de um servidor a processos sigilosos ou a dados pessoais de colegas.
+
+        "Dossiê" ou anotações não oficiais de um gestor sobre dados sensíveis de um subordinado (orientação sexual, filiação político-partidária, etc.), usado para fins de perseguição.
+
+        Comunicação confidencial de órgãos de controle (Receita Federal, COAF) detalhando movimentações financeiras atípicas de um magistrado.
+
+        Laudo médico detalhado sobre a condição de saúde grave de um dependente, anexado a um pedido de licença ou benefício.
+
+        Transcrição de interceptação telefônica autorizada, compartilhada com a corregedoria, detalhando conversas pessoais comprometedoras de um servidor.
+
+        Relatório social detalhado sobre as condições de extrema vulnerabilidade social e familiar de um servidor que solicita remoção.
+
+        Documento interno que justifica a negação de um direito a um titular de dados (servidor), configurando uma potencial violação direta da LGPD.
+
+        Informações sobre diagnóstico de doença estigmatizante ou de notificação compulsória de um servidor ou parte em um processo.
+
+        Registros de atendimentos de um servidor pelo serviço de psicologia ou assistência social do tribunal, detalhando questões de foro íntimo e alta vulnerabilidade emocional.
+
+        SIGILOSO - NÍVEL MÉDIO: Informações confidenciais que, se vazadas, causariam constrangimento severo, prejuízo profissional ou violação de privacidade significativa para os envolvidos.
+
+        Exemplos no contexto do TRT:
+
+        Gestão de Pessoas e RH:
+
+        Avaliação de desempenho periódica, com feedbacks detalhados sobre pontos fortes e a desenvolver.
+
+        E-mails ou memorandos com feedback sobre a performance de estagiários ou aprendizes.
+
+        Processo de solicitação de remoção ou transferência por interesse pessoal, não relacionado à segurança.
+
+        Comunicações sobre o processo seletivo interno, incluindo lista de candidatos e justificativas para aprovação ou recusa.
+
+        Advertência ou notificação de suspensão por infração disciplinar de natureza leve (ex: atrasos, descumprimento de prazos).
+
+        Entrevista de desligamento, contendo as opiniões do servidor que está de saída sobre a gestão e o ambiente de trabalho.
+
+        Justificativas de ausência para resolver problemas pessoais ou familiares.
+
+        Saúde e Bem-estar (Não Graves):
+
+        Atestado médico para afastamento por doenças comuns (gripe, viroses) ou procedimentos de baixa complexidade.
+
+        Agendamento de perícias médicas ou exames de rotina para servidores.
+
+        Pedidos de reembolso ou comprovantes de despesas com consultas, exames ou medicamentos de uso contínuo para doenças não estigmatizantes.
+
+        Laudos de fisioterapia ou relatórios sobre tratamento de Lesão por Esforço Repetitivo (LER/DORT).
+
+        Financeiro e Administrativo:
+
+        Solicitação de adiantamento salarial ou de férias.
+
+        Relatórios detalhados de despesas de viagem para fins de reembolso (diárias, passagens, etc.).
+
+        Rascunhos de atos normativos (portarias, resoluções) antes de sua revisão final e publicação oficial.
+
+        Atas de reuniões de equipe que detalham dificuldades operacionais, metas não atingidas ou conflitos internos de baixo impacto.
+
+        E-mails trocados entre setores para planejamento de orçamento ou alocação de recursos.
+
+        Jurídico e Processual (Interno):
+
+        Comunicações entre a defesa de um servidor e a comissão de PAD, em fases iniciais ou sobre questões procedimentais.
+
+        Parecer jurídico interno sobre questões administrativas de impacto moderado, que orienta a tomada de decisão de um gestor.
+
+        Solicitação de atualização de dados cadastrais sensíveis (endereço, estado civil, dados bancários para depósito).
+
+        Pedido de certidão ou cópia de documentos funcionais para fins particulares (ex: financiamento imobiliário).
+
+        Dados Sensíveis por Definição (LGPD):
+
+        Registro de filiação sindical de um servidor, contido em um formulário de desconto em folha ou em listas da associação.
+
+        Solicitação de dispensa ou de horário especial para cumprimento de obrigações religiosas específicas (ex: Sabbat, Ramadã, etc.).
+
+        Anotações ou comentários informais de um gestor sobre a convicção política ou filosófica de um membro da equipe, registradas em e-mails ou rascunhos de avaliação.
+
+        Planilha de controle para o cadastro de dados biométricos (digital ou facial) dos servidores para um novo sistema de acesso ou ponto eletrônico.
+
+        Formulário de declaração de etnia ou raça para fins de políticas de cotas ou censo interno.
+
+        Pesquisa de clima organizacional que, embora anônima na coleta, possa ter seus resultados brutos cruzados para identificar opiniões individuais.
+
+        PROCESSO DE PENSAMENTO E GERAÇÃO (OBRIGATÓRIO):
+
+        PASSO 1: ANÁLISE DO CONCEITO-CHAVE E GATILHOS DE SENSIBILIDADE.
+        Leia o "Texto de Inspiração" e extraia o conceito mais básico e abstrato. Identifique palavras-chave ou subtemas que possam indicar dados pessoais sensíveis (saúde, filiação, sexualidade, etc.), vulnerabilidades (financeira, psicológica, segurança) ou situações de risco à privacidade que o texto de inspiração, mesmo vago, possa sugerir. Estes serão seus "gatilhos de sensibilidade" para a próxima etapa.
+        Ex: "servidor em férias" -> conceito: afastamento temporário. Gatilho: possíveis despesas médicas durante a viagem, ou licença por motivo de saúde.
+        Ex: "compra de cadeiras" -> conceito: aquisição de material. Gatilho: fraude em licitação, ou dados bancários do fornecedor.
+
+        PASSO 2: COMBINAÇÃO CRIATIVA (O CORAÇÃO DA VARIEDADE).
+        Para gerar um cenário único, escolha aleatoriamente UM item de CADA UM dos três eixos abaixo. A combinação desses três eixos definirá a natureza do seu documento.
+
+        EIXO 1: TIPO DE DOCUMENTO (A forma):
+
+        Portaria da Presidência
+
+        Despacho da Corregedoria
+
+        Ofício Circular Interno (Restrito)
+
+        Relatório Conclusivo de Sindicância
+
+        Atestado Médico (com detalhes)
+
+        Laudo Pericial Psiquiátrico
+
+        Transcrição de Depoimento (PAD)
+
+        E-mail Confidencial entre Diretores
+
+        Folha de Pagamento Detalhada (com descontos)
+
+        Pedido de Remoção por Segurança
+
+        Ata de Reunião de Colegiado (Restrita)
+
+        Solicitação de Acesso a Dados Pessoais (via Lei de Acesso à Informação, mas interna)
+
+        Registro de Auditoria de Acesso a Sistemas
+
+        Análise de Fluxo de Dados (Mapeamento LGPD interno)
+
+        EIXO 2: ASSUNTO SENSÍVEL (O conteúdo):
+
+        Investigação de Assédio Moral/Sexual
+
+        Abertura de Processo Administrativo Disciplinar (PAD)
+
+        Diagnóstico de Doença Grave ou Incapacitante (CID)
+
+        Tratamento de Saúde Mental / Dependência Química
+
+        Conflito Interpessoal Grave (com ameaças)
+
+        Suspeita de Fraude ou Corrupção
+
+        Análise de Desempenho para Exoneração
+
+        Detalhes de Dificuldade Financeira (empréstimos, dívidas)
+
+        Pedido de Proteção a Testemunha (em processo interno)
+
+        Informação sobre Orientação Sexual ou Identidade de Gênero
+
+        Solicitação de Anonimização/Exclusão de Dados Negada (com justificativa)
+
+        Relato de Violação de Dados Pessoais (Data Breach)
+
+        Decisão sobre Compartilhamento de Dados com Terceiros
+
+        Monitoramento de Comunicações Internas (e-mail, chat)
+
+        Denúncia de Retaliação por Exercício de Direito LGPD
+
+        Resultado de Teste de Vazamento de Informações (Pentest)
+
+        EIXO 3: PARTES ENVOLVIDAS (Os atores):
+
+        Juiz Titular de Vara do Trabalho
+
+        Juiz Substituto
+
+        Diretor(a) de Secretaria
+
+        Técnico(a) Judiciário(a)
+
+        Analista Judiciário(a)
+
+        Oficial de Justiça Avaliador Federal
+
+        Perito Médico Judicial
+
+        Servidor(a) Comissionado(a)
+
+        Estagiário(a) de Direito
+
+        Membro da Comissão de Ética
+
+        Coordenador(a) de TI e Segurança da Informação
+
+        Advogado(a) de Servidor em PAD
+
+        Parente/Dependente de Magistrado/Servidor (com dados próprios)
+
+        Encarregado de Proteção de Dados (DPO)
+
+        Membro da Equipe de Tratamento de Incidentes (ETIR)
+
+        PASSO 3: TRANSFORMAÇÃO CONCEITUAL E ENFÂSE LGPD.
+        Use o conceito-chave e os gatilhos de sensibilidade do PASSO 1 como pivô para o cenário criado pela sua combinação de eixos do PASSO 2. A ligação deve ser inteligente e, sempre que possível, evidenciar uma potencial violação, risco ou tratamento sensível de dados pessoais conforme a LGPD.
+        Ex: Se a inspiração era "servidor em férias", o conceito é "afastamento temporário", e o gatilho "licença por motivo de saúde". Se a combinação foi "Atestado Médico" + "Tratamento de Saúde Mental" + "Juiz Substituto", a transformação seria um atestado detalhado de licença de um juiz substituto para tratamento de saúde mental, com o risco de vazamento pela sensibilidade do dado.
+
+        PASSO 4: GERAÇÃO DO DOCUMENTO REALISTA.
+        Escreva o documento, materializando a sua transformação, seguindo as diretrizes abaixo.
+
+        Diretriz de Formato e Estilo (MUITO IMPORTANTE): O texto_sintetico deve ser um fragmento contínuo de texto, como se fosse um parágrafo ou uma sequência de parágrafos extraídos de um documento maior ou de um e-mail. NÃO inclua títulos, cabeçalhos formais (como 'DE:', 'PARA:', 'ASSUNTO:'), nem seções numeradas ou com marcadores (como '1. DOS FATOS', '2. CONCLUSÃO'). O objetivo é simular um trecho de texto vazado, não um documento oficial completo e formatado.
+
+        Diretriz de Realismo: Seja extremamente verossímil. Incorpore jargões, números de processo fictícios (ex: PAD nº 1234/2025-TRT25), matrículas funcionais, datas, e referências a artigos de leis (LGPD, Lei 8.112/90, Provimentos da Corregedoria, Resoluções do CNJ) ou regimentos internos fictícios. Destaque por que a informação é sensível sob a LGPD (Art. 5º e 11º) e como seu vazamento implicaria em risco aos direitos e liberdades dos titulares (Art. 49º). Forneça detalhes que justifiquem o sigilo e a necessidade de tratamento restrito. Pense como um Corregedor analisando uma falha disciplinar e um DPO avaliando um incidente de segurança ou privacidade.
+
+        Diretriz de Tamanho e Concisão (CRÍTICO): O texto final gerado (texto_sintetico) NÃO DEVE, EM HIPÓTESE ALGUMA, ULTRAPASSAR 200 PALAVRAS. A capacidade de resumir a essência de um documento complexo de forma concisa é parte da sua tarefa como especialista.
+
+        EXEMPLO DE TRANSFORMAÇÃO APLICANDO O NOVO PROCESSO:
+
+        Inspiração: "A servidora Maria Souza solicitou troca de monitor."
+
+        PASSO 1 (Análise): Conceito-chave é necessidade de equipamento específico por um servidor. Gatilho de Sensibilidade: possível condição de saúde que justifique a solicitação.
+
+        PASSO 2 (Combinação): Escolho aleatoriamente:
+
+        Eixo 1: Atestado Médico (com detalhes)
+
+        Eixo 2: Diagnóstico de Doença Grave ou Incapacitante (CID)
+
+        Eixo 3: Analista Judiciário(a)
+
+        PASSO 3 (Transformação): A necessidade de um equipamento específico não é por preferência, mas por uma condição médica grave. A Analista Judiciária Maria Souza precisa de um monitor especial devido a um laudo de doença degenerativa da visão, o que configura um tratamento de dado sensível sob a LGPD, com risco de discriminação caso vazado.
+
+        PASSO 4 (Geração): Gero um atestado médico detalhado para Maria Souza, matrícula 9876, emitido pelo Dr. Carlos Lima, CRM 12345, diagnosticando "Degeneração Macular (CID-10 H35.3)", recomendando trabalho remoto e o uso de um monitor de alta resolução com contraste adaptativo para evitar a progressão da cegueira. O documento é marcado como "CONFIDENCIAL", e o Art. 11 da LGPD justifica seu tratamento restrito devido à natureza de dado sensível de saúde. (Texto com ~90 palavras).
+
+        SAÍDA OBRIGATÓRIA (JSON VÁLIDO):
+        Sua resposta DEVE ser uma string JSON válida contendo um único objeto com as chaves:
+
+        "justificativa_transformacao": Uma frase curta explicando a conexão lógica que você criou (Ex: "Transformei a solicitação de um item em um laudo médico que justifica a necessidade do item.").
+
+        "nivel_sigilo_gerado": A string exata do nível de sigilo que melhor representa o documento gerado (Ex: "SIGILOSO - NÍVEL ALTO" ou "SIGILOSO - NÍVEL MÉDIO").
+
+        "texto_sintetico": O texto completo do documento sigiloso gerado, em formato de string, com no máximo 200 palavras.
+
+        "confianca_geracao_sintetica": Um número de 0.0 a 1.0.
+
+"""
+
+SUFIXO_AUMENTO = """        TEXTO DE INSPIRAÇÃO PARA ESTA TAREFA:
+        "{inspiracao}"
+
+        GERE AGORA SEU DOCUMENTO SIGILOSO SEGUINDO TODOS OS PASSOS:
+        """
+
+
+prompts = RegistroPrompts()
+prompts.registrar(TemplatePrompt(TAREFA_CLASSIFICACAO, "v2.6", PREFIXO_CLASSIFICACAO, SUFIXO_CLASSIFICACAO))
+# v2.6-lote serializa o lote com os separadores padrão do json.dumps, como antes do registro
+prompts.registrar(TemplatePrompt(TAREFA_CLASSIFICACAO_LOTE, "v2.6-lote", PREFIXO_CLASSIFICACAO_LOTE, SUFIXO_CLASSIFICACAO_LOTE, opcoes_json={}))
+prompts.registrar(TemplatePrompt(TAREFA_SINTESE, "v2.2", PREFIXO_SINTESE, SUFIXO_SINTESE, opcoes_json={"indent": 2}))
+# v2.3: mesmo texto, lote em JSON compacto (a indentação só gastava tokens de entrada)
+prompts.registrar(TemplatePrompt(TAREFA_SINTESE, "v2.3", PREFIXO_SINTESE, SUFIXO_SINTESE), padrao=True)
+prompts.registrar(TemplatePrompt(TAREFA_AUMENTO, "v3.7", PREFIXO_AUMENTO, SUFIXO_AUMENTO))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Lista as versões de prompt registradas e o tamanho do prefixo fixo de cada uma.")
+    parser.parse_args()
+    logger.info("tarefa             | versão     | tokens do prefixo | situação")
+    for tarefa in prompts.tarefas():
+        for versao in prompts.versoes(tarefa):
+            template = prompts.obter(tarefa, versao)
+            situacao = "padrão" if versao == prompts.obter(tarefa).versao else ""
+            if versao in prompts.ativas(tarefa):
+                situacao = f"{situacao}, ativa" if situacao else "ativa"
+            logger.info(f"{tarefa:<18} | {versao:<10} | {template.tokens_prefixo:>17} | {situacao}")
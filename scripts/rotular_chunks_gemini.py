@@ -1,13 +1,40 @@
 # Script para rotular chunks já gerados usando Gemini
 import os
 import logging
-import google.generativeai as genai
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne
 from dotenv import load_dotenv
 from pathlib import Path
 from datetime import datetime
 import time
-from dataset.migracao_dados.gemini_classificacao_utils import classificar_chunk_gemini
+import queue
+import argparse
+import threading
+from dataset.migracao_dados.gemini_classificacao_utils import (
+    classificacao_em_cache,
+    classificar_chunk_gemini,
+    classificar_chunks_gemini_em_lote,
+    registrar_metricas_interpretacao,
+)
+from dataset.migracao_dados.cache_respostas_gemini import registrar_estatisticas_cache
+from dataset.migracao_dados.buffer_escrita_mongo import BufferEscritaMongo
+from dataset.migracao_dados.consultas_mongo import (
+    CAMPO_PRIORIDADE_ROTULAGEM,
+    criar_fila_rotulagem,
+    criar_observador,
+    normalizar_novos_documentos,
+    preparar_colecoes,
+)
+from dataset.migracao_dados.pool_chaves_gemini import PoolDeChaves
+from dataset.migracao_dados.registro_prompts import TAREFA_CLASSIFICACAO, TAREFA_CLASSIFICACAO_LOTE, prompts
+from dataset.migracao_dados.metricas_pipeline import (
+    iniciar_servidor_metricas,
+    itens_processados,
+    profundidade_fila,
+    rotulos_por_origem,
+)
+from dataset.migracao_dados.classificador_local import ORIGEM_CLASSIFICADOR_LOCAL, prefiltrar
+from dataset.migracao_dados.priorizador_rotulagem import criar_priorizador
+from dataset.migracao_dados.erros_gemini import BACKOFF_QUOTA, ErroGemini, ErroLimiteTaxa
 from bson import ObjectId
 
 # Carregar variáveis do .env do diretório do projeto
@@ -25,163 +52,430 @@ MONGO_PORT = os.getenv("MONGO_PORT", "27017")
 MONGO_URI = f"mongodb://{MONGO_USER}:{MONGO_PASS}@{MONGO_HOST}:{MONGO_PORT}/"
 
 # Definição de constantes
-BATCH_SIZE = 1
-KEY_NAMES = [
-    "GEMINI_API_KEY",
-    "GEMINI_API_KEY_4",
-    "GEMINI_API_KEY_5",
-    "GEMINI_API_KEY_6",
-    "GEMINI_API_KEY_7",
-    "GEMINI_API_KEY_8",
-    "GEMINI_API_KEY_9",
-]
+BATCH_SIZE = int(os.getenv("GEMINI_TAMANHO_LOTE_ROTULAGEM", "1"))  # > 1 usa o prompt de classificação em lote
 NOME_MODELO = 'gemini-2.5-flash'
 
-gemini_keys = []
-gemini_key_names = []
-for name in KEY_NAMES:
-    value = os.getenv(name)
-    if value:
-        gemini_keys.append(value)
-        gemini_key_names.append(name)
-if not gemini_keys:
-    raise ValueError(f"Nenhuma chave Gemini encontrada no arquivo {env_path}")
-current_key_index = 0
-
-def configurar_gemini(key, key_name):
-    """Configura o modelo Gemini."""
+# Modo concorrente (o orçamento RPM/TPM por chave vem do pool: GEMINI_RPM_POR_CHAVE/GEMINI_TPM_POR_CHAVE)
+EM_VOO_POR_CHAVE = int(os.getenv("GEMINI_EM_VOO_POR_CHAVE", "2"))
+TOKENS_ESTIMADOS_RESPOSTA_POR_CHUNK = 150
+# Prefixo fixo da classificação (o maior entre individual e lote, versões padrão) + resposta JSON
+TOKENS_ESTIMADOS_PROMPT = max(
+    prompts.obter(TAREFA_CLASSIFICACAO).tokens_prefixo, prompts.obter(TAREFA_CLASSIFICACAO_LOTE).tokens_prefixo
+) + TOKENS_ESTIMADOS_RESPOSTA_POR_CHUNK
+INTERVALO_ALIMENTACAO_SEGUNDOS = 0.5
+INTERVALO_RELATORIO_SEGUNDOS = 60
+# Modo contínuo: espera máxima por chunks novos antes de refazer a reserva (retentativas agendadas)
+INTERVALO_SEM_PENDENTES_SEGUNDOS = 60
+
+# Caminho que produziu cada rótulo (campo 'origem_rotulo'); o classificador local só rotula
+# chunks acima do seu limiar (PREFILTRO_LOCAL_ATIVADO=1, ver classificador_local.py)
+ORIGEM_GEMINI = "gemini"
+ORIGEM_CACHE = "cache"
+
+# Pool compartilhado: um cliente pré-construído por chave, com cooldown e orçamento próprios
+pool_gemini = PoolDeChaves.compartilhado(NOME_MODELO)
+
+def montar_documento_rotulado(chunk, classificacao, justificativa, confianca, versao_prompt, origem=ORIGEM_GEMINI):
+    """Monta o documento de 'chunks_rotulados' ou retorna None se a classificação for inválida."""
+    novo_doc = dict(chunk)
+    novo_doc.pop('_id', None)  # Garante que o MongoDB gere um novo _id
+    # Garante que id_documento_original seja ObjectId e sempre presente
+    id_doc_original = chunk.get("id_documento_original")
+    if id_doc_original is not None and not isinstance(id_doc_original, ObjectId):
+        try:
+            id_doc_original = ObjectId(str(id_doc_original))
+        except Exception:
+            pass
+    novo_doc["id_documento_original"] = id_doc_original
+    # Garante que id_documento_anonimizado seja ObjectId e sempre presente
+    id_doc_anonimizado = chunk.get("id_documento_anonimizado")
+    if id_doc_anonimizado is not None and not isinstance(id_doc_anonimizado, ObjectId):
+        try:
+            id_doc_anonimizado = ObjectId(str(id_doc_anonimizado))
+        except Exception:
+            pass
+    novo_doc["id_documento_anonimizado"] = id_doc_anonimizado
+    novo_doc['id_chunk_sintetico'] = chunk['_id']  # Referência ao _id do chunk sintético
+
+    # Padroniza tipos para evitar erro de comparação
     try:
-        genai.configure(api_key=key)
-        model = genai.GenerativeModel(NOME_MODELO)
-        
-        logger.info(f"Gemini configurado com a chave: {key_name}")
-        return model
-    except Exception as e:
-        logger.error(f"Erro ao configurar Gemini com a chave {key_name}: {str(e)}")
-        raise
+        classificacao_int = int(classificacao)
+    except Exception:
+        classificacao_int = -1
+    try:
+        confianca_float = float(confianca)
+    except Exception:
+        confianca_float = 0.0
+    justificativa_lower = justificativa.lower().strip() if justificativa else ""
+    # Só grava e marca como concluída se a classificação for válida
+    if not (
+        classificacao_int not in [-1, None] and
+        confianca_float > 0 and
+        justificativa_lower and
+        not justificativa_lower.startswith("erro:")
+    ):
+        return None
+    novo_doc.update({
+        "classificacao_acesso": classificacao,
+        "justificativa_acesso": justificativa,
+        "confianca_classificacao": confianca,
+        "modelo_rotulador": ORIGEM_CLASSIFICADOR_LOCAL if origem == ORIGEM_CLASSIFICADOR_LOCAL else NOME_MODELO,
+        "versao_prompt_rotulacao": versao_prompt,
+        "origem_rotulo": origem,
+        "data_rotulagem_chunk": datetime.now(),
+        "status_rotulagem": "concluida"
+    })
+    return novo_doc
+
+def registrar_falha_rotulagem(fila, chunk_id, erro, saida_bruta=None):
+    """Agenda a próxima tentativa do chunk ou, no limite, o manda para as falhas permanentes."""
+    tentativas = fila.registrar_falha(chunk_id, erro, saida_bruta)
+    if tentativas is None:
+        logger.warning(f"Reserva do chunk {chunk_id} perdida antes de registrar a falha: {erro}")
+    elif tentativas >= fila.agenda.max_tentativas:
+        logger.error(f"Chunk {chunk_id} atingiu o máximo de tentativas e foi marcado como falha permanente: {erro}")
+    else:
+        logger.warning(f"Falha ao rotular o chunk {chunk_id}. Tentativa {tentativas} de {fila.agenda.max_tentativas}: {erro}")
+
+def adiar_por_quota(fila, chunk_ids, erro):
+    """Quota esgotada em todas as chaves não é defeito do chunk: adia sem gastar tentativa."""
+    atraso = BACKOFF_QUOTA.espera(0, erro.retry_after)
+    logger.warning(f"Quota esgotada em todas as chaves; {len(chunk_ids)} chunk(s) adiado(s) em {atraso:.0f}s: {erro}")
+    for chunk_id in chunk_ids:
+        fila.adiar(chunk_id, atraso)
+
+def enfileirar_rotulo(buffer, fila, collection_rotulados, chunk, novo_doc, ao_concluir=None, ao_falhar=None):
+    """Enfileira a gravação em 'chunks_rotulados' e, só depois dela, a conclusão da reserva na origem.
+
+    A gravação é um upsert por 'id_chunk_sintetico' (só insere se ainda não existir), então
+    um chunk rotulado de novo após a reserva expirar não gera documento duplicado.
+    """
+    def falhar():
+        registrar_falha_rotulagem(fila, chunk["_id"], "Erro ao gravar o rótulo.")
+        if ao_falhar is not None:
+            ao_falhar()
+
+    def concluir():
+        itens_processados.incrementar(estagio="rotulagem")
+        rotulos_por_origem.incrementar(origem=novo_doc["origem_rotulo"])
+        logger.info(f"Chunk sintético {chunk['_id']} rotulado e salvo em 'chunks_rotulados' com sucesso.")
+        if ao_concluir is not None:
+            ao_concluir()
+
+    # Os campos de reserva, de tentativas e de prioridade da origem não fazem parte do documento rotulado
+    for campo in (fila.campo_trabalhador, fila.campo_reserva, fila.agenda.campo_tentativas,
+                  fila.agenda.campo_proxima_tentativa, fila.agenda.campo_ultimo_erro, CAMPO_PRIORIDADE_ROTULAGEM):
+        novo_doc.pop(campo, None)
 
-model = configurar_gemini(gemini_keys[current_key_index], gemini_key_names[current_key_index])
+    def marcar_origem():
+        buffer.adicionar(
+            fila.colecao,
+            fila.operacao_concluir(chunk["_id"], {"status_rotulagem": "concluida"}),
+            ao_confirmar=concluir,
+            ao_falhar=falhar
+        )
 
-def rotular_chunks_gemini():
+    buffer.adicionar(
+        collection_rotulados,
+        UpdateOne({"id_chunk_sintetico": chunk["_id"]}, {"$setOnInsert": novo_doc}, upsert=True),
+        ao_confirmar=marcar_origem,
+        ao_falhar=falhar
+    )
+
+def classificar_texto(texto, tokens_estimados):
+    """Classifica pelo classificador local se ele estiver confiante, depois pelo cache e,
+    por fim, pela chave com mais folga do pool.
+
+    Retorna (resultado no formato de `classificar_chunk_gemini`, origem do rótulo).
+    Erros da API chegam como ErroGemini depois de esgotada a política do pool.
+    """
+    rotulo_local = prefiltrar([texto])[0]
+    if rotulo_local is not None:
+        return rotulo_local, ORIGEM_CLASSIFICADOR_LOCAL
+    em_cache = classificacao_em_cache(texto, NOME_MODELO)
+    if em_cache is not None:
+        return em_cache, ORIGEM_CACHE
+    resultado, _ = pool_gemini.executar(
+        tokens_estimados,
+        lambda chave: classificar_chunk_gemini(texto, chave.modelo, consultar_cache=False)
+    )
+    return resultado, ORIGEM_GEMINI
+
+def rotular_lote_de_chunks(chunks, fila, collection_rotulados, buffer):
+    """Classifica vários chunks em uma única chamada (prompt em lote) e grava os válidos.
+
+    Os chunks que o classificador local rotula com confiança não entram no prompt; se o
+    rótulo local não der um documento válido, o chunk segue para o Gemini.
+    """
+    rotulos_locais = prefiltrar([chunk["texto_sintetico"] for chunk in chunks])
+    para_o_gemini = []
+    for chunk, rotulo in zip(chunks, rotulos_locais):
+        novo_doc = None if rotulo is None else montar_documento_rotulado(chunk, *rotulo, origem=ORIGEM_CLASSIFICADOR_LOCAL)
+        if novo_doc is None:
+            para_o_gemini.append(chunk)
+            continue
+        enfileirar_rotulo(buffer, fila, collection_rotulados, chunk, novo_doc)
+    chunks = para_o_gemini
+    if not chunks:
+        return
+    lote = [{"id": str(chunk["_id"]), "texto": chunk["texto_sintetico"]} for chunk in chunks]
+    tokens_estimados = TOKENS_ESTIMADOS_PROMPT + sum(len(item["texto"]) // 4 + TOKENS_ESTIMADOS_RESPOSTA_POR_CHUNK for item in lote)
+    try:
+        (resultados, uso), chave = pool_gemini.executar(
+            tokens_estimados,
+            lambda chave: classificar_chunks_gemini_em_lote(lote, chave.modelo)
+        )
+    except ErroLimiteTaxa as e:
+        adiar_por_quota(fila, [chunk["_id"] for chunk in chunks], e)
+        return
+    except ErroGemini as e:
+        logger.error(f"Erro ao rotular lote de {len(chunks)} chunks ({type(e).__name__}): {e}")
+        for chunk in chunks:
+            registrar_falha_rotulagem(fila, chunk["_id"], f"{type(e).__name__}: {e}", e.saida_bruta)
+        return
+    pool_gemini.registrar_tokens(chave, tokens_estimados, uso["tokens_entrada"] + uso["tokens_saida"] or None)
+    logger.info(f"Lote de {len(chunks)} chunks: {uso['rotulados']} rotulados em {uso['chamadas']} chamadas, {uso['tokens_por_chunk']} tokens/chunk.")
+    for chunk in chunks:
+        classificacao, justificativa, confianca, versao_prompt = resultados[str(chunk["_id"])]
+        novo_doc = montar_documento_rotulado(chunk, classificacao, justificativa, confianca, versao_prompt)
+        if novo_doc is None:
+            registrar_falha_rotulagem(fila, chunk["_id"], justificativa)
+            continue
+        enfileirar_rotulo(buffer, fila, collection_rotulados, chunk, novo_doc)
+
+def aguardar_chunks_novos(observador, buffer, collection_chunks):
+    """Grava o que está no buffer e espera o observador avisar de chunks sintéticos novos."""
+    buffer.descarregar()
+    logger.info("Nenhum chunk pendente para rotular. Aguardando chunks novos...")
+    normalizar_novos_documentos(collection_chunks, observador.aguardar(INTERVALO_SEM_PENDENTES_SEGUNDOS))
+
+def rotular_chunks_gemini(continuo=False):
+    """Rotula os chunks pendentes um lote por vez; com `continuo`, espera chunks novos em vez de encerrar."""
     client = None
-    global current_key_index, model
+    observador = None
+    buffer = BufferEscritaMongo()
     try:
         client = MongoClient(MONGO_URI)
         db = client['dataset_treinamento']
         collection_chunks = db['chunks_sinteticos']
         collection_rotulados = db['chunks_rotulados']
+        preparar_colecoes(db)
+        fila = criar_fila_rotulagem(collection_chunks)
+        priorizador = criar_priorizador(db)
+        if continuo:
+            observador = criar_observador(fila).iniciar()
+        logger.info(f"Rotulando como trabalhador {fila.id_trabalhador}.")
         while True:
-            # Busca um batch de chunks pendentes
-            chunks = list(collection_chunks.find({
-                "status_rotulagem": "pendente",
-                "$or": [
-                    {"erro_rotulagem": {"$exists": False}},
-                    {"erro_rotulagem": False}
-                ],
-                "nome_modelo": "gemini-2.5-flash"
-            }).limit(BATCH_SIZE))
+            # Grava os rótulos do ciclo anterior antes de buscar pendentes de novo
+            buffer.descarregar()
+            if priorizador is not None:
+                priorizador.atualizar()
+            # Reserva um batch de chunks pendentes (ou com reserva vencida) para este processo
+            chunks = fila.reivindicar_lote(BATCH_SIZE)
             if not chunks:
-                logger.info("Nenhum chunk pendente para rotular. Encerrando.")
-                break
+                if observador is None:
+                    logger.info("Nenhum chunk pendente para rotular. Encerrando.")
+                    break
+                aguardar_chunks_novos(observador, buffer, collection_chunks)
+                continue
+            if len(chunks) > 1:
+                rotular_lote_de_chunks(chunks, fila, collection_rotulados, buffer)
+                continue
             for chunk in chunks:
-                tentativas_chave = 0
-                sucesso_classificacao = False
-                while tentativas_chave < len(gemini_keys):
-                    # Avança para a próxima chave (round-robin)
-                    current_key_index = (current_key_index + 1) % len(gemini_keys)
-                    try:
-                        # Garante que o model está sempre atualizado com a chave corrente
-                        model = configurar_gemini(gemini_keys[current_key_index], gemini_key_names[current_key_index])
-                        logger.info(f"Classificando chunk sintético {chunk['_id']} (chunk original: {chunk.get('id_chunk_original')}, doc original: {chunk.get('id_documento_original')})")
-                        classificacao, justificativa, confianca, versao_prompt = classificar_chunk_gemini(
-                            chunk["texto_sintetico"],
-                            model
-                        )
-                        # Checa se houve erro de quota ou modelo inesperado
-                        erro_quota = False
-                        erro_modelo = False
-                        if justificativa is not None:
-                            if ("quota" in justificativa.lower() or "rate limit" in justificativa.lower() or "bloqueio" in justificativa.lower()):
-                                erro_quota = True
-                            if ("unexpected model name format" in justificativa.lower()):
-                                erro_modelo = True
-                        if erro_quota or erro_modelo:
-                            logger.warning(f"Quota/modelo excedido para a chave {gemini_key_names[current_key_index]}. Avançando para a próxima chave...")
-                            tentativas_chave += 1
-                            time.sleep(30)
-                            continue
-                        # Se não for erro de quota/modelo, segue fluxo normal
-                        novo_doc = dict(chunk)
-                        novo_doc.pop('_id', None)  # Garante que o MongoDB gere um novo _id
-                        # Garante que id_documento_original seja ObjectId e sempre presente
-                        id_doc_original = chunk.get("id_documento_original")
-                        if id_doc_original is not None and not isinstance(id_doc_original, ObjectId):
-                            try:
-                                id_doc_original = ObjectId(str(id_doc_original))
-                            except Exception:
-                                pass
-                        novo_doc["id_documento_original"] = id_doc_original
-                        # Garante que id_documento_anonimizado seja ObjectId e sempre presente
-                        id_doc_anonimizado = chunk.get("id_documento_anonimizado")
-                        if id_doc_anonimizado is not None and not isinstance(id_doc_anonimizado, ObjectId):
-                            try:
-                                id_doc_anonimizado = ObjectId(str(id_doc_anonimizado))
-                            except Exception:
-                                pass
-                        novo_doc["id_documento_anonimizado"] = id_doc_anonimizado
-                        novo_doc['id_chunk_sintetico'] = chunk['_id']  # Referência ao _id do chunk sintético
-
-                        # LOG DETALHADO PARA DEPURAÇÃO
-                        logger.info(f"DEBUG: classificacao={classificacao} ({type(classificacao)}), confianca={confianca} ({type(confianca)}), justificativa={justificativa}")
-                        # Padroniza tipos para evitar erro de comparação
-                        try:
-                            classificacao_int = int(classificacao)
-                        except Exception:
-                            classificacao_int = -1
-                        try:
-                            confianca_float = float(confianca)
-                        except Exception:
-                            confianca_float = 0.0
-                        justificativa_lower = justificativa.lower().strip() if justificativa else ""
-                        # Só grava e marca como concluída se a classificação for válida
-                        if (
-                            classificacao_int not in [-1, None] and
-                            confianca_float > 0 and
-                            justificativa_lower and
-                            "erro ao chamar api" not in justificativa_lower and
-                            "unexpected model name format" not in justificativa_lower and
-                            "quota" not in justificativa_lower and
-                            "rate limit" not in justificativa_lower and
-                            "bloqueio" not in justificativa_lower
-                        ):
-                            novo_doc.update({
-                                "classificacao_acesso": classificacao,
-                                "justificativa_acesso": justificativa,
-                                "confianca_classificacao": confianca,
-                                "modelo_rotulador": NOME_MODELO,
-                                "versao_prompt_rotulacao": versao_prompt,
-                                "data_rotulagem_chunk": datetime.now(),
-                                "status_rotulagem": "concluida"
-                            })
-                            result = collection_rotulados.insert_one(novo_doc)
-                            collection_chunks.update_one({"_id": chunk["_id"]}, {"$set": {"status_rotulagem": "concluida"}})
-                            logger.info(f"Chunk sintético {chunk['_id']} rotulado e salvo em 'chunks_rotulados' com sucesso. Novo _id: {result.inserted_id}")
-                        else:
-                            logger.warning(f"Classificação FALHOU para o chunk {chunk['_id']}. Mantendo como pendente para nova tentativa. Justificativa: {justificativa}")
-                        sucesso_classificacao = True
-                        time.sleep(30)
-                        break  # Sai do while de tentativas de chave
-                    except Exception as e:
-                        logger.error(f"Erro ao rotular chunk {chunk['_id']}: {e}")
-                        time.sleep(30)
-                        break  # Sai do while de tentativas de chave em caso de erro inesperado
-                # Se não conseguiu classificar com nenhuma chave, não grava nada e vai para o próximo chunk
+                tokens_estimados = TOKENS_ESTIMADOS_PROMPT + len(chunk["texto_sintetico"]) // 4
+                logger.info(f"Classificando chunk sintético {chunk['_id']} (chunk original: {chunk.get('id_chunk_original')}, doc original: {chunk.get('id_documento_original')})")
+                try:
+                    # O pool escolhe a chave com mais folga e aplica a política de cada tipo de erro
+                    (classificacao, justificativa, confianca, versao_prompt), origem = classificar_texto(
+                        chunk["texto_sintetico"],
+                        tokens_estimados
+                    )
+                except ErroLimiteTaxa as e:
+                    adiar_por_quota(fila, [chunk["_id"]], e)
+                    continue
+                except ErroGemini as e:
+                    registrar_falha_rotulagem(fila, chunk["_id"], f"{type(e).__name__}: {e}", e.saida_bruta)
+                    continue
+                novo_doc = montar_documento_rotulado(chunk, classificacao, justificativa, confianca, versao_prompt, origem)
+                if novo_doc is not None:
+                    enfileirar_rotulo(buffer, fila, collection_rotulados, chunk, novo_doc)
+                else:
+                    registrar_falha_rotulagem(fila, chunk["_id"], justificativa)
+    except Exception as e:
+        logger.error(f"Erro geral ao rotular chunks: {e}")
+    finally:
+        if observador is not None:
+            observador.parar()
+        registrar_estatisticas_cache()
+        registrar_metricas_interpretacao()
+        if client:
+            buffer.descarregar()
+            client.close()
+            logger.info("Conexão com MongoDB fechada.")
+
+# ---------------------------------------------------------------------------
+# Modo concorrente: N requisições em voo por chave, com orçamento RPM/TPM por
+# chave controlado por baldes de tokens em vez de time.sleep(30) fixo.
+# ---------------------------------------------------------------------------
+
+class ProgressoRotulagem:
+    """Estado compartilhado entre o alimentador e os trabalhadores do modo concorrente."""
+
+    def __init__(self):
+        self.inicio = time.monotonic()
+        self.concluidos = 0
+        self.falhas = 0
+        self.em_andamento = set()
+        self._lock = threading.Lock()
+
+    def iniciar(self, chunk_id):
+        with self._lock:
+            self.em_andamento.add(chunk_id)
+
+    def concluir(self, chunk_id, sucesso):
+        with self._lock:
+            self.em_andamento.discard(chunk_id)
+            if sucesso:
+                self.concluidos += 1
+            else:
+                # Falhas voltam à fila só no prazo agendado (ver registrar_falha_rotulagem)
+                self.falhas += 1
+
+    def quantidade_em_andamento(self):
+        with self._lock:
+            return len(self.em_andamento)
+
+    def chunks_por_minuto(self):
+        minutos = (time.monotonic() - self.inicio) / 60.0
+        return self.concluidos / minutos if minutos > 0 else 0.0
+
+def rotular_chunk(chunk, fila, progresso, buffer, fila_trabalho, collection_rotulados):
+    """Classifica um chunk já reservado (texto em memória) e enfileira o rótulo no buffer."""
+    try:
+        texto = chunk["texto_sintetico"]
+        tokens_estimados = TOKENS_ESTIMADOS_PROMPT + len(texto) // 4
+        try:
+            (classificacao, justificativa, confianca, versao_prompt), origem = classificar_texto(texto, tokens_estimados)
+        except ErroLimiteTaxa as e:
+            # Todas as chaves em cooldown: o chunk espera na fila local pela próxima chave livre
+            # (ou é adiado no banco, se a fila local é limitada e está cheia)
+            try:
+                fila.put_nowait(chunk)
+                logger.warning(f"Quota esgotada em todas as chaves; chunk {chunk['_id']} volta para a fila: {e}")
+            except queue.Full:
+                adiar_por_quota(fila_trabalho, [chunk["_id"]], e)
+                progresso.concluir(chunk["_id"], sucesso=False)
+            return
+        except ErroGemini as e:
+            registrar_falha_rotulagem(fila_trabalho, chunk["_id"], f"{type(e).__name__}: {e}", e.saida_bruta)
+            progresso.concluir(chunk["_id"], sucesso=False)
+            return
+        novo_doc = montar_documento_rotulado(chunk, classificacao, justificativa, confianca, versao_prompt, origem)
+        if novo_doc is None:
+            registrar_falha_rotulagem(fila_trabalho, chunk["_id"], justificativa)
+            progresso.concluir(chunk["_id"], sucesso=False)
+            return
+        # O chunk só sai de "em andamento" quando a conclusão na origem é gravada,
+        # para o alimentador não reservar mais chunks do que cabem em voo + buffer
+        enfileirar_rotulo(
+            buffer, fila_trabalho, collection_rotulados, chunk, novo_doc,
+            ao_concluir=lambda chunk_id=chunk["_id"]: progresso.concluir(chunk_id, sucesso=True),
+            ao_falhar=lambda chunk_id=chunk["_id"]: progresso.concluir(chunk_id, sucesso=False)
+        )
+    except Exception as e:
+        logger.error(f"Erro ao rotular chunk {chunk['_id']}: {e}")
+        progresso.concluir(chunk["_id"], sucesso=False)
+
+def _trabalhador_rotulagem(fila, progresso, buffer, fila_trabalho, collection_rotulados):
+    """Consome chunks da fila, pedindo ao pool a chave com mais folga para cada requisição."""
+    while True:
+        chunk = fila.get()
+        if chunk is None:
+            return
+        rotular_chunk(chunk, fila, progresso, buffer, fila_trabalho, collection_rotulados)
+
+def rotular_chunks_gemini_concorrente(em_voo_por_chave=EM_VOO_POR_CHAVE, continuo=False):
+    """Rotula os chunks pendentes mantendo até `em_voo_por_chave` requisições simultâneas por chave.
+
+    Com `continuo`, espera chunks novos (change stream ou sondagem) em vez de encerrar.
+    """
+    client = None
+    observador = None
+    trabalhadores = []
+    fila = queue.Queue()
+    profundidade_fila.acompanhar(fila.qsize, fila="rotulagem")
+    progresso = ProgressoRotulagem()
+    buffer = BufferEscritaMongo()
+    try:
+        client = MongoClient(MONGO_URI)
+        db = client['dataset_treinamento']
+        collection_chunks = db['chunks_sinteticos']
+        collection_rotulados = db['chunks_rotulados']
+        preparar_colecoes(db)
+        fila_trabalho = criar_fila_rotulagem(collection_chunks)
+        priorizador = criar_priorizador(db)
+        if continuo:
+            observador = criar_observador(fila_trabalho).iniciar()
+
+        pool_gemini.definir_em_voo_por_chave(em_voo_por_chave)
+        capacidade = len(pool_gemini) * em_voo_por_chave
+        for _ in range(capacidade):
+            trabalhador = threading.Thread(
+                target=_trabalhador_rotulagem,
+                args=(fila, progresso, buffer, fila_trabalho, collection_rotulados),
+                daemon=True
+            )
+            trabalhador.start()
+            trabalhadores.append(trabalhador)
+        logger.info(f"Modo concorrente: {len(pool_gemini)} chaves x {em_voo_por_chave} em voo (trabalhador {fila_trabalho.id_trabalhador}).")
+
+        ultimo_relatorio = time.monotonic()
+        while True:
+            livres = capacidade - progresso.quantidade_em_andamento()
+            if livres > 0:
+                if priorizador is not None:
+                    priorizador.atualizar()
+                # Chunks reservados (por este ou outro processo) não voltam na busca
+                novos = fila_trabalho.reivindicar_lote(livres)
+                for chunk in novos:
+                    progresso.iniciar(chunk["_id"])
+                    fila.put(chunk)
+                if not novos and progresso.quantidade_em_andamento() == 0:
+                    if observador is None:
+                        logger.info("Nenhum chunk pendente para rotular. Encerrando.")
+                        break
+                    aguardar_chunks_novos(observador, buffer, collection_chunks)
+                    continue
+            if time.monotonic() - ultimo_relatorio >= INTERVALO_RELATORIO_SEGUNDOS:
+                logger.info(f"Vazão: {progresso.chunks_por_minuto():.1f} chunks/min ({progresso.concluidos} rotulados, {progresso.falhas} falhas, {progresso.quantidade_em_andamento()} em voo).")
+                ultimo_relatorio = time.monotonic()
+            buffer.descarregar_se_vencido()
+            time.sleep(INTERVALO_ALIMENTACAO_SEGUNDOS)
     except Exception as e:
         logger.error(f"Erro geral ao rotular chunks: {e}")
     finally:
+        if observador is not None:
+            observador.parar()
+        for _ in trabalhadores:
+            fila.put(None)
+        for trabalhador in trabalhadores:
+            trabalhador.join()
+        buffer.descarregar()
+        logger.info(f"Rotulagem concorrente finalizada: {progresso.concluidos} rotulados, {progresso.falhas} falhas, {progresso.chunks_por_minuto():.1f} chunks/min.")
+        registrar_estatisticas_cache()
+        registrar_metricas_interpretacao()
         if client:
             client.close()
             logger.info("Conexão com MongoDB fechada.")
 
 if __name__ == "__main__":
-    rotular_chunks_gemini() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Rotula chunks sintéticos com o Gemini.")
+    parser.add_argument("--concorrente", action="store_true", help="Usa o modo concorrente, com várias requisições em voo por chave.")
+    parser.add_argument("--em-voo-por-chave", type=int, default=EM_VOO_POR_CHAVE)
+    parser.add_argument("--continuo", action="store_true", help="Não encerra sem pendentes: rotula chunks sintéticos assim que chegam.")
+    args = parser.parse_args()
+    iniciar_servidor_metricas()
+    if args.concorrente:
+        rotular_chunks_gemini_concorrente(args.em_voo_por_chave, args.continuo)
+    else:
+        rotular_chunks_gemini(args.continuo)
@@ -0,0 +1,90 @@
+import os
+import json
+import random
+import time
+import logging
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from dataset.migracao_dados.modelo_gemini_falso import gerar_texto_falso
+
+# Servidor HTTP local que imita o endpoint REST `:generateContent` da API Gemini.
+# Uso: python servidor_gemini_falso.py --porta 8089 --latencia 0.8
+# e, nos scripts, GEMINI_API_ENDPOINT=http://localhost:8089
+# Sem HTTP, GEMINI_BACKEND=falso usa o mesmo gerador de respostas dentro do processo.
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class ManipuladorGeminiFalso(BaseHTTPRequestHandler):
+    latencia = 0.5
+    taxa_erro_quota = 0.0
+
+    def do_POST(self):
+        tamanho = int(self.headers.get("Content-Length", 0))
+        corpo = json.loads(self.rfile.read(tamanho) or b"{}")
+        time.sleep(random.expovariate(1.0 / self.latencia) if self.latencia > 0 else 0)
+
+        if not self.path.split("?")[0].endswith(":generateContent"):
+            self._responder(404, {"error": {"code": 404, "message": "Rota não suportada.", "status": "NOT_FOUND"}})
+            return
+        if random.random() < self.taxa_erro_quota:
+            self._responder(429, {"error": {"code": 429, "message": "Resource has been exhausted (e.g. check quota).", "status": "RESOURCE_EXHAUSTED"}})
+            return
+
+        # A instrução de sistema (prefixo fixo do prompt, ver PromptComPrefixo) vem antes do conteúdo
+        instrucao = corpo.get("systemInstruction") or corpo.get("system_instruction") or {}
+        texto_prompt = "".join(
+            parte.get("text", "")
+            for conteudo in [instrucao] + corpo.get("contents", [])
+            for parte in conteudo.get("parts", [])
+        )
+        # Mesmas respostas do backend em processo (GEMINI_BACKEND=falso), via HTTP
+        texto = gerar_texto_falso(texto_prompt, random.Random())
+        tokens_entrada = len(texto_prompt) // 4
+        tokens_saida = len(texto) // 4
+        self._responder(200, {
+            "candidates": [{
+                "content": {"parts": [{"text": texto}], "role": "model"},
+                "finishReason": "STOP",
+                "index": 0,
+            }],
+            "usageMetadata": {
+                "promptTokenCount": tokens_entrada,
+                "candidatesTokenCount": tokens_saida,
+                "totalTokenCount": tokens_entrada + tokens_saida,
+            },
+        })
+
+    def _responder(self, status, payload):
+        dados = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def log_message(self, formato, *args):
+        logger.debug(formato % args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor Gemini falso para testes locais.")
+    parser.add_argument("--porta", type=int, default=int(os.getenv("GEMINI_FALSO_PORTA", "8089")))
+    parser.add_argument("--latencia", type=float, default=0.5, help="Latência média (s) por requisição.")
+    parser.add_argument("--taxa-erro-quota", type=float, default=0.0, help="Fração de respostas 429.")
+    args = parser.parse_args()
+
+    ManipuladorGeminiFalso.latencia = args.latencia
+    ManipuladorGeminiFalso.taxa_erro_quota = args.taxa_erro_quota
+    servidor = ThreadingHTTPServer(("127.0.0.1", args.porta), ManipuladorGeminiFalso)
+    logger.info(f"Servidor Gemini falso ouvindo em http://127.0.0.1:{args.porta}")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,8 @@
 import os
+import queue
 import logging
-import google.generativeai as genai
-from pymongo import MongoClient
+import threading
+from pymongo import MongoClient, UpdateOne
 import pymongo.errors
 import time
 from dotenv import load_dotenv
@@ -9,6 +10,39 @@ from pathlib import Path
 from datetime import datetime
 import json
 from bson import ObjectId
+from dataset.migracao_dados.pool_chaves_gemini import PoolDeChaves, tokens_da_resposta
+from dataset.migracao_dados.buffer_escrita_mongo import BufferEscritaMongo
+from dataset.migracao_dados.consultas_mongo import (
+    MAX_TENTATIVAS_SINTESE,
+    criar_fila_sintese,
+    criar_observador,
+    normalizar_novos_documentos,
+    preparar_colecoes,
+)
+from dataset.migracao_dados.fila_trabalho_mongo import SEM_ESPERA
+from dataset.migracao_dados.indice_quase_duplicatas import (
+    encerrar_ao_receber_sigterm, salvar_indice_compartilhado, verificar_texto_sintetico
+)
+from dataset.migracao_dados.metricas_pipeline import (
+    iniciar_servidor_metricas,
+    itens_processados,
+    profundidade_fila,
+    respostas_interpretadas,
+)
+from dataset.migracao_dados.erros_gemini import (
+    BACKOFF_QUOTA,
+    ErroConteudoBloqueado,
+    ErroGemini,
+    ErroLimiteTaxa,
+    ErroRespostaInvalida,
+)
+from dataset.migracao_dados.cache_respostas_gemini import (
+    armazenar_cache_gemini,
+    consultar_cache_gemini,
+    gerar_conteudo,
+    registrar_estatisticas_cache,
+)
+from dataset.migracao_dados.registro_prompts import TAREFA_SINTESE, prompts
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -24,225 +58,323 @@ except Exception as e:
 
 # Configurações do Processo
 NOME_MODELO_GEMINI = 'gemini-2.5-flash'
-VERSAO_PROMPT = 'v2.2'
 MONGO_USER = os.getenv("MONGO_USER", "usuario")
 MONGO_PASS = os.getenv("MONGO_PASS", "senha")
 MONGO_HOST = os.getenv("MONGO_HOST", "localhost")
 MONGO_PORT = os.getenv("MONGO_PORT", "27017")
 MONGO_URI = f"mongodb://{MONGO_USER}:{MONGO_PASS}@{MONGO_HOST}:{MONGO_PORT}/"
-TAMANHO_LOTE = 1  # Número de chunks a processar por chamada de API
-MAX_TENTATIVAS_CHUNK = 3 # Máximo de tentativas para um chunk que falha consistentemente
-
-# Carregar chaves Gemini
-key_names = [
-    "GEMINI_API_KEY", "GEMINI_API_KEY_4", "GEMINI_API_KEY_5",
-    "GEMINI_API_KEY_6", "GEMINI_API_KEY_7", "GEMINI_API_KEY_8", "GEMINI_API_KEY_9",
-]
-gemini_keys = [os.getenv(name) for name in key_names if os.getenv(name)]
-if not gemini_keys:
-    raise ValueError("Nenhuma chave Gemini encontrada no arquivo .env")
-current_key_index = 0
-
-def configurar_gemini(api_key):
-    """Configura o modelo Gemini."""
-    try:
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel(NOME_MODELO_GEMINI)
-        chave_mascarada = f"{api_key[:6]}...{api_key[-4:]}"
-        logger.info(f"Gemini configurado com sucesso usando o modelo {NOME_MODELO_GEMINI} e a chave de índice {current_key_index} ({chave_mascarada}).")
-        return model
-    except Exception as e:
-        logger.error(f"Erro ao configurar Gemini: {e}")
-        raise
-
-# Configuração inicial com a primeira chave
-model = configurar_gemini(gemini_keys[current_key_index])
-
-
-def gerar_textos_sinteticos_em_lote(lote_chunks):
-    """Gera textos sintéticos para um lote de chunks."""
-    global current_key_index, model
-
-    # Rodízio de chaves a cada chamada
-    current_key_index = (current_key_index + 1) % len(gemini_keys)
-    model = configurar_gemini(gemini_keys[current_key_index])
-
-    prompt = f"""
-        Você é um especialista na criação de dados sintéticos para treinar IAs na classificação de sigilo de documentos, com foco na LGPD e LAI. Sua especialidade é o domínio administrativo e jurídico.
-        Sua tarefa é processar a lista de textos JSON abaixo. Para cada texto, crie uma nova versão sintética, seguindo as regras à risca para garantir a qualidade do dataset de treinamento.
-
-        REGRAS PRINCIPAIS:
-
-        1. OBJETIVO PRINCIPAL - MANTER O NÍVEL DE SIGILO: O propósito final é treinar um modelo de IA para classificar documentos conforme seu nível de sigilo. Portanto, a regra mais importante é: o texto sintético deve manter o mesmo contexto e o mesmo potencial de sensibilidade do texto original. Se o original continha dados sensíveis (mesmo que anonimizados como <DADOS_BANCARIOS>), o texto sintético deve conter dados fictícios igualmente sensíveis (ex: números de contas bancárias, valores de transações, etc.). A natureza do documento (um relatório financeiro, um ofício judicial, um memorando interno) deve ser preservada.
-
-        2. REESCRITA COMPLETA COM DADOS FICTÍCIOS: O novo texto deve ser uma paráfrase completa do original. Todas as informações específicas (nomes, datas, locais, valores, números de processo, etc.) devem ser substituídas por dados totalmente fictícios, mas que sejam realistas e plausíveis dentro do contexto administrativo/jurídico.
-
-        3. SUBSTITUIÇÃO OBRIGATÓRIA DE PLACEHOLDERS: O texto original contém placeholders anonimizados no formato <TIPO_DADO> (ex: <PESSOA>, <ORGANIZAÇÃO>). Você DEVE OBRIGATORIAMENTE substituir cada um desses placeholders por uma informação fictícia correspondente ao tipo indicado. Por exemplo, <PESSOA> vira "Sra. Carolina Matos", <ORGANIZAÇÃO> vira "Consultoria Integral Ltda.", e assim por diante.
-
-        4. CONCISÃO E LIMITE DE TAMANHO: O "texto_sintetico" gerado NÃO PODE ULTRAPASSAR 200 PALAVRAS. Seja objetivo e preserve a essência do documento original dentro deste limite.
-
-        5. SAÍDA ESTRITAMENTE EM JSON: Sua resposta DEVE ser uma string JSON válida, representando uma lista de objetos. Não inclua nenhum texto, explicação ou formatação fora do JSON (absolutamente nenhum ```json no início ou no fim).
-
-        EXEMPLO DE TRANSFORMAÇÃO:
-
-        ENTRADA (Exemplo de um item da lista):
+# Lotes são montados pelo custo estimado em tokens, não por um número fixo de chunks
+ORCAMENTO_TOKENS_ENTRADA_LOTE = int(os.getenv("GEMINI_SINTESE_TOKENS_ENTRADA_LOTE", "8000"))
+ORCAMENTO_TOKENS_SAIDA_LOTE = int(os.getenv("GEMINI_SINTESE_TOKENS_SAIDA_LOTE", "6000"))
+MAX_CHUNKS_POR_LOTE = int(os.getenv("GEMINI_SINTESE_MAX_CHUNKS_LOTE", "20"))
+# Campos do chunk de origem usados na síntese
+PROJECAO_CHUNK_ORIGEM = {"chunk_texto": 1, "id_documento_anonimizado": 1, "id_documento_original": 1}
+MAX_TENTATIVAS_CHUNK = MAX_TENTATIVAS_SINTESE # Máximo de tentativas para um chunk que falha consistentemente
+
+# Pool compartilhado de chaves Gemini (um cliente pré-construído por chave)
+pool_gemini = PoolDeChaves.compartilhado(NOME_MODELO_GEMINI)
+TOKENS_ESTIMADOS_INSTRUCOES = prompts.obter(TAREFA_SINTESE).tokens_prefixo  # Prefixo fixo da versão padrão
+TOKENS_ESTIMADOS_SAIDA_POR_CHUNK = 450  # Até 200 palavras + id e confiança no JSON
+TOKENS_ESTIMADOS_ENVELOPE_POR_CHUNK = 30  # Chaves e id de cada item na lista de entrada
+INTERVALO_RELATORIO_LOTES_SEGUNDOS = 600
+
+# Processamento contínuo: trabalhadores por chave e fila limitada de lotes reservados
+EM_VOO_POR_CHAVE = int(os.getenv("GEMINI_EM_VOO_POR_CHAVE", "1"))
+LOTES_NA_FILA_POR_TRABALHADOR = 2
+INTERVALO_SEM_PENDENTES_SEGUNDOS = 60
+INTERVALO_ALIMENTACAO_SEGUNDOS = 0.5
+
+
+class RespostaLoteInvalida(ErroRespostaInvalida):
+    """A resposta do lote não é uma lista JSON válida (em geral, saída truncada)."""
+
+
+class EstatisticasLotes:
+    """Chamadas, taxa de sucesso e latência agregadas por tamanho de lote."""
+
+    def __init__(self):
+        self.por_tamanho = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, tamanho, sintetizados, latencia_segundos):
+        with self._lock:
+            estatistica = self.por_tamanho.setdefault(tamanho, {"chamadas": 0, "chunks": 0, "sintetizados": 0, "latencia_total": 0.0})
+            estatistica["chamadas"] += 1
+            estatistica["chunks"] += tamanho
+            estatistica["sintetizados"] += sintetizados
+            estatistica["latencia_total"] += latencia_segundos
+
+    def registrar_relatorio(self):
+        with self._lock:
+            linhas = [
+                f"{tamanho} chunks: {e['chamadas']} chamadas, sucesso {e['sintetizados'] / e['chunks']:.0%}, latência média {e['latencia_total'] / e['chamadas']:.1f}s"
+                for tamanho, e in sorted(self.por_tamanho.items())
+            ]
+        if linhas:
+            logger.info("Lotes de síntese por tamanho: " + "; ".join(linhas))
 
-        JSON
 
-        {{
-          "id_original": "exemplo_id_123",
-          "texto_original": "OFÍCIO Nº 101/2024 - <ORGANIZAÇÃO> Requerimento de Pagamento. RECLAMANTE: <PESSOA>. RECLAMADA: <ORGANIZAÇÃO>. Foi arbitrado pelo Juízo, a título de honorários periciais, o valor de R$ 1.500,00."
-        }}
-        SAÍDA ESPERADA (Como você deve gerar o item correspondente na lista de resultados):
+estatisticas_lotes = EstatisticasLotes()
 
-        JSON
 
-        {{
-          "id_original": "exemplo_id_123",
-          "texto_sintetico": "COMUNICADO OFICIAL Nº 245/2024 - TRIBUNAL REGIONAL DO TRABALHO. Assunto: Solicitação de Quitação de Verba Honorária. Requerente: Sra. Juliana Almeida. Requerida: Empresa de Logística Brasil Total S.A. Foi estipulado por este Juízo, para cobrir os honorários do perito, a quantia de R$ 1.850,00.",
-          "confianca_geracao": 0.98
-        }}
-        ESTRUTURA DE ENTRADA (POR ITEM):
+def estimar_tokens_chunk(doc):
+    """(entrada, saída) estimadas para um chunk no prompt de síntese."""
+    texto = doc.get("chunk_texto") or ""
+    return len(texto) // 4 + TOKENS_ESTIMADOS_ENVELOPE_POR_CHUNK, TOKENS_ESTIMADOS_SAIDA_POR_CHUNK
 
-        "id_original": Identificador do chunk.
+def estimar_tokens_lote(lote_chunks):
+    """Total estimado (entrada + saída) de uma chamada com `lote_chunks`."""
+    entrada = saida = 0
+    for chunk in lote_chunks:
+        entrada_chunk, saida_chunk = estimar_tokens_chunk({"chunk_texto": chunk.get("texto_original")})
+        entrada += entrada_chunk
+        saida += saida_chunk
+    return TOKENS_ESTIMADOS_INSTRUCOES + entrada + saida
 
-        "texto_original": O texto a ser reescrito.
+def reservar_lote_por_orcamento(fila, sobra=None):
+    """Reserva chunks até o lote atingir o orçamento de entrada/saída ou MAX_CHUNKS_POR_LOTE.
 
-        ESTRUTURA DE SAÍDA OBRIGATÓRIA (POR ITEM):
+    Retorna (lote, sobra): `sobra` é o chunk já reservado que não coube e abre o próximo
+    lote. Um chunk sozinho acima do orçamento ainda forma um lote de um.
+    """
+    lote = []
+    entrada = TOKENS_ESTIMADOS_INSTRUCOES
+    saida = 0
+    while len(lote) < MAX_CHUNKS_POR_LOTE:
+        doc = sobra if sobra is not None else fila.reivindicar(PROJECAO_CHUNK_ORIGEM)
+        sobra = None
+        if doc is None:
+            break
+        entrada_chunk, saida_chunk = estimar_tokens_chunk(doc)
+        if lote and (entrada + entrada_chunk > ORCAMENTO_TOKENS_ENTRADA_LOTE or saida + saida_chunk > ORCAMENTO_TOKENS_SAIDA_LOTE):
+            return lote, doc
+        lote.append(doc)
+        entrada += entrada_chunk
+        saida += saida_chunk
+    return lote, None
+
+def limpar_resposta_json(resposta):
+    """Remove as cercas ```json que o modelo às vezes inclui."""
+    cleaned_response = resposta.strip()
+    if cleaned_response.startswith("```json"):
+        cleaned_response = cleaned_response[7:]
+    if cleaned_response.endswith("```"):
+        cleaned_response = cleaned_response[:-3]
+    return cleaned_response
+
+def marcar_versao(resultados, versao):
+    """Anota em cada item a versão do prompt que o gerou (o lote pode ter sido dividido entre versões)."""
+    if isinstance(resultados, list):
+        for item in resultados:
+            if isinstance(item, dict):
+                item["versao_prompt"] = versao
+    return resultados
 
-        "id_original": O mesmo identificador do chunk de entrada.
+def gerar_textos_sinteticos_em_lote(lote_chunks):
+    """Gera textos sintéticos para um lote de chunks.
 
-        "texto_sintetico": O texto totalmente reescrito com dados fictícios, placeholders substituídos e com no máximo 200 palavras.
+    Cada item traz a `versao_prompt` usada. Erros da API que sobram após a política do
+    pool são lançados como ErroGemini.
+    """
+    template = prompts.escolher(TAREFA_SINTESE, ",".join(str(chunk["id_original"]) for chunk in lote_chunks))
+    prompt = template.montar(lote=lote_chunks)
+
+    # O pool escolhe a chave com mais folga e aplica a política de cada tipo de erro:
+    # cooldown e troca de chave em 429, backoff com jitter em falhas transitórias.
+    tokens_estimados = estimar_tokens_lote(lote_chunks)
+    resposta_em_cache = consultar_cache_gemini(NOME_MODELO_GEMINI, template.versao, prompt)
+    if resposta_em_cache is not None:
+        logger.info("Lote atendido pelo cache de respostas do Gemini.")
+        return marcar_versao(json.loads(limpar_resposta_json(resposta_em_cache)), template.versao)
+
+    def chamar(chave):
+        response = gerar_conteudo(chave.modelo, prompt)
+        pool_gemini.registrar_tokens(chave, tokens_estimados, tokens_da_resposta(response))
+        return response
 
-        "confianca_geracao": Um float de 0.0 a 1.0 indicando sua confiança na qualidade da geração.
+    try:
+        response, _ = pool_gemini.executar(tokens_estimados, chamar)
+    except ErroConteudoBloqueado as e:
+        # Basta um chunk barrado para bloquear o lote: a divisão isola o culpado
+        raise RespostaLoteInvalida(f"Conteúdo bloqueado: {e}") from e
 
-        LOTE DE CHUNKS PARA PROCESSAR:
-        {json.dumps(lote_chunks, indent=2, ensure_ascii=False)}
+    texto_resposta = None
+    try:
+        texto_resposta = response.text
+        resultados = json.loads(limpar_resposta_json(texto_resposta))
+    except ValueError as e:  # Inclui json.JSONDecodeError e resposta sem texto
+        logger.error(f"Erro ao decodificar JSON da resposta do Gemini ({len(lote_chunks)} chunks): {e}")
+        respostas_interpretadas.incrementar(tarefa="síntese", forma="falha")
+        raise RespostaLoteInvalida(str(e), saida_bruta=texto_resposta) from e
+    if not isinstance(resultados, list):
+        respostas_interpretadas.incrementar(tarefa="síntese", forma="falha")
+        raise RespostaLoteInvalida(f"Esperada uma lista JSON, recebido {type(resultados).__name__}.", saida_bruta=texto_resposta)
+    respostas_interpretadas.incrementar(tarefa="síntese", forma="json")
+    armazenar_cache_gemini(NOME_MODELO_GEMINI, template.versao, prompt, texto_resposta)
+    return marcar_versao(resultados, template.versao)
+
+def gerar_textos_sinteticos_com_divisao(lote_chunks):
+    """Gera o lote; se a resposta vier inválida (ex.: JSON truncado), divide-o ao meio e tenta cada metade.
+
+    Retorna a lista de resultados (possivelmente parcial); um chunk que sozinho ainda
+    recebe resposta inválida aparece como {"id_original", "erro", "saida_bruta"}.
+    Erros da API são lançados como ErroGemini. Cada chamada é registrada em
+    `estatisticas_lotes` com seu tamanho, acertos e latência.
     """
-    
-    # O loop de tentativas agora serve como um fallback. Se a chave escolhida no rodízio
-    # falhar, ele tentará as chaves seguintes para ESTE LOTE específico.
-    tentativas_chave = 0
-    while tentativas_chave < len(gemini_keys):
-        try:
-            response = model.generate_content(prompt)
-            cleaned_response = response.text.strip()
-            if cleaned_response.startswith("```json"):
-                cleaned_response = cleaned_response[7:]
-            if cleaned_response.endswith("```"):
-                cleaned_response = cleaned_response[:-3]
-            
-            return json.loads(cleaned_response)
-
-        except json.JSONDecodeError as e:
-            logger.error(f"Erro ao decodificar JSON da resposta do Gemini: {e}\nResposta recebida: {response.text}")
-            return None # Falha irrecuperável para este lote
-
-        except Exception as e:
-            error_str = str(e).lower()
-            if "quota" in error_str or "rate limit" in error_str or "blocked" in error_str:
-                logger.warning(f"Chave de índice {current_key_index} falhou (Quota/Limite/Bloqueio).")
-                tentativas_chave += 1
-                
-                # Pula para a próxima chave para tentar processar o mesmo lote
-                current_key_index = (current_key_index + 1) % len(gemini_keys)
-                model = configurar_gemini(gemini_keys[current_key_index])
-                logger.info("Tentando novamente o mesmo lote com a próxima chave...")
-                continue
-            else:
-                logger.error(f"Erro inesperado na API do Gemini: {e}")
-                return None # Falha irrecuperável para este lote
-    
-    logger.error("Todas as chaves Gemini falharam para este lote. O lote será marcado para nova tentativa mais tarde.")
-    return None
-
-def processar_lote_e_salvar(lote_para_processar, col_origem, col_destino):
-    """Processa um lote de chunks e salva os resultados."""
-    logger.info(f"Processando um lote de {TAMANHO_LOTE} chunks...")
-    resultados_lote = gerar_textos_sinteticos_em_lote(lote_para_processar)
-    
-    if resultados_lote is None:
-        logger.error("Falha ao processar o lote. Nenhum resultado recebido da API. Marcando para nova tentativa.")
+    inicio = time.monotonic()
+    try:
+        resultados = gerar_textos_sinteticos_em_lote(lote_chunks)
+    except RespostaLoteInvalida as e:
+        estatisticas_lotes.registrar(len(lote_chunks), 0, time.monotonic() - inicio)
+        if len(lote_chunks) == 1:
+            return [{"id_original": lote_chunks[0]["id_original"], "erro": str(e), "saida_bruta": e.saida_bruta}]
+        meio = len(lote_chunks) // 2
+        logger.warning(f"Resposta inválida para lote de {len(lote_chunks)} chunks. Dividindo em {meio} + {len(lote_chunks) - meio}.")
+        resultados = []
+        for metade in (lote_chunks[:meio], lote_chunks[meio:]):
+            resultados_metade = gerar_textos_sinteticos_com_divisao(metade)
+            if resultados_metade:
+                resultados.extend(resultados_metade)
+        return resultados
+    ids_lote = {chunk["id_original"] for chunk in lote_chunks}
+    sintetizados = sum(
+        1 for item in resultados or []
+        if isinstance(item, dict) and item.get("id_original") in ids_lote and item.get("texto_sintetico")
+    )
+    latencia = time.monotonic() - inicio
+    estatisticas_lotes.registrar(len(lote_chunks), sintetizados, latencia)
+    logger.info(f"Lote de {len(lote_chunks)} chunks: {sintetizados} sintetizados em {latencia:.1f}s.")
+    return resultados
+
+def registrar_falha_sintese(fila, chunk_id_obj, chunk_id_str, erro, saida_bruta=None):
+    """Encerra a reserva agendando a próxima tentativa ou, no limite, manda o chunk para as falhas permanentes."""
+    tentativas = fila.registrar_falha(chunk_id_obj, erro, saida_bruta)
+    if tentativas is None:
+        logger.warning(f"Reserva do chunk {chunk_id_str} perdida antes de registrar a falha: {erro}")
+    elif tentativas >= MAX_TENTATIVAS_CHUNK:
+        logger.error(f"Chunk {chunk_id_str} atingiu o máximo de tentativas e foi marcado como falha permanente: {erro}")
+    else:
+        logger.warning(f"Falha na síntese do chunk {chunk_id_str}. Tentativa {tentativas} de {MAX_TENTATIVAS_CHUNK}: {erro}")
+
+def montar_documento_sintetico(doc_original, resultado):
+    """Documento de 'chunks_sinteticos' para um item bem-sucedido da resposta do lote.
+
+    Quase-duplicatas de textos já sintetizados saem marcadas e não entram na fila de rotulagem.
+    """
+    doc_sintetico = {
+        "id_chunk_original": doc_original["_id"],
+        "id_documento_anonimizado": doc_original.get("id_documento_anonimizado"),
+        "id_documento_original": doc_original.get("id_documento_original"),
+        "texto_sintetico": resultado["texto_sintetico"],
+        "fonte": "proad_sintetico", 
+        "nome_modelo": NOME_MODELO_GEMINI,
+        "versao_prompt": resultado.get("versao_prompt"),
+        "confianca_geracao": resultado.get("confianca_geracao"),
+        "data_sintetizacao": datetime.now(),
+        "status_rotulagem": "pendente",
+        "erro_rotulagem": False,
+        "proxima_tentativa_rotulagem_em": SEM_ESPERA
+    }
+    doc_sintetico.update(verificar_texto_sintetico("chunks_sinteticos", doc_original["_id"], resultado["texto_sintetico"]))
+    return doc_sintetico
+
+def sintetizar_lote(lote_para_processar, docs_originais, fila):
+    """Gera o lote e devolve [(id ObjectId, id str, documento sintético)] dos chunks bem-sucedidos.
+
+    `docs_originais` mapeia o id (str) de cada chunk ao documento lido na reserva, evitando
+    um find_one por chunk. Os demais chunks já saem daqui com a falha registrada (ou
+    adiados, se a quota de todas as chaves acabou).
+    """
+    logger.info(f"Processando um lote de {len(lote_para_processar)} chunks...")
+    try:
+        resultados_lote = gerar_textos_sinteticos_com_divisao(lote_para_processar)
+    except ErroLimiteTaxa as e:
+        # Quota não é defeito do chunk: volta à fila depois do cooldown, sem gastar tentativa
+        atraso = BACKOFF_QUOTA.espera(0, e.retry_after)
+        logger.error(f"Quota esgotada em todas as chaves. Lote de {len(lote_para_processar)} chunks adiado em {atraso:.0f}s.")
         for chunk_info in lote_para_processar:
-            col_origem.update_one(
-                {"_id": ObjectId(chunk_info["id_original"])},
-                {"$inc": {"tentativas_sintese": 1}, "$set": {"status_sintese": "pendente"}}
-            )
-        return
-
-    mapa_resultados = {item['id_original']: item for item in resultados_lote}
+            fila.adiar(ObjectId(chunk_info["id_original"]), atraso)
+        return []
+    except ErroGemini as e:
+        logger.error(f"Falha ao processar o lote ({type(e).__name__}): {e}. Marcando para nova tentativa.")
+        for chunk_info in lote_para_processar:
+            registrar_falha_sintese(fila, ObjectId(chunk_info["id_original"]), chunk_info["id_original"], f"{type(e).__name__}: {e}")
+        return []
 
+    mapa_resultados = {item.get('id_original'): item for item in resultados_lote if isinstance(item, dict)}
+    sintetizados = []
     for chunk_original_info in lote_para_processar:
         chunk_id_str = chunk_original_info["id_original"]
         chunk_id_obj = ObjectId(chunk_id_str)
-        resultado = mapa_resultados.get(chunk_id_str)
-
-        if resultado and resultado.get("texto_sintetico"):
-            try:
-                doc_original = col_origem.find_one({"_id": chunk_id_obj})
-                if not doc_original:
-                    logger.warning(f"Documento original com ID {chunk_id_str} não encontrado. Pulando.")
-                    continue
-                
-                doc_sintetico = {
-                    "id_chunk_original": doc_original["_id"],
-                    "id_documento_anonimizado": doc_original.get("id_documento_anonimizado"),
-                    "id_documento_original": doc_original.get("id_documento_original"),
-                    "texto_sintetico": resultado["texto_sintetico"],
-                    "fonte": "proad_sintetico", 
-                    "nome_modelo": NOME_MODELO_GEMINI,
-                    "versao_prompt": VERSAO_PROMPT,
-                    "confianca_geracao": resultado.get("confianca_geracao"),
-                    "data_sintetizacao": datetime.now(),
-                    "status_rotulagem": "pendente"
-                }
-                
-                result = col_destino.update_one(
-                    {"id_chunk_original": chunk_id_obj},
-                    {"$set": doc_sintetico},
-                    upsert=True
-                )
-                if result.upserted_id is not None:
-                    logger.info(f"Resultado update_one: matched={result.matched_count}, modified={result.modified_count}, upserted_id={result.upserted_id} (novo documento criado)")
-                else:
-                    doc = col_destino.find_one({"id_chunk_original": chunk_id_obj})
-                    logger.info(f"Resultado update_one: matched={result.matched_count}, modified={result.modified_count}, _id existente={doc.get('_id') if doc else None}")
-                
-                col_origem.update_one(
-                    {"_id": chunk_id_obj},
-                    {"$set": {"status_sintese": "sucesso", "tentativas_sintese": 0}}
-                )
-                logger.info(f"Chunk {chunk_id_str} sintetizado com sucesso.")
-
-            except Exception as e:
-                logger.error(f"Erro ao salvar o chunk sintetizado {chunk_id_str}: {e}")
-                col_origem.update_one(
-                    {"_id": chunk_id_obj},
-                    {"$inc": {"tentativas_sintese": 1}, "$set": {"status_sintese": "erro_salvamento"}}
-                )
-
+        resultado = mapa_resultados.get(chunk_id_str) or {}
+        if resultado.get("texto_sintetico"):
+            doc_sintetico = montar_documento_sintetico(docs_originais[chunk_id_str], resultado)
+            sintetizados.append((chunk_id_obj, chunk_id_str, doc_sintetico))
         else:
-            update_result = col_origem.update_one(
-                {"_id": chunk_id_obj},
-                {"$inc": {"tentativas_sintese": 1}, "$set": {"status_sintese": "pendente"}}
+            registrar_falha_sintese(
+                fila, chunk_id_obj, chunk_id_str,
+                resultado.get("erro", "Resposta do lote sem texto sintético para o chunk."),
+                resultado.get("saida_bruta")
             )
-            doc_atualizado = col_origem.find_one({"_id": chunk_id_obj})
-            tentativas = doc_atualizado.get("tentativas_sintese", 0)
-            if tentativas >= MAX_TENTATIVAS_CHUNK:
-                col_origem.update_one(
-                    {"_id": chunk_id_obj},
-                    {"$set": {"status_sintese": "falha_permanente"}}
-                )
-                logger.error(f"Chunk {chunk_id_str} atingiu o máximo de tentativas e foi marcado como falha permanente.")
-            else:
-                logger.warning(f"Falha na síntese do chunk {chunk_id_str}. Tentativa {tentativas} de {MAX_TENTATIVAS_CHUNK}.")
-    
-    logger.info("Lote processado. Aguardando 30 segundos...")
-    time.sleep(15)
-
-def processar_chunks_para_sintetizacao():
-    """Processa chunks pendentes de sintetização."""
+    return sintetizados
+
+def processar_lote_e_salvar(lote_para_processar, docs_originais, fila, col_destino, buffer):
+    """Processa um lote de chunks e enfileira os resultados no buffer de escrita.
+
+    O upsert em `col_destino` e a marcação de sucesso na origem vão para o buffer
+    (bulk_write); a marcação só é enfileirada depois que o upsert é gravado.
+    """
+    for chunk_id_obj, chunk_id_str, doc_sintetico in sintetizar_lote(lote_para_processar, docs_originais, fila):
+
+        def confirmar(chunk_id_obj=chunk_id_obj, chunk_id_str=chunk_id_str):
+            buffer.adicionar(fila.colecao, fila.operacao_concluir(
+                chunk_id_obj, {"status_sintese": "sucesso", "tentativas_sintese": 0}
+            ))
+            itens_processados.incrementar(estagio="síntese")
+            logger.info(f"Chunk {chunk_id_str} sintetizado com sucesso.")
+
+        def falhar(chunk_id_obj=chunk_id_obj, chunk_id_str=chunk_id_str):
+            registrar_falha_sintese(fila, chunk_id_obj, chunk_id_str, "Erro ao salvar o chunk sintetizado.")
+
+        buffer.adicionar(
+            col_destino,
+            UpdateOne({"id_chunk_original": chunk_id_obj}, {"$set": doc_sintetico}, upsert=True),
+            ao_confirmar=confirmar,
+            ao_falhar=falhar
+        )
+
+def _trabalhador_sintese(fila_lotes, fila, col_destino, buffer):
+    """Consome lotes já reservados; o pool escolhe a chave com mais folga para cada chamada."""
+    while True:
+        docs = fila_lotes.get()
+        if docs is None:
+            return
+        try:
+            lote_atual = [
+                {"id_original": str(doc["_id"]), "texto_original": doc.get("chunk_texto")}
+                for doc in docs
+            ]
+            docs_lote = {str(doc["_id"]): doc for doc in docs}
+            processar_lote_e_salvar(lote_atual, docs_lote, fila, col_destino, buffer)
+        except Exception as e:
+            logger.error(f"Erro ao processar lote de {len(docs)} chunks: {e}", exc_info=True)
+
+def processar_chunks_para_sintetizacao(em_voo_por_chave=EM_VOO_POR_CHAVE):
+    """Sintetiza continuamente os chunks pendentes.
+
+    O alimentador reserva um lote por vez (só os campos usados na síntese) e o coloca
+    numa fila limitada; quando ela enche, a reserva para até algum trabalhador liberar
+    espaço. Assim a memória não depende do tamanho do backlog e chunks que ficam
+    pendentes durante a execução entram na próxima reserva. Sem pendentes, o alimentador
+    espera o observador da coleção (change stream ou sondagem indexada) avisar de chunks
+    novos, e no máximo `INTERVALO_SEM_PENDENTES_SEGUNDOS` (retentativas agendadas).
+    Retorna só em caso de erro.
+    """
     client = None
+    trabalhadores = []
+    fila_lotes = None
+    observador = None
+    buffer = BufferEscritaMongo()
     try:
         client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
         client.admin.command('ping')
@@ -250,60 +382,61 @@ def processar_chunks_para_sintetizacao():
         collection_origem = db['chunks']
         collection_destino = db['chunks_sinteticos'] 
         
-        collection_destino.create_index("id_chunk_original", unique=True)
-        
-        logger.info("Iniciando busca por chunks para sintetizar...")
+        preparar_colecoes(db)
         
-        query = {
-            "$and": [
-                {
-                    "$or": [
-                        {"status_sintese": {"$in": ["pendente", "erro_salvamento"]}},
-                        {"status_sintese": None},
-                        {"status_sintese": {"$exists": False}}
-                    ]
-                },
-                {
-                    "$or": [
-                        {"tentativas_sintese": {"$lt": MAX_TENTATIVAS_CHUNK}},
-                        {"tentativas_sintese": {"$exists": False}}
-                    ]
-                },
-                {
-                    "$or": [
-                        {"erro_rotulagem": {"$exists": False}},
-                        {"erro_rotulagem": False}
-                    ]
-                }
-            ]
-        }
-        
-        cursor = collection_origem.find(query).limit(5000)
-        docs = list(cursor)
-        lote_atual = []
-        docs_encontrados = False
-        for doc in docs:
-            docs_encontrados = True
-            lote_atual.append({
-                "id_original": str(doc["_id"]),
-                "texto_original": doc.get("chunk_texto")
-            })
-
-            if len(lote_atual) >= TAMANHO_LOTE:
-                processar_lote_e_salvar(lote_atual, collection_origem, collection_destino)
-                lote_atual = []
-        
-        if lote_atual:
-            processar_lote_e_salvar(lote_atual, collection_origem, collection_destino)
-
-        if not docs_encontrados:
-            logger.info("Nenhum chunk para processar encontrado neste ciclo.")
+        fila = criar_fila_sintese(collection_origem)
+        observador = criar_observador(fila).iniciar()
+        pool_gemini.definir_em_voo_por_chave(em_voo_por_chave)
+        quantidade_trabalhadores = len(pool_gemini) * em_voo_por_chave
+        fila_lotes = queue.Queue(maxsize=quantidade_trabalhadores * LOTES_NA_FILA_POR_TRABALHADOR)
+        profundidade_fila.acompanhar(fila_lotes.qsize, fila="síntese")
+        for _ in range(quantidade_trabalhadores):
+            trabalhador = threading.Thread(
+                target=_trabalhador_sintese,
+                args=(fila_lotes, fila, collection_destino, buffer),
+                daemon=True
+            )
+            trabalhador.start()
+            trabalhadores.append(trabalhador)
+        logger.info(f"Sintetizando com {quantidade_trabalhadores} trabalhadores (trabalhador {fila.id_trabalhador})...")
+
+        # Cada chunk é reservado atomicamente (outros processos não pegam os mesmos) e
+        # empacotado em lotes pelo orçamento de tokens
+        sobra = None
+        ultimo_relatorio = time.monotonic()
+        while True:
+            docs, sobra = reservar_lote_por_orcamento(fila, sobra)
+            salvar_indice_compartilhado(somente_se_vencido=True)
+            if time.monotonic() - ultimo_relatorio >= INTERVALO_RELATORIO_LOTES_SEGUNDOS:
+                estatisticas_lotes.registrar_relatorio()
+                ultimo_relatorio = time.monotonic()
+            if not docs:
+                buffer.descarregar()
+                logger.info("Nenhum chunk pendente. Aguardando chunks novos...")
+                normalizar_novos_documentos(collection_origem, observador.aguardar(INTERVALO_SEM_PENDENTES_SEGUNDOS))
+                continue
+            while True:
+                try:
+                    fila_lotes.put(docs, timeout=INTERVALO_ALIMENTACAO_SEGUNDOS)
+                    break
+                except queue.Full:
+                    buffer.descarregar_se_vencido()
 
     except pymongo.errors.ConnectionFailure as e:
         logger.error(f"Erro de conexão com o MongoDB: {e}")
     except Exception as e:
         logger.error(f"Erro geral no processamento: {e}", exc_info=True)
     finally:
+        if observador is not None:
+            observador.parar()
+        for _ in trabalhadores:
+            fila_lotes.put(None)
+        for trabalhador in trabalhadores:
+            trabalhador.join()
+        buffer.descarregar()
+        estatisticas_lotes.registrar_relatorio()
+        registrar_estatisticas_cache()
+        salvar_indice_compartilhado()
         if client:
             client.close()
             logger.info("Conexão com MongoDB fechada.")
@@ -311,10 +444,12 @@ def processar_chunks_para_sintetizacao():
 def main():
     """Loop principal do serviço."""
     logger.info("Serviço de Sintetização de Dados iniciado.")
+    iniciar_servidor_metricas()
+    encerrar_ao_receber_sigterm()
     while True:
         processar_chunks_para_sintetizacao()
-        logger.info("Ciclo de sintetização concluído. Aguardando 1 hora para o próximo.")
-        time.sleep(3600)
+        logger.info(f"Sintetização interrompida. Reiniciando em {INTERVALO_SEM_PENDENTES_SEGUNDOS} segundos.")
+        time.sleep(INTERVALO_SEM_PENDENTES_SEGUNDOS)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,102 @@
+"""Configuração dos testes: torna os scripts importáveis como `dataset.migracao_dados`.
+
+No projeto completo, esta pasta `scripts` é o pacote `dataset/migracao_dados`; num checkout
+só deste repositório o pacote não existe, então ele é registrado apontando para cá.
+
+A fixture `db` usa o MongoDB de `MONGO_TESTE_URI` quando definido (um banco descartável
+por teste) e, sem ele, o mongomock.
+"""
+import importlib.util
+import os
+import sys
+import types
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+PASTA_SCRIPTS = Path(__file__).resolve().parent.parent
+MONGO_TESTE_URI = os.getenv("MONGO_TESTE_URI")
+
+
+def _registrar_pacote_scripts():
+    try:
+        if importlib.util.find_spec("dataset.migracao_dados") is not None:
+            return
+    except ModuleNotFoundError:
+        pass
+    dataset = sys.modules.get("dataset")
+    if dataset is None:
+        dataset = types.ModuleType("dataset")
+        dataset.__path__ = []
+        sys.modules["dataset"] = dataset
+    migracao_dados = types.ModuleType("dataset.migracao_dados")
+    migracao_dados.__path__ = [str(PASTA_SCRIPTS)]
+    sys.modules["dataset.migracao_dados"] = migracao_dados
+    dataset.migracao_dados = migracao_dados
+
+
+_registrar_pacote_scripts()
+
+
+def _compatibilizar_mongomock(mongomock):
+    """Cobre no mongomock o que os scripts usam do MongoDB e ele ainda não implementa.
+
+    - o pymongo 4.9+ passa `sort` (None fora de update_one/replace_one com ordenação) às
+      operações de bulk_write, argumento que o construtor de lotes do mongomock 4.3 não aceita;
+    - nos pipelines de atualização da agenda de tentativas, `$add` soma milissegundos a uma
+      data e o estágio `$unset` remove campos.
+    """
+    import mongomock.aggregate as agregacao
+
+    construtor = mongomock.collection.BulkOperationBuilder
+    if getattr(construtor, "_compativel", False):
+        return
+
+    def ignorar_sort_vazio(metodo):
+        def adicionar(self, *args, sort=None, **kwargs):
+            if sort is not None:
+                raise NotImplementedError("mongomock não implementa `sort` em bulk_write")
+            return metodo(self, *args, **kwargs)
+        return adicionar
+
+    construtor.add_update = ignorar_sort_vazio(construtor.add_update)
+    construtor.add_replace = ignorar_sort_vazio(construtor.add_replace)
+
+    operador_aritmetico = agregacao._Parser._handle_arithmetic_operator
+
+    def somar_datas(self, operador, valores):
+        if operador == "$add":
+            termos = [self.parse(valor) for valor in valores]
+            datas = [termo for termo in termos if isinstance(termo, datetime)]
+            if len(datas) == 1:
+                milissegundos = sum(termo for termo in termos if not isinstance(termo, datetime))
+                return datas[0] + timedelta(milliseconds=milissegundos)
+        return operador_aritmetico(self, operador, valores)
+
+    def estagio_unset(colecao, banco, campos):
+        campos = [campos] if isinstance(campos, str) else campos
+        return [{chave: valor for chave, valor in doc.items() if chave not in campos} for doc in colecao]
+
+    agregacao._Parser._handle_arithmetic_operator = somar_datas
+    if agregacao._PIPELINE_HANDLERS.get("$unset") is None:
+        agregacao._PIPELINE_HANDLERS["$unset"] = estagio_unset
+    construtor._compativel = True
+
+
+@pytest.fixture
+def db():
+    if MONGO_TESTE_URI:
+        pymongo = pytest.importorskip("pymongo")
+        cliente = pymongo.MongoClient(MONGO_TESTE_URI, serverSelectionTimeoutMS=5000, tz_aware=True)
+        nome = f"teste_{uuid.uuid4().hex[:8]}"
+        try:
+            yield cliente[nome]
+        finally:
+            cliente.drop_database(nome)
+            cliente.close()
+    else:
+        mongomock = pytest.importorskip("mongomock")
+        _compatibilizar_mongomock(mongomock)
+        yield mongomock.MongoClient(tz_aware=True).dataset_treinamento
@@ -0,0 +1,85 @@
+"""Gravação dos textos sigilosos e marcação do chunk de inspiração."""
+import os
+
+import pytest
+
+pytest.importorskip("dotenv")
+pymongo = pytest.importorskip("pymongo")
+pytest.importorskip("google.generativeai")
+os.environ.setdefault("GEMINI_API_KEY", "chave-de-teste")
+
+from dataset.migracao_dados import aumentador_dataset_sigiloso as aumentador
+from dataset.migracao_dados.consultas_mongo import criar_agenda_aumento
+
+RESULTADO = {"texto_sintetico": "texto sigiloso gerado", "confianca_geracao_sintetica": 0.9, "versao_prompt": "v1"}
+
+
+indexados = []
+
+
+@pytest.fixture
+def colecoes(db, monkeypatch):
+    indexados.clear()
+    monkeypatch.setattr(aumentador, "gerar_texto_sigiloso", lambda chunk: dict(RESULTADO))
+    monkeypatch.setattr(aumentador, "consultar_texto_sintetico", lambda *args: {})
+    monkeypatch.setattr(aumentador, "registrar_texto_sintetico", lambda *args: indexados.append(args[1]))
+    db.chunks.insert_many([{"_id": i, "usado_para_geracao_sigilosa": False} for i in range(3)])
+    return db.chunks, db.chunks_sigilosos, criar_agenda_aumento(db)
+
+
+def _usado(chunks, chunk_id):
+    return chunks.find_one({"_id": chunk_id})["usado_para_geracao_sigilosa"]
+
+
+def test_grava_o_documento_e_marca_o_chunk(colecoes):
+    chunks, sigilosos, agenda = colecoes
+
+    assert aumentador.processo_de_aumento(chunks, sigilosos, {"_id": 0}, agenda) is True
+
+    assert _usado(chunks, 0) is True
+    doc = sigilosos.find_one({"id_chunk_original": 0})
+    assert doc["texto_sintetico"] == RESULTADO["texto_sintetico"]
+    assert doc["versao_prompt"] == "v1"
+
+
+def test_falha_na_gravacao_nao_marca_o_chunk(colecoes, monkeypatch):
+    chunks, sigilosos, agenda = colecoes
+
+    def falhar(*args, **kwargs):
+        raise pymongo.errors.OperationFailure("falha simulada")
+    monkeypatch.setattr(type(sigilosos), "update_one", falhar)
+
+    assert aumentador.processo_de_aumento(chunks, sigilosos, {"_id": 1}, agenda) is False
+    assert _usado(chunks, 1) is False
+
+
+def test_chunk_que_ja_tem_documento_so_completa_a_marcacao(colecoes):
+    """Uma gravação anterior cuja marcação falhou: não gera um segundo documento."""
+    chunks, sigilosos, agenda = colecoes
+    sigilosos.insert_one({"id_chunk_original": 1, "texto_sintetico": "anterior"})
+
+    assert aumentador.processo_de_aumento(chunks, sigilosos, {"_id": 1}, agenda) is False
+
+    assert _usado(chunks, 1) is True
+    assert [doc["texto_sintetico"] for doc in sigilosos.find({"id_chunk_original": 1})] == ["anterior"]
+
+
+def test_chunk_usado_por_outro_processo_descarta_a_geracao(colecoes):
+    chunks, sigilosos, agenda = colecoes
+    chunks.update_one({"_id": 2}, {"$set": {"usado_para_geracao_sigilosa": True}})
+
+    assert aumentador.processo_de_aumento(chunks, sigilosos, {"_id": 2}, agenda) is False
+
+    assert sigilosos.count_documents({}) == 0
+
+
+def test_so_indexa_o_texto_gravado_e_com_o_chunk_marcado(colecoes):
+    """Gerações descartadas não entram no índice de quase-duplicatas."""
+    chunks, sigilosos, agenda = colecoes
+    sigilosos.insert_one({"id_chunk_original": 1, "texto_sintetico": "anterior"})
+
+    assert aumentador.processo_de_aumento(chunks, sigilosos, {"_id": 1}, agenda) is False
+    assert indexados == []
+
+    assert aumentador.processo_de_aumento(chunks, sigilosos, {"_id": 0}, agenda) is True
+    assert indexados == [sigilosos.find_one({"id_chunk_original": 0})["_id"]]
@@ -0,0 +1,128 @@
+"""Normalização dos campos de fila e consultas de trabalho dos scripts."""
+import os
+
+import pytest
+
+pytest.importorskip("dotenv")
+pymongo = pytest.importorskip("pymongo")
+
+from dataset.migracao_dados import consultas_mongo
+from dataset.migracao_dados.consultas_mongo import (
+    CAMPO_PRIORIDADE_ROTULAGEM,
+    INDICE_SIGILOSO_POR_CHUNK,
+    MAX_TENTATIVAS_SINTESE,
+    consultas_dos_trabalhadores,
+    criar_fila_sintese,
+    deduplicar_sigilosos,
+    estagios_do_plano,
+    estagios_problematicos,
+    garantir_indice_sigilosos,
+    normalizar_campos_de_fila,
+    preparar_colecoes,
+    verificar_planos_de_consulta,
+)
+from dataset.migracao_dados.fila_trabalho_mongo import STATUS_FALHA_PERMANENTE
+
+
+def test_normalizacao_preenche_campos_ausentes(db):
+    db.chunks.insert_one({"_id": 1, "texto": "t"})
+
+    normalizar_campos_de_fila(db)
+
+    doc = db.chunks.find_one({"_id": 1})
+    assert doc["status_sintese"] == "pendente"
+    assert doc["tentativas_sintese"] == 0
+    assert doc["erro_rotulagem"] is False
+    assert doc["usado_para_geracao_sigilosa"] is False
+    assert criar_fila_sintese(db.chunks).reivindicar()["_id"] == 1
+
+
+def test_chunks_antigos_com_tentativas_esgotadas_saem_da_fila(db):
+    db.chunks.insert_many([
+        {"_id": 1, "status_sintese": "pendente", "tentativas_sintese": MAX_TENTATIVAS_SINTESE},
+        {"_id": 2, "status_sintese": "erro_salvamento", "tentativas_sintese": MAX_TENTATIVAS_SINTESE + 1},
+        {"_id": 3, "status_sintese": "erro_salvamento", "tentativas_sintese": MAX_TENTATIVAS_SINTESE - 1},
+        {"_id": 4, "status_sintese": "sucesso", "tentativas_sintese": MAX_TENTATIVAS_SINTESE},
+    ])
+
+    normalizar_campos_de_fila(db)
+
+    status = {doc["_id"]: doc["status_sintese"] for doc in db.chunks.find()}
+    assert status == {1: STATUS_FALHA_PERMANENTE, 2: STATUS_FALHA_PERMANENTE, 3: "erro_salvamento", 4: "sucesso"}
+    assert [doc["_id"] for doc in criar_fila_sintese(db.chunks).reivindicar_lote(10)] == [3]
+
+
+def test_preparar_colecoes_nao_depende_dos_sigilosos_antigos(db):
+    db.chunks_sigilosos.insert_many([{"id_chunk_original": 1}, {"id_chunk_original": 1}, {}, {}])
+
+    preparar_colecoes(db)
+
+    assert INDICE_SIGILOSO_POR_CHUNK.document["name"] not in db.chunks_sigilosos.index_information()
+
+
+def test_deduplicar_sigilosos_mantem_o_mais_antigo(db):
+    db.chunks_sigilosos.insert_many([
+        {"_id": 1, "id_chunk_original": "a"},
+        {"_id": 2, "id_chunk_original": "a"},
+        {"_id": 3, "id_chunk_original": "a"},
+        {"_id": 4, "id_chunk_original": "b"},
+        {"_id": 5},
+    ])
+
+    assert deduplicar_sigilosos(db.chunks_sigilosos) == 2
+    assert deduplicar_sigilosos(db.chunks_sigilosos) == 0
+
+    originais = {doc["_id"]: doc.get("id_chunk_original") for doc in db.chunks_sigilosos.find()}
+    assert originais == {1: "a", 2: None, 3: None, 4: "b", 5: None}
+    assert db.chunks_sigilosos.count_documents({"id_chunk_original_duplicado": "a"}) == 2
+
+
+def test_indice_sigilosos_rejeita_segundo_documento_do_mesmo_chunk(db):
+    db.chunks_sigilosos.insert_many([{"id_chunk_original": "a"}, {"id_chunk_original": "b"}])
+
+    garantir_indice_sigilosos(db)
+
+    assert INDICE_SIGILOSO_POR_CHUNK.document["name"] in db.chunks_sigilosos.index_information()
+    with pytest.raises(pymongo.errors.DuplicateKeyError):
+        db.chunks_sigilosos.insert_one({"id_chunk_original": "b"})
+
+
+@pytest.mark.skipif(not os.getenv("MONGO_TESTE_URI"),
+                    reason="o mongomock ignora partialFilterExpression ao validar um índice único novo")
+def test_indice_sigilosos_com_duplicatas_e_documentos_antigos(db):
+    db.chunks_sigilosos.insert_many([{"id_chunk_original": "a"}, {"id_chunk_original": "a"}, {}, {}])
+
+    garantir_indice_sigilosos(db)
+
+    assert INDICE_SIGILOSO_POR_CHUNK.document["name"] in db.chunks_sigilosos.index_information()
+    assert db.chunks_sigilosos.count_documents({}) == 4
+    db.chunks_sigilosos.insert_many([{}, {}])
+
+
+def test_estagios_problematicos_inclui_ordenacao_em_memoria():
+    ordenado_em_memoria = {"stage": "LIMIT", "inputStage": {"stage": "SORT", "inputStage": {
+        "stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": "fila_rotulagem"}}}}
+    or_ordenado_pelo_indice = {"stage": "LIMIT", "inputStage": {"stage": "FETCH", "inputStage": {
+        "stage": "SORT_MERGE", "inputStages": [{"stage": "IXSCAN"}, {"stage": "IXSCAN"}]}}}
+    varredura = {"stage": "LIMIT", "inputStage": {"stage": "SORT", "inputStage": {"stage": "COLLSCAN"}}}
+
+    assert estagios_problematicos(estagios_do_plano(ordenado_em_memoria)) == ["SORT"]
+    assert estagios_problematicos(estagios_do_plano(or_ordenado_pelo_indice)) == []
+    assert estagios_problematicos(estagios_do_plano(varredura)) == ["COLLSCAN", "SORT"]
+
+
+def test_reserva_de_rotulagem_e_verificada_com_a_ordenacao_da_fila(db, monkeypatch):
+    monkeypatch.setattr(consultas_mongo, "PRIORIZACAO_ROTULAGEM_ATIVADA", True)
+
+    ordenacoes = {descricao: ordenacao for descricao, _, _, ordenacao in consultas_dos_trabalhadores(db)}
+
+    assert ordenacoes["reserva de rotulagem"] == [(CAMPO_PRIORIDADE_ROTULAGEM, -1)]
+    assert ordenacoes["reserva de síntese"] is None
+
+
+@pytest.mark.skipif(not os.getenv("MONGO_TESTE_URI"), reason="o mongomock não implementa explain()")
+def test_consultas_dos_trabalhadores_usam_indice_com_priorizacao(db, monkeypatch):
+    monkeypatch.setattr(consultas_mongo, "PRIORIZACAO_ROTULAGEM_ATIVADA", True)
+    preparar_colecoes(db)
+
+    assert verificar_planos_de_consulta(db) == []
@@ -0,0 +1,44 @@
+"""Nomes das classes nos relatórios e divisão sem vazamento entre partições."""
+import logging
+import re
+from pathlib import Path
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("pyarrow")
+pytest.importorskip("dotenv")
+pytest.importorskip("pymongo")
+
+from dataset.migracao_dados.balanceador_dataset import NOMES_CLASSES
+from dataset.migracao_dados.divisor_dataset import resumir_particoes
+
+RAIZ = Path(__file__).resolve().parents[2]
+LINHA_CLASSE = re.compile(r"^\| \*\*(\d)\*\* \| (\w+) \|", re.MULTILINE)
+
+
+@pytest.mark.parametrize("documento", ["dicionario_dados.md", "README.md"])
+def test_nomes_das_classes_seguem_a_documentacao(documento):
+    tabela = {int(codigo): nome for codigo, nome in LINHA_CLASSE.findall((RAIZ / documento).read_text(encoding="utf-8"))}
+    assert tabela == NOMES_CLASSES
+
+
+def test_resumo_das_particoes_nomeia_cada_classe(caplog):
+    classes = np.array([0, 0, 1, 2, 2, 2])
+    particoes = np.array([0, 0, 1, 0, 2, 2], dtype=np.int8)
+    grupos = np.array([0, 0, 1, 2, 3, 3])
+
+    with caplog.at_level(logging.INFO):
+        resumir_particoes(classes, particoes, grupos)
+
+    linhas = {mensagem.split(":")[0].strip(): mensagem for mensagem in caplog.messages if ":" in mensagem}
+    assert "treino 2 (100.0%)" in linhas["Sigiloso"]
+    assert "validacao 1 (100.0%)" in linhas["Interno"]
+    assert "teste 2 (66.7%)" in linhas["Público"]
+
+
+def test_resumo_das_particoes_detecta_grupo_dividido():
+    classes = np.array([0, 0])
+    particoes = np.array([0, 1], dtype=np.int8)
+    with pytest.raises(AssertionError):
+        resumir_particoes(classes, particoes, np.array([5, 5]))
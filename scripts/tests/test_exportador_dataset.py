@@ -0,0 +1,46 @@
+"""Exportação em partes Arrow/Parquet a partir de uma coleção em memória."""
+import pytest
+
+pytest.importorskip("pyarrow")
+pytest.importorskip("dotenv")
+mongomock = pytest.importorskip("mongomock")
+
+from dataset.migracao_dados.exportador_dataset import carregar_dataset, exportar_dataset
+
+
+def _docs(quantidade, fonte=None, inicio=0):
+    docs = []
+    for i in range(inicio, inicio + quantidade):
+        doc = {"texto": f"texto {i}", "classificacao_acesso": i % 3, "confianca_classificacao": 0.9}
+        if fonte is not None:
+            doc["fonte"] = fonte
+        docs.append(doc)
+    return docs
+
+
+@pytest.mark.parametrize("formato", ["arrow", "parquet"])
+def test_primeiro_lote_sem_fonte(tmp_path, formato):
+    colecao = mongomock.MongoClient().db.chunks_rotulados
+    # O primeiro lote inteiro sem `fonte`; os seguintes trazem fontes conhecidas e novas
+    colecao.insert_many(_docs(4))
+    colecao.insert_many(_docs(3, "proad_sintetico", inicio=4))
+    colecao.insert_many(_docs(3, "reformulação", inicio=7))
+
+    assert exportar_dataset(colecao, tmp_path, formato, tamanho_lote=4) == 10
+
+    fontes = carregar_dataset(tmp_path).column("fonte").to_pylist()
+    assert fontes == [None] * 4 + ["proad_sintetico"] * 3 + ["reformulação"] * 3
+
+
+def test_exportacao_incremental_anexa_parte(tmp_path):
+    colecao = mongomock.MongoClient().db.chunks_rotulados
+    colecao.insert_many(_docs(5, "proad_sintetico"))
+    assert exportar_dataset(colecao, tmp_path, tamanho_lote=4) == 5
+
+    colecao.insert_many(_docs(2, inicio=5))
+    assert exportar_dataset(colecao, tmp_path, tamanho_lote=4) == 2
+    assert exportar_dataset(colecao, tmp_path, tamanho_lote=4) == 0
+
+    tabela = carregar_dataset(tmp_path)
+    assert tabela.num_rows == 7
+    assert tabela.column("texto").to_pylist() == [f"texto {i}" for i in range(7)]
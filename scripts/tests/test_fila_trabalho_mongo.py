@@ -0,0 +1,232 @@
+"""Reserva, expiração, conclusão e devolução de documentos na fila de trabalho."""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytest.importorskip("pymongo")
+
+from dataset.migracao_dados.fila_trabalho_mongo import (
+    ADIADO_INDEFINIDAMENTE,
+    COLECAO_FALHAS_PERMANENTES,
+    LIMITE_CARACTERES_SAIDA_BRUTA,
+    SEM_ESPERA,
+    STATUS_EM_PROCESSAMENTO,
+    STATUS_FALHA_PERMANENTE,
+    AgendaDeTentativas,
+    FilaDeTrabalhoMongo,
+)
+
+PENDENTES = {"status": "pendente"}
+
+
+def _fila(colecao, trabalhador, **kwargs):
+    return FilaDeTrabalhoMongo(colecao, "status", PENDENTES, "teste", id_trabalhador=trabalhador, **kwargs)
+
+
+def _agendar_agora(colecao, documento_id):
+    """Simula o fim da espera entre tentativas."""
+    colecao.update_one({"_id": documento_id}, {"$set": {"proxima_tentativa_teste_em": SEM_ESPERA}})
+
+
+def _inserir(colecao, quantidade, **campos):
+    colecao.insert_many([
+        {"_id": i, "status": "pendente", "proxima_tentativa_teste_em": SEM_ESPERA, **campos}
+        for i in range(quantidade)
+    ])
+
+
+def _vencer_reserva(colecao, documento_id):
+    """Simula o fim do prazo da reserva sem esperar por ele."""
+    colecao.update_one({"_id": documento_id},
+                       {"$set": {"reserva_teste_ate": datetime.now(timezone.utc) - timedelta(seconds=1)}})
+
+
+def test_reivindicar_reserva_cada_documento_uma_vez(db):
+    _inserir(db.fila, 3)
+    a, b = _fila(db.fila, "a"), _fila(db.fila, "b")
+
+    reservados = [a.reivindicar(), b.reivindicar(), a.reivindicar()]
+
+    assert sorted(doc["_id"] for doc in reservados) == [0, 1, 2]
+    assert a.reivindicar() is None and b.reivindicar() is None
+    doc = db.fila.find_one({"_id": reservados[0]["_id"]})
+    assert doc["status"] == STATUS_EM_PROCESSAMENTO
+    assert doc["trabalhador_teste"] == "a"
+    assert doc["reserva_teste_ate"] > datetime.now(timezone.utc)
+
+
+def test_reivindicar_lote_respeita_quantidade_e_ordenacao(db):
+    db.fila.insert_many([
+        {"_id": i, "status": "pendente", "proxima_tentativa_teste_em": SEM_ESPERA, "prioridade": p}
+        for i, p in enumerate([0.1, 0.9, 0.5, 0.7])
+    ])
+    fila = _fila(db.fila, "a", ordenacao=[("prioridade", -1)])
+
+    assert [doc["_id"] for doc in fila.reivindicar_lote(3)] == [1, 3, 2]
+    assert [doc["_id"] for doc in fila.reivindicar_lote(3)] == [0]
+
+
+def test_proxima_tentativa_futura_nao_e_reivindicada(db):
+    _inserir(db.fila, 1, proxima_tentativa_teste_em=datetime.now(timezone.utc) + timedelta(hours=1))
+    assert _fila(db.fila, "a").reivindicar() is None
+
+
+def test_reserva_vencida_volta_a_ser_reivindicada(db):
+    _inserir(db.fila, 1)
+    a, b = _fila(db.fila, "a"), _fila(db.fila, "b")
+    a.reivindicar()
+    assert b.reivindicar() is None
+
+    _vencer_reserva(db.fila, 0)
+
+    assert b.reivindicar()["_id"] == 0
+    assert db.fila.find_one({"_id": 0})["trabalhador_teste"] == "b"
+
+
+def test_trabalhador_que_perdeu_a_reserva_nao_altera_o_documento(db):
+    """Recuperação de queda: o processo travado volta depois que outro assumiu o documento."""
+    _inserir(db.fila, 1)
+    travado, novo = _fila(db.fila, "travado"), _fila(db.fila, "novo")
+    travado.reivindicar()
+    _vencer_reserva(db.fila, 0)
+    novo.reivindicar()
+
+    resultado = db.fila.bulk_write([travado.operacao_concluir(0, {"status": "concluida"})])
+    travado.liberar(0)
+    travado.adiar(0, 3600)
+
+    assert resultado.modified_count == 0
+    doc = db.fila.find_one({"_id": 0})
+    assert doc["status"] == STATUS_EM_PROCESSAMENTO
+    assert doc["trabalhador_teste"] == "novo"
+    assert doc["proxima_tentativa_teste_em"] == SEM_ESPERA
+
+
+def test_operacao_concluir_encerra_a_reserva(db):
+    _inserir(db.fila, 1)
+    fila = _fila(db.fila, "a")
+    fila.reivindicar()
+
+    db.fila.bulk_write([fila.operacao_concluir(0, {"status": "concluida", "resultado": 1})])
+
+    doc = db.fila.find_one({"_id": 0})
+    assert doc["status"] == "concluida" and doc["resultado"] == 1
+    assert "trabalhador_teste" not in doc and "reserva_teste_ate" not in doc
+    assert fila.reivindicar() is None
+
+
+def test_liberar_devolve_a_fila_imediatamente(db):
+    _inserir(db.fila, 1)
+    a, b = _fila(db.fila, "a"), _fila(db.fila, "b")
+    a.reivindicar()
+
+    a.liberar(0)
+
+    doc = db.fila.find_one({"_id": 0})
+    assert doc["status"] == "pendente"
+    assert "trabalhador_teste" not in doc and "reserva_teste_ate" not in doc
+    assert b.reivindicar()["_id"] == 0
+
+
+def test_adiar_so_devolve_depois_do_atraso(db):
+    _inserir(db.fila, 1)
+    fila = _fila(db.fila, "a")
+    fila.reivindicar()
+
+    fila.adiar(0, 3600)
+
+    doc = db.fila.find_one({"_id": 0})
+    assert doc["status"] == "pendente"
+    assert doc["proxima_tentativa_teste_em"] > datetime.now(timezone.utc) + timedelta(minutes=59)
+    assert "tentativas_teste" not in doc
+    assert fila.reivindicar() is None
+
+    _agendar_agora(db.fila, 0)
+    assert fila.reivindicar()["_id"] == 0
+
+
+def test_registrar_falha_agenda_nova_tentativa_com_backoff(db):
+    _inserir(db.fila, 1)
+    fila = _fila(db.fila, "a", max_tentativas=5)
+    espera_base = fila.agenda.espera_base_segundos
+
+    for tentativa in (1, 2):
+        fila.reivindicar()
+        antes = datetime.now(timezone.utc)
+        assert fila.registrar_falha(0, f"erro {tentativa}") == tentativa
+
+        doc = db.fila.find_one({"_id": 0})
+        assert doc["status"] == "pendente"
+        assert doc["ultimo_erro_teste"] == f"erro {tentativa}"
+        assert "trabalhador_teste" not in doc and "reserva_teste_ate" not in doc
+        # Espera base * 2**(tentativas - 1), com jitter entre metade e o total
+        espera = espera_base * 2 ** (tentativa - 1)
+        assert antes + timedelta(seconds=espera / 2 - 1) <= doc["proxima_tentativa_teste_em"]
+        assert doc["proxima_tentativa_teste_em"] <= datetime.now(timezone.utc) + timedelta(seconds=espera)
+        assert fila.reivindicar() is None
+        _agendar_agora(db.fila, 0)
+
+    assert db[COLECAO_FALHAS_PERMANENTES].count_documents({}) == 0
+
+
+def test_espera_entre_tentativas_e_limitada(db):
+    _inserir(db.fila, 1, tentativas_teste=30)
+    agenda = AgendaDeTentativas("teste", db[COLECAO_FALHAS_PERMANENTES], max_tentativas=50,
+                                espera_base_segundos=60, espera_maxima_segundos=120)
+
+    agenda.registrar_falha(db.fila, {"_id": 0}, 0, "erro")
+
+    doc = db.fila.find_one({"_id": 0})
+    assert doc["proxima_tentativa_teste_em"] <= datetime.now(timezone.utc) + timedelta(seconds=120)
+
+
+def test_tentativas_esgotadas_vao_para_falhas_permanentes(db):
+    _inserir(db.fila, 1)
+    fila = _fila(db.fila, "a", max_tentativas=2)
+    fila.reivindicar()
+    fila.registrar_falha(0, "primeiro erro")
+    _agendar_agora(db.fila, 0)
+    fila.reivindicar()
+
+    saida_bruta = "x" * (LIMITE_CARACTERES_SAIDA_BRUTA + 10)
+    assert fila.registrar_falha(0, "último erro", saida_bruta) == 2
+
+    doc = db.fila.find_one({"_id": 0})
+    assert doc["status"] == STATUS_FALHA_PERMANENTE
+    assert "trabalhador_teste" not in doc and "reserva_teste_ate" not in doc
+    falha = db[COLECAO_FALHAS_PERMANENTES].find_one({"etapa": "teste", "id_documento": 0})
+    assert falha["colecao"] == "fila"
+    assert falha["tentativas"] == 2
+    assert falha["ultimo_erro"] == "último erro"
+    assert len(falha["saida_bruta"]) == LIMITE_CARACTERES_SAIDA_BRUTA
+    _agendar_agora(db.fila, 0)
+    assert fila.reivindicar() is None
+
+
+def test_registrar_falha_sem_a_reserva_nao_conta_tentativa(db):
+    _inserir(db.fila, 1)
+    travado, novo = _fila(db.fila, "travado"), _fila(db.fila, "novo")
+    travado.reivindicar()
+    _vencer_reserva(db.fila, 0)
+    novo.reivindicar()
+
+    assert travado.registrar_falha(0, "erro") is None
+    doc = db.fila.find_one({"_id": 0})
+    assert "tentativas_teste" not in doc
+    assert doc["trabalhador_teste"] == "novo"
+
+
+def test_agenda_sem_fila_grava_campos_ao_esgotar(db):
+    """Uso do aumentador: sem status de fila, o documento esgotado é adiado indefinidamente."""
+    _inserir(db.fila, 1)
+    agenda = AgendaDeTentativas("teste", db[COLECAO_FALHAS_PERMANENTES], max_tentativas=2)
+    campos = {"campos_ao_esgotar": {agenda.campo_proxima_tentativa: ADIADO_INDEFINIDAMENTE}}
+
+    assert agenda.registrar_falha(db.fila, {"_id": 0}, 0, "erro", **campos) == 1
+    assert db.fila.find_one({"_id": 0})["proxima_tentativa_teste_em"] < ADIADO_INDEFINIDAMENTE
+    assert agenda.registrar_falha(db.fila, {"_id": 0}, 0, "erro", **campos) == 2
+
+    doc = db.fila.find_one({"_id": 0})
+    assert doc["proxima_tentativa_teste_em"] == ADIADO_INDEFINIDAMENTE
+    assert doc["status"] == "pendente"
+    assert db[COLECAO_FALHAS_PERMANENTES].count_documents({"id_documento": 0}) == 1
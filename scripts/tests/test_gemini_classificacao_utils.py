@@ -0,0 +1,56 @@
+"""Saída estruturada da classificação passando pela conversão real do SDK do Gemini."""
+import json
+
+import pytest
+
+pytest.importorskip("dotenv")
+pytest.importorskip("pymongo")
+genai = pytest.importorskip("google.generativeai")
+glm = pytest.importorskip("google.ai.generativelanguage")
+from google.generativeai.types import generation_types
+
+from dataset.migracao_dados.gemini_classificacao_utils import configuracao_geracao
+
+CAMPOS = {"CLASSIFICACAO", "EXPLICACAO", "CONFIANCA"}
+
+
+class ClienteFalso:
+    """Cliente do SDK que guarda a requisição e devolve uma resposta fixa."""
+
+    def __init__(self, texto):
+        self.texto = texto
+        self.requisicoes = []
+
+    def generate_content(self, request, **kwargs):
+        self.requisicoes.append(request)
+        return glm.GenerateContentResponse(
+            candidates=[{"content": {"parts": [{"text": self.texto}], "role": "model"}, "finish_reason": 1}]
+        )
+
+
+def test_esquema_de_um_texto_e_convertido_pelo_sdk():
+    esquema = generation_types.to_generation_config_dict(configuracao_geracao())["response_schema"]
+    assert esquema.type_ == glm.Type.OBJECT
+    assert set(esquema.properties) == CAMPOS
+    assert esquema.properties["CLASSIFICACAO"].type_ == glm.Type.INTEGER
+    assert esquema.properties["CONFIANCA"].type_ == glm.Type.NUMBER
+
+
+def test_esquema_em_lote_e_convertido_pelo_sdk():
+    esquema = generation_types.to_generation_config_dict(configuracao_geracao(em_lote=True))["response_schema"]
+    assert esquema.type_ == glm.Type.ARRAY
+    assert set(esquema.items.properties) == CAMPOS | {"id"}
+
+
+@pytest.mark.parametrize("em_lote", [False, True])
+def test_generate_content_envia_o_esquema(em_lote):
+    cliente = ClienteFalso(json.dumps({"CLASSIFICACAO": 1, "EXPLICACAO": "ok", "CONFIANCA": 0.9}))
+    modelo = genai.GenerativeModel("gemini-1.5-flash")
+    modelo._client = cliente
+
+    resposta = modelo.generate_content("texto", generation_config=configuracao_geracao(em_lote=em_lote))
+
+    assert json.loads(resposta.text)["CLASSIFICACAO"] == 1
+    config = cliente.requisicoes[0].generation_config
+    assert config.response_mime_type == "application/json"
+    assert config.response_schema.type_ == (glm.Type.ARRAY if em_lote else glm.Type.OBJECT)
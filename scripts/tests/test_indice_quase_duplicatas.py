@@ -0,0 +1,51 @@
+"""Gravação do índice de quase-duplicatas compartilhado entre processos."""
+import pytest
+
+pytest.importorskip("dotenv")
+pytest.importorskip("pymongo")
+pytest.importorskip("numpy")
+
+from dataset.migracao_dados.indice_quase_duplicatas import IndiceQuaseDuplicatas
+
+TEXTO_A = "o servidor solicitou a remoção do processo administrativo sigiloso da unidade"
+TEXTO_B = "a licitação para compra de papel foi homologada pela comissão na semana passada"
+
+
+def test_salvar_mescla_o_que_outro_processo_gravou(tmp_path):
+    """Dois processos com o mesmo arquivo: o último a gravar não apaga as entradas do outro."""
+    caminho = tmp_path / "indice.npz"
+    sintetizador, aumentador = IndiceQuaseDuplicatas(), IndiceQuaseDuplicatas()
+    sintetizador.inserir("chunks_sinteticos:1", TEXTO_A)
+    aumentador.inserir("chunks_sigilosos:2", TEXTO_B)
+
+    sintetizador.salvar(caminho)
+    aumentador.salvar(caminho)
+
+    assert sorted(IndiceQuaseDuplicatas.carregar(caminho).chaves) == ["chunks_sigilosos:2", "chunks_sinteticos:1"]
+    # As entradas mescladas também passam a valer nas consultas do processo que gravou
+    assert aumentador.consultar(TEXTO_A)[0] == "chunks_sinteticos:1"
+
+
+def test_reconstrucao_substitui_o_arquivo(tmp_path):
+    caminho = tmp_path / "indice.npz"
+    antigo = IndiceQuaseDuplicatas()
+    antigo.inserir("chunks_sigilosos:removido", TEXTO_A)
+    antigo.salvar(caminho)
+
+    refeito = IndiceQuaseDuplicatas()
+    refeito.inserir("chunks_sinteticos:1", TEXTO_B)
+    refeito.salvar(caminho, mesclar=False)
+
+    assert IndiceQuaseDuplicatas.carregar(caminho).chaves == ["chunks_sinteticos:1"]
+
+
+def test_salvar_se_alterado_respeita_o_intervalo(tmp_path):
+    caminho = tmp_path / "indice.npz"
+    indice = IndiceQuaseDuplicatas()
+    indice.inserir("chunks_sinteticos:1", TEXTO_A)
+
+    indice.salvar_se_alterado(caminho, intervalo_segundos=3600)
+    assert not caminho.exists()
+
+    indice.salvar_se_alterado(caminho, intervalo_segundos=0)
+    assert caminho.exists() and not indice.alterado
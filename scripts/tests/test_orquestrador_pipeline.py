@@ -0,0 +1,98 @@
+"""Gravação dos chunks sintéticos e devolução das reservas no encerramento do orquestrador."""
+import os
+
+import pytest
+
+pytest.importorskip("dotenv")
+pytest.importorskip("pymongo")
+pytest.importorskip("google.generativeai")
+os.environ.setdefault("GEMINI_API_KEY", "chave-de-teste")
+
+from dataset.migracao_dados import orquestrador_pipeline as orquestrador
+from dataset.migracao_dados.fila_trabalho_mongo import SEM_ESPERA, STATUS_EM_PROCESSAMENTO
+
+
+@pytest.fixture
+def pipeline(db):
+    pipeline = orquestrador.OrquestradorPipeline(db, 1, 1, 0)
+    pipeline.priorizador = None
+    return pipeline
+
+
+class ObservadorParado:
+    """Observador que nunca recebe eventos (o mongomock não tem change streams)."""
+
+    def iniciar(self):
+        return self
+
+    def aguardar(self, segundos):
+        return []
+
+    def parar(self):
+        pass
+
+
+def _sintetico(texto):
+    return {"texto_sintetico": texto, "status_rotulagem": "pendente", "nome_modelo": orquestrador.NOME_MODELO_SINTESE}
+
+
+def _pendentes(colecao, quantidade, **campos):
+    colecao.insert_many([{"_id": i, "erro_rotulagem": False, **campos} for i in range(quantidade)])
+
+
+def test_gravar_sinteticos_nao_reinicia_chunk_ja_existente(pipeline, db):
+    db.chunks_sinteticos.insert_one({"_id": "existente", "id_chunk_original": 1, "status_rotulagem": "concluida"})
+
+    inseridos, falhas = pipeline._gravar_sinteticos([(2, "2", _sintetico("outro")), (1, "1", _sintetico("novo texto"))])
+
+    assert inseridos == {0} and falhas == set()
+    existente = db.chunks_sinteticos.find_one({"id_chunk_original": 1})
+    assert existente["status_rotulagem"] == "concluida"
+    assert pipeline.fila_rotulagem.campo_trabalhador not in existente
+    assert pipeline.fila_rotulagem.campo_reserva not in existente
+    novo = db.chunks_sinteticos.find_one({"id_chunk_original": 2})
+    assert novo["status_rotulagem"] == STATUS_EM_PROCESSAMENTO
+    assert novo[pipeline.fila_rotulagem.campo_trabalhador] == pipeline.fila_rotulagem.id_trabalhador
+
+
+def test_alimentador_de_sintese_devolve_o_que_reservou_ao_encerrar(pipeline, db, monkeypatch):
+    _pendentes(db.chunks, 3, status_sintese="pendente", proxima_tentativa_sintese_em=SEM_ESPERA)
+
+    def reservar_e_parar(fila, sobra):
+        # O sinal de parada chega depois da reserva do lote e da sobra
+        lote = fila.reivindicar_lote(2)
+        sobra = fila.reivindicar()
+        pipeline.parar.set()
+        return lote, sobra
+    monkeypatch.setattr(orquestrador, "reservar_lote_por_orcamento", reservar_e_parar)
+    monkeypatch.setattr(orquestrador, "colocar", lambda fila, item, parar, medidor=None: False)
+    monkeypatch.setattr(orquestrador, "criar_observador", lambda fila: ObservadorParado())
+
+    pipeline._alimentar_sintese()
+
+    for doc in db.chunks.find():
+        assert doc["status_sintese"] == "pendente"
+        assert pipeline.fila_sintese.campo_trabalhador not in doc
+
+
+def test_encerramento_devolve_chunks_recolocados_na_fila_local(pipeline, db, monkeypatch):
+    _pendentes(db.chunks_sinteticos, 1, status_rotulagem="pendente", nome_modelo=orquestrador.NOME_MODELO_SINTESE,
+               proxima_tentativa_rotulagem_em=SEM_ESPERA, texto_sintetico="t")
+    chunk = pipeline.fila_rotulagem.reivindicar()
+    pipeline.a_rotular.put(chunk)
+
+    def quota_esgotada(chunk, fila, *args):
+        # Como em rotular_chunk com todas as chaves em cooldown: o chunk volta à fila local
+        fila.put_nowait(chunk)
+    monkeypatch.setattr(orquestrador, "rotular_chunk", quota_esgotada)
+    monkeypatch.setattr(orquestrador.OrquestradorPipeline, "_alimentar_sintese", lambda self: None)
+    monkeypatch.setattr(orquestrador.OrquestradorPipeline, "_alimentar_rotulagem", lambda self: None)
+    monkeypatch.setattr(orquestrador.OrquestradorPipeline, "_sintetizar", lambda self, medidor: None)
+    pipeline.parar.set()
+
+    pipeline.executar()
+
+    doc = db.chunks_sinteticos.find_one({"_id": 0})
+    assert doc["status_rotulagem"] == "pendente"
+    assert pipeline.fila_rotulagem.campo_trabalhador not in doc
+    assert pipeline.a_rotular.empty()
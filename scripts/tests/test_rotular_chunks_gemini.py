@@ -0,0 +1,34 @@
+"""Rotulagem em lote: pré-filtro local e envio ao Gemini."""
+import os
+
+import pytest
+
+pytest.importorskip("dotenv")
+pytest.importorskip("pymongo")
+pytest.importorskip("google.generativeai")
+os.environ.setdefault("GEMINI_API_KEY", "chave-de-teste")
+
+from dataset.migracao_dados import rotular_chunks_gemini as rotulador
+
+USO = {"tokens_entrada": 10, "tokens_saida": 5, "rotulados": 1, "chamadas": 1, "tokens_por_chunk": 15}
+
+
+def test_rotulo_local_invalido_segue_para_o_gemini(monkeypatch):
+    """Um rótulo local que não gera documento válido não pode derrubar o lote."""
+    chunks = [{"_id": 1, "texto_sintetico": "texto um"}, {"_id": 2, "texto_sintetico": "texto dois"}]
+    # Probabilidade arredondada para zero: montar_documento_rotulado devolve None
+    monkeypatch.setattr(rotulador, "prefiltrar", lambda textos: [(1, "Rotulado pelo classificador local.", 0.0, "v1"), None])
+    enviados, gravados = [], []
+
+    def executar(tokens, funcao):
+        enviados.append(tokens)
+        return ({"1": (2, "justificativa", 0.9, "v1"), "2": (0, "justificativa", 0.8, "v1")}, USO), None
+    monkeypatch.setattr(rotulador.pool_gemini, "executar", executar)
+    monkeypatch.setattr(rotulador.pool_gemini, "registrar_tokens", lambda *args: None)
+    monkeypatch.setattr(rotulador, "enfileirar_rotulo",
+                        lambda buffer, fila, colecao, chunk, novo_doc: gravados.append((chunk["_id"], novo_doc["origem_rotulo"])))
+
+    rotulador.rotular_lote_de_chunks(chunks, None, None, None)
+
+    assert len(enviados) == 1
+    assert gravados == [(1, rotulador.ORIGEM_GEMINI), (2, rotulador.ORIGEM_GEMINI)]